@@ -0,0 +1,195 @@
+/*
+ * Compares the throughput of `umash_fprint_fd`'s strategies, and of
+ * `umash_fprint_fd_pipelined`'s engines, on a file, when the file's
+ * pages are already in the page cache ("hot"), and after evicting
+ * them ("cold").
+ *
+ *   $ cc -O2 -std=gnu99 -W -Wall -mpclmul -I. bench/fd_bench.c \
+ *         umash_fd.c umash.c -pthread -o fd_bench
+ *   $ head -c 1G /dev/urandom > /var/tmp/umash.dat
+ *   $ ./fd_bench /var/tmp/umash.dat [TRIALS [QUEUE_DEPTH]]
+ *
+ * Cold runs evict the file with `POSIX_FADV_DONTNEED`, which does not
+ * need special privileges, but only drops clean pages.  The file
+ * should live on the storage device of interest (not tmpfs).
+ */
+#define _GNU_SOURCE
+#include <assert.h>
+#include <errno.h>
+#include <fcntl.h>
+#include <inttypes.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <sys/stat.h>
+#include <time.h>
+#include <unistd.h>
+
+#include "umash.h"
+#include "umash_fd.h"
+
+static struct umash_params my_params;
+
+/* 0 for the default queue depth. */
+static unsigned int queue_depth;
+
+static const struct strategy {
+	const char *name;
+	int flags;
+	bool pipelined;
+} strategies[] = {
+	{ "auto", 0, false },
+	{ "mmap", UMASH_FD_MMAP, false },
+	{ "pread", UMASH_FD_PREAD, false },
+	{ "direct", UMASH_FD_DIRECT, false },
+	{ "uring", 0, true },
+	{ "uring-d", UMASH_FD_DIRECT, true },
+	{ "threads", UMASH_FD_THREADS, true },
+	{ "thread-d", UMASH_FD_THREADS | UMASH_FD_DIRECT, true },
+};
+
+static double
+now(void)
+{
+	struct timespec ts;
+	int r;
+
+	r = clock_gettime(CLOCK_MONOTONIC, &ts);
+	assert(r == 0);
+	return ts.tv_sec + 1e-9 * ts.tv_nsec;
+}
+
+static bool
+run(struct umash_fp *fp, int fd, size_t size, const struct strategy *strategy)
+{
+	struct umash_fd_options options = {
+		.size = sizeof(options),
+		.flags = strategy->flags,
+		.queue_depth = queue_depth,
+	};
+
+	if (strategy->pipelined)
+		return umash_fprint_fd_pipelined(
+		    fp, &my_params, 0, fd, 0, size, &options);
+
+	return umash_fprint_fd(fp, &my_params, 0, fd, 0, size, strategy->flags);
+}
+
+static void
+evict(int fd)
+{
+
+	(void)fdatasync(fd);
+	(void)posix_fadvise(fd, 0, 0, POSIX_FADV_DONTNEED);
+	return;
+}
+
+static int
+cmp_double(const void *x, const void *y)
+{
+	double a = *(const double *)x;
+	double b = *(const double *)y;
+
+	return (a > b) - (a < b);
+}
+
+static void
+bench_strategy(int fd, size_t size, const struct strategy *strategy, bool cold,
+    size_t n_trials, struct umash_fp *expected)
+{
+	double *timings = calloc(n_trials, sizeof(*timings));
+	double best, median;
+
+	assert(timings != NULL);
+
+	/* Warm up, or make sure the first trial is cold. */
+	if (cold) {
+		evict(fd);
+	} else {
+		struct umash_fp fp;
+
+		if (!run(&fp, fd, size, strategy)) {
+			fprintf(stderr, "%-8s %s: failed (%s)\n", strategy->name,
+			    cold ? "cold" : "hot", strerror(errno));
+			free(timings);
+			return;
+		}
+	}
+
+	for (size_t i = 0; i < n_trials; i++) {
+		struct umash_fp fp;
+		double begin;
+
+		if (cold)
+			evict(fd);
+
+		begin = now();
+		if (!run(&fp, fd, size, strategy)) {
+			fprintf(stderr, "%-8s %s: failed (%s)\n", strategy->name,
+			    cold ? "cold" : "hot", strerror(errno));
+			free(timings);
+			return;
+		}
+
+		timings[i] = now() - begin;
+		if (expected->hash[0] != fp.hash[0] || expected->hash[1] != fp.hash[1]) {
+			fprintf(stderr, "%s: fingerprint mismatch\n", strategy->name);
+			abort();
+		}
+	}
+
+	qsort(timings, n_trials, sizeof(*timings), cmp_double);
+	best = timings[0];
+	median = timings[n_trials / 2];
+	printf("%-8s %-4s best %8.3f GB/s median %8.3f GB/s\n", strategy->name,
+	    cold ? "cold" : "hot", (size / best) * 1e-9, (size / median) * 1e-9);
+	free(timings);
+	return;
+}
+
+int
+main(int argc, char **argv)
+{
+	struct umash_fp expected;
+	struct stat st;
+	size_t n_trials = 5;
+	int fd;
+
+	if (argc < 2) {
+		fprintf(stderr, "Usage: %s FILE [TRIALS [QUEUE_DEPTH]]\n", argv[0]);
+		return 1;
+	}
+
+	if (argc > 2)
+		n_trials = strtoul(argv[2], NULL, 10);
+	assert(n_trials > 0);
+
+	if (argc > 3)
+		queue_depth = strtoul(argv[3], NULL, 10);
+
+	umash_params_derive(&my_params, 0, NULL);
+
+	fd = open(argv[1], O_RDONLY);
+	if (fd < 0 || fstat(fd, &st) != 0) {
+		perror("open");
+		return 1;
+	}
+
+	if (!umash_fprint_fd(
+		&expected, &my_params, 0, fd, 0, st.st_size, UMASH_FD_PREAD)) {
+		perror("umash_fprint_fd");
+		return 1;
+	}
+
+	printf("%s: %" PRIu64 " bytes, fingerprint %016" PRIx64 " %016" PRIx64 "\n",
+	    argv[1], (uint64_t)st.st_size, expected.hash[0], expected.hash[1]);
+
+	for (size_t cold = 0; cold < 2; cold++) {
+		for (size_t i = 0; i < sizeof(strategies) / sizeof(strategies[0]); i++)
+			bench_strategy(fd, st.st_size, &strategies[i], cold != 0,
+			    n_trials, &expected);
+	}
+
+	close(fd);
+	return 0;
+}
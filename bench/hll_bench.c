@@ -0,0 +1,183 @@
+/*
+ * Measures the throughput of `umash_hll` insertions, one key per
+ * call, with `umash_hll_insert_many`, and with
+ * `umash_hll_insert_rows`, for fixed-size keys, as well as the cost
+ * of merging and estimating dense sketches.
+ *
+ *   $ cc -O2 -std=gnu99 -W -Wall -mpclmul -I. bench/hll_bench.c \
+ *         umash_hll.c umash.c -o hll_bench
+ *   $ ./hll_bench [KEYS [PRECISION]]
+ *
+ * Keys are distinct little-endian counters, zero-padded to the key
+ * size, so the sketch quickly switches to the dense representation.
+ */
+#include <assert.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <time.h>
+
+#include "umash.h"
+#include "umash_hll.h"
+
+static const size_t key_sizes[] = { 8, 16, 64 };
+
+static double
+now(void)
+{
+	struct timespec ts;
+	int r;
+
+	r = clock_gettime(CLOCK_MONOTONIC, &ts);
+	assert(r == 0);
+	return ts.tv_sec + 1e-9 * ts.tv_nsec;
+}
+
+static struct umash_hll *
+create(unsigned int precision, bool dense)
+{
+	struct umash_hll *ret;
+
+	ret = umash_hll_create(&(struct umash_hll_options) {
+	    .size = sizeof(struct umash_hll_options),
+	    .precision = precision,
+	    .dense = dense,
+	});
+	if (ret == NULL) {
+		perror("umash_hll_create");
+		exit(1);
+	}
+
+	return ret;
+}
+
+static void
+report(const char *name, size_t n, double elapsed, const struct umash_hll *hll)
+{
+
+	printf("  %-12s %8.2f Mkeys/s %7.1f ns/key", name, 1e-6 * n / elapsed,
+	    1e9 * elapsed / n);
+	if (hll != NULL)
+		printf("  (estimate %.0f)", umash_hll_estimate(hll));
+	printf("\n");
+	return;
+}
+
+static void
+bench_insert(size_t key_size, size_t n_keys, unsigned int precision)
+{
+	struct umash_hll *hll;
+	const void **keys;
+	size_t *lengths;
+	char *rows;
+	double begin;
+	bool r;
+
+	rows = calloc(n_keys, key_size);
+	keys = calloc(n_keys, sizeof(*keys));
+	lengths = calloc(n_keys, sizeof(*lengths));
+	assert(rows != NULL && keys != NULL && lengths != NULL);
+
+	for (size_t i = 0; i < n_keys; i++) {
+		uint64_t counter = i;
+
+		memcpy(&rows[i * key_size], &counter, sizeof(counter));
+		keys[i] = &rows[i * key_size];
+		lengths[i] = key_size;
+	}
+
+	printf("%zu-byte keys\n", key_size);
+
+	hll = create(precision, false);
+	begin = now();
+	for (size_t i = 0; i < n_keys; i++) {
+		r = umash_hll_insert(hll, keys[i], lengths[i]);
+		assert(r);
+	}
+	report("insert", n_keys, now() - begin, hll);
+	umash_hll_destroy(hll);
+
+	hll = create(precision, false);
+	begin = now();
+	r = umash_hll_insert_many(hll, keys, lengths, n_keys);
+	assert(r);
+	report("insert_many", n_keys, now() - begin, hll);
+	umash_hll_destroy(hll);
+
+	hll = create(precision, false);
+	begin = now();
+	r = umash_hll_insert_rows(hll, rows, key_size, n_keys);
+	assert(r);
+	report("insert_rows", n_keys, now() - begin, hll);
+	umash_hll_destroy(hll);
+
+	free(lengths);
+	free(keys);
+	free(rows);
+	return;
+}
+
+static void
+bench_merge(unsigned int precision)
+{
+	const size_t repeat = 10000;
+	struct umash_hll *dst, *src;
+	size_t m = (size_t)1 << precision;
+	double begin, elapsed;
+	double estimate = 0;
+
+	dst = create(precision, true);
+	src = create(precision, true);
+	for (uint64_t i = 0; i < 4 * m; i++) {
+		uint64_t key = i;
+
+		umash_hll_insert(src, &key, sizeof(key));
+		key += 4 * m;
+		umash_hll_insert(dst, &key, sizeof(key));
+	}
+
+	begin = now();
+	for (size_t i = 0; i < repeat; i++) {
+		bool r = umash_hll_merge(dst, src);
+
+		assert(r);
+	}
+	elapsed = now() - begin;
+	printf("  merge p=%-2u   %8.2f us/merge %7.2f GB/s\n", precision,
+	    1e6 * elapsed / repeat, 1e-9 * m * repeat / elapsed);
+
+	begin = now();
+	for (size_t i = 0; i < repeat / 10; i++)
+		estimate += umash_hll_estimate(dst);
+	elapsed = now() - begin;
+	printf("  estimate p=%-2u %8.2f us/estimate  (%.0f for %zu keys)\n", precision,
+	    1e6 * elapsed / (repeat / 10), estimate / (repeat / 10), 8 * m);
+
+	umash_hll_destroy(src);
+	umash_hll_destroy(dst);
+	return;
+}
+
+int
+main(int argc, char **argv)
+{
+	size_t n_keys = 1000000;
+	unsigned int precision = 14;
+
+	if (argc > 1)
+		n_keys = strtoul(argv[1], NULL, 10);
+	if (argc > 2)
+		precision = strtoul(argv[2], NULL, 10);
+	assert(n_keys > 0);
+	assert(
+	    precision >= UMASH_HLL_MIN_PRECISION && precision <= UMASH_HLL_MAX_PRECISION);
+
+	printf("%zu keys, precision %u\n", n_keys, precision);
+	for (size_t i = 0; i < sizeof(key_sizes) / sizeof(key_sizes[0]); i++)
+		bench_insert(key_sizes[i], n_keys, precision);
+
+	printf("dense sketches\n");
+	bench_merge(14);
+	bench_merge(18);
+	return 0;
+}
@@ -1,8 +1,10 @@
 #include "bench/runner.h"
 
 #include <assert.h>
+#include <immintrin.h>
 #include <stdlib.h>
 #include <string.h>
+#include <sys/mman.h>
 
 #include "umash.h"
 
@@ -82,6 +84,20 @@ get_ticks_end(void)
  */
 #define JITTER_MASK ALLOC_ALIGNMENT
 
+/**
+ * Cold benchmarks align their buffer to huge pages, so that the
+ * kernel may back it with huge pages (and we only measure cache
+ * misses, not TLB misses).
+ */
+#define HUGE_PAGE_SIZE (2UL << 20)
+
+/**
+ * Number of rounds for each input size and loop in
+ * `umash_bench_calibrate_threshold`.  We keep the fastest round, and
+ * alternate between the two loops to average out frequency changes.
+ */
+#define CALIBRATION_ROUNDS 5
+
 uint64_t
 ID(umash_bench_aggregate)(const size_t *input_len, size_t num_trials, size_t max_len)
 {
@@ -211,3 +227,118 @@ ID(umash_bench_fp_individual)(const struct bench_individual_options *options,
 	free(buf);
 	return;
 }
+
+static uint64_t
+calibration_trial(const char *buf, size_t len, size_t num_trials)
+{
+	uint64_t begin, end;
+	uint64_t seed = 0;
+
+	begin = get_ticks_begin(&seed);
+	seed += begin;
+	for (size_t i = 0; i < num_trials; i++) {
+		struct umash_fp fp;
+
+		seed += umash_full(&params[seed & PARAMS_MASK], seed, /*which=*/0,
+		    buf + (seed & JITTER_MASK), len);
+		fp = umash_fprint(
+		    &params[seed & PARAMS_MASK], seed, buf + (seed & JITTER_MASK), len);
+		seed += fp.hash[0] ^ fp.hash[1];
+	}
+
+	end = get_ticks_end();
+	return end - begin;
+}
+
+size_t
+ID(umash_bench_calibrate_threshold)(size_t max_len, size_t num_trials)
+{
+	size_t bufsz = ALLOC_ALIGNMENT * (1 + (max_len + JITTER_MASK) / ALLOC_ALIGNMENT);
+	const size_t previous = umash_multiple_blocks_threshold_get();
+	size_t threshold = SIZE_MAX;
+	char *buf;
+
+	if (posix_memalign((void *)&buf, ALLOC_ALIGNMENT, bufsz) != 0)
+		assert(0 && "Failed to allocate buffer.");
+
+	memset(buf, 0x42, max_len + JITTER_MASK);
+
+	for (size_t len = max_len - (max_len % UMASH_BLOCK_SIZE); len >= UMASH_BLOCK_SIZE;
+	    len -= UMASH_BLOCK_SIZE) {
+		/* best[0] for the block-at-a-time loop, best[1] for bulk. */
+		uint64_t best[2] = { UINT64_MAX, UINT64_MAX };
+
+		for (size_t round = 0; round < CALIBRATION_ROUNDS; round++) {
+			for (size_t bulk = 0; bulk < 2; bulk++) {
+				uint64_t ticks;
+
+				umash_multiple_blocks_threshold_set(
+				    (bulk != 0) ? UMASH_BLOCK_SIZE : SIZE_MAX);
+				ticks = calibration_trial(buf, len, num_trials);
+				if (ticks < best[bulk])
+					best[bulk] = ticks;
+			}
+		}
+
+		if (best[1] > best[0])
+			break;
+
+		threshold = len;
+	}
+
+	umash_multiple_blocks_threshold_set(previous);
+	free(buf);
+	return threshold;
+}
+
+static void
+flush_buffer(const char *buf, size_t len)
+{
+
+	for (size_t i = 0; i < len; i += 64)
+		_mm_clflush(buf + i);
+
+	_mm_mfence();
+	return;
+}
+
+void
+ID(umash_bench_fp_cold)(const struct bench_cold_options *options,
+    uint64_t *restrict timings, size_t len, size_t num_trials)
+{
+	size_t bufsz = HUGE_PAGE_SIZE * (1 + len / HUGE_PAGE_SIZE);
+	size_t prefetch_distance = options->prefetch_distance;
+	char *buf;
+	uint64_t seed = 0;
+
+	if (posix_memalign((void *)&buf, HUGE_PAGE_SIZE, bufsz) != 0)
+		assert(0 && "Failed to allocate buffer.");
+
+	(void)madvise(buf, bufsz, MADV_HUGEPAGE);
+	memset(buf, 0x42, bufsz);
+
+	for (size_t i = 0; i < num_trials; i++) {
+		struct umash_fp fp;
+		uint64_t begin, end;
+
+		flush_buffer(buf, len);
+
+		begin = get_ticks_begin(&seed);
+		seed += begin;
+
+		if (prefetch_distance == 0) {
+			fp = umash_fprint(&params[seed & PARAMS_MASK], seed, buf, len);
+		} else {
+			fp = umash_fprint_cold(&params[seed & PARAMS_MASK], seed, buf,
+			    len, prefetch_distance);
+		}
+
+		end = get_ticks_end();
+		seed += fp.hash[0] ^ fp.hash[1] ^ end;
+
+		timings[i] = end - begin;
+	}
+
+	free(buf);
+	return;
+}
@@ -30,6 +30,15 @@ struct bench_individual_options {
 #define ID_(X, Y) ID__(X, Y)
 #define ID__(X, Y) X##Y
 
+struct bench_cold_options {
+	size_t size; /* sizeof(struct bench_cold_options) */
+	/*
+	 * 0 to call `umash_fprint`, otherwise the prefetch distance
+	 * for `umash_fprint_cold`.
+	 */
+	size_t prefetch_distance;
+};
+
 /**
  * Returns the aggregate latency to compute `num_trials`
  * UMASH hashes.
@@ -79,3 +88,31 @@ void ID(umash_bench_individual)(const struct bench_individual_options *,
  */
 void ID(umash_bench_fp_individual)(const struct bench_individual_options *,
     uint64_t *timings, const size_t *input_len, size_t num_trials, size_t max_len);
+
+/**
+ * Measures the input size at which the bulk `umash_multiple_blocks`
+ * loop starts beating the block-at-a-time loop on this machine.
+ *
+ * The runner links its own copy of umash, so this leaves its
+ * threshold unchanged: callers must pass the result to
+ * `umash_multiple_blocks_threshold_set` in the umash they use.
+ *
+ * We time hashes and fingerprints for multiples of `UMASH_BLOCK_SIZE`,
+ * from `max_len` down, and stop as soon as the bulk loop is slower.
+ *
+ * @param max_len the longest input size to time.
+ * @param num_trials number of hashes and fingerprints per size and loop.
+ * @return the new threshold, or SIZE_MAX if the bulk loop is never
+ *   faster.
+ */
+size_t ID(umash_bench_calibrate_threshold)(size_t max_len, size_t num_trials);
+
+/**
+ * Evaluates cycle timings for fingerprinting the same `len`-byte
+ * buffer `num_trials` times, after flushing it from cache before each
+ * trial.  The buffer is aligned to 2 MB, and we ask for huge pages.
+ *
+ * @param timings[OUT]: populated with the timing for each trial.
+ */
+void ID(umash_bench_fp_cold)(
+    const struct bench_cold_options *, uint64_t *timings, size_t len, size_t num_trials);
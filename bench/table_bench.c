@@ -0,0 +1,296 @@
+/*
+ * Measures the throughput of `umash_table` inserts, successful and
+ * failed lookups, and deletes, on a pool of threads, for keys whose
+ * lengths follow a given distribution.
+ *
+ *   $ cc -O2 -std=gnu99 -W -Wall -mpclmul -I. bench/table_bench.c \
+ *         umash_table.c umash.c -pthread -o table_bench
+ *   $ ./table_bench DISTRIBUTION [THREADS [KEYS]]
+ *
+ * The distribution is one of `fixed:N` (all keys are N bytes long),
+ * `uniform:A-B` (lengths uniformly distributed in [A, B]), or the
+ * path to a file with one length per line, e.g., the sizes of the
+ * `umash_full` calls in a trace, which the benchmark cycles through.
+ *
+ * Each thread inserts, looks up, and deletes its own slice of the
+ * keys, so the timings include contention on shard locks, but not
+ * on individual entries.  Key bytes are random, so short keys may
+ * repeat; repeated insertions simply overwrite the previous value.
+ */
+#define _GNU_SOURCE
+#include <assert.h>
+#include <inttypes.h>
+#include <pthread.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <time.h>
+
+#include "umash.h"
+#include "umash_table.h"
+
+struct keys {
+	size_t n;
+	size_t *offsets; /* n + 1 offsets into bytes. */
+	char *bytes;
+};
+
+enum phase {
+	PHASE_INSERT,
+	PHASE_HIT,
+	PHASE_MISS,
+	PHASE_DELETE,
+	PHASE_COUNT,
+};
+
+static const char *const phase_names[PHASE_COUNT] = {
+	"insert",
+	"lookup (hit)",
+	"lookup (miss)",
+	"delete",
+};
+
+struct worker {
+	pthread_t thread;
+	struct umash_table *table;
+	enum phase phase;
+	size_t begin;
+	size_t end;
+	size_t found;
+};
+
+static struct keys present;
+static struct keys absent;
+
+static double
+now(void)
+{
+	struct timespec ts;
+	int r;
+
+	r = clock_gettime(CLOCK_MONOTONIC, &ts);
+	assert(r == 0);
+	return ts.tv_sec + 1e-9 * ts.tv_nsec;
+}
+
+static uint64_t
+xorshift(uint64_t *state)
+{
+	uint64_t x = *state;
+
+	x ^= x << 13;
+	x ^= x >> 7;
+	x ^= x << 17;
+	*state = x;
+	return x;
+}
+
+/*
+ * Fills `lengths[0 ... n)` according to `spec`.
+ */
+static void
+parse_lengths(size_t *lengths, size_t n, const char *spec, uint64_t *rng)
+{
+	unsigned long a, b;
+
+	if (sscanf(spec, "fixed:%lu", &a) == 1) {
+		for (size_t i = 0; i < n; i++)
+			lengths[i] = a;
+		return;
+	}
+
+	if (sscanf(spec, "uniform:%lu-%lu", &a, &b) == 2 && a <= b) {
+		for (size_t i = 0; i < n; i++)
+			lengths[i] = a + xorshift(rng) % (b - a + 1);
+		return;
+	}
+
+	{
+		FILE *file = fopen(spec, "r");
+		size_t *cycle = NULL;
+		size_t n_cycle = 0, capacity = 0;
+		unsigned long len;
+
+		if (file == NULL) {
+			perror(spec);
+			exit(1);
+		}
+
+		while (fscanf(file, "%lu", &len) == 1) {
+			if (n_cycle == capacity) {
+				capacity = 2 * capacity + 1024;
+				cycle = realloc(cycle, capacity * sizeof(*cycle));
+				assert(cycle != NULL);
+			}
+
+			cycle[n_cycle++] = len;
+		}
+
+		fclose(file);
+		if (n_cycle == 0) {
+			fprintf(stderr, "%s: no lengths\n", spec);
+			exit(1);
+		}
+
+		for (size_t i = 0; i < n; i++)
+			lengths[i] = cycle[i % n_cycle];
+		free(cycle);
+	}
+
+	return;
+}
+
+static void
+make_keys(struct keys *keys, const size_t *lengths, size_t n, uint64_t *rng)
+{
+	size_t total = 0;
+
+	keys->n = n;
+	keys->offsets = calloc(n + 1, sizeof(*keys->offsets));
+	assert(keys->offsets != NULL);
+	for (size_t i = 0; i < n; i++) {
+		keys->offsets[i] = total;
+		total += lengths[i];
+	}
+
+	keys->offsets[n] = total;
+	keys->bytes = malloc(total + sizeof(uint64_t));
+	assert(keys->bytes != NULL);
+	for (size_t i = 0; i < total; i += sizeof(uint64_t)) {
+		uint64_t word = xorshift(rng);
+
+		memcpy(&keys->bytes[i], &word, sizeof(word));
+	}
+
+	return;
+}
+
+static void *
+work(void *arg)
+{
+	struct worker *worker = arg;
+	const struct keys *keys = (worker->phase == PHASE_MISS) ? &absent : &present;
+
+	for (size_t i = worker->begin; i < worker->end; i++) {
+		const char *key = &keys->bytes[keys->offsets[i]];
+		size_t n = keys->offsets[i + 1] - keys->offsets[i];
+		uint64_t value;
+
+		switch (worker->phase) {
+		case PHASE_INSERT:
+			if (!umash_table_insert(worker->table, key, n, i)) {
+				perror("umash_table_insert");
+				abort();
+			}
+			break;
+		case PHASE_HIT:
+		case PHASE_MISS:
+			worker->found +=
+			    umash_table_lookup(worker->table, key, n, &value);
+			break;
+		case PHASE_DELETE:
+			worker->found +=
+			    umash_table_delete(worker->table, key, n, &value);
+			break;
+		default:
+			abort();
+		}
+	}
+
+	return NULL;
+}
+
+static void
+run_phase(struct umash_table *table, enum phase phase, size_t n_threads)
+{
+	struct worker workers[n_threads];
+	size_t n = present.n;
+	size_t found = 0;
+	double begin, elapsed;
+
+	begin = now();
+	for (size_t i = 0; i < n_threads; i++) {
+		int r;
+
+		workers[i] = (struct worker) {
+			.table = table,
+			.phase = phase,
+			.begin = (n * i) / n_threads,
+			.end = (n * (i + 1)) / n_threads,
+		};
+
+		r = pthread_create(&workers[i].thread, NULL, work, &workers[i]);
+		assert(r == 0);
+	}
+
+	for (size_t i = 0; i < n_threads; i++) {
+		pthread_join(workers[i].thread, NULL);
+		found += workers[i].found;
+	}
+
+	elapsed = now() - begin;
+	printf("%-14s %8.2f Mops/s %7.1f ns/op", phase_names[phase], 1e-6 * n / elapsed,
+	    1e9 * elapsed * n_threads / n);
+	if (phase != PHASE_INSERT)
+		printf("  (%zu found)", found);
+	printf("\n");
+	return;
+}
+
+int
+main(int argc, char **argv)
+{
+	struct umash_params params;
+	struct umash_table_stats stats;
+	struct umash_table *table;
+	size_t n_threads = 1;
+	size_t n_keys = 1000000;
+	size_t *lengths;
+	uint64_t rng = 0x9e3779b97f4a7c15ULL;
+
+	if (argc < 2) {
+		fprintf(stderr,
+		    "Usage: %s fixed:N|uniform:A-B|LENGTHS_FILE [THREADS [KEYS]]\n",
+		    argv[0]);
+		return 1;
+	}
+
+	if (argc > 2)
+		n_threads = strtoul(argv[2], NULL, 10);
+	if (argc > 3)
+		n_keys = strtoul(argv[3], NULL, 10);
+	assert(n_threads > 0 && n_keys > 0);
+
+	lengths = calloc(n_keys, sizeof(*lengths));
+	assert(lengths != NULL);
+	parse_lengths(lengths, n_keys, argv[1], &rng);
+	make_keys(&present, lengths, n_keys, &rng);
+	make_keys(&absent, lengths, n_keys, &rng);
+	free(lengths);
+
+	umash_params_derive(&params, 0, NULL);
+	table = umash_table_create(&(struct umash_table_options) {
+	    .size = sizeof(struct umash_table_options),
+	    .params = &params,
+	});
+	if (table == NULL) {
+		perror("umash_table_create");
+		return 1;
+	}
+
+	printf("%s: %zu keys, %.1f bytes/key, %zu threads\n", argv[1], n_keys,
+	    (double)present.offsets[n_keys] / n_keys, n_threads);
+	for (size_t phase = 0; phase < PHASE_COUNT; phase++) {
+		run_phase(table, phase, n_threads);
+		if (phase == PHASE_INSERT) {
+			umash_table_stats(table, &stats);
+			printf("  %" PRIu64 " entries, %" PRIu64 " slots, %" PRIu64
+			       " resizes, %" PRIu64 " rotations\n",
+			    stats.entries, stats.capacity, stats.resizes,
+			    stats.rotations);
+		}
+	}
+
+	umash_table_destroy(table);
+	return 0;
+}
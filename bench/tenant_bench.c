@@ -0,0 +1,164 @@
+/*
+ * Measures the latency of hashing a short key with a randomly chosen
+ * tenant's parameters, when there are so many tenants that their
+ * parameters are almost never cached.  Compares a table of full
+ * `struct umash_params` with a table of `struct umash_params_compact`.
+ *
+ *   $ cc -O2 -std=gnu99 -W -Wall -mpclmul -I. bench/tenant_bench.c \
+ *         umash.c -o tenant_bench
+ *   $ ./tenant_bench [TENANTS [LOOKUPS]]
+ *
+ * Each lookup depends on the previous one's hash value, so the
+ * timings include the full cache miss latency, instead of letting the
+ * CPU overlap independent misses.
+ */
+#define _GNU_SOURCE
+#include <assert.h>
+#include <inttypes.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <time.h>
+
+#include "umash.h"
+
+static const size_t key_sizes[] = { 8, 16, 64 };
+
+static double
+now(void)
+{
+	struct timespec ts;
+	int r;
+
+	r = clock_gettime(CLOCK_MONOTONIC, &ts);
+	assert(r == 0);
+	return ts.tv_sec + 1e-9 * ts.tv_nsec;
+}
+
+static void *
+alloc_table(size_t n, size_t size)
+{
+	void *ret = NULL;
+
+	if (posix_memalign(&ret, 64, n * size) != 0) {
+		perror("posix_memalign");
+		exit(1);
+	}
+
+	return ret;
+}
+
+static struct umash_params *
+full_table(size_t n_tenants)
+{
+	struct umash_params *ret = alloc_table(n_tenants, sizeof(*ret));
+
+	/* All tenants share a key, but they're still distinct structs. */
+	umash_params_derive(&ret[0], 0, NULL);
+	for (size_t i = 1; i < n_tenants; i++)
+		ret[i] = ret[0];
+
+	return ret;
+}
+
+static struct umash_params_compact *
+compact_table(size_t n_tenants)
+{
+	struct umash_params_compact *ret = alloc_table(n_tenants, sizeof(*ret));
+	struct umash_params params;
+
+	umash_params_derive(&params, 0, NULL);
+	for (size_t i = 0; i < n_tenants; i++)
+		umash_params_compact_init(&ret[i], &params);
+
+	return ret;
+}
+
+static double
+bench_full(const struct umash_params *table, size_t n_tenants, size_t n_lookups,
+    const char *key, size_t key_size, uint64_t *acc)
+{
+	uint64_t h = *acc;
+	double begin = now();
+
+	for (size_t i = 0; i < n_lookups; i++) {
+		uint64_t tenant = (h ^ (i * 0x9e3779b97f4a7c15ULL)) % n_tenants;
+
+		h = umash_full(&table[tenant], 0, 0, key, key_size);
+	}
+
+	*acc = h;
+	return (now() - begin) * 1e9 / n_lookups;
+}
+
+static double
+bench_compact(const struct umash_params_compact *table, size_t n_tenants,
+    size_t n_lookups, const char *key, size_t key_size, uint64_t *acc)
+{
+	uint64_t h = *acc;
+	double begin = now();
+
+	for (size_t i = 0; i < n_lookups; i++) {
+		uint64_t tenant = (h ^ (i * 0x9e3779b97f4a7c15ULL)) % n_tenants;
+
+		h = umash_full_compact(&table[tenant], 0, key, key_size);
+	}
+
+	*acc = h;
+	return (now() - begin) * 1e9 / n_lookups;
+}
+
+int
+main(int argc, char **argv)
+{
+	char key[64];
+	size_t n_tenants = 1000 * 1000;
+	size_t n_lookups = 10 * 1000 * 1000;
+	uint64_t acc_full = 0, acc_compact = 0;
+	double full[sizeof(key_sizes) / sizeof(key_sizes[0])];
+
+	if (argc > 1)
+		n_tenants = strtoul(argv[1], NULL, 10);
+	if (argc > 2)
+		n_lookups = strtoul(argv[2], NULL, 10);
+	assert(n_tenants > 0 && n_lookups > 0);
+
+	memset(key, 'x', sizeof(key));
+
+	/* Only allocate one table at a time, to keep the footprint stable. */
+	{
+		struct umash_params *table = full_table(n_tenants);
+
+		printf("full:    %zu tenants, %.1f MB\n", n_tenants,
+		    n_tenants * sizeof(*table) * 1e-6);
+		for (size_t i = 0; i < sizeof(key_sizes) / sizeof(key_sizes[0]); i++)
+			full[i] = bench_full(
+			    table, n_tenants, n_lookups, key, key_sizes[i], &acc_full);
+		free(table);
+	}
+
+	{
+		struct umash_params_compact *table = compact_table(n_tenants);
+
+		printf("compact: %zu tenants, %.1f MB\n", n_tenants,
+		    n_tenants * sizeof(*table) * 1e-6);
+		for (size_t i = 0; i < sizeof(key_sizes) / sizeof(key_sizes[0]); i++) {
+			double compact = bench_compact(
+			    table, n_tenants, n_lookups, key, key_sizes[i], &acc_compact);
+
+			printf("%2zu-byte keys: full %6.1f ns/lookup compact %6.1f "
+			       "ns/lookup\n",
+			    key_sizes[i], full[i], compact);
+		}
+		free(table);
+	}
+
+	/* Both tables hold the same key, so the chains must match. */
+	if (acc_full != acc_compact) {
+		fprintf(stderr, "hash mismatch: %016" PRIx64 " %016" PRIx64 "\n",
+		    acc_full, acc_compact);
+		return 1;
+	}
+
+	return 0;
+}
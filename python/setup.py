@@ -0,0 +1,41 @@
+"""
+Builds the `umash` Python package, a CPython extension around the C
+library in the parent directory.
+
+    $ pip install ./python
+"""
+import os
+import platform
+
+from setuptools import Extension, setup
+
+TOPLEVEL = os.path.relpath(os.path.join(os.path.dirname(__file__), ".."))
+
+if platform.machine() in ("aarch64", "arm64"):
+    ARCH_FLAGS = ["-march=armv8-a+crypto"]
+else:
+    ARCH_FLAGS = ["-mpclmul"]
+
+setup(
+    name="umash",
+    version="0.1.0",
+    description="Python bindings for UMASH, a fast almost universal hash",
+    license="MIT",
+    packages=["umash"],
+    ext_modules=[
+        Extension(
+            "umash._umash",
+            sources=[
+                os.path.join("umash", "_umash.c"),
+                os.path.join(TOPLEVEL, "umash.c"),
+            ],
+            depends=[
+                os.path.join(TOPLEVEL, "umash.h"),
+                os.path.join(TOPLEVEL, "umash_long.inc"),
+            ],
+            include_dirs=[TOPLEVEL],
+            extra_compile_args=["-std=gnu99"] + ARCH_FLAGS,
+        )
+    ],
+    python_requires=">=3.7",
+)
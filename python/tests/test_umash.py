@@ -0,0 +1,157 @@
+"""
+Test suite for the CPython extension.
+"""
+import array
+import mmap
+import os
+import pickle
+import struct
+import sys
+import threading
+
+from hypothesis import given
+import hypothesis.strategies as st
+import pytest
+import umash
+
+# The reference implementation is at the top level.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../.."))
+from umash_reference import umash as umash_reference, UmashKey
+
+
+U64S = st.integers(min_value=0, max_value=2**64 - 1)
+
+
+FIELD = 2**61 - 1
+
+
+OH_COUNT = umash.BLOCK_SIZE // 8 + 2
+
+
+def test_example():
+    """Reproduce the output of `example.c`."""
+    params = umash.Params(0, b"hello example.c".ljust(32, b"\0"))
+    data = b"the quick brown fox"
+    assert umash.fprint(data, 42, params=params) == (
+        0x398C5BB5CC113D03,
+        0x3A52693519575ABA,
+    )
+    assert umash.hash(data, seed=42, which=0, params=params) == 0x398C5BB5CC113D03
+    assert umash.hash(data, seed=42, which=1, params=params) == 0x3A52693519575ABA
+
+
+def test_hash_which():
+    """`which` selects one of the two fingerprint halves, and nothing else."""
+    for which in (-1, 2):
+        with pytest.raises(ValueError):
+            umash.hash(b"abc", which=which)
+
+
+@given(
+    seed=U64S,
+    multiplier=st.integers(min_value=0, max_value=FIELD - 1),
+    key=st.lists(U64S, min_size=OH_COUNT, max_size=OH_COUNT),
+    data=st.binary(),
+)
+def test_hash_reference(seed, multiplier, key, data):
+    """Compare `umash.hash` with the reference, through raw params."""
+    raw = struct.pack("<38Q", (multiplier**2) % FIELD, multiplier, 0, 0, *key)
+    params = umash.Params.from_buffer(raw)
+    expected = umash_reference(
+        UmashKey(poly=multiplier, oh=key), seed, data, secondary=False
+    )
+    assert umash.hash(data, seed, params=params) == expected
+
+
+@given(bits=U64S, seed=U64S, data=st.binary())
+def test_fprint_hash(bits, seed, data):
+    """The fingerprint should consist of the two hash values."""
+    params = umash.Params(bits)
+    assert umash.fprint(data, seed, params=params) == (
+        umash.hash(data, seed, 0, params=params),
+        umash.hash(data, seed, 1, params=params),
+    )
+
+
+def test_default_params():
+    """params=None should match `umash_params_derive(0, NULL)`."""
+    data = os.urandom(1000)
+    assert umash.fprint(data) == umash.fprint(data, params=umash.Params())
+    assert umash.fprint(data) == umash.fprint(data, params=None)
+    assert umash.fprint(data) != umash.fprint(data, params=umash.Params(1))
+
+
+def test_buffer_types(tmp_path):
+    """Any contiguous buffer should hash like the equivalent bytes."""
+    data = os.urandom(3 * umash.RELEASE_GIL_THRESHOLD + 17)
+    expected = umash.fprint(data)
+
+    assert umash.fprint(bytearray(data)) == expected
+    assert umash.fprint(memoryview(data)) == expected
+    assert umash.fprint(memoryview(data)[10:]) == umash.fprint(data[10:])
+
+    path = tmp_path / "data"
+    path.write_bytes(data)
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+        assert umash.fprint(m) == expected
+
+    words = array.array("Q", [1, 2, 3])
+    assert umash.hash(words) == umash.hash(words.tobytes())
+
+    with pytest.raises(TypeError):
+        umash.hash("not bytes")
+    with pytest.raises(BufferError):
+        umash.hash(memoryview(data)[::2])
+
+
+def test_numpy():
+    """NumPy arrays hash in place."""
+    np = pytest.importorskip("numpy")
+    values = np.arange(1000, dtype=np.uint32)
+    assert umash.fprint(values) == umash.fprint(values.tobytes())
+
+
+def test_argument_checks():
+    with pytest.raises(OverflowError):
+        umash.hash(b"", seed=-1)
+    with pytest.raises(OverflowError):
+        umash.hash(b"", seed=2**64)
+    with pytest.raises(OverflowError):
+        umash.Params(2**64)
+    with pytest.raises(ValueError):
+        umash.Params(0, b"short")
+    with pytest.raises(TypeError):
+        umash.hash(b"", params=b"\0" * 304)
+    with pytest.raises(ValueError):
+        umash.Params.from_buffer(b"\0" * 10)
+
+
+def test_params_buffer_pickle():
+    """Params objects round-trip through their buffer and pickle."""
+    params = umash.Params(1234, os.urandom(32))
+    data = os.urandom(100)
+    copy = umash.Params.from_buffer(bytes(params))
+    unpickled = pickle.loads(pickle.dumps(params))
+    assert len(bytes(params)) == 8 * (4 + OH_COUNT)
+    assert umash.fprint(data, params=copy) == umash.fprint(data, params=params)
+    assert umash.fprint(data, params=unpickled) == umash.fprint(data, params=params)
+
+
+def test_threads():
+    """Concurrent calls on large inputs (without the GIL) should still
+    return the right values."""
+    data = os.urandom(4 * umash.RELEASE_GIL_THRESHOLD)
+    expected = umash.fprint(data)
+    results = []
+
+    def work():
+        for _ in range(20):
+            results.append(umash.fprint(data))
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [expected] * 80
@@ -0,0 +1,125 @@
+"""
+Test suite for the asyncio streaming helpers.
+"""
+import asyncio
+import concurrent.futures
+import os
+import threading
+
+from hypothesis import given, settings
+import hypothesis.strategies as st
+import umash
+
+
+U64S = st.integers(min_value=0, max_value=2**64 - 1)
+
+
+class CountingExecutor(concurrent.futures.ThreadPoolExecutor):
+    def __init__(self):
+        super().__init__(max_workers=2)
+        self.submitted = 0
+
+    def submit(self, *args, **kwargs):
+        self.submitted += 1
+        return super().submit(*args, **kwargs)
+
+
+class GatedExecutor(concurrent.futures.ThreadPoolExecutor):
+    """Runs each job once `gate` is set."""
+
+    def __init__(self):
+        super().__init__(max_workers=2)
+        self.gate = threading.Event()
+
+    def submit(self, fn, *args, **kwargs):
+        def gated():
+            self.gate.wait()
+            return fn(*args, **kwargs)
+
+        return super().submit(gated)
+
+
+async def iterate(chunks):
+    for chunk in chunks:
+        await asyncio.sleep(0)
+        yield chunk
+
+
+@settings(deadline=None)
+@given(seed=U64S, chunks=st.lists(st.binary(max_size=600), max_size=10))
+def test_afprint(seed, chunks):
+    params = umash.Params(seed)
+    expected = umash.fprint(b"".join(chunks), seed, params=params)
+    assert asyncio.run(umash.afprint(iterate(chunks), seed, params)) == expected
+
+
+def test_offload():
+    """Large chunks go to the executor, small ones stay inline."""
+    executor = CountingExecutor()
+    chunks = [os.urandom(10), os.urandom(2 * umash.OFFLOAD_THRESHOLD), b"x"]
+
+    async def run():
+        return await umash.afprint(iterate(chunks), executor=executor)
+
+    with executor:
+        assert asyncio.run(run()) == umash.fprint(b"".join(chunks))
+    assert executor.submitted == 1
+
+
+def test_concurrent_updates():
+    """Updates from concurrent tasks are applied in the order they were
+    awaited, even when some are offloaded."""
+    chunks = [os.urandom(n) for n in (100, 5000, 3, 10000, 64)]
+
+    async def run():
+        state = umash.StreamingFingerprinter(seed=1, offload_threshold=1000)
+        await asyncio.gather(*(state.update(chunk) for chunk in chunks))
+        return state
+
+    state = asyncio.run(run())
+    assert state.intdigest() == umash.fprint(b"".join(chunks), 1)
+    assert state.hexdigest() == "%016x%016x" % umash.fprint(b"".join(chunks), 1)
+
+
+def test_copy():
+    async def run():
+        state = umash.StreamingFingerprinter(offload_threshold=0)
+        await state.update(b"prefix")
+        snapshot = state.copy()
+        await snapshot.update(b" and more")
+        await state.update(memoryview(b" and less"))
+        return state, snapshot
+
+    state, snapshot = asyncio.run(run())
+    assert state.intdigest() == umash.fprint(b"prefix and less")
+    assert snapshot.intdigest() == umash.fprint(b"prefix and more")
+    assert snapshot.digest() == umash.Fingerprinter(b"prefix and more").digest()
+
+
+def test_cancel_update():
+    """Cancelling an offloaded update mid-stream doesn't let later updates
+    overtake the chunk that's still being hashed."""
+    executor = GatedExecutor()
+    chunks = [b"head", os.urandom(5000), b"tail"]
+
+    async def run():
+        state = umash.StreamingFingerprinter(executor=executor, offload_threshold=1000)
+        await state.update(chunks[0])
+        big = asyncio.ensure_future(state.update(chunks[1]))
+        await asyncio.sleep(0.01)
+        big.cancel()
+        tail = asyncio.ensure_future(state.update(chunks[2]))
+        await asyncio.sleep(0.01)
+        assert not big.done() and not tail.done()
+
+        executor.gate.set()
+        await tail
+        assert big.cancelled()
+        return state
+
+    with executor:
+        try:
+            state = asyncio.run(run())
+        finally:
+            executor.gate.set()
+    assert state.intdigest() == umash.fprint(b"".join(chunks))
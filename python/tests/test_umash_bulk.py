@@ -0,0 +1,124 @@
+"""
+Test suite for the bulk NumPy entry points.
+"""
+import os
+
+from hypothesis import given
+import hypothesis.strategies as st
+import pytest
+import umash
+
+np = pytest.importorskip("numpy")
+
+
+U64S = st.integers(min_value=0, max_value=2**64 - 1)
+
+
+WHICH = st.integers(min_value=0, max_value=1)
+
+
+@given(
+    seed=U64S,
+    which=WHICH,
+    n_rows=st.integers(min_value=0, max_value=20),
+    row_len=st.integers(min_value=0, max_value=300),
+)
+def test_hash_rows(seed, which, n_rows, row_len):
+    rows = np.frombuffer(os.urandom(n_rows * row_len), dtype=np.uint8)
+    rows = rows.reshape(n_rows, row_len)
+
+    hashes = umash.hash_rows(rows, seed, which)
+    fprints = umash.hash_rows(rows, seed, fprint=True)
+    assert hashes.dtype == fprints.dtype == np.uint64
+    assert hashes.shape == (n_rows,)
+    assert fprints.shape == (n_rows, 2)
+    for i in range(n_rows):
+        assert int(hashes[i]) == umash.hash(rows[i].tobytes(), seed, which)
+        assert tuple(int(x) for x in fprints[i]) == umash.fprint(
+            rows[i].tobytes(), seed
+        )
+
+
+def test_hash_rows_layout():
+    """Non-contiguous and non-byte arrays hash the bytes in each row."""
+    values = np.arange(60, dtype=np.uint32).reshape(10, 6)
+    columns = values[:, ::2]
+    expected = [umash.hash(row.tobytes()) for row in columns]
+    assert umash.hash_rows(columns).tolist() == expected
+    with pytest.raises(ValueError):
+        umash.hash_rows(values.ravel())
+
+
+@given(values=st.lists(U64S), seed=U64S, which=WHICH)
+def test_hash_u64(values, seed, which):
+    params = umash.Params(seed)
+    array = np.array(values, dtype=np.uint64)
+    hashes = umash.hash_u64(array, seed, which, params=params)
+    fprints = umash.hash_u64(array, seed, params=params, fprint=True)
+    assert hashes.tolist() == [
+        umash.hash(x.to_bytes(8, "little"), seed, which, params=params) for x in values
+    ]
+    assert [tuple(fp) for fp in fprints.tolist()] == [
+        umash.fprint(x.to_bytes(8, "little"), seed, params=params) for x in values
+    ]
+
+
+def test_hash_u64_shape():
+    values = np.arange(12, dtype=np.int64).reshape(3, 4)
+    assert umash.hash_u64(values).shape == (3, 4)
+    assert umash.hash_u64(values, fprint=True).shape == (3, 4, 2)
+    assert (umash.hash_u64(values).ravel() == umash.hash_u64(values.ravel())).all()
+    with pytest.raises(TypeError):
+        umash.hash_u64(np.arange(4, dtype=np.int32))
+
+
+@given(
+    strings=st.lists(st.binary(max_size=100)),
+    seed=U64S,
+    which=WHICH,
+    wide=st.booleans(),
+    base=st.integers(min_value=0, max_value=10),
+)
+def test_hash_varlen(strings, seed, which, wide, base):
+    """Hash a column of strings, with a `base` byte offset like a
+    slice of an Arrow array."""
+    data = b"\0" * base + b"".join(strings)
+    offsets = np.cumsum([base] + [len(s) for s in strings])
+    offsets = offsets.astype(np.int64 if wide else np.int32)
+
+    hashes = umash.hash_varlen(offsets, data, seed, which)
+    fprints = umash.hash_varlen(
+        offsets, np.frombuffer(data, np.uint8), seed, fprint=True
+    )
+    assert hashes.tolist() == [umash.hash(s, seed, which) for s in strings]
+    assert [tuple(fp) for fp in fprints.tolist()] == [
+        umash.fprint(s, seed) for s in strings
+    ]
+
+
+def test_hash_varlen_invalid():
+    data = b"abcdef"
+    for offsets in ([0, 3, 2], [-1, 2], [0, 7], [4, 3, 6]):
+        with pytest.raises(ValueError):
+            umash.hash_varlen(np.array(offsets, dtype=np.int32), data)
+    with pytest.raises(ValueError):
+        umash.hash_varlen(np.array([], dtype=np.int64), data)
+    with pytest.raises(TypeError):
+        umash.hash_varlen(np.array([0, 1], dtype=np.uint8), data)
+    with pytest.raises(ValueError):
+        umash.hash_varlen(np.array([0, 6], dtype=np.int32), data, which=2)
+    with pytest.raises(ValueError):
+        umash.hash_u64(np.arange(4, dtype=np.uint64), which=-1)
+
+
+def test_large_column():
+    """Large columns release the GIL, and should still get the same
+    values."""
+    n = umash.RELEASE_GIL_THRESHOLD
+    values = np.frombuffer(os.urandom(8 * n), dtype=np.uint64)
+    hashes = umash.hash_u64(values)
+    for i in range(0, n, 997):
+        assert int(hashes[i]) == umash.hash(values[i].tobytes())
+
+    offsets = np.arange(0, 8 * n + 1, 8, dtype=np.int64)
+    assert (umash.hash_varlen(offsets, values) == hashes).all()
@@ -0,0 +1,161 @@
+"""
+Test suite for `FingerprintCache` and `memoize`.
+"""
+import threading
+
+from hypothesis import given
+import hypothesis.strategies as st
+import pytest
+import umash
+from umash._cache import ENTRY_OVERHEAD
+
+
+def unit_size(value):
+    """Every value counts for 100 bytes, including the entry overhead."""
+    return 100 - ENTRY_OVERHEAD
+
+
+def test_lru():
+    cache = umash.FingerprintCache(300, sizeof=unit_size)
+    keys = [cache.fingerprint(b"key %d" % i) for i in range(4)]
+    for i, key in enumerate(keys[:3]):
+        cache.put(key, i)
+
+    assert cache.get(keys[0]) == 0  # 0 is now the most recently used.
+    cache.put(keys[3], 3)
+    assert keys[1] not in cache
+    assert [cache.get(key) for key in keys] == [0, None, 2, 3]
+    assert cache.info() == umash.CacheInfo(
+        hits=4, misses=1, evictions=1, entries=3, bytes=300, max_bytes=300
+    )
+
+
+def test_gds():
+    """GreedyDual-Size keeps expensive entries over recent cheap ones."""
+    cache = umash.FingerprintCache(300, sizeof=unit_size, policy="gds")
+    expensive, cheap1, cheap2, cheap3 = [cache.fingerprint(i) for i in range(4)]
+    cache.put(expensive, "expensive", cost=100.0)
+    cache.put(cheap1, "cheap1", cost=1.0)
+    cache.put(cheap2, "cheap2", cost=1.0)
+    cache.put(cheap3, "cheap3", cost=1.0)
+    assert expensive in cache
+    assert cheap1 not in cache
+    assert cache.get(cheap3) == "cheap3"
+    assert cache.info().evictions == 1
+
+
+def test_gds_ties():
+    """Entries with the same priority are evicted least recently used
+    first, and `put` never evicts the entry it inserts."""
+    for seed in range(20):
+        params = umash.Params(seed, bytes([seed]) * 32)
+        cache = umash.FingerprintCache(
+            200, sizeof=unit_size, policy="gds", params=params
+        )
+        keys = [cache.fingerprint(i) for i in range(10)]
+        for i, key in enumerate(keys):
+            cache.put(key, i)
+            assert key in cache
+            if i > 0:
+                assert keys[i - 1] in cache
+        assert len(cache) == 2
+
+
+def test_oversized():
+    cache = umash.FingerprintCache(1000)
+    fp = cache.fingerprint("key")
+    cache.put(fp, b"x" * 2000)
+    assert fp not in cache
+    assert len(cache) == 0
+
+
+@given(
+    ops=st.lists(
+        st.tuples(st.integers(min_value=0, max_value=20), st.integers(1, 500)),
+        max_size=100,
+    ),
+    policy=st.sampled_from(["lru", "gds"]),
+)
+def test_bounded(ops, policy):
+    """The cache never exceeds its budget, and hits return what was put."""
+    cache = umash.FingerprintCache(2000, sizeof=lambda value: len(value), policy=policy)
+    latest = {}
+    for key, size in ops:
+        fp = cache.fingerprint(key)
+        value = bytes([key]) * size
+        if cache.get(fp) is None:
+            cache.put(fp, value, cost=size)
+            latest[key] = value
+        assert cache.info().bytes <= 2000
+        assert cache.get(fp) in (None, latest[key])
+
+    info = cache.info()
+    assert info.entries == len(cache)
+    assert info.hits + info.misses == 2 * len(ops)
+
+
+def test_fingerprint_params():
+    """Each cache uses its own random params, unless told otherwise."""
+    x, y = umash.FingerprintCache(100), umash.FingerprintCache(100)
+    assert x.fingerprint(b"abc") != y.fingerprint(b"abc")
+    params = umash.Params(1)
+    z = umash.FingerprintCache(100, params=params)
+    assert z.fingerprint(b"abc") == umash.fprint(b"abc", params=params)
+    assert z.fingerprint([1, 2]) == umash.fprint_object([1, 2], params=params)
+    with pytest.raises(ValueError):
+        umash.FingerprintCache(100, policy="fifo")
+
+
+def test_memoize():
+    calls = []
+
+    @umash.memoize(1 << 20)
+    def square(x, offset=0):
+        calls.append(x)
+        return x * x + offset
+
+    assert [square(i) for i in (1, 2, 1, 2, 3)] == [1, 4, 1, 4, 9]
+    assert square(2, offset=1) == 5
+    assert calls == [1, 2, 3, 2]
+    assert square.cache_info().hits == 2
+    assert square.cache_info().misses == 4
+    assert square.__name__ == "square"
+
+    square.cache_clear()
+    assert square(1) == 1
+    assert calls[-1] == 1
+
+
+def test_memoize_key():
+    @umash.memoize(policy="gds", key=lambda data, _: bytes(data))
+    def length(data, ignored):
+        return len(data)
+
+    assert length(b"abc", 1) == 3
+    assert length(bytearray(b"abc"), 2) == 3
+    assert length.cache_info().hits == 1
+
+
+def test_threads():
+    cache = umash.FingerprintCache(50 * 1000, sizeof=lambda value: 1000)
+    errors = []
+
+    def work(base):
+        for i in range(2000):
+            fp = cache.fingerprint((base + i) % 100)
+            value = cache.get(fp)
+            if value is None:
+                cache.put(fp, (base + i) % 100)
+            elif value != (base + i) % 100:
+                errors.append(value)
+
+    threads = [threading.Thread(target=work, args=(i * 7,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    info = cache.info()
+    assert info.bytes <= info.max_bytes
+    assert info.hits + info.misses == 8000
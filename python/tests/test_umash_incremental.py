@@ -0,0 +1,114 @@
+"""
+Test suite for the incremental `Hasher` and `Fingerprinter` objects.
+"""
+import os
+import threading
+
+from hypothesis import given
+import hypothesis.strategies as st
+import pytest
+import umash
+
+
+U64S = st.integers(min_value=0, max_value=2**64 - 1)
+
+
+CHUNKS = st.lists(st.binary(max_size=2 * umash.BLOCK_SIZE + 1), max_size=8)
+
+
+@given(bits=U64S, seed=U64S, which=st.integers(min_value=0, max_value=1), chunks=CHUNKS)
+def test_hasher(bits, seed, which, chunks):
+    """Feeding chunks to a `Hasher` should match `umash.hash` on the
+    concatenation."""
+    params = umash.Params(bits)
+    hasher = umash.Hasher(seed=seed, which=which, params=params)
+    for chunk in chunks:
+        hasher.update(chunk)
+
+    expected = umash.hash(b"".join(chunks), seed, which, params=params)
+    assert hasher.intdigest() == expected
+    assert hasher.digest() == expected.to_bytes(8, "big")
+    assert hasher.hexdigest() == "%016x" % expected
+    # Digesting does not consume the state.
+    assert hasher.intdigest() == expected
+
+
+@given(bits=U64S, seed=U64S, chunks=CHUNKS)
+def test_fingerprinter(bits, seed, chunks):
+    """Feeding chunks to a `Fingerprinter` should match `umash.fprint` on
+    the concatenation."""
+    params = umash.Params(bits)
+    fingerprinter = umash.Fingerprinter(seed=seed, params=params)
+    for chunk in chunks:
+        fingerprinter.update(memoryview(chunk))
+
+    expected = umash.fprint(b"".join(chunks), seed, params=params)
+    assert fingerprinter.intdigest() == expected
+    assert fingerprinter.digest() == b"".join(x.to_bytes(8, "big") for x in expected)
+    assert fingerprinter.hexdigest() == "%016x%016x" % expected
+
+
+@given(prefix=st.binary(), suffixes=st.lists(st.binary(), min_size=2, max_size=4))
+def test_copy(prefix, suffixes):
+    """Copies should evolve independently from the original."""
+    original = umash.Fingerprinter(prefix, seed=42)
+    copies = [original.copy() for _ in suffixes]
+    for state, suffix in zip(copies, suffixes):
+        state.update(suffix)
+
+    assert original.intdigest() == umash.fprint(prefix, 42)
+    for state, suffix in zip(copies, suffixes):
+        assert state.intdigest() == umash.fprint(prefix + suffix, 42)
+
+
+def test_copy_keeps_params():
+    """A copy must keep its params alive after everything else lets go."""
+    key = os.urandom(32)
+    data = os.urandom(1000)
+    state = umash.Hasher(data[:100], params=umash.Params(1234, key))
+    snapshot = state.copy()
+    del state
+    snapshot.update(data[100:])
+    assert snapshot.intdigest() == umash.hash(data, params=umash.Params(1234, key))
+
+
+def test_attributes():
+    hasher = umash.Hasher()
+    fingerprinter = umash.Fingerprinter()
+    assert (hasher.name, hasher.digest_size) == ("umash", 8)
+    assert (fingerprinter.name, fingerprinter.digest_size) == ("umash_fprint", 16)
+    assert hasher.block_size == fingerprinter.block_size == umash.BLOCK_SIZE
+    assert umash.Hasher(b"abc").intdigest() == umash.hash(b"abc")
+    assert umash.Fingerprinter(b"abc").intdigest() == umash.fprint(b"abc")
+
+
+def test_argument_checks():
+    with pytest.raises(ValueError):
+        umash.Hasher(which=2)
+    with pytest.raises(OverflowError):
+        umash.Fingerprinter(seed=-1)
+    with pytest.raises(TypeError):
+        umash.Fingerprinter(params=1)
+    with pytest.raises(TypeError):
+        umash.Hasher().update("text")
+    with pytest.raises(TypeError):
+        umash.Hasher(b"", 42)
+
+
+def test_threads():
+    """Concurrent large updates on the same object are serialised."""
+    chunk = os.urandom(2 * umash.RELEASE_GIL_THRESHOLD)
+    state = umash.Fingerprinter()
+
+    def work():
+        for _ in range(10):
+            state.update(chunk)
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Every update feeds the same bytes, so the interleaving doesn't matter.
+    assert state.intdigest() == umash.fprint(chunk * 40)
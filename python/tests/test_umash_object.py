@@ -0,0 +1,99 @@
+"""
+Test suite for `umash.fprint_object`.
+"""
+import pickle
+import struct
+import tracemalloc
+
+from hypothesis import given
+import hypothesis.strategies as st
+import pytest
+import umash
+
+
+U64S = st.integers(min_value=0, max_value=2**64 - 1)
+
+
+OBJECTS = st.recursive(
+    st.none() | st.booleans() | st.integers() | st.floats() | st.text() | st.binary(),
+    lambda children: st.lists(children) | st.dictionaries(st.text(), children),
+    max_leaves=20,
+)
+
+
+class Recorder:
+    """Collects the records `fprint_object` should hash."""
+
+    def __init__(self):
+        self.records = []
+
+    def write(self, data):
+        self.records.append(b"\0" + struct.pack("<Q", len(data)) + bytes(data))
+        return len(data)
+
+    def buffer_callback(self, buffer):
+        raw = buffer.raw()
+        self.records.append(b"\1" + struct.pack("<Q", raw.nbytes) + raw.tobytes())
+        return False
+
+
+def reference(obj, seed=0, protocol=5):
+    recorder = Recorder()
+    callback = recorder.buffer_callback if protocol >= 5 else None
+    pickle.Pickler(recorder, protocol=protocol, buffer_callback=callback).dump(obj)
+    return umash.fprint(b"".join(recorder.records), seed)
+
+
+@given(obj=OBJECTS, seed=U64S, protocol=st.integers(min_value=2, max_value=5))
+def test_reference(obj, seed, protocol):
+    assert umash.fprint_object(obj, seed, protocol=protocol) == reference(
+        obj, seed, protocol
+    )
+
+
+@given(x=OBJECTS, y=OBJECTS)
+def test_distinct(x, y):
+    """Objects with different pickles have different fingerprints."""
+    if pickle.dumps(x, protocol=5) != pickle.dumps(y, protocol=5):
+        assert umash.fprint_object(x) != umash.fprint_object(y)
+    else:
+        assert umash.fprint_object(x) == umash.fprint_object(y)
+
+
+def test_out_of_band():
+    """Contiguous buffers are hashed in place, and differ from the same
+    bytes pickled in-band."""
+    np = pytest.importorskip("numpy")
+    array = np.arange(1 << 20, dtype=np.uint64)
+
+    tracemalloc.start()
+    try:
+        fp = umash.fprint_object(array)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert peak < array.nbytes // 8
+    assert fp == reference(array)
+    assert fp != umash.fprint_object(array, protocol=4)
+    assert fp != umash.fprint_object(array.tobytes())
+
+    array[12345] = 0
+    assert umash.fprint_object(array) != fp
+    # Non-contiguous arrays still work, in-band.
+    assert umash.fprint_object(array[::2]) == reference(array[::2])
+
+
+def test_large_bytes():
+    """Large bytes objects are written directly, not buffered."""
+    data = bytes(range(256)) * 4096
+    obj = [data, data[::-1]]
+    tracemalloc.start()
+    try:
+        fp = umash.fprint_object(obj, seed=3)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert peak < len(data) // 4
+    assert fp == reference(obj, seed=3)
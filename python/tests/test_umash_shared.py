@@ -0,0 +1,131 @@
+"""
+Test suite for params tables in shared memory and mapped files.
+"""
+import multiprocessing
+import os
+
+import pytest
+import umash
+
+
+SPECS = [(i, os.urandom(32)) for i in range(5)] + [(42, None)]
+
+
+def test_params_table():
+    """`ParamsTable` entries hash like the params they were derived
+    from, and the table never copies them."""
+    buf = bytearray(len(SPECS) * umash.PARAMS_SIZE + 7)
+    assert umash.derive_params_table(buf, SPECS) == len(SPECS) * umash.PARAMS_SIZE
+
+    table = umash.ParamsTable(buf)
+    assert len(table) == len(SPECS)
+    for (bits, key), params in zip(SPECS, table):
+        assert bytes(params) == bytes(umash.Params(bits, key))
+        assert umash.fprint(b"abc", params=params) == umash.fprint(
+            b"abc", params=umash.Params(bits, key)
+        )
+
+    assert bytes(table[-1]) == bytes(umash.Params(42))
+    with pytest.raises(IndexError):
+        table[len(SPECS)]
+
+    # Entries point into the buffer, so it can't be resized under them.
+    with pytest.raises(BufferError):
+        buf.extend(b"x")
+
+    # Pickling copies the params.
+    params = table[1]
+    assert bytes(umash.Params.from_buffer(bytes(params))) == bytes(params)
+
+
+def test_params_table_lifetime():
+    """Params from a table keep the buffer alive."""
+    buf = bytearray(2 * umash.PARAMS_SIZE)
+    umash.derive_params_table(buf, SPECS[:2])
+    params = umash.ParamsTable(buf)[1]
+    hasher = umash.Hasher(b"abc", params=params)
+    del buf, params
+    assert hasher.intdigest() == umash.hash(b"abc", params=umash.Params(*SPECS[1]))
+
+
+def test_params_table_checks():
+    with pytest.raises(ValueError):
+        umash.derive_params_table(bytearray(10), SPECS)
+    with pytest.raises(ValueError):
+        umash.ParamsTable(memoryview(bytearray(2 * umash.PARAMS_SIZE))[1:])
+    with pytest.raises(TypeError):
+        umash.ParamsTable("not a buffer")
+
+
+def test_params_file(tmp_path):
+    path = tmp_path / "params"
+    umash.write_params_file(path, SPECS)
+    table = umash.open_params_file(path)
+    assert [bytes(params) for params in table] == [
+        bytes(umash.Params(bits, key)) for bits, key in SPECS
+    ]
+
+    # The mapping is read-only.
+    with pytest.raises(TypeError):
+        memoryview(table[0])[0] = 1
+
+    umash.write_params_file(path, [])
+    assert len(umash.open_params_file(path)) == 0
+
+
+def _worker(name, data, queue):
+    with umash.SharedParams(name) as shared:
+        queue.put([umash.fprint(data, params=params) for params in shared])
+
+
+def test_shared_params():
+    """Another process sees the same params in shared memory."""
+    data = b"the quick brown fox"
+    expected = [umash.fprint(data, params=umash.Params(*spec)) for spec in SPECS]
+    shared = umash.SharedParams.create(SPECS)
+    try:
+        assert len(shared) == len(SPECS)
+        assert [umash.fprint(data, params=shared[i]) for i in range(len(SPECS))] == (
+            expected
+        )
+
+        ctx = multiprocessing.get_context("spawn")
+        queue = ctx.Queue()
+        worker = ctx.Process(target=_worker, args=(shared.name, data, queue))
+        worker.start()
+        assert queue.get(timeout=60) == expected
+        worker.join()
+        assert worker.exitcode == 0
+
+        params = shared[0]
+        with pytest.raises(BufferError):
+            shared.close()
+        del params
+    finally:
+        shared.close()
+        shared.unlink()
+
+
+def test_shared_params_untracked(monkeypatch):
+    """Attaching doesn't leave the segment with this process's resource
+    tracker, which would unlink it when the process exits."""
+    from multiprocessing import resource_tracker
+
+    registered = set()
+    monkeypatch.setattr(
+        resource_tracker, "register", lambda name, rtype: registered.add(name)
+    )
+    monkeypatch.setattr(
+        resource_tracker, "unregister", lambda name, rtype: registered.discard(name)
+    )
+
+    shared = umash.SharedParams.create(SPECS)
+    try:
+        registered.clear()
+        other = umash.SharedParams(shared.name)
+        assert len(other) == len(SPECS)
+        assert registered == set()
+        other.close()
+    finally:
+        shared.close()
+        shared.unlink()
@@ -0,0 +1,77 @@
+"""
+Python bindings for UMASH.
+
+`hash` and `fprint` accept any object that exports a contiguous
+buffer (bytes, bytearray, memoryview, mmap, NumPy arrays...), read
+the bytes in place, and release the GIL for large inputs.
+
+By default, both functions use the parameters derived from
+`umash_params_derive(0, NULL)`; pass `params=umash.Params(bits, key)`
+for a different key.
+
+`Hasher` and `Fingerprinter` compute the same values incrementally,
+with the `update` / `digest` / `hexdigest` / `copy` interface of
+`hashlib` objects.
+
+`hash_rows`, `hash_u64` and `hash_varlen` hash every element of a
+NumPy array or Arrow-style string column in one call, and return
+NumPy arrays (NumPy is only imported when these functions are called).
+
+`await afprint(chunks)` and `StreamingFingerprinter` fingerprint
+async streams, and hash large chunks on a thread pool to keep the
+event loop responsive.
+
+`ParamsTable` exposes an array of prepared params in shared memory
+or a mapped file, without copies; `SharedParams`, `write_params_file`
+and `open_params_file` create and attach to such tables.
+
+`fprint_object` fingerprints an object's pickle as it is written, and
+`FingerprintCache` and `memoize` cache values keyed by fingerprints.
+"""
+from ._umash import (
+    BLOCK_SIZE,
+    RELEASE_GIL_THRESHOLD,
+    Fingerprinter,
+    Hasher,
+    PARAMS_SIZE,
+    Params,
+    ParamsTable,
+    fprint,
+    hash,
+)
+from ._aio import OFFLOAD_THRESHOLD, StreamingFingerprinter, afprint
+from ._bulk import hash_rows, hash_u64, hash_varlen
+from ._cache import CacheInfo, FingerprintCache, memoize
+from ._object import fprint_object
+from ._shared import (
+    SharedParams,
+    derive_params_table,
+    open_params_file,
+    write_params_file,
+)
+
+__all__ = [
+    "BLOCK_SIZE",
+    "OFFLOAD_THRESHOLD",
+    "PARAMS_SIZE",
+    "RELEASE_GIL_THRESHOLD",
+    "CacheInfo",
+    "FingerprintCache",
+    "Fingerprinter",
+    "Hasher",
+    "Params",
+    "ParamsTable",
+    "SharedParams",
+    "StreamingFingerprinter",
+    "afprint",
+    "derive_params_table",
+    "fprint",
+    "fprint_object",
+    "hash",
+    "hash_rows",
+    "hash_u64",
+    "hash_varlen",
+    "memoize",
+    "open_params_file",
+    "write_params_file",
+]
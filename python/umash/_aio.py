@@ -0,0 +1,121 @@
+"""
+asyncio helpers to fingerprint streams without blocking the event
+loop.
+"""
+import asyncio
+import concurrent.futures
+import os
+import threading
+
+from ._umash import Fingerprinter
+
+# Chunks shorter than this are hashed inline, on the event loop:
+# at several GB/s, that's faster than a round-trip to a worker thread.
+OFFLOAD_THRESHOLD = 1 << 20
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _default_executor():
+    """Returns the shared bounded thread pool for large chunks."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=min(4, os.cpu_count() or 1),
+                thread_name_prefix="umash",
+            )
+        return _executor
+
+
+class StreamingFingerprinter:
+    """Incrementally computes `umash.fprint(data, seed, params)` for
+    data that arrives in chunks, from asyncio code.
+
+    `await update(chunk)` hashes chunks of at least `offload_threshold`
+    bytes on `executor` (by default, a small thread pool shared by all
+    instances), and shorter ones inline.  Concurrent updates are
+    applied in the order they were awaited.
+    """
+
+    def __init__(
+        self,
+        seed=0,
+        params=None,
+        *,
+        executor=None,
+        offload_threshold=OFFLOAD_THRESHOLD,
+    ):
+        self._state = Fingerprinter(seed=seed, params=params)
+        self._executor = executor
+        self._offload_threshold = offload_threshold
+        # Created on first use, in the running loop.
+        self._lock = None
+
+    async def update(self, data):
+        """Feeds the bytes in `data` to the fingerprint.  `data` must not
+        change until the update completes.
+
+        Cancelling an offloaded update only takes effect once the
+        worker thread is done with `data`, which is then part of the
+        fingerprint."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        size = memoryview(data).nbytes
+        async with self._lock:
+            if size < self._offload_threshold:
+                self._state.update(data)
+                return
+
+            executor = self._executor or _default_executor()
+            future = asyncio.get_running_loop().run_in_executor(
+                executor, self._state.update, data
+            )
+            try:
+                await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # The worker thread is still hashing `data`: hold the
+                # lock until it's done, or the next update could feed
+                # the state first.
+                while not future.done():
+                    try:
+                        await asyncio.wait([future])
+                    except asyncio.CancelledError:
+                        pass
+                if not future.cancelled():
+                    future.exception()  # Don't warn about unretrieved errors.
+                raise
+
+    def copy(self):
+        """Returns an independent snapshot of the fingerprint state.
+        Pending updates may or may not be included."""
+        ret = StreamingFingerprinter.__new__(StreamingFingerprinter)
+        ret._state = self._state.copy()
+        ret._executor = self._executor
+        ret._offload_threshold = self._offload_threshold
+        ret._lock = None
+        return ret
+
+    def digest(self):
+        return self._state.digest()
+
+    def hexdigest(self):
+        return self._state.hexdigest()
+
+    def intdigest(self):
+        return self._state.intdigest()
+
+
+async def afprint(chunks, seed=0, params=None, *, executor=None):
+    """Returns `umash.fprint` of the concatenation of the bytes-like
+    chunks yielded by the async iterable `chunks`.
+
+    Large chunks are hashed on `executor`, like
+    `StreamingFingerprinter`, so the event loop keeps running.
+    """
+    state = StreamingFingerprinter(seed, params, executor=executor)
+    async for chunk in chunks:
+        await state.update(chunk)
+    return state.intdigest()
@@ -0,0 +1,84 @@
+"""
+Bulk hashing for NumPy arrays and Arrow-style string columns.
+
+Each function makes one call into C, which loops over every element
+(without the GIL, for large inputs), and returns a `uint64` array of
+hashes, or a `(..., 2)` `uint64` array of fingerprints when
+`fprint=True`.
+"""
+from ._umash import _hash_rows, _hash_varlen
+
+
+def _empty(np, shape, fprint):
+    if fprint:
+        shape = tuple(shape) + (2,)
+    return np.empty(shape, dtype=np.uint64)
+
+
+def hash_rows(rows, seed=0, which=0, params=None, fprint=False):
+    """Hashes the bytes in each row of the 2D array `rows`.
+
+    `hash_rows(rows)[i] == hash(rows[i].tobytes())`, and similarly for
+    `fprint`.
+    """
+    import numpy as np
+
+    rows = np.ascontiguousarray(rows)
+    if rows.ndim != 2:
+        raise ValueError("rows must be a 2D array, not %dD" % rows.ndim)
+
+    out = _empty(np, rows.shape[:1], fprint)
+    _hash_rows(
+        rows,
+        rows.shape[1] * rows.itemsize,
+        out,
+        seed=seed,
+        which=which,
+        params=params,
+        fprint=fprint,
+    )
+    return out
+
+
+def hash_u64(values, seed=0, which=0, params=None, fprint=False):
+    """Hashes each 8-byte element in `values` (e.g., a `uint64`,
+    `int64`, or `float64` array), and returns an array of the same
+    shape.
+
+    Each element is hashed as its 8 bytes in memory, so, on
+    little-endian machines, `hash_u64(values)[i] ==
+    hash(int(values[i]).to_bytes(8, "little"))`.
+    """
+    import numpy as np
+
+    values = np.ascontiguousarray(values)
+    if values.itemsize != 8:
+        raise TypeError("values must have 8-byte elements, not %s" % values.dtype)
+
+    out = _empty(np, values.shape, fprint)
+    _hash_rows(values, 8, out, seed=seed, which=which, params=params, fprint=fprint)
+    return out
+
+
+def hash_varlen(offsets, data, seed=0, which=0, params=None, fprint=False):
+    """Hashes each string `data[offsets[i]:offsets[i + 1]]`, for the
+    `len(offsets) - 1` strings in an Arrow-style column.
+
+    `offsets` is an `int32` or `int64` array of non-decreasing offsets
+    into `data`, any contiguous buffer (e.g., `bytes` or a `uint8`
+    array).  For a `pyarrow` string array `a`, that's
+    `a.offsets.to_numpy()` and `a.buffers()[2]`.
+    """
+    import numpy as np
+
+    offsets = np.ascontiguousarray(offsets)
+    if offsets.ndim != 1 or offsets.dtype not in (np.int32, np.int64):
+        raise TypeError("offsets must be a 1D int32 or int64 array")
+    if len(offsets) == 0:
+        raise ValueError("offsets must have at least one element")
+
+    out = _empty(np, (len(offsets) - 1,), fprint)
+    _hash_varlen(
+        offsets, data, out, seed=seed, which=which, params=params, fprint=fprint
+    )
+    return out
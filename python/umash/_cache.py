@@ -0,0 +1,211 @@
+"""
+Memoization keyed by 128-bit UMASH fingerprints.
+
+Caches only store the fingerprint of each key, never the key itself.
+With fresh random parameters per cache (the default), any two distinct
+keys of `s` bytes or fewer collide with probability less than
+`ceil(s / 2**26)**2 * 2**-83`, regardless of how the keys were chosen.
+"""
+import collections
+import functools
+import heapq
+import itertools
+import os
+import random
+import sys
+import threading
+import time
+
+from ._object import fprint_object
+from ._umash import Params, fprint
+
+CacheInfo = collections.namedtuple(
+    "CacheInfo", ["hits", "misses", "evictions", "entries", "bytes", "max_bytes"]
+)
+
+# Approximate bookkeeping cost of each entry, on top of its value.
+ENTRY_OVERHEAD = 200
+
+
+class FingerprintCache:
+    """A thread-safe map from fingerprints to values, bounded by the
+    total size of the values.
+
+    `sizeof(value)` estimates each value's size in bytes (default
+    `sys.getsizeof`).  When the total exceeds `max_bytes`, `policy`
+    decides what to evict: "lru" evicts the least recently used
+    entries, and "gds" (GreedyDual-Size) evicts entries with the
+    lowest `cost / size`, aged by how long ago they were used.
+    """
+
+    def __init__(self, max_bytes, *, sizeof=None, policy="lru", params=None):
+        if policy not in ("lru", "gds"):
+            raise ValueError("policy must be 'lru' or 'gds', not %r" % (policy,))
+        if params is None:
+            params = Params(random.getrandbits(64), os.urandom(32))
+
+        self.max_bytes = max_bytes
+        self.params = params
+        self._sizeof = sizeof or sys.getsizeof
+        self._gds = policy == "gds"
+        self._lock = threading.Lock()
+        # fp -> [value, size, priority, cost / size, heap sequence];
+        # ordered by recency for LRU.
+        self._entries = collections.OrderedDict()
+        # GreedyDual-Size min-heap of (priority, sequence, fp), with
+        # stale items.  The sequence number breaks ties in favour of
+        # recently used entries.
+        self._heap = []
+        self._sequence = itertools.count()
+        self._inflation = 0.0
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def fingerprint(self, key):
+        """Returns the fingerprint for `key`: bytes-like keys are hashed
+        directly, anything else via `fprint_object`.  Callers should
+        stick to one kind of key per cache."""
+        try:
+            return fprint(key, params=self.params)
+        except TypeError:
+            return fprint_object(key, params=self.params)
+
+    def get(self, fp, default=None):
+        """Returns the value for fingerprint `fp`, or `default`."""
+        with self._lock:
+            entry = self._entries.get(fp)
+            if entry is None:
+                self._misses += 1
+                return default
+
+            self._hits += 1
+            if self._gds:
+                self._touch(fp, entry)
+            else:
+                self._entries.move_to_end(fp)
+            return entry[0]
+
+    def put(self, fp, value, cost=1.0):
+        """Associates `value` with fingerprint `fp`.  `cost` is how
+        expensive the value is to recompute (only "gds" uses it).
+        Values larger than `max_bytes` are not cached."""
+        size = self._sizeof(value) + ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            old = self._entries.pop(fp, None)
+            if old is not None:
+                self._bytes -= old[1]
+
+            entry = [value, size, 0.0, cost / size, None]
+            self._entries[fp] = entry
+            self._bytes += size
+            if self._gds:
+                self._touch(fp, entry)
+            self._evict(fp)
+
+    def _touch(self, fp, entry):
+        entry[2] = self._inflation + entry[3]
+        entry[4] = next(self._sequence)
+        heapq.heappush(self._heap, (entry[2], entry[4], fp))
+        if len(self._heap) > 2 * len(self._entries) + 64:
+            self._heap = [(e[2], e[4], key) for key, e in self._entries.items()]
+            heapq.heapify(self._heap)
+
+    def _evict(self, keep):
+        """Evicts entries until the cache fits in its budget, never
+        evicting `keep`, the entry that was just inserted."""
+        kept = None
+        while self._bytes > self.max_bytes:
+            if self._gds:
+                item = heapq.heappop(self._heap)
+                priority, sequence, fp = item
+                entry = self._entries.get(fp)
+                if entry is None or entry[4] != sequence:
+                    continue  # Stale heap item.
+                if fp == keep:
+                    kept = item
+                    continue
+                self._inflation = priority
+                del self._entries[fp]
+            else:
+                fp, entry = next(iter(self._entries.items()))
+                if fp == keep:
+                    break  # Only `keep` is left, and it fits.
+                del self._entries[fp]
+            self._bytes -= entry[1]
+            self._evictions += 1
+
+        if kept is not None:
+            heapq.heappush(self._heap, kept)
+
+    def __contains__(self, fp):
+        with self._lock:
+            return fp in self._entries
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def clear(self):
+        """Drops all entries; the counters keep going."""
+        with self._lock:
+            self._entries.clear()
+            self._heap = []
+            self._bytes = 0
+
+    def info(self):
+        with self._lock:
+            return CacheInfo(
+                self._hits,
+                self._misses,
+                self._evictions,
+                len(self._entries),
+                self._bytes,
+                self.max_bytes,
+            )
+
+
+_MISSING = object()
+
+
+def memoize(max_bytes=64 << 20, *, key=None, sizeof=None, policy="lru", params=None):
+    """Decorator that caches a pure function's results in a
+    `FingerprintCache`.
+
+    By default, calls are keyed by the fingerprint of the pickled
+    `(args, kwargs)`; `key(*args, **kwargs)` may instead return the
+    bytes (or object) to fingerprint.  With the "gds" policy, the cost
+    of each entry is the time it took to compute.
+
+    Like `functools.lru_cache`, the wrapper has `cache_info()` and
+    `cache_clear()` methods, and concurrent misses on the same key
+    may all call the function.
+    """
+
+    def decorator(fn):
+        cache = FingerprintCache(max_bytes, sizeof=sizeof, policy=policy, params=params)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if key is not None:
+                fp = cache.fingerprint(key(*args, **kwargs))
+            else:
+                fp = cache.fingerprint((args, sorted(kwargs.items())))
+
+            ret = cache.get(fp, _MISSING)
+            if ret is _MISSING:
+                begin = time.perf_counter()
+                ret = fn(*args, **kwargs)
+                cache.put(fp, ret, cost=time.perf_counter() - begin)
+            return ret
+
+        wrapper.cache = cache
+        wrapper.cache_info = cache.info
+        wrapper.cache_clear = cache.clear
+        return wrapper
+
+    return decorator
@@ -0,0 +1,62 @@
+"""
+Fingerprints Python objects by streaming their pickle straight into
+a `Fingerprinter`, without materialising the serialised bytes.
+"""
+import pickle
+import struct
+
+from ._umash import Fingerprinter
+
+# Each chunk of input to the fingerprinter is a record: a tag, the
+# payload's length as a little-endian u64, then the payload.  That
+# keeps the in-band pickle stream and out-of-band buffers apart.
+_PICKLE_TAG = b"\x00"
+_BUFFER_TAG = b"\x01"
+_HEADER = struct.Struct("<cQ")
+
+
+class _FingerprintWriter:
+    """File-like sink for `pickle.Pickler`."""
+
+    def __init__(self, state):
+        self._state = state
+
+    def _record(self, tag, data):
+        data = memoryview(data)
+        self._state.update(_HEADER.pack(tag, data.nbytes))
+        self._state.update(data)
+
+    def write(self, data):
+        self._record(_PICKLE_TAG, data)
+        return memoryview(data).nbytes
+
+    def buffer_callback(self, buffer):
+        """Hashes contiguous out-of-band buffers in place, and asks
+        pickle to serialise the rest in-band."""
+        try:
+            raw = buffer.raw()
+        except BufferError:
+            return True
+        self._record(_BUFFER_TAG, raw)
+        return False
+
+
+def fprint_object(obj, seed=0, params=None, protocol=5):
+    """Returns the fingerprint of `obj`'s pickle, as a pair of 64-bit
+    integers, like `umash.fprint`.
+
+    The pickle is fed to the fingerprint as it is written (in frames
+    of at most 64 KB, or one write for large bytes objects), so the
+    only allocations are pickle's own.  With protocol 5, contiguous
+    `PickleBuffer`s (e.g., NumPy arrays) are hashed out-of-band,
+    directly from the object's memory.
+
+    Equal fingerprints imply equal pickles, not equal objects: pickles
+    depend on insertion order for dicts and sets, on object identity,
+    and on the protocol, which is why `protocol` defaults to 5 rather
+    than `pickle.HIGHEST_PROTOCOL`.
+    """
+    writer = _FingerprintWriter(Fingerprinter(seed=seed, params=params))
+    callback = writer.buffer_callback if protocol >= 5 else None
+    pickle.Pickler(writer, protocol=protocol, buffer_callback=callback).dump(obj)
+    return writer._state.intdigest()
@@ -0,0 +1,128 @@
+"""
+Parameter tables shared between processes, in POSIX shared memory or
+in a file mapped read-only.
+
+A parent process derives each `(bits, key)` pair once; workers
+attach to the table, and hash with `table[i]`, a `Params` object that
+points into the shared mapping.
+"""
+import mmap
+import os
+
+from ._umash import PARAMS_SIZE, Params, ParamsTable
+
+
+def derive_params_table(buffer, specs):
+    """Fills the writable `buffer` with one `struct umash_params` per
+    `(bits, key)` pair in `specs` (`key` may be None), and returns the
+    number of bytes written."""
+    view = memoryview(buffer).cast("B")
+    specs = list(specs)
+    if len(view) < len(specs) * PARAMS_SIZE:
+        raise ValueError(
+            "buffer holds %d bytes, %d params need %d"
+            % (len(view), len(specs), len(specs) * PARAMS_SIZE)
+        )
+
+    for i, (bits, key) in enumerate(specs):
+        view[i * PARAMS_SIZE : (i + 1) * PARAMS_SIZE] = bytes(Params(bits, key))
+    return len(specs) * PARAMS_SIZE
+
+
+def write_params_file(path, specs):
+    """Writes a params table for `specs` to `path`, for
+    `open_params_file`."""
+    specs = list(specs)
+    table = bytearray(len(specs) * PARAMS_SIZE)
+    derive_params_table(table, specs)
+    with open(path, "wb") as f:
+        f.write(table)
+
+
+def open_params_file(path):
+    """Maps the params table in `path` read-only, and returns a
+    `ParamsTable` for it.  The mapping lives until the table and all
+    the `Params` it returned are gone."""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return ParamsTable(b"")
+        return ParamsTable(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+
+class SharedParams:
+    """A params table in a `multiprocessing.shared_memory` segment.
+
+    `SharedParams.create(specs)` derives the table in a new segment;
+    other processes attach with `SharedParams(name)`.  Either way,
+    `len()` and indexing go through a read-only `ParamsTable`.
+
+    `close()` fails with BufferError while `Params` from the table
+    are still alive: they point into the mapping.
+    """
+
+    def __init__(self, name):
+        from multiprocessing import shared_memory
+
+        try:
+            # Attaching processes should not unlink the segment on
+            # exit (Python 3.13+).
+            shm = shared_memory.SharedMemory(name, track=False)
+        except TypeError:
+            from multiprocessing import resource_tracker
+
+            shm = shared_memory.SharedMemory(name)
+            # Older versions register every attachment with the
+            # resource tracker, which would unlink the segment (and
+            # warn about a leak) when this process exits.
+            resource_tracker.unregister(shm._name, "shared_memory")
+        self._attach(shm)
+
+    def _attach(self, shm):
+        self._shm = shm
+        self.table = ParamsTable(shm.buf)
+
+    @classmethod
+    def create(cls, specs, name=None):
+        """Derives params for the `(bits, key)` pairs in `specs` in a
+        new shared memory segment."""
+        from multiprocessing import shared_memory
+
+        specs = list(specs)
+        shm = shared_memory.SharedMemory(
+            name, create=True, size=max(1, len(specs) * PARAMS_SIZE)
+        )
+        try:
+            derive_params_table(shm.buf, specs)
+            ret = cls.__new__(cls)
+            ret._attach(shm)
+            return ret
+        except BaseException:
+            shm.close()
+            shm.unlink()
+            raise
+
+    @property
+    def name(self):
+        return self._shm.name
+
+    def __len__(self):
+        return len(self.table)
+
+    def __getitem__(self, i):
+        return self.table[i]
+
+    def close(self):
+        """Detaches from the segment."""
+        table, self.table = self.table, None
+        del table
+        self._shm.close()
+
+    def unlink(self):
+        """Destroys the segment once every process has closed it."""
+        self._shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,1037 @@
+/*
+ * CPython bindings for UMASH.
+ *
+ * SPDX-License-Identifier: MIT
+ * Copyright 2022 Backtrace I/O, Inc.
+ *
+ * All entry points accept any object that exports a contiguous
+ * buffer (bytes, bytearray, memoryview, mmap, NumPy arrays, ...), and
+ * hash the exported bytes in place, without copying them.
+ */
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+
+#include <inttypes.h>
+
+#include "umash.h"
+
+/*
+ * Calls on at least this many bytes release the GIL.  Shorter inputs
+ * hash faster than the GIL round-trip.
+ */
+#define RELEASE_GIL_THRESHOLD ((size_t)1 << 16)
+
+/*
+ * A `Params` object either owns its `struct umash_params`, or
+ * borrows one from a `ParamsTable` (`owner`), e.g., in shared memory.
+ */
+/* clang-format off */
+typedef struct {
+	PyObject_HEAD
+	const struct umash_params *ptr; /* &params, or into owner. */
+	PyObject *owner;
+	struct umash_params params;
+} ParamsObject;
+
+/*
+ * A `ParamsTable` is a read-only view of an array of `struct
+ * umash_params` in someone else's buffer.
+ */
+typedef struct {
+	PyObject_HEAD
+	Py_buffer view;
+	Py_ssize_t count;
+} ParamsTableObject;
+/* clang-format on */
+
+static PyTypeObject ParamsType;
+static PyTypeObject ParamsTableType;
+
+/* Derived with `umash_params_derive(0, NULL)`. */
+static struct umash_params default_params;
+
+/**
+ * `O&` converter for 64-bit unsigned integers: unlike the `K`
+ * format, this one raises OverflowError instead of wrapping around.
+ */
+static int
+u64_converter(PyObject *obj, void *dst)
+{
+	unsigned long long value;
+
+	value = PyLong_AsUnsignedLongLong(obj);
+	if (value == (unsigned long long)-1 && PyErr_Occurred())
+		return 0;
+
+	*(uint64_t *)dst = value;
+	return 1;
+}
+
+/**
+ * `O&` converter for the `params` keyword argument: None picks the
+ * default parameters.
+ */
+static int
+params_converter(PyObject *obj, void *dst)
+{
+
+	if (obj == Py_None) {
+		*(const struct umash_params **)dst = &default_params;
+		return 1;
+	}
+
+	if (!PyObject_TypeCheck(obj, &ParamsType)) {
+		PyErr_Format(PyExc_TypeError, "params must be a umash.Params, not %.200s",
+		    Py_TYPE(obj)->tp_name);
+		return 0;
+	}
+
+	*(const struct umash_params **)dst = ((ParamsObject *)obj)->ptr;
+	return 1;
+}
+
+static PyObject *
+Params_new(PyTypeObject *type, PyObject *args, PyObject *kwds)
+{
+	static char *kwlist[] = { "bits", "key", NULL };
+	uint64_t bits = 0;
+	Py_buffer key = { .buf = NULL };
+	ParamsObject *self;
+
+	if (!PyArg_ParseTupleAndKeywords(
+		args, kwds, "|O&z*:Params", kwlist, u64_converter, &bits, &key))
+		return NULL;
+
+	if (key.buf != NULL && key.len != 32) {
+		PyErr_Format(
+		    PyExc_ValueError, "key must be 32 bytes long, not %zd", key.len);
+		PyBuffer_Release(&key);
+		return NULL;
+	}
+
+	self = (ParamsObject *)type->tp_alloc(type, 0);
+	if (self != NULL) {
+		umash_params_derive(&self->params, bits, key.buf);
+		self->ptr = &self->params;
+	}
+
+	if (key.buf != NULL)
+		PyBuffer_Release(&key);
+	return (PyObject *)self;
+}
+
+static PyObject *
+Params_from_buffer(PyObject *cls, PyObject *arg)
+{
+	Py_buffer view;
+	ParamsObject *self;
+
+	if (PyObject_GetBuffer(arg, &view, PyBUF_SIMPLE) != 0)
+		return NULL;
+
+	if (view.len != (Py_ssize_t)sizeof(struct umash_params)) {
+		PyErr_Format(PyExc_ValueError, "expected %zu bytes, got %zd",
+		    sizeof(struct umash_params), view.len);
+		PyBuffer_Release(&view);
+		return NULL;
+	}
+
+	self = (ParamsObject *)((PyTypeObject *)cls)->tp_alloc((PyTypeObject *)cls, 0);
+	if (self != NULL) {
+		memcpy(&self->params, view.buf, sizeof(self->params));
+		self->ptr = &self->params;
+	}
+
+	PyBuffer_Release(&view);
+	return (PyObject *)self;
+}
+
+static PyObject *
+Params_reduce(PyObject *self, PyObject *Py_UNUSED(ignored))
+{
+	PyObject *ctor, *ret;
+
+	ctor = PyObject_GetAttrString((PyObject *)Py_TYPE(self), "from_buffer");
+	if (ctor == NULL)
+		return NULL;
+
+	ret = Py_BuildValue("(N(y#))", ctor, (const char *)((ParamsObject *)self)->ptr,
+	    (Py_ssize_t)sizeof(struct umash_params));
+	return ret;
+}
+
+static int
+Params_getbuffer(PyObject *self, Py_buffer *view, int flags)
+{
+
+	return PyBuffer_FillInfo(view, self, (void *)((ParamsObject *)self)->ptr,
+	    sizeof(struct umash_params), /*readonly=*/1, flags);
+}
+
+static void
+Params_dealloc(ParamsObject *self)
+{
+
+	Py_XDECREF(self->owner);
+	Py_TYPE(self)->tp_free((PyObject *)self);
+	return;
+}
+
+static PyBufferProcs Params_as_buffer = {
+	.bf_getbuffer = Params_getbuffer,
+};
+
+static PyMethodDef Params_methods[] = {
+	{ "from_buffer", Params_from_buffer, METH_O | METH_CLASS,
+	    "Params.from_buffer(data)\n--\n\n"
+	    "Returns a copy of the prepared `struct umash_params` in `data`, e.g.,\n"
+	    "`bytes(params)` for another `Params` object." },
+	{ "__reduce__", Params_reduce, METH_NOARGS, NULL },
+	{ NULL },
+};
+
+/* clang-format off */
+static PyTypeObject ParamsType = {
+	PyVarObject_HEAD_INIT(NULL, 0)
+	.tp_name = "umash.Params",
+	.tp_doc = "Params(bits=0, key=None)\n--\n\n"
+		  "A UMASH key, derived from a 64-bit value and an optional 32-byte\n"
+		  "secret with `umash_params_derive`.  Params objects export their\n"
+		  "`struct umash_params` as a read-only buffer.",
+	.tp_basicsize = sizeof(ParamsObject),
+	.tp_flags = Py_TPFLAGS_DEFAULT,
+	.tp_new = Params_new,
+	.tp_dealloc = (destructor)Params_dealloc,
+	.tp_methods = Params_methods,
+	.tp_as_buffer = &Params_as_buffer,
+};
+/* clang-format on */
+
+static PyObject *
+ParamsTable_new(PyTypeObject *type, PyObject *args, PyObject *kwds)
+{
+	static char *kwlist[] = { "buffer", NULL };
+	ParamsTableObject *self;
+	PyObject *buffer;
+
+	if (!PyArg_ParseTupleAndKeywords(args, kwds, "O:ParamsTable", kwlist, &buffer))
+		return NULL;
+
+	self = (ParamsTableObject *)type->tp_alloc(type, 0);
+	if (self == NULL)
+		return NULL;
+
+	if (PyObject_GetBuffer(buffer, &self->view, PyBUF_SIMPLE) != 0) {
+		self->view.obj = NULL;
+		Py_DECREF(self);
+		return NULL;
+	}
+
+	if ((uintptr_t)self->view.buf % _Alignof(struct umash_params) != 0) {
+		PyErr_SetString(PyExc_ValueError, "params table buffer is misaligned");
+		Py_DECREF(self);
+		return NULL;
+	}
+
+	self->count = self->view.len / (Py_ssize_t)sizeof(struct umash_params);
+	return (PyObject *)self;
+}
+
+static void
+ParamsTable_dealloc(ParamsTableObject *self)
+{
+
+	if (self->view.obj != NULL)
+		PyBuffer_Release(&self->view);
+	Py_TYPE(self)->tp_free((PyObject *)self);
+	return;
+}
+
+static Py_ssize_t
+ParamsTable_length(PyObject *self)
+{
+
+	return ((ParamsTableObject *)self)->count;
+}
+
+static PyObject *
+ParamsTable_item(PyObject *self, Py_ssize_t i)
+{
+	ParamsTableObject *table = (ParamsTableObject *)self;
+	ParamsObject *ret;
+
+	if (i < 0 || i >= table->count) {
+		PyErr_SetString(PyExc_IndexError, "params table index out of range");
+		return NULL;
+	}
+
+	ret = (ParamsObject *)ParamsType.tp_alloc(&ParamsType, 0);
+	if (ret == NULL)
+		return NULL;
+
+	Py_INCREF(self);
+	ret->owner = self;
+	ret->ptr = (const struct umash_params *)table->view.buf + i;
+	return (PyObject *)ret;
+}
+
+static PySequenceMethods ParamsTable_as_sequence = {
+	.sq_length = ParamsTable_length,
+	.sq_item = ParamsTable_item,
+};
+
+/* clang-format off */
+static PyTypeObject ParamsTableType = {
+	PyVarObject_HEAD_INIT(NULL, 0)
+	.tp_name = "umash.ParamsTable",
+	.tp_doc = "ParamsTable(buffer)\n--\n\n"
+		  "A read-only array of `struct umash_params` in `buffer` (e.g., a\n"
+		  "shared memory segment or a mapped file), without any copy.\n"
+		  "`table[i]` returns a `Params` object that points into the buffer.\n"
+		  "Trailing bytes that do not fill a whole entry are ignored.",
+	.tp_basicsize = sizeof(ParamsTableObject),
+	.tp_flags = Py_TPFLAGS_DEFAULT,
+	.tp_new = ParamsTable_new,
+	.tp_dealloc = (destructor)ParamsTable_dealloc,
+	.tp_as_sequence = &ParamsTable_as_sequence,
+};
+/* clang-format on */
+
+static PyObject *
+umash_hash(PyObject *module, PyObject *args, PyObject *kwds)
+{
+	static char *kwlist[] = { "data", "seed", "which", "params", NULL };
+	const struct umash_params *params = &default_params;
+	Py_buffer data;
+	uint64_t seed = 0;
+	uint64_t ret;
+	int which = 0;
+
+	(void)module;
+	if (!PyArg_ParseTupleAndKeywords(args, kwds, "y*|O&iO&:hash", kwlist, &data,
+		u64_converter, &seed, &which, params_converter, &params))
+		return NULL;
+
+	if (which < 0 || which > 1) {
+		PyErr_Format(PyExc_ValueError, "which must be 0 or 1, not %d", which);
+		PyBuffer_Release(&data);
+		return NULL;
+	}
+
+	if ((size_t)data.len >= RELEASE_GIL_THRESHOLD) {
+		Py_BEGIN_ALLOW_THREADS;
+		ret = umash_full(params, seed, which, data.buf, data.len);
+		Py_END_ALLOW_THREADS;
+	} else {
+		ret = umash_full(params, seed, which, data.buf, data.len);
+	}
+
+	PyBuffer_Release(&data);
+	return PyLong_FromUnsignedLongLong(ret);
+}
+
+static PyObject *
+fp_to_tuple(struct umash_fp fp)
+{
+
+	return Py_BuildValue(
+	    "(KK)", (unsigned long long)fp.hash[0], (unsigned long long)fp.hash[1]);
+}
+
+static PyObject *
+umash_fprint_py(PyObject *module, PyObject *args, PyObject *kwds)
+{
+	static char *kwlist[] = { "data", "seed", "params", NULL };
+	const struct umash_params *params = &default_params;
+	Py_buffer data;
+	uint64_t seed = 0;
+	struct umash_fp ret;
+
+	(void)module;
+	if (!PyArg_ParseTupleAndKeywords(args, kwds, "y*|O&O&:fprint", kwlist, &data,
+		u64_converter, &seed, params_converter, &params))
+		return NULL;
+
+	if ((size_t)data.len >= RELEASE_GIL_THRESHOLD) {
+		Py_BEGIN_ALLOW_THREADS;
+		ret = umash_fprint(params, seed, data.buf, data.len);
+		Py_END_ALLOW_THREADS;
+	} else {
+		ret = umash_fprint(params, seed, data.buf, data.len);
+	}
+
+	PyBuffer_Release(&data);
+	return fp_to_tuple(ret);
+}
+
+/*
+ * Bulk entry points write to a caller-provided buffer of `n` uint64
+ * (or `n` pairs of uint64 for fingerprints), and hash everything in
+ * one call, so that per-element costs stay in C.  The Python
+ * wrappers in `umash/_bulk.py` allocate NumPy arrays for the output.
+ */
+
+/**
+ * Acquires a writable buffer for `n` results, and returns `n` in
+ * `*n_out`, or returns false with an exception on error.
+ */
+static bool
+bulk_out_buffer(PyObject *out, bool fprint, Py_buffer *view, size_t *n_out)
+{
+	size_t elsize = fprint ? sizeof(struct umash_fp) : sizeof(uint64_t);
+
+	if (PyObject_GetBuffer(out, view, PyBUF_WRITABLE) != 0)
+		return false;
+
+	if ((size_t)view->len % elsize != 0 ||
+	    (uintptr_t)view->buf % _Alignof(uint64_t) != 0) {
+		PyErr_Format(PyExc_ValueError,
+		    "out must be an aligned buffer of %zu-byte elements", elsize);
+		PyBuffer_Release(view);
+		return false;
+	}
+
+	*n_out = (size_t)view->len / elsize;
+	return true;
+}
+
+static void
+bulk_hash_rows(const struct umash_params *params, uint64_t seed, int which, bool fprint,
+    const char *data, size_t row_len, size_t n, void *out)
+{
+
+	if (fprint) {
+		umash_fprint_strided(params, seed, data, row_len, row_len, n, out);
+		return;
+	}
+
+	for (size_t i = 0; i < n; i++)
+		((uint64_t *)out)[i] =
+		    umash_full(params, seed, which, data + i * row_len, row_len);
+
+	return;
+}
+
+static PyObject *
+umash_hash_rows(PyObject *module, PyObject *args, PyObject *kwds)
+{
+	static char *kwlist[] = { "data", "row_len", "out", "seed", "which", "params",
+		"fprint", NULL };
+	const struct umash_params *params = &default_params;
+	Py_buffer data, out_view;
+	PyObject *out;
+	Py_ssize_t row_len;
+	size_t n;
+	uint64_t seed = 0;
+	int which = 0;
+	int fprint = 0;
+
+	(void)module;
+	if (!PyArg_ParseTupleAndKeywords(args, kwds, "y*nO|O&iO&p:_hash_rows", kwlist,
+		&data, &row_len, &out, u64_converter, &seed, &which, params_converter,
+		&params, &fprint))
+		return NULL;
+
+	if (!fprint && (which < 0 || which > 1)) {
+		PyErr_Format(PyExc_ValueError, "which must be 0 or 1, not %d", which);
+		goto out_data;
+	}
+
+	if (!bulk_out_buffer(out, fprint, &out_view, &n))
+		goto out_data;
+
+	if (row_len < 0 || (size_t)data.len != n * (size_t)row_len) {
+		PyErr_Format(PyExc_ValueError,
+		    "expected %zu rows of %zd bytes, got %zd bytes", n, row_len,
+		    data.len);
+		goto out_view;
+	}
+
+	if ((size_t)data.len >= RELEASE_GIL_THRESHOLD) {
+		Py_BEGIN_ALLOW_THREADS;
+		bulk_hash_rows(
+		    params, seed, which, fprint, data.buf, row_len, n, out_view.buf);
+		Py_END_ALLOW_THREADS;
+	} else {
+		bulk_hash_rows(
+		    params, seed, which, fprint, data.buf, row_len, n, out_view.buf);
+	}
+
+	PyBuffer_Release(&out_view);
+	PyBuffer_Release(&data);
+	Py_RETURN_NONE;
+
+out_view:
+	PyBuffer_Release(&out_view);
+out_data:
+	PyBuffer_Release(&data);
+	return NULL;
+}
+
+/**
+ * Hashes the `n` strings `data[offsets[i] ... offsets[i + 1])`, where
+ * `offsets` has `offset_size` (4 or 8) byte signed entries.
+ *
+ * Returns `n` on success, and the index of the first invalid entry in
+ * `offsets` otherwise.
+ */
+static size_t
+bulk_hash_varlen(const struct umash_params *params, uint64_t seed, int which, bool fprint,
+    const void *offsets, size_t offset_size, const char *data, size_t n_bytes, size_t n,
+    void *out)
+{
+	int64_t begin, end;
+
+#define OFFSET(I)                                                                  \
+	(offset_size == sizeof(int32_t) ? (int64_t)((const int32_t *)offsets)[I] : \
+					  ((const int64_t *)offsets)[I])
+
+	end = OFFSET(0);
+	for (size_t i = 0; i < n; i++) {
+		begin = end;
+		end = OFFSET(i + 1);
+		if (begin < 0 || end < begin || (uint64_t)end > n_bytes)
+			return i;
+
+		if (fprint) {
+			((struct umash_fp *)out)[i] =
+			    umash_fprint(params, seed, data + begin, end - begin);
+		} else {
+			((uint64_t *)out)[i] =
+			    umash_full(params, seed, which, data + begin, end - begin);
+		}
+	}
+
+#undef OFFSET
+	return n;
+}
+
+static PyObject *
+umash_hash_varlen(PyObject *module, PyObject *args, PyObject *kwds)
+{
+	static char *kwlist[] = { "offsets", "data", "out", "seed", "which", "params",
+		"fprint", NULL };
+	const struct umash_params *params = &default_params;
+	Py_buffer offsets, data, out_view;
+	PyObject *offsets_obj, *out;
+	size_t n, n_offsets, done;
+	uint64_t seed = 0;
+	int which = 0;
+	int fprint = 0;
+
+	(void)module;
+	if (!PyArg_ParseTupleAndKeywords(args, kwds, "Oy*O|O&iO&p:_hash_varlen", kwlist,
+		&offsets_obj, &data, &out, u64_converter, &seed, &which, params_converter,
+		&params, &fprint))
+		return NULL;
+
+	if (!fprint && (which < 0 || which > 1)) {
+		PyErr_Format(PyExc_ValueError, "which must be 0 or 1, not %d", which);
+		goto out_data;
+	}
+
+	if (PyObject_GetBuffer(offsets_obj, &offsets, PyBUF_C_CONTIGUOUS) != 0)
+		goto out_data;
+
+	if (offsets.itemsize != sizeof(int32_t) && offsets.itemsize != sizeof(int64_t)) {
+		PyErr_Format(PyExc_ValueError,
+		    "offsets must have 4 or 8 byte items, not %zd", offsets.itemsize);
+		goto out_offsets;
+	}
+
+	if (!bulk_out_buffer(out, fprint, &out_view, &n))
+		goto out_offsets;
+
+	n_offsets = (size_t)offsets.len / offsets.itemsize;
+	if (n_offsets != n + 1) {
+		PyErr_Format(PyExc_ValueError,
+		    "expected %zu offsets for %zu strings, got %zu", n + 1, n, n_offsets);
+		goto out_view;
+	}
+
+	if ((size_t)data.len + n * sizeof(uint64_t) >= RELEASE_GIL_THRESHOLD) {
+		Py_BEGIN_ALLOW_THREADS;
+		done = bulk_hash_varlen(params, seed, which, fprint, offsets.buf,
+		    offsets.itemsize, data.buf, data.len, n, out_view.buf);
+		Py_END_ALLOW_THREADS;
+	} else {
+		done = bulk_hash_varlen(params, seed, which, fprint, offsets.buf,
+		    offsets.itemsize, data.buf, data.len, n, out_view.buf);
+	}
+
+	if (done != n) {
+		PyErr_Format(PyExc_ValueError,
+		    "invalid offsets for string %zu in %zd bytes of data", done,
+		    data.len);
+		goto out_view;
+	}
+
+	PyBuffer_Release(&out_view);
+	PyBuffer_Release(&offsets);
+	PyBuffer_Release(&data);
+	Py_RETURN_NONE;
+
+out_view:
+	PyBuffer_Release(&out_view);
+out_offsets:
+	PyBuffer_Release(&offsets);
+out_data:
+	PyBuffer_Release(&data);
+	return NULL;
+}
+
+/*
+ * `Hasher` and `Fingerprinter` objects wrap the same incremental
+ * sink, and only differ in how they digest it.
+ *
+ * Sinks borrow their `umash_params`, so each object holds a
+ * reference to its `Params` (NULL for `default_params`).  Large
+ * updates release the GIL; the lock serialises concurrent calls on
+ * the same object, like `hashlib` does.
+ */
+/* clang-format off */
+typedef struct {
+	PyObject_HEAD
+	PyObject *params;
+	PyThread_type_lock lock;
+	union {
+		struct umash_state hash;
+		struct umash_fp_state fp;
+	} state;
+} SinkObject;
+/* clang-format on */
+
+static PyTypeObject HasherType;
+static PyTypeObject FingerprinterType;
+
+#define SINK_LOCK(SELF)                                         \
+	do {                                                    \
+		if (!PyThread_acquire_lock((SELF)->lock, 0)) {  \
+			Py_BEGIN_ALLOW_THREADS;                 \
+			PyThread_acquire_lock((SELF)->lock, 1); \
+			Py_END_ALLOW_THREADS;                   \
+		}                                               \
+	} while (0)
+
+#define SINK_UNLOCK(SELF) PyThread_release_lock((SELF)->lock)
+
+static SinkObject *
+sink_alloc(PyTypeObject *type, PyObject *params)
+{
+	SinkObject *self;
+
+	self = (SinkObject *)type->tp_alloc(type, 0);
+	if (self == NULL)
+		return NULL;
+
+	self->lock = PyThread_allocate_lock();
+	if (self->lock == NULL) {
+		Py_DECREF(self);
+		PyErr_NoMemory();
+		return NULL;
+	}
+
+	if (params != Py_None) {
+		Py_INCREF(params);
+		self->params = params;
+	}
+
+	return self;
+}
+
+static void
+sink_dealloc(SinkObject *self)
+{
+
+	if (self->lock != NULL)
+		PyThread_free_lock(self->lock);
+	Py_XDECREF(self->params);
+	Py_TYPE(self)->tp_free((PyObject *)self);
+	return;
+}
+
+/**
+ * Feeds the bytes in `data` to `self`'s sink.  The caller must not
+ * hold the object's lock.
+ */
+static void
+sink_update(SinkObject *self, const Py_buffer *data)
+{
+
+	if ((size_t)data->len >= RELEASE_GIL_THRESHOLD) {
+		Py_BEGIN_ALLOW_THREADS;
+		PyThread_acquire_lock(self->lock, 1);
+		umash_sink_update(&self->state.hash.sink, data->buf, data->len);
+		PyThread_release_lock(self->lock);
+		Py_END_ALLOW_THREADS;
+	} else {
+		SINK_LOCK(self);
+		umash_sink_update(&self->state.hash.sink, data->buf, data->len);
+		SINK_UNLOCK(self);
+	}
+
+	return;
+}
+
+static PyObject *
+Sink_update(PyObject *self, PyObject *arg)
+{
+	Py_buffer data;
+
+	if (PyObject_GetBuffer(arg, &data, PyBUF_SIMPLE) != 0)
+		return NULL;
+
+	sink_update((SinkObject *)self, &data);
+	PyBuffer_Release(&data);
+	Py_RETURN_NONE;
+}
+
+static PyObject *
+Sink_copy(PyObject *self, PyObject *Py_UNUSED(ignored))
+{
+	SinkObject *src = (SinkObject *)self;
+	SinkObject *dst;
+
+	dst = sink_alloc(Py_TYPE(self), src->params != NULL ? src->params : Py_None);
+	if (dst == NULL)
+		return NULL;
+
+	/* The sink is byte-copyable, and `params` keeps `oh` alive. */
+	SINK_LOCK(src);
+	dst->state = src->state;
+	SINK_UNLOCK(src);
+	return (PyObject *)dst;
+}
+
+/**
+ * Shared constructor for `Hasher` and `Fingerprinter`: parses the
+ * arguments, and feeds the optional initial `data` to the new sink.
+ */
+static PyObject *
+sink_new(PyTypeObject *type, PyObject *args, PyObject *kwds, bool fprint)
+{
+	static char *hash_kwlist[] = { "data", "seed", "which", "params", NULL };
+	static char *fp_kwlist[] = { "data", "seed", "params", NULL };
+	const struct umash_params *params;
+	PyObject *params_obj = Py_None;
+	Py_buffer data = { .buf = NULL };
+	SinkObject *self;
+	uint64_t seed = 0;
+	int which = 0;
+	bool ok;
+
+	if (fprint) {
+		ok = PyArg_ParseTupleAndKeywords(args, kwds, "|y*$O&O:Fingerprinter",
+		    fp_kwlist, &data, u64_converter, &seed, &params_obj);
+	} else {
+		ok = PyArg_ParseTupleAndKeywords(args, kwds, "|y*$O&iO:Hasher",
+		    hash_kwlist, &data, u64_converter, &seed, &which, &params_obj);
+	}
+
+	if (!ok)
+		return NULL;
+
+	if (params_converter(params_obj, &params) == 0)
+		goto fail;
+
+	if (!fprint && (which < 0 || which > 1)) {
+		PyErr_Format(PyExc_ValueError, "which must be 0 or 1, not %d", which);
+		goto fail;
+	}
+
+	self = sink_alloc(type, params_obj);
+	if (self == NULL)
+		goto fail;
+
+	if (fprint) {
+		umash_fp_init(&self->state.fp, params, seed);
+	} else {
+		umash_init(&self->state.hash, params, seed, which);
+	}
+
+	if (data.buf != NULL) {
+		sink_update(self, &data);
+		PyBuffer_Release(&data);
+	}
+
+	return (PyObject *)self;
+
+fail:
+	if (data.buf != NULL)
+		PyBuffer_Release(&data);
+	return NULL;
+}
+
+static PyObject *
+Hasher_new(PyTypeObject *type, PyObject *args, PyObject *kwds)
+{
+
+	return sink_new(type, args, kwds, /*fprint=*/false);
+}
+
+static uint64_t
+Hasher_value(SinkObject *self)
+{
+	uint64_t ret;
+
+	SINK_LOCK(self);
+	ret = umash_digest(&self->state.hash);
+	SINK_UNLOCK(self);
+	return ret;
+}
+
+static PyObject *
+Hasher_digest(PyObject *self, PyObject *Py_UNUSED(ignored))
+{
+	uint64_t value = Hasher_value((SinkObject *)self);
+	unsigned char buf[8];
+
+	/* Big endian, so that `digest().hex() == hexdigest()`. */
+	for (size_t i = 0; i < sizeof(buf); i++)
+		buf[i] = value >> (56 - 8 * i);
+
+	return PyBytes_FromStringAndSize((const char *)buf, sizeof(buf));
+}
+
+static PyObject *
+Hasher_hexdigest(PyObject *self, PyObject *Py_UNUSED(ignored))
+{
+	char buf[17];
+
+	snprintf(buf, sizeof(buf), "%016" PRIx64, Hasher_value((SinkObject *)self));
+	return PyUnicode_FromString(buf);
+}
+
+static PyObject *
+Hasher_intdigest(PyObject *self, PyObject *Py_UNUSED(ignored))
+{
+
+	return PyLong_FromUnsignedLongLong(Hasher_value((SinkObject *)self));
+}
+
+static PyObject *
+Fingerprinter_new(PyTypeObject *type, PyObject *args, PyObject *kwds)
+{
+
+	return sink_new(type, args, kwds, /*fprint=*/true);
+}
+
+static struct umash_fp
+Fingerprinter_value(SinkObject *self)
+{
+	struct umash_fp ret;
+
+	SINK_LOCK(self);
+	ret = umash_fp_digest(&self->state.fp);
+	SINK_UNLOCK(self);
+	return ret;
+}
+
+static PyObject *
+Fingerprinter_digest(PyObject *self, PyObject *Py_UNUSED(ignored))
+{
+	struct umash_fp fp = Fingerprinter_value((SinkObject *)self);
+	unsigned char buf[16];
+
+	for (size_t i = 0; i < sizeof(buf); i++)
+		buf[i] = fp.hash[i / 8] >> (56 - 8 * (i % 8));
+
+	return PyBytes_FromStringAndSize((const char *)buf, sizeof(buf));
+}
+
+static PyObject *
+Fingerprinter_hexdigest(PyObject *self, PyObject *Py_UNUSED(ignored))
+{
+	struct umash_fp fp = Fingerprinter_value((SinkObject *)self);
+	char buf[33];
+
+	/* Same format as `umashsum`. */
+	snprintf(buf, sizeof(buf), "%016" PRIx64 "%016" PRIx64, fp.hash[0], fp.hash[1]);
+	return PyUnicode_FromString(buf);
+}
+
+static PyObject *
+Fingerprinter_intdigest(PyObject *self, PyObject *Py_UNUSED(ignored))
+{
+
+	return fp_to_tuple(Fingerprinter_value((SinkObject *)self));
+}
+
+static PyObject *
+Sink_get_name(PyObject *self, void *Py_UNUSED(closure))
+{
+
+	return PyUnicode_FromString(
+	    Py_TYPE(self) == &HasherType ? "umash" : "umash_fprint");
+}
+
+static PyObject *
+Sink_get_digest_size(PyObject *self, void *Py_UNUSED(closure))
+{
+
+	return PyLong_FromLong(Py_TYPE(self) == &HasherType ? 8 : 16);
+}
+
+static PyObject *
+Sink_get_block_size(PyObject *self, void *Py_UNUSED(closure))
+{
+
+	(void)self;
+	return PyLong_FromLong(UMASH_BLOCK_SIZE);
+}
+
+static PyGetSetDef Sink_getset[] = {
+	{ "name", Sink_get_name, NULL, NULL, NULL },
+	{ "digest_size", Sink_get_digest_size, NULL, NULL, NULL },
+	{ "block_size", Sink_get_block_size, NULL, NULL, NULL },
+	{ NULL },
+};
+
+static PyMethodDef Hasher_methods[] = {
+	{ "update", Sink_update, METH_O,
+	    "update(data)\n--\n\n"
+	    "Feeds the bytes in `data` to the hash state." },
+	{ "copy", Sink_copy, METH_NOARGS,
+	    "copy()\n--\n\n"
+	    "Returns an independent snapshot of the hash state, in O(1)." },
+	{ "digest", Hasher_digest, METH_NOARGS,
+	    "digest()\n--\n\n"
+	    "Returns the UMASH value of the bytes fed so far, as 8 big-endian bytes." },
+	{ "hexdigest", Hasher_hexdigest, METH_NOARGS,
+	    "hexdigest()\n--\n\n"
+	    "Returns `digest()` as 16 hexadecimal digits." },
+	{ "intdigest", Hasher_intdigest, METH_NOARGS,
+	    "intdigest()\n--\n\n"
+	    "Returns the UMASH value as an integer, like `umash.hash`." },
+	{ NULL },
+};
+
+static PyMethodDef Fingerprinter_methods[] = {
+	{ "update", Sink_update, METH_O,
+	    "update(data)\n--\n\n"
+	    "Feeds the bytes in `data` to the hash state." },
+	{ "copy", Sink_copy, METH_NOARGS,
+	    "copy()\n--\n\n"
+	    "Returns an independent snapshot of the hash state, in O(1)." },
+	{ "digest", Fingerprinter_digest, METH_NOARGS,
+	    "digest()\n--\n\n"
+	    "Returns the UMASH fingerprint of the bytes fed so far, as two\n"
+	    "8-byte big-endian values." },
+	{ "hexdigest", Fingerprinter_hexdigest, METH_NOARGS,
+	    "hexdigest()\n--\n\n"
+	    "Returns `digest()` as 32 hexadecimal digits, like `umashsum`." },
+	{ "intdigest", Fingerprinter_intdigest, METH_NOARGS,
+	    "intdigest()\n--\n\n"
+	    "Returns the fingerprint as a pair of integers, like `umash.fprint`." },
+	{ NULL },
+};
+
+/* clang-format off */
+static PyTypeObject HasherType = {
+	PyVarObject_HEAD_INIT(NULL, 0)
+	.tp_name = "umash.Hasher",
+	.tp_doc = "Hasher(data=b\"\", *, seed=0, which=0, params=None)\n--\n\n"
+		  "Incrementally computes `umash.hash(data, seed, which, params)`,\n"
+		  "with the same interface as `hashlib` objects.",
+	.tp_basicsize = sizeof(SinkObject),
+	.tp_flags = Py_TPFLAGS_DEFAULT,
+	.tp_new = Hasher_new,
+	.tp_dealloc = (destructor)sink_dealloc,
+	.tp_methods = Hasher_methods,
+	.tp_getset = Sink_getset,
+};
+
+static PyTypeObject FingerprinterType = {
+	PyVarObject_HEAD_INIT(NULL, 0)
+	.tp_name = "umash.Fingerprinter",
+	.tp_doc = "Fingerprinter(data=b\"\", *, seed=0, params=None)\n--\n\n"
+		  "Incrementally computes `umash.fprint(data, seed, params)`,\n"
+		  "with the same interface as `hashlib` objects.",
+	.tp_basicsize = sizeof(SinkObject),
+	.tp_flags = Py_TPFLAGS_DEFAULT,
+	.tp_new = Fingerprinter_new,
+	.tp_dealloc = (destructor)sink_dealloc,
+	.tp_methods = Fingerprinter_methods,
+	.tp_getset = Sink_getset,
+};
+/* clang-format on */
+
+static PyMethodDef umash_methods[] = {
+	{ "hash", (PyCFunction)(void (*)(void))umash_hash, METH_VARARGS | METH_KEYWORDS,
+	    "hash(data, seed=0, which=0, params=None)\n--\n\n"
+	    "Returns the 64-bit UMASH hash of the bytes in `data`.  `which`\n"
+	    "selects the first (0) or second (1) UMASH function in `params`." },
+	{ "fprint", (PyCFunction)(void (*)(void))umash_fprint_py,
+	    METH_VARARGS | METH_KEYWORDS,
+	    "fprint(data, seed=0, params=None)\n--\n\n"
+	    "Returns the 128-bit UMASH fingerprint of the bytes in `data`, as a\n"
+	    "pair of 64-bit integers `(hash(data, which=0), hash(data, which=1))`." },
+	{ "_hash_rows", (PyCFunction)(void (*)(void))umash_hash_rows,
+	    METH_VARARGS | METH_KEYWORDS,
+	    "_hash_rows(data, row_len, out, seed=0, which=0, params=None, fprint=False)\n"
+	    "--\n\n"
+	    "Hashes each `row_len`-byte row in `data` into the matching\n"
+	    "element of the writable buffer `out`." },
+	{ "_hash_varlen", (PyCFunction)(void (*)(void))umash_hash_varlen,
+	    METH_VARARGS | METH_KEYWORDS,
+	    "_hash_varlen(offsets, data, out, seed=0, which=0, params=None, fprint=False)\n"
+	    "--\n\n"
+	    "Hashes each string `data[offsets[i]:offsets[i + 1]]` into `out[i]`." },
+	{ NULL },
+};
+
+static struct PyModuleDef umash_module = {
+	PyModuleDef_HEAD_INIT,
+	.m_name = "umash._umash",
+	.m_doc = "CPython bindings for the UMASH C library.",
+	.m_size = -1,
+	.m_methods = umash_methods,
+};
+
+static int
+add_type(PyObject *module, const char *name, PyTypeObject *type)
+{
+
+	Py_INCREF(type);
+	if (PyModule_AddObject(module, name, (PyObject *)type) < 0) {
+		Py_DECREF(type);
+		return -1;
+	}
+
+	return 0;
+}
+
+PyMODINIT_FUNC
+PyInit__umash(void)
+{
+	PyObject *module;
+
+	umash_params_derive(&default_params, 0, NULL);
+
+	if (PyType_Ready(&ParamsType) < 0 || PyType_Ready(&ParamsTableType) < 0 ||
+	    PyType_Ready(&HasherType) < 0 || PyType_Ready(&FingerprinterType) < 0)
+		return NULL;
+
+	module = PyModule_Create(&umash_module);
+	if (module == NULL)
+		return NULL;
+
+	if (add_type(module, "Params", &ParamsType) < 0 ||
+	    add_type(module, "ParamsTable", &ParamsTableType) < 0 ||
+	    add_type(module, "Hasher", &HasherType) < 0 ||
+	    add_type(module, "Fingerprinter", &FingerprinterType) < 0)
+		goto fail;
+
+	if (PyModule_AddIntConstant(module, "BLOCK_SIZE", UMASH_BLOCK_SIZE) < 0 ||
+	    PyModule_AddIntConstant(module, "PARAMS_SIZE", sizeof(struct umash_params)) <
+		0 ||
+	    PyModule_AddIntConstant(
+		module, "RELEASE_GIL_THRESHOLD", RELEASE_GIL_THRESHOLD) < 0)
+		goto fail;
+
+	return module;
+
+fail:
+	Py_DECREF(module);
+	return NULL;
+}
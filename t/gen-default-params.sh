@@ -0,0 +1,13 @@
+#!/bin/sh
+# Regenerates umash_default_params.[ch] from umash_default_params.txt.
+set -e
+BASE=$(dirname $(readlink -f "$0"))
+TMP=$(mktemp -d)
+trap 'rm -rf "$TMP"' EXIT
+
+cd "${BASE}/../"
+${CC:-cc} ${CFLAGS:- -O2 -std=c99 -W -Wall -mpclmul} -I. \
+          t/gen_default_params.c umash.c -o "$TMP/gen_default_params"
+"$TMP/gen_default_params" --header < umash_default_params.txt > "$TMP/umash_default_params.h"
+"$TMP/gen_default_params" < umash_default_params.txt > "$TMP/umash_default_params.c"
+mv "$TMP/umash_default_params.h" "$TMP/umash_default_params.c" .
@@ -0,0 +1,201 @@
+/*
+ * Generates `umash_default_params.c` (or, with the `--header`
+ * argument, `umash_default_params.h`) from the list of `(bits, key)`
+ * pairs in `umash_default_params.txt`.  See `t/gen-default-params.sh`.
+ *
+ * Each non-empty input line that doesn't start with `#` consists of
+ * the `bits` argument to `umash_params_derive` (in decimal, or
+ * hexadecimal with a `0x` prefix), and either `-` for the default
+ * secret, or the 32-byte secret as 64 hexadecimal digits.
+ */
+#include <assert.h>
+#include <ctype.h>
+#include <inttypes.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+
+#include "umash.h"
+
+static int
+hex_digit(char c)
+{
+
+	if (c >= '0' && c <= '9')
+		return c - '0';
+	if (c >= 'a' && c <= 'f')
+		return 10 + c - 'a';
+	if (c >= 'A' && c <= 'F')
+		return 10 + c - 'A';
+	return -1;
+}
+
+static bool
+parse_key(unsigned char key[static 32], const char *hex)
+{
+
+	if (strlen(hex) != 64)
+		return false;
+
+	for (size_t i = 0; i < 32; i++) {
+		int hi = hex_digit(hex[2 * i]);
+		int lo = hex_digit(hex[2 * i + 1]);
+
+		if (hi < 0 || lo < 0)
+			return false;
+
+		key[i] = (unsigned char)(16 * hi + lo);
+	}
+
+	return true;
+}
+
+static void
+print_words(const char *indent, const uint64_t *words, size_t n)
+{
+
+	for (size_t i = 0; i < n; i++) {
+		printf("%s0x%016" PRIx64 "ULL,", (i % 3 == 0) ? indent : " ", words[i]);
+		if (i % 3 == 2 || i + 1 == n)
+			printf("\n");
+	}
+
+	return;
+}
+
+static const char header_prologue[] =
+    "/*\n"
+    " * Generated by t/gen-default-params.sh from umash_default_params.txt.\n"
+    " * DO NOT EDIT.\n"
+    " */\n"
+    "#ifndef UMASH_DEFAULT_PARAMS_H\n"
+    "#define UMASH_DEFAULT_PARAMS_H\n"
+    "#include \"umash.h\"\n"
+    "\n"
+    "/**\n"
+    " * # Precomputed UMASH parameters\n"
+    " *\n"
+    " * SPDX-License-Identifier: MIT\n"
+    " * Copyright 2022 Backtrace I/O, Inc.\n"
+    " *\n"
+    " * `umash_params_derive` expands its inputs with Salsa20 and\n"
+    " * validates the result with `umash_params_prepare`.  That's quick,\n"
+    " * but short-lived processes that always derive the same parameters\n"
+    " * may as well load them from `.rodata`.\n"
+    " *\n"
+    " * `umash_default_params[i]` is the `struct umash_params` that\n"
+    " * `umash_params_derive` constructs for the `i`th `(bits, key)` pair\n"
+    " * listed in `umash_default_params.txt`.  For example, if that pair\n"
+    " * is `0 -`,\n"
+    " *\n"
+    " *     umash_params_derive(&params, 0, NULL);\n"
+    " *     umash_full(&params, ...);\n"
+    " *\n"
+    " * is equivalent to\n"
+    " *\n"
+    " *     umash_full(&umash_default_params[i], ...);\n"
+    " *\n"
+    " * This version of the table holds:\n"
+    " *\n";
+
+static const char header_declarations[] = " */\n"
+					  "\n"
+					  "#ifdef __cplusplus\n"
+					  "extern \"C\" {\n"
+					  "#endif\n"
+					  "\n";
+
+static const char header_epilogue[] = "\n"
+				      "#ifdef __cplusplus\n"
+				      "}\n"
+				      "#endif\n"
+				      "#endif /* !UMASH_DEFAULT_PARAMS_H */\n";
+
+int
+main(int argc, char **argv)
+{
+	static struct umash_params params[1024];
+	static uint64_t bits[1024];
+	static bool default_key[1024];
+	char line[256];
+	size_t lineno = 0;
+	size_t n_params = 0;
+
+	while (fgets(line, sizeof(line), stdin) != NULL) {
+		unsigned char key[32];
+		char key_str[80];
+		char *cursor = line;
+
+		lineno++;
+		while (isspace((unsigned char)*cursor))
+			cursor++;
+
+		if (*cursor == '\0' || *cursor == '#')
+			continue;
+
+		if (n_params == sizeof(params) / sizeof(params[0])) {
+			fprintf(stderr, "line %zu: too many entries\n", lineno);
+			return 1;
+		}
+
+		if (sscanf(cursor, "%" SCNi64 " %79s", &bits[n_params], key_str) != 2) {
+			fprintf(stderr, "line %zu: expected `bits key`\n", lineno);
+			return 1;
+		}
+
+		default_key[n_params] = strcmp(key_str, "-") == 0;
+		if (!default_key[n_params] && !parse_key(key, key_str)) {
+			fprintf(stderr, "line %zu: key must be `-` or 64 hex digits\n",
+			    lineno);
+			return 1;
+		}
+
+		umash_params_derive(&params[n_params], bits[n_params],
+		    default_key[n_params] ? NULL : key);
+		n_params++;
+	}
+
+	if (argc > 1 && strcmp(argv[1], "--header") == 0) {
+		printf("%s", header_prologue);
+		for (size_t i = 0; i < n_params; i++) {
+			printf(" * - `umash_default_params[%zu]`: bits = %" PRIu64
+			       ", %s key.\n",
+			    i, bits[i], default_key[i] ? "default" : "custom");
+		}
+		printf("%s", header_declarations);
+		printf("enum { UMASH_DEFAULT_PARAMS_COUNT = %zu };\n\n", n_params);
+		printf("extern const struct umash_params "
+		       "umash_default_params[UMASH_DEFAULT_PARAMS_COUNT];\n");
+		printf("%s", header_epilogue);
+		return 0;
+	}
+
+	printf(
+	    "/*\n"
+	    " * Generated by t/gen-default-params.sh from umash_default_params.txt.\n"
+	    " * DO NOT EDIT.\n"
+	    " */\n"
+	    "#include \"umash_default_params.h\"\n"
+	    "\n"
+	    "const struct umash_params umash_default_params[UMASH_DEFAULT_PARAMS_COUNT] = {\n");
+
+	for (size_t i = 0; i < n_params; i++) {
+		printf("\t/* bits = %" PRIu64 ", %s key. */\n", bits[i],
+		    default_key[i] ? "default" : "custom");
+		printf("\t{\n"
+		       "\t\t.poly = {\n");
+		for (size_t j = 0; j < 2; j++) {
+			printf("\t\t\t{ 0x%016" PRIx64 "ULL, 0x%016" PRIx64 "ULL },\n",
+			    params[i].poly[j][0], params[i].poly[j][1]);
+		}
+		printf("\t\t},\n"
+		       "\t\t.oh = {\n");
+		print_words("\t\t\t", params[i].oh,
+		    sizeof(params[i].oh) / sizeof(params[i].oh[0]));
+		printf("\t\t},\n"
+		       "\t},\n");
+	}
+
+	printf("};\n");
+	return 0;
+}
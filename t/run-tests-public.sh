@@ -6,7 +6,9 @@ PYTHON=${PYTHON3:-python3}
 (cd "${BASE}/../";
  ${CC:-cc} '-DUMASH_SECTION="umash_text"' \
            ${CFLAGS:- -O2 -std=c99 -W -Wall -mpclmul -DUMASH_LONG_INPUTS=1} \
-           umash.c \
+           umash.c umash_fd.c umash_default_params.c umash_table.c \
+           umash_bloom.c umash_fuse.c umash_hll.c umash_freq.c \
+           umash_minhash.c -pthread \
 	   -fPIC --shared -o libumash.so)
 
 OUT_OF_SECTION_SYMS=$(
@@ -6,9 +6,13 @@ PYTHON=${PYTHON3:-python3}
 (cd "${BASE}/../";
  ${CC:-cc} -DUMASH_TEST_ONLY '-DUMASH_SECTION="umash_text"' \
            ${CFLAGS:- -g -O2 -std=c99 -W -Wall -mpclmul -DUMASH_LONG_INPUTS=0} \
-           umash.c \
+           umash.c umash_fd.c umash_default_params.c umash_table.c \
+           umash_bloom.c umash_fuse.c umash_hll.c umash_freq.c \
+           umash_minhash.c -pthread \
 	   -fPIC --shared -o umash_test_only.so;
  ${CC:-cc} ${CFLAGS:- -O2 -std=c99 -W -Wall -mpclmul} -c example.c -o /dev/null;
+ ${CC:-cc} ${CFLAGS:- -O2 -std=c99 -W -Wall -mpclmul} \
+           umashsum.c umash.c umash_fd.c -pthread -o umashsum;
 )
 
 OUT_OF_SECTION_SYMS=$(
@@ -0,0 +1,36 @@
+"""
+Test suite for the precomputed table of UMASH parameters.
+"""
+import os
+
+from umash import C, FFI
+
+
+SELF_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def read_table_spec():
+    """Parses `umash_default_params.txt` into a list of (bits, key)
+    pairs, where `key` is None for the default secret."""
+    ret = []
+    with open(SELF_DIR + "/../umash_default_params.txt") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            bits, key = line.split()
+            ret.append((int(bits, 0), None if key == "-" else bytes.fromhex(key)))
+    return ret
+
+
+def test_public_umash_default_params():
+    """Each entry in the table should match `umash_params_derive`."""
+    spec = read_table_spec()
+    assert C.UMASH_DEFAULT_PARAMS_COUNT == len(spec)
+
+    size = FFI.sizeof("struct umash_params")
+    for i, (bits, key) in enumerate(spec):
+        expected = FFI.new("struct umash_params[1]")
+        C.umash_params_derive(expected, bits, FFI.NULL if key is None else key)
+        actual = FFI.buffer(FFI.addressof(C.umash_default_params[i]), size)
+        assert bytes(actual) == bytes(FFI.buffer(expected, size)), (bits, key)
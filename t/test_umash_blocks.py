@@ -0,0 +1,107 @@
+"""
+Test suite for the parallel (block-by-block) fingerprinting interface.
+"""
+from hypothesis import given
+import hypothesis.strategies as st
+from umash import C, FFI
+
+
+U64S = st.integers(min_value=0, max_value=2**64 - 1)
+
+
+BLOCK_SIZE = C.UMASH_BLOCK_SIZE
+
+
+def derived_params(bits):
+    params = FFI.new("struct umash_params[1]")
+    C.umash_params_derive(params, bits, FFI.NULL)
+    return params
+
+
+def split_fprint(params, seed, data, cuts):
+    """Fingerprints `data` by hashing the blocks between each cut
+    independently, concatenating the partial fingerprints, and
+    digesting the tail."""
+    n_blocks = max(0, len(data) - 16) // BLOCK_SIZE
+    cuts = sorted(set([0, n_blocks] + [cut % (n_blocks + 1) for cut in cuts]))
+    block_buf = FFI.from_buffer(data)
+
+    empty = FFI.new("struct umash_fp_blocks[1]")
+    acc = empty[0]
+    for begin, end in zip(cuts, cuts[1:]):
+        partial = C.umash_fprint_blocks(
+            params, seed, block_buf + begin * BLOCK_SIZE, end - begin
+        )
+        acc = C.umash_fp_blocks_concat(params, acc, partial)
+
+    assert acc.n_blocks == n_blocks
+    tail = data[n_blocks * BLOCK_SIZE :]
+    tail_buf = FFI.new("char[]", len(tail))
+    FFI.memmove(tail_buf, tail, len(tail))
+    return C.umash_fp_blocks_digest(params, seed, acc, tail_buf, len(tail))
+
+
+@given(
+    bits=U64S,
+    seed=U64S,
+    data=st.binary(min_size=0, max_size=8 * BLOCK_SIZE),
+    cuts=st.lists(st.integers(min_value=0), max_size=6),
+)
+def test_public_umash_fp_blocks(bits, seed, data, cuts):
+    """Splitting the input in runs of blocks should not change the
+    fingerprint."""
+    params = derived_params(bits)
+    expected = C.umash_fprint(params, seed, data, len(data))
+    actual = split_fprint(params, seed, data, cuts)
+    assert [actual.hash[0], actual.hash[1]] == [expected.hash[0], expected.hash[1]]
+
+
+@given(
+    bits=U64S,
+    seed=U64S,
+    n_blocks=st.integers(min_value=0, max_value=200),
+    tail_size=st.integers(min_value=16, max_value=BLOCK_SIZE + 16),
+    cuts=st.lists(st.integers(min_value=0), max_size=3),
+)
+def test_public_umash_fp_blocks_long(bits, seed, n_blocks, tail_size, cuts):
+    """Exercise the bulk loops, with inputs of up to 50 KB."""
+    params = derived_params(bits)
+    data = bytes(
+        (i * 7 + (i >> 8)) % 256 for i in range(n_blocks * BLOCK_SIZE + tail_size)
+    )
+    expected = C.umash_fprint(params, seed, data, len(data))
+    actual = split_fprint(params, seed, data, cuts)
+    assert [actual.hash[0], actual.hash[1]] == [expected.hash[0], expected.hash[1]]
+
+
+@given(
+    bits=U64S,
+    seed=U64S,
+    sizes=st.lists(st.integers(min_value=0, max_value=4), min_size=3, max_size=3),
+)
+def test_public_umash_fp_blocks_concat_associative(bits, seed, sizes):
+    """Concatenation should be associative, with the empty run as identity."""
+    params = derived_params(bits)
+    data = bytes(range(256)) * sum(sizes)
+    buf = FFI.from_buffer(data)
+    runs = []
+    offset = 0
+    for size in sizes:
+        runs.append(C.umash_fprint_blocks(params, seed, buf + offset, size))
+        offset += size * BLOCK_SIZE
+
+    def key(blocks):
+        return (blocks.acc[0], blocks.acc[1], blocks.n_blocks)
+
+    left = C.umash_fp_blocks_concat(
+        params, C.umash_fp_blocks_concat(params, runs[0], runs[1]), runs[2]
+    )
+    right = C.umash_fp_blocks_concat(
+        params, runs[0], C.umash_fp_blocks_concat(params, runs[1], runs[2])
+    )
+    whole = C.umash_fprint_blocks(params, seed, buf, sum(sizes))
+    assert key(left) == key(right) == key(whole)
+
+    empty = FFI.new("struct umash_fp_blocks[1]")
+    assert key(C.umash_fp_blocks_concat(params, empty[0], whole)) == key(whole)
+    assert key(C.umash_fp_blocks_concat(params, whole, empty[0])) == key(whole)
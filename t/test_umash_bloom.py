@@ -0,0 +1,201 @@
+"""
+Test suite for the blocked Bloom filter.
+"""
+import errno
+import functools
+import random
+import tempfile
+
+from hypothesis import given, settings
+import hypothesis.strategies as st
+from umash import C, FFI, create, data_bytes
+
+
+U64S = st.integers(min_value=0, max_value=2**64 - 1)
+FPS = st.lists(st.tuples(U64S, U64S), max_size=200)
+
+
+def make_filter(**kwargs):
+    return create(
+        "umash_bloom_options", C.umash_bloom_create, C.umash_bloom_destroy, **kwargs
+    )
+
+
+def fp_array(fps):
+    ret = FFI.new("struct umash_fp[]", max(1, len(fps)))
+    for i, (h0, h1) in enumerate(fps):
+        ret[i].hash[0] = h0
+        ret[i].hash[1] = h1
+    return ret
+
+
+def query_all(bloom, fps):
+    found = FFI.new("bool[]", max(1, len(fps)))
+    count = C.umash_bloom_query_many(bloom, fp_array(fps), len(fps), found)
+    assert count == sum(found[0 : len(fps)])
+    return list(found[0 : len(fps)])
+
+
+data = functools.partial(data_bytes, C.umash_bloom_data)
+
+
+@settings(deadline=None)
+@given(
+    expected_keys=st.integers(min_value=0, max_value=1000),
+    bits_per_key=st.integers(min_value=0, max_value=40),
+    n_hashes=st.integers(min_value=0, max_value=16),
+    fps=FPS,
+)
+def test_public_umash_bloom_no_false_negative(
+    expected_keys, bits_per_key, n_hashes, fps
+):
+    """Inserted fingerprints are always found, one at a time or in bulk."""
+    one = make_filter(
+        expected_keys=expected_keys, bits_per_key=bits_per_key, n_hashes=n_hashes
+    )
+    many = make_filter(
+        expected_keys=expected_keys, bits_per_key=bits_per_key, n_hashes=n_hashes
+    )
+    array = fp_array(fps)
+    for i in range(len(fps)):
+        C.umash_bloom_insert(one, array + i)
+    C.umash_bloom_insert_many(many, array, len(fps))
+
+    assert data(one) == data(many)
+    for i in range(len(fps)):
+        assert C.umash_bloom_query(one, array + i)
+    assert query_all(many, fps) == [True] * len(fps)
+
+
+@settings(deadline=None)
+@given(
+    seed=U64S,
+    key=st.binary(min_size=32, max_size=32),
+    keys=st.lists(st.binary(max_size=100), max_size=200),
+)
+def test_public_umash_bloom_keys(seed, key, keys):
+    """The keys functions are the same as fingerprinting keys and
+    calling the fingerprint functions."""
+    params = FFI.new("struct umash_params[1]")
+    C.umash_params_derive(params, 0, key)
+
+    by_keys = make_filter(expected_keys=len(keys))
+    by_fps = make_filter(expected_keys=len(keys))
+    buffers = [FFI.from_buffer(k) for k in keys]
+    pointers = FFI.new("void *[]", buffers or 1)
+    lengths = FFI.new("size_t[]", [len(k) for k in keys] or 1)
+
+    C.umash_bloom_insert_keys(by_keys, params, seed, pointers, lengths, len(keys))
+    fps = []
+    for k in keys:
+        fp = C.umash_fprint(params, seed, k, len(k))
+        fps.append((fp.hash[0], fp.hash[1]))
+    C.umash_bloom_insert_many(by_fps, fp_array(fps), len(fps))
+    assert data(by_keys) == data(by_fps)
+
+    found = FFI.new("bool[]", max(1, len(keys)))
+    assert C.umash_bloom_query_keys(
+        by_fps, params, seed, pointers, lengths, len(keys), found
+    ) == len(keys)
+
+
+def test_public_umash_bloom_false_positive_rate():
+    """The default sizing (12 bits per key) should have a false positive
+    rate under 1%."""
+    rng = random.Random(1)
+    n = 100000
+    bloom = make_filter(expected_keys=n)
+    present = [(rng.getrandbits(64), rng.getrandbits(64)) for _ in range(n)]
+    absent = [(rng.getrandbits(64), rng.getrandbits(64)) for _ in range(n)]
+    C.umash_bloom_insert_many(bloom, fp_array(present), n)
+
+    found = FFI.new("bool[]", n)
+    assert C.umash_bloom_query_many(bloom, fp_array(present), n, found) == n
+    false_positives = C.umash_bloom_query_many(bloom, fp_array(absent), n, found)
+    assert 0 < false_positives < 0.01 * n
+
+
+@settings(deadline=None)
+@given(
+    n_threads=st.integers(min_value=0, max_value=4),
+    n=st.integers(min_value=0, max_value=100000),
+    seed=U64S,
+)
+def test_public_umash_bloom_build(n_threads, n, seed):
+    """Parallel builds yield the same filter as a sequential insertion."""
+    rng = random.Random(seed)
+    fps = fp_array([(rng.getrandbits(64), rng.getrandbits(64)) for _ in range(n)])
+    sequential = make_filter(expected_keys=max(1, n // 4))
+    parallel = make_filter(expected_keys=max(1, n // 4))
+    C.umash_bloom_insert_many(sequential, fps, n)
+    C.umash_bloom_build(parallel, fps, n, n_threads)
+    assert data(sequential) == data(parallel)
+
+
+def test_public_umash_bloom_serialization():
+    """Views and mapped files answer like the original filter."""
+    rng = random.Random(2)
+    fps = [(rng.getrandbits(64), rng.getrandbits(64)) for _ in range(5000)]
+    bloom = make_filter(expected_keys=1000)
+    C.umash_bloom_insert_many(bloom, fp_array(fps[:1000]), 1000)
+    expected = query_all(bloom, fps)
+    serialized = data(bloom)
+    assert len(serialized) == 64 * (1 + C.umash_bloom_n_blocks(bloom))
+
+    # Views need 64-byte aligned data.
+    backing = FFI.new("char[]", len(serialized) + 64)
+    offset = -int(FFI.cast("uintptr_t", backing)) % 64
+    FFI.memmove(backing + offset, serialized, len(serialized))
+    view = C.umash_bloom_view(backing + offset, len(serialized))
+    assert view != FFI.NULL
+    view = FFI.gc(view, C.umash_bloom_destroy)
+    assert query_all(view, fps) == expected
+    assert data(view) == serialized
+
+    with tempfile.TemporaryFile() as f:
+        f.write(serialized)
+        f.flush()
+        mapped = C.umash_bloom_open_fd(f.fileno())
+    assert mapped != FFI.NULL
+    mapped = FFI.gc(mapped, C.umash_bloom_destroy)
+    assert query_all(mapped, fps) == expected
+
+
+def test_public_umash_bloom_invalid():
+    """Bad options and corrupt serialized filters fail with EINVAL."""
+    options = FFI.new("struct umash_bloom_options *")
+    assert C.umash_bloom_create(options) == FFI.NULL
+    assert FFI.errno == errno.EINVAL
+
+    options.size = FFI.sizeof("struct umash_bloom_options")
+    options.n_hashes = 17
+    assert C.umash_bloom_create(options) == FFI.NULL
+    assert FFI.errno == errno.EINVAL
+
+    bloom = C.umash_bloom_create(FFI.NULL)
+    assert bloom != FFI.NULL
+    bloom = FFI.gc(bloom, C.umash_bloom_destroy)
+    serialized = data(bloom)
+
+    backing = FFI.new("char[]", len(serialized) + 128)
+    aligned = backing + (-int(FFI.cast("uintptr_t", backing)) % 64)
+    for corrupt in [
+        serialized[:-64],
+        serialized + bytes(64),
+        b"X" + serialized[1:],
+        serialized[:64],
+    ]:
+        FFI.memmove(aligned, corrupt, len(corrupt))
+        assert C.umash_bloom_view(aligned, len(corrupt)) == FFI.NULL
+        assert FFI.errno == errno.EINVAL
+
+    # Misaligned copies of a valid filter are also rejected.
+    FFI.memmove(aligned + 8, serialized, len(serialized))
+    assert C.umash_bloom_view(aligned + 8, len(serialized)) == FFI.NULL
+    assert FFI.errno == errno.EINVAL
+
+    with tempfile.TemporaryFile() as f:
+        f.write(serialized[:32])
+        f.flush()
+        assert C.umash_bloom_open_fd(f.fileno()) == FFI.NULL
+        assert FFI.errno == errno.EINVAL
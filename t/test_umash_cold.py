@@ -0,0 +1,36 @@
+"""
+Test suite for the cold-data (prefetching) entry points.
+"""
+import os
+
+from hypothesis import given, settings
+import hypothesis.strategies as st
+from umash import C, FFI
+
+
+U64S = st.integers(min_value=0, max_value=2**64 - 1)
+
+
+@settings(deadline=None)
+@given(
+    bits=U64S,
+    seed=U64S,
+    n_bytes=st.integers(min_value=0, max_value=40000),
+    prefetch_distance=st.integers(min_value=0, max_value=1 << 16),
+)
+def test_public_umash_cold(bits, seed, n_bytes, prefetch_distance):
+    """The cold-data functions should match umash_full and
+    umash_fprint for any prefetch distance."""
+    params = FFI.new("struct umash_params[1]")
+    C.umash_params_derive(params, bits, FFI.NULL)
+    data = os.urandom(n_bytes)
+
+    expected = C.umash_fprint(params, seed, data, n_bytes)
+    actual = C.umash_fprint_cold(params, seed, data, n_bytes, prefetch_distance)
+    assert [actual.hash[0], actual.hash[1]] == [expected.hash[0], expected.hash[1]]
+
+    for which in (0, 1):
+        assert (
+            C.umash_full_cold(params, seed, which, data, n_bytes, prefetch_distance)
+            == expected.hash[which]
+        )
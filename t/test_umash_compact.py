@@ -0,0 +1,61 @@
+"""
+Test suite for the hash-only `umash_params_compact` entry points.
+"""
+import os
+
+from hypothesis import given, settings
+import hypothesis.strategies as st
+from umash import C, FFI
+
+
+U64S = st.integers(min_value=0, max_value=2**64 - 1)
+
+
+def compact_params(bits):
+    """Returns a derived params struct and its compact version."""
+    params = FFI.new("struct umash_params[1]")
+    C.umash_params_derive(params, bits, FFI.NULL)
+    compact = FFI.new("struct umash_params_compact[1]")
+    C.umash_params_compact_init(compact, params)
+    return params, compact
+
+
+def check_compact(bits, seed, data, split):
+    params, compact = compact_params(bits)
+    n_bytes = len(data)
+    block = FFI.new("char[]", n_bytes)
+    FFI.memmove(block, data, n_bytes)
+
+    expected = C.umash_full(params, seed, 0, block, n_bytes)
+    assert C.umash_full_compact(compact, seed, block, n_bytes) == expected
+
+    state = FFI.new("struct umash_state[1]")
+    C.umash_init_compact(state, compact, seed)
+    split = min(split, n_bytes)
+    C.umash_sink_update(FFI.addressof(state[0].sink), block, split)
+    C.umash_sink_update(FFI.addressof(state[0].sink), block + split, n_bytes - split)
+    assert C.umash_digest(state) == expected
+
+
+@given(
+    bits=U64S,
+    seed=U64S,
+    data=st.binary(),
+    split=st.integers(min_value=0, max_value=1000),
+)
+def test_public_umash_full_compact(bits, seed, data, split):
+    """The compact params should compute the same hash as umash_full
+    with which = 0, in one shot or incrementally."""
+    check_compact(bits, seed, data, split)
+
+
+@settings(deadline=None)
+@given(
+    bits=U64S,
+    seed=U64S,
+    n_bytes=st.integers(min_value=0, max_value=20000),
+    split=st.integers(min_value=0, max_value=20000),
+)
+def test_public_umash_full_compact_long(bits, seed, n_bytes, split):
+    """Exercise the multiple-blocks path."""
+    check_compact(bits, seed, os.urandom(n_bytes), split)
@@ -0,0 +1,178 @@
+"""
+Test suite for file descriptor fingerprinting.
+"""
+import errno
+import os
+import tempfile
+
+from hypothesis import given, settings
+import hypothesis.strategies as st
+import pytest
+from umash import C, FFI
+
+
+U64S = st.integers(min_value=0, max_value=2**64 - 1)
+
+
+FLAGS = [0, C.UMASH_FD_MMAP, C.UMASH_FD_PREAD, C.UMASH_FD_DIRECT]
+
+
+def derived_params(bits):
+    params = FFI.new("struct umash_params[1]")
+    C.umash_params_derive(params, bits, FFI.NULL)
+    return params
+
+
+def fprint_file(params, seed, contents, offset, n_bytes, flags):
+    """Writes `contents` to a temporary file, and returns the
+    fingerprint for `n_bytes` at `offset` in that file, or None if the
+    OS can't do O_DIRECT on temporary files."""
+    with tempfile.TemporaryFile(dir=os.path.dirname(os.path.abspath(__file__))) as f:
+        f.write(contents)
+        f.flush()
+        result = FFI.new("struct umash_fp[1]")
+        if not C.umash_fprint_fd(
+            result, params, seed, f.fileno(), offset, n_bytes, flags
+        ):
+            if flags == C.UMASH_FD_DIRECT and FFI.errno == errno.EINVAL:
+                return None
+            raise OSError(FFI.errno, os.strerror(FFI.errno))
+        # The file offset should not move.
+        assert f.tell() == len(contents)
+        return [result[0].hash[0], result[0].hash[1]]
+
+
+@given(
+    bits=U64S,
+    seed=U64S,
+    data=st.binary(),
+    prefix=st.integers(min_value=0, max_value=5000),
+    suffix=st.integers(min_value=0, max_value=100),
+    flags=st.sampled_from(FLAGS),
+)
+def test_public_umash_fprint_fd(bits, seed, data, prefix, suffix, flags):
+    """Fingerprinting a range in a file should match umash_fprint."""
+    params = derived_params(bits)
+    contents = b"\xaa" * prefix + data + b"\x55" * suffix
+
+    expected = C.umash_fprint(params, seed, data, len(data))
+    actual = fprint_file(params, seed, contents, prefix, len(data), flags)
+    if actual is None:
+        pytest.skip("O_DIRECT not supported")
+    assert actual == [expected.hash[0], expected.hash[1]]
+
+
+@settings(deadline=None, max_examples=10)
+@given(
+    bits=U64S,
+    seed=U64S,
+    prefix=st.integers(min_value=0, max_value=5000),
+    extra=st.integers(min_value=0, max_value=1 << 20),
+    flags=st.sampled_from(FLAGS),
+)
+def test_public_umash_fprint_fd_large(bits, seed, prefix, extra, flags):
+    """Exercise multi-chunk reads and the mmap path."""
+    params = derived_params(bits)
+    n_bytes = (4 << 20) + extra
+    data = os.urandom(n_bytes)
+    contents = b"\xaa" * prefix + data
+
+    expected = C.umash_fprint(params, seed, data, len(data))
+    actual = fprint_file(params, seed, contents, prefix, len(data), flags)
+    if actual is None:
+        pytest.skip("O_DIRECT not supported")
+    assert actual == [expected.hash[0], expected.hash[1]]
+
+
+@given(
+    data=st.binary(),
+    offset=st.integers(min_value=0, max_value=100),
+    excess=st.integers(min_value=1, max_value=10),
+    flags=st.sampled_from(FLAGS),
+)
+def test_public_umash_fprint_fd_past_eof(data, offset, excess, flags):
+    """Ranges that extend past EOF should fail with EINVAL."""
+    params = derived_params(0)
+    n_bytes = max(0, len(data) - offset) + excess
+    with tempfile.TemporaryFile() as f:
+        f.write(data)
+        f.flush()
+        result = FFI.new("struct umash_fp[1]")
+        assert not C.umash_fprint_fd(
+            result, params, 0, f.fileno(), offset, n_bytes, flags
+        )
+        assert FFI.errno == errno.EINVAL
+
+
+def fprint_file_pipelined(params, seed, contents, offset, n_bytes, options):
+    """Like `fprint_file`, but with `umash_fprint_fd_pipelined`."""
+    with tempfile.TemporaryFile(dir=os.path.dirname(os.path.abspath(__file__))) as f:
+        f.write(contents)
+        f.flush()
+        result = FFI.new("struct umash_fp[1]")
+        if not C.umash_fprint_fd_pipelined(
+            result, params, seed, f.fileno(), offset, n_bytes, options
+        ):
+            if (options.flags & C.UMASH_FD_DIRECT) and FFI.errno == errno.EINVAL:
+                return None
+            raise OSError(FFI.errno, os.strerror(FFI.errno))
+        assert f.tell() == len(contents)
+        return [result[0].hash[0], result[0].hash[1]]
+
+
+PIPELINED_FLAGS = [
+    0,
+    C.UMASH_FD_DIRECT,
+    C.UMASH_FD_THREADS,
+    C.UMASH_FD_THREADS | C.UMASH_FD_DIRECT,
+]
+
+
+@settings(deadline=None)
+@given(
+    bits=U64S,
+    seed=U64S,
+    prefix=st.integers(min_value=0, max_value=5000),
+    n_bytes=st.integers(min_value=0, max_value=100000),
+    flags=st.sampled_from(PIPELINED_FLAGS),
+    queue_depth=st.integers(min_value=0, max_value=5),
+    segment_size=st.sampled_from([0, 1, 4096, 3 * 4096]),
+)
+def test_public_umash_fprint_fd_pipelined(
+    bits, seed, prefix, n_bytes, flags, queue_depth, segment_size
+):
+    """Pipelined fingerprinting should match umash_fprint, for any
+    queue depth and segment size."""
+    params = derived_params(bits)
+    data = os.urandom(n_bytes)
+    contents = b"\xaa" * prefix + data + b"\x55" * 10
+    options = FFI.new("struct umash_fd_options *")
+    options.size = FFI.sizeof("struct umash_fd_options")
+    options.flags = flags
+    options.queue_depth = queue_depth
+    options.segment_size = segment_size
+
+    expected = C.umash_fprint(params, seed, data, len(data))
+    actual = fprint_file_pipelined(params, seed, contents, prefix, len(data), options)
+    if actual is None:
+        pytest.skip("O_DIRECT not supported")
+    assert actual == [expected.hash[0], expected.hash[1]]
+
+
+@given(
+    data=st.binary(),
+    offset=st.integers(min_value=0, max_value=100),
+    excess=st.integers(min_value=1, max_value=10),
+)
+def test_public_umash_fprint_fd_pipelined_past_eof(data, offset, excess):
+    """Ranges that extend past EOF should fail with EINVAL."""
+    params = derived_params(0)
+    n_bytes = max(0, len(data) - offset) + excess
+    with tempfile.TemporaryFile() as f:
+        f.write(data)
+        f.flush()
+        result = FFI.new("struct umash_fp[1]")
+        assert not C.umash_fprint_fd_pipelined(
+            result, params, 0, f.fileno(), offset, n_bytes, FFI.NULL
+        )
+        assert FFI.errno == errno.EINVAL
@@ -0,0 +1,281 @@
+"""
+Test suite for the count-min and count sketches.
+"""
+import collections
+import errno
+import functools
+import struct
+import threading
+
+from hypothesis import given, settings
+import hypothesis.strategies as st
+from umash import C, FFI, Keys, create, options, serialized
+
+
+U64S = st.integers(min_value=0, max_value=2**64 - 1)
+SECRETS = st.none() | st.binary(min_size=32, max_size=32)
+KINDS = st.sampled_from(
+    [
+        dict(kind=C.UMASH_FREQ_COUNT_MIN),
+        dict(kind=C.UMASH_FREQ_COUNT_MIN, conservative=True),
+        dict(kind=C.UMASH_FREQ_COUNT_SKETCH),
+    ]
+)
+KEYS = st.lists(st.binary(max_size=8), max_size=200)
+
+
+def create_freq(secret=None, **kwargs):
+    if secret is not None:
+        kwargs["secret"] = secret
+    return create(
+        "umash_freq_options", C.umash_freq_create, C.umash_freq_destroy, **kwargs
+    )
+
+
+def update_all(freq, keys, weights=None):
+    array = Keys(keys)
+    if weights is None:
+        weights = FFI.NULL
+    else:
+        weights = FFI.new("int64_t[]", weights or 1)
+    C.umash_freq_update_many(freq, array.pointers, array.lengths, weights, array.count)
+
+
+def estimate_all(freq, keys):
+    array = Keys(keys)
+    estimates = FFI.new("int64_t[]", max(1, len(keys)))
+    C.umash_freq_estimate_many(
+        freq, array.pointers, array.lengths, array.count, estimates
+    )
+    return list(estimates[0 : len(keys)])
+
+
+serialize = functools.partial(
+    serialized, C.umash_freq_serialized_size, C.umash_freq_serialize
+)
+
+
+def counters(freq):
+    """Returns the sketch's counters, row by row."""
+    serialized = serialize(freq)[32:]
+    values = struct.unpack("<%dq" % (len(serialized) // 8), serialized)
+    width = C.umash_freq_width(freq)
+    return [list(values[i : i + width]) for i in range(0, len(values), width)]
+
+
+@settings(deadline=None)
+@given(
+    kind=KINDS,
+    derived_rows=st.booleans(),
+    depth=st.integers(min_value=0, max_value=16),
+    width_bits=st.integers(min_value=1, max_value=6),
+    keys=KEYS,
+)
+def test_public_umash_freq_update(kind, derived_rows, depth, width_bits, keys):
+    """Bulk updates match individual updates, and so do bulk estimates.
+    Count-min estimates never fall short of the true count."""
+    options = dict(depth=depth, width_bits=width_bits, derived_rows=derived_rows)
+    options.update(kind)
+    bulk = create_freq(**options)
+    update_all(bulk, keys)
+    update_all(bulk, keys, [3] * len(keys))
+
+    single = create_freq(**options)
+    for key in keys:
+        C.umash_freq_update(single, key, len(key), 1)
+    for key in keys:
+        C.umash_freq_update(single, key, len(key), 3)
+    assert serialize(bulk) == serialize(single)
+
+    estimates = estimate_all(bulk, keys)
+    assert estimates == [C.umash_freq_estimate(bulk, key, len(key)) for key in keys]
+    if kind["kind"] == C.UMASH_FREQ_COUNT_MIN:
+        counts = collections.Counter(keys)
+        for key, estimate in zip(keys, estimates):
+            assert estimate >= 4 * counts[key]
+
+    C.umash_freq_clear(bulk)
+    assert estimate_all(bulk, keys) == [0] * len(keys)
+
+
+@settings(deadline=None)
+@given(
+    secret=SECRETS,
+    bits=U64S,
+    derived_rows=st.booleans(),
+    sketch=st.booleans(),
+    key=st.binary(),
+)
+def test_public_umash_freq_rows(secret, bits, derived_rows, sketch, key):
+    """Rows hash keys with double hashing on `umash_fprint`, or with
+    `umash_full` and parameters derived from `bits + row`."""
+    depth, width_bits = 3, 4
+    kind = C.UMASH_FREQ_COUNT_SKETCH if sketch else C.UMASH_FREQ_COUNT_MIN
+    freq = create_freq(
+        secret,
+        kind=kind,
+        bits=bits,
+        depth=depth,
+        width_bits=width_bits,
+        derived_rows=derived_rows,
+    )
+    C.umash_freq_update(freq, key, len(key), 5)
+
+    params = FFI.new("struct umash_params[1]")
+    secret_arg = secret or FFI.NULL
+    if derived_rows:
+        hashes = []
+        for row in range(depth):
+            C.umash_params_derive(params, (bits + row) % 2**64, secret_arg)
+            hashes.append(C.umash_full(params, 0, 0, key, len(key)))
+    else:
+        C.umash_params_derive(params, bits, secret_arg)
+        fp = C.umash_fprint(params, 0, key, len(key))
+        hashes = [
+            (fp.hash[0] + row * (fp.hash[1] | 1)) % 2**64 for row in range(depth)
+        ]
+
+    for row, values in enumerate(counters(freq)):
+        column = hashes[row] >> (64 - width_bits)
+        sign = -1 if sketch and (hashes[row] >> (63 - width_bits)) & 1 else 1
+        assert values[column] == 5 * sign
+        assert sum(values) == 5 * sign
+
+
+def test_public_umash_freq_heavy_hitters():
+    """All sketches find the heavy hitters of a skewed stream; the
+    conservative update and the count sketch are more accurate for
+    the long tail."""
+    counts = {b"heavy %d" % i: 10000 // (i + 1) for i in range(20)}
+    counts.update({b"tail %d" % i: 1 + i % 3 for i in range(20000)})
+    keys = list(counts)
+    weights = [counts[key] for key in keys]
+    total = sum(weights)
+
+    errors = {}
+    for name, options in [
+        ("count-min", dict()),
+        ("conservative", dict(conservative=True)),
+        ("count sketch", dict(kind=C.UMASH_FREQ_COUNT_SKETCH, depth=5)),
+    ]:
+        freq = create_freq(width_bits=12, **options)
+        update_all(freq, keys, weights)
+        estimates = estimate_all(freq, keys)
+        error = [abs(e - w) for e, w in zip(estimates, weights)]
+        # The count-min bound, e * total / width, holds with high probability.
+        assert max(error[:20]) <= 2.72 * total / 4096
+        errors[name] = sum(error) / len(error)
+    assert errors["conservative"] < errors["count-min"]
+    assert errors["count sketch"] < errors["count-min"]
+
+
+@settings(deadline=None)
+@given(kind=KINDS, atomic=st.booleans(), left=KEYS, right=KEYS)
+def test_public_umash_freq_merge(kind, atomic, left, right):
+    """Merging sketches adds their counters; without conservative updates,
+    that's the sketch of the concatenated stream."""
+    a = create_freq(atomic=atomic, width_bits=5, **kind)
+    b = create_freq(width_bits=5, **kind)
+    union = create_freq(width_bits=5, **kind)
+    update_all(a, left)
+    update_all(b, right)
+    update_all(union, left + right)
+    expected = [
+        [x + y for x, y in zip(row_a, row_b)]
+        for row_a, row_b in zip(counters(a), counters(b))
+    ]
+
+    assert C.umash_freq_merge(a, b)
+    assert counters(a) == expected
+    if not kind.get("conservative"):
+        assert serialize(a) == serialize(union)
+
+    for other in [
+        create_freq(width_bits=6, **kind),
+        create_freq(width_bits=5, bits=1, **kind),
+        create_freq(width_bits=5, derived_rows=True, **kind),
+        create_freq(width_bits=5, secret=b"x" * 32, **kind),
+    ]:
+        assert not C.umash_freq_merge(a, other)
+        assert FFI.errno == errno.EINVAL
+
+
+def test_public_umash_freq_atomic():
+    """Atomic sketches don't lose concurrent updates."""
+    keys = [b"%d" % (i % 100) for i in range(20000)]
+    for options in [dict(), dict(kind=C.UMASH_FREQ_COUNT_SKETCH)]:
+        freq = create_freq(atomic=True, width_bits=16, **options)
+        threads = [
+            threading.Thread(target=update_all, args=(freq, keys)) for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert estimate_all(freq, [b"%d" % i for i in range(100)]) == [800] * 100
+
+
+def test_public_umash_freq_serialization():
+    """Sketches survive a round trip through their serialized format, given
+    the same secret, and corrupt data fails with EINVAL."""
+    secret = b"umash_freq serialization test".ljust(32, b"\0")
+    keys = [b"%d" % (i % 500) for i in range(5000)]
+    for options in [
+        dict(),
+        dict(conservative=True, derived_rows=True, bits=42),
+        dict(kind=C.UMASH_FREQ_COUNT_SKETCH, depth=7, width_bits=9),
+    ]:
+        freq = create_freq(secret, atomic=True, **options)
+        update_all(freq, keys)
+        serialized = serialize(freq)
+        copy = C.umash_freq_deserialize(serialized, len(serialized), secret)
+        assert copy != FFI.NULL
+        copy = FFI.gc(copy, C.umash_freq_destroy)
+        assert serialize(copy) == serialized
+        assert estimate_all(copy, keys) == estimate_all(freq, keys)
+        update_all(copy, keys)
+        update_all(freq, keys)
+        assert serialize(copy) == serialize(freq)
+
+        # The copy must merge with sketches created with the same options.
+        assert C.umash_freq_merge(create_freq(secret, **options), copy)
+
+    size = len(serialized)
+    buf = FFI.new("char[]", size)
+    assert not C.umash_freq_serialize(freq, buf, size - 1)
+    assert FFI.errno == errno.ENOSPC
+
+    for corrupt in [
+        b"",
+        serialized[:31],
+        serialized[:-8],
+        serialized + bytes(8),
+        b"X" + serialized[1:],
+        serialized[:4] + b"\2" + serialized[5:],
+        serialized[:5] + b"\2" + serialized[6:],
+        serialized[:6] + b"\1" + serialized[7:],
+        serialized[:6] + b"\4" + serialized[7:],
+        serialized[:7] + b"\0" + serialized[8:],
+        serialized[:7] + b"\x11" + serialized[8:],
+        serialized[:8] + b"\x1d" + serialized[9:],
+        serialized[:9] + b"\1" + serialized[10:],
+        serialized[:24] + b"\1" + serialized[25:],
+    ]:
+        assert C.umash_freq_deserialize(corrupt, len(corrupt), secret) == FFI.NULL
+        assert FFI.errno == errno.EINVAL
+
+
+def test_public_umash_freq_invalid():
+    """Invalid options fail with EINVAL."""
+    empty = FFI.new("struct umash_freq_options *")
+    assert C.umash_freq_create(empty) == FFI.NULL
+    assert FFI.errno == errno.EINVAL
+
+    for fields in [
+        dict(kind=2),
+        dict(kind=C.UMASH_FREQ_COUNT_SKETCH, conservative=True),
+        dict(depth=17),
+        dict(width_bits=29),
+    ]:
+        assert C.umash_freq_create(options("umash_freq_options", **fields)) == FFI.NULL
+        assert FFI.errno == errno.EINVAL
@@ -0,0 +1,52 @@
+"""
+Test suite for multi-key hashing.
+"""
+import os
+
+from hypothesis import given, settings
+import hypothesis.strategies as st
+from umash import C, FFI
+
+
+U64S = st.integers(min_value=0, max_value=2**64 - 1)
+
+
+def check_multi(bits, seed, data):
+    """Compares `umash_full_multi` with one `umash_full` call per
+    derived params struct."""
+    k = len(bits)
+    params = FFI.new("struct umash_params[]", max(1, k))
+    params_ptrs = FFI.new("struct umash_params *[]", max(1, k))
+    for i, value in enumerate(bits):
+        C.umash_params_derive(params + i, value, FFI.NULL)
+        params_ptrs[i] = params + i
+
+    n_bytes = len(data)
+    block = FFI.new("char[]", n_bytes)
+    FFI.memmove(block, data, n_bytes)
+    out = FFI.new("uint64_t[]", max(1, k))
+    C.umash_full_multi(params_ptrs, k, seed, block, n_bytes, out)
+
+    expected = [C.umash_full(params + i, seed, 0, block, n_bytes) for i in range(k)]
+    assert list(out)[:k] == expected
+
+
+@given(
+    bits=st.lists(U64S, max_size=10),
+    seed=U64S,
+    data=st.binary(),
+)
+def test_public_umash_full_multi(bits, seed, data):
+    """umash_full_multi should match k calls to umash_full."""
+    check_multi(bits, seed, data)
+
+
+@settings(deadline=None)
+@given(
+    bits=st.lists(U64S, min_size=1, max_size=64),
+    seed=U64S,
+    n_bytes=st.integers(min_value=0, max_value=20000),
+)
+def test_public_umash_full_multi_long(bits, seed, n_bytes):
+    """Exercise the chunked loop with up to 64 keys."""
+    check_multi(bits, seed, os.urandom(n_bytes))
@@ -0,0 +1,215 @@
+"""
+Test suite for the binary fuse filter.
+"""
+import errno
+import functools
+import tempfile
+
+from hypothesis import given, settings
+import hypothesis.strategies as st
+from umash import C, FFI, Keys, create, options, data_bytes
+
+
+U64S = st.integers(min_value=0, max_value=2**64 - 1)
+SECRETS = st.none() | st.binary(min_size=32, max_size=32)
+
+
+def build(secret, keys, **kwargs):
+    array = Keys(keys)
+    return create(
+        "umash_fuse_options",
+        lambda opts: C.umash_fuse_build(
+            secret or FFI.NULL, array.pointers, array.lengths, array.count, opts
+        ),
+        C.umash_fuse_destroy,
+        **kwargs,
+    )
+
+
+def contains_all(fuse, keys):
+    array = Keys(keys)
+    found = FFI.new("bool[]", max(1, len(keys)))
+    count = C.umash_fuse_contains_many(
+        fuse, array.pointers, array.lengths, array.count, found
+    )
+    assert count == sum(found[0 : len(keys)])
+    return list(found[0 : len(keys)])
+
+
+data = functools.partial(data_bytes, C.umash_fuse_data)
+
+
+@settings(deadline=None)
+@given(
+    secret=SECRETS,
+    bits=U64S,
+    fingerprint_bits=st.sampled_from([0, 8, 16]),
+    n_threads=st.integers(min_value=0, max_value=3),
+    keys=st.lists(st.binary(max_size=20), max_size=300),
+)
+def test_public_umash_fuse_no_false_negative(
+    secret, bits, fingerprint_bits, n_threads, keys
+):
+    """All the keys in the set are in the filter."""
+    fuse = build(
+        secret,
+        keys,
+        bits=bits,
+        fingerprint_bits=fingerprint_bits,
+        n_threads=n_threads,
+    )
+    assert C.umash_fuse_size(fuse) == len(set(keys))
+    assert contains_all(fuse, keys) == [True] * len(keys)
+
+    params = C.umash_fuse_params(fuse)
+    for key in keys:
+        assert C.umash_fuse_contains(fuse, key, len(key))
+        fp = FFI.new("struct umash_fp[1]", [C.umash_fprint(params, 0, key, len(key))])
+        assert C.umash_fuse_contains_fp(fuse, fp)
+
+
+@settings(deadline=None)
+@given(
+    secret=SECRETS,
+    bits=U64S,
+    keys=st.lists(st.binary(max_size=20), max_size=100),
+)
+def test_public_umash_fuse_params(secret, bits, keys):
+    """The filter uses the parameters derived from the first `bits` value
+    that works, and rebuilding is deterministic."""
+    fuse = build(secret, keys, bits=bits)
+    again = build(secret, keys, bits=bits, n_threads=2)
+    assert data(fuse) == data(again)
+
+    found = False
+    for attempt in range(32):
+        expected = FFI.new("struct umash_params[1]")
+        C.umash_params_derive(expected, (bits + attempt) % 2**64, secret or FFI.NULL)
+        if bytes(FFI.buffer(expected)) == bytes(
+            FFI.buffer(C.umash_fuse_params(fuse), FFI.sizeof("struct umash_params"))
+        ):
+            found = True
+            break
+    assert found
+
+
+def test_public_umash_fuse_false_positive_rate():
+    """The false positive rate should be close to 2**-fingerprint_bits,
+    for about 1.125 * fingerprint_bits bits per key."""
+    n = 50000
+    keys = [b"key %d" % i for i in range(n)]
+    others = [b"other %d" % i for i in range(n)]
+    for fingerprint_bits in (8, 16):
+        fuse = build(None, keys, fingerprint_bits=fingerprint_bits)
+        assert contains_all(fuse, keys) == [True] * n
+        false_positives = sum(contains_all(fuse, others))
+        expected = n * 2**-fingerprint_bits
+        assert false_positives < 2 * expected + 5
+        assert 8 * len(data(fuse)) < 1.3 * fingerprint_bits * n
+
+
+def test_public_umash_fuse_serialization():
+    """Views and mapped files answer like the original filter, as long as
+    they're given the same secret."""
+    secret = b"umash_fuse serialization test".ljust(32, b"\0")
+    keys = [b"%d" % i for i in range(2000)]
+    queries = keys + [b"x%d" % i for i in range(2000)]
+    fuse = build(secret, keys, fingerprint_bits=16)
+    expected = contains_all(fuse, queries)
+    serialized = data(fuse)
+
+    backing = FFI.new("char[]", len(serialized) + 8)
+    aligned = backing + (-int(FFI.cast("uintptr_t", backing)) % 8)
+    FFI.memmove(aligned, serialized, len(serialized))
+    view = C.umash_fuse_view(aligned, len(serialized), secret)
+    assert view != FFI.NULL
+    view = FFI.gc(view, C.umash_fuse_destroy)
+    assert contains_all(view, queries) == expected
+    assert C.umash_fuse_size(view) == len(keys)
+
+    # A different secret yields different params, and garbage answers.
+    wrong = C.umash_fuse_view(aligned, len(serialized), FFI.NULL)
+    assert wrong != FFI.NULL
+    wrong = FFI.gc(wrong, C.umash_fuse_destroy)
+    assert contains_all(wrong, keys) != [True] * len(keys)
+
+    with tempfile.TemporaryFile() as f:
+        f.write(serialized)
+        f.flush()
+        mapped = C.umash_fuse_open_fd(f.fileno(), secret)
+    assert mapped != FFI.NULL
+    mapped = FFI.gc(mapped, C.umash_fuse_destroy)
+    assert contains_all(mapped, queries) == expected
+
+
+def test_public_umash_fuse_invalid():
+    """Bad options and corrupt serialized filters fail with EINVAL."""
+    keys = Keys([b"a", b"b"])
+    options = FFI.new("struct umash_fuse_options *")
+    assert (
+        C.umash_fuse_build(FFI.NULL, keys.pointers, keys.lengths, 2, options)
+        == FFI.NULL
+    )
+    assert FFI.errno == errno.EINVAL
+
+    options.size = FFI.sizeof("struct umash_fuse_options")
+    options.fingerprint_bits = 12
+    assert (
+        C.umash_fuse_build(FFI.NULL, keys.pointers, keys.lengths, 2, options)
+        == FFI.NULL
+    )
+    assert FFI.errno == errno.EINVAL
+
+    serialized = data(build(None, [b"%d" % i for i in range(100)]))
+    backing = FFI.new("char[]", len(serialized) + 16)
+    aligned = backing + (-int(FFI.cast("uintptr_t", backing)) % 8)
+    for corrupt in [
+        serialized[:-1],
+        serialized + b"\0",
+        b"X" + serialized[1:],
+        serialized[:64],
+    ]:
+        FFI.memmove(aligned, corrupt, len(corrupt))
+        assert C.umash_fuse_view(aligned, len(corrupt), FFI.NULL) == FFI.NULL
+        assert FFI.errno == errno.EINVAL
+
+    FFI.memmove(aligned + 1, serialized, len(serialized))
+    assert C.umash_fuse_view(aligned + 1, len(serialized), FFI.NULL) == FFI.NULL
+    assert FFI.errno == errno.EINVAL
+
+    with tempfile.TemporaryFile() as f:
+        f.write(serialized[:32])
+        f.flush()
+        assert C.umash_fuse_open_fd(f.fileno(), FFI.NULL) == FFI.NULL
+        assert FFI.errno == errno.EINVAL
+
+
+def test_public_umash_fuse_retry():
+    """Construction retries with the next `bits` value after a peeling
+    failure, and fails with EAGAIN once it runs out of attempts."""
+    keys = [b"%d" % i for i in range(20)]
+    array = Keys(keys)
+
+    # Small sets fail to peel often enough to find a failure quickly.
+    for bits in range(1000):
+        fuse = C.umash_fuse_build(
+            FFI.NULL,
+            array.pointers,
+            array.lengths,
+            array.count,
+            options("umash_fuse_options", bits=bits, max_attempts=1),
+        )
+        if fuse == FFI.NULL:
+            break
+        C.umash_fuse_destroy(fuse)
+    else:
+        assert False, "no peeling failure"
+    assert FFI.errno == errno.EAGAIN
+
+    fuse = build(None, keys, bits=bits)
+    assert contains_all(fuse, keys) == [True] * len(keys)
+    first = FFI.new("struct umash_params[1]")
+    C.umash_params_derive(first, bits, FFI.NULL)
+    assert bytes(FFI.buffer(first)) != bytes(
+        FFI.buffer(C.umash_fuse_params(fuse), FFI.sizeof("struct umash_params"))
+    )
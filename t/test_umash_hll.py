@@ -0,0 +1,217 @@
+"""
+Test suite for the HyperLogLog sketches.
+"""
+import errno
+import functools
+import struct
+
+from hypothesis import given, settings
+import hypothesis.strategies as st
+from umash import C, FFI, Keys, create, serialized
+
+
+PRECISIONS = st.integers(min_value=4, max_value=18)
+KEYS = st.lists(st.binary(max_size=20), max_size=300)
+
+
+def create_hll(**kwargs):
+    return create(
+        "umash_hll_options", C.umash_hll_create, C.umash_hll_destroy, **kwargs
+    )
+
+
+def insert_all(hll, keys):
+    array = Keys(keys)
+    assert C.umash_hll_insert_many(hll, array.pointers, array.lengths, array.count)
+
+
+def insert_range(hll, begin, end):
+    """Inserts the integers in [begin, end) as 8-byte rows."""
+    rows = struct.pack("<%dQ" % (end - begin), *range(begin, end))
+    assert C.umash_hll_insert_rows(hll, rows, 8, end - begin)
+
+
+serialize = functools.partial(
+    serialized, C.umash_hll_serialized_size, C.umash_hll_serialize
+)
+
+
+def deserialize(serialized):
+    hll = C.umash_hll_deserialize(serialized, len(serialized), FFI.NULL, 0)
+    assert hll != FFI.NULL
+    return FFI.gc(hll, C.umash_hll_destroy)
+
+
+@settings(deadline=None)
+@given(precision=PRECISIONS, keys=KEYS)
+def test_public_umash_hll_insert(precision, keys):
+    """Single and bulk insertions build the same sketch, and duplicate
+    keys don't change it."""
+    params = FFI.new("struct umash_params[1]")
+    C.umash_params_derive(params, 0, FFI.NULL)
+    bulk = create_hll(precision=precision)
+    insert_all(bulk, keys)
+    insert_all(bulk, keys)
+
+    single = create_hll(precision=precision)
+    hashes = create_hll(precision=precision)
+    for key in keys:
+        assert C.umash_hll_insert(single, key, len(key))
+        hash = C.umash_full(params, 0, 0, key, len(key))
+        assert C.umash_hll_insert_hash(hashes, hash)
+
+    assert serialize(bulk) == serialize(single) == serialize(hashes)
+    assert C.umash_hll_precision(bulk) == precision
+    if not keys:
+        assert C.umash_hll_estimate(bulk) == 0
+
+
+@settings(deadline=None)
+@given(precision=PRECISIONS, keys=KEYS)
+def test_public_umash_hll_sparse_to_dense(precision, keys):
+    """The sparse representation converts exactly to the dense one."""
+    sparse = create_hll(precision=precision)
+    dense = create_hll(precision=precision, dense=True)
+    insert_all(sparse, keys)
+    insert_all(dense, keys)
+    assert C.umash_hll_is_dense(dense)
+
+    # Merging a dense sketch forces the conversion.
+    empty = create_hll(precision=precision, dense=True)
+    assert C.umash_hll_merge(sparse, empty)
+    assert C.umash_hll_is_dense(sparse)
+    assert serialize(sparse) == serialize(dense)
+    assert C.umash_hll_estimate(sparse) == C.umash_hll_estimate(dense)
+
+
+@settings(deadline=None)
+@given(
+    precision=PRECISIONS,
+    dense=st.lists(st.booleans(), min_size=2, max_size=2),
+    left=KEYS,
+    right=KEYS,
+)
+def test_public_umash_hll_merge(precision, dense, left, right):
+    """Merging two sketches yields the sketch of the union."""
+    a = create_hll(precision=precision, dense=dense[0])
+    b = create_hll(precision=precision, dense=dense[1])
+    union = create_hll(precision=precision, dense=True)
+    insert_all(a, left)
+    insert_all(b, right)
+    insert_all(union, left + right)
+
+    assert C.umash_hll_merge(a, b)
+    assert C.umash_hll_merge(a, create_hll(precision=precision, dense=True))
+    assert serialize(a) == serialize(union)
+
+    params = FFI.new("struct umash_params[1]")
+    C.umash_params_derive(params, 1, FFI.NULL)
+    for other in [
+        create_hll(precision=precision + 1 if precision < 18 else 4),
+        create_hll(precision=precision, seed=1),
+        create_hll(precision=precision, params=params),
+    ]:
+        assert not C.umash_hll_merge(a, other)
+        assert FFI.errno == errno.EINVAL
+
+    # Equal parameters at different addresses are fine.
+    C.umash_params_derive(params, 0, FFI.NULL)
+    assert C.umash_hll_merge(a, create_hll(precision=precision, params=params))
+
+
+def test_public_umash_hll_accuracy():
+    """Estimates are within a few standard errors of the true count,
+    in the sparse and dense ranges."""
+    for precision in (10, 14):
+        sigma = 1.04 / (2**precision) ** 0.5
+        hll = create_hll(precision=precision)
+        count = 0
+        for n in (10, 100, 1000, 3000, 10000, 30000, 100000, 300000):
+            insert_range(hll, count, n)
+            count = n
+            estimate = C.umash_hll_estimate(hll)
+            assert abs(estimate - n) <= 4 * sigma * n, (precision, n, estimate)
+        assert C.umash_hll_is_dense(hll)
+
+        C.umash_hll_clear(hll)
+        assert not C.umash_hll_is_dense(hll)
+        assert C.umash_hll_estimate(hll) == 0
+
+
+def test_public_umash_hll_serialization():
+    """Sketches survive a round trip through their serialized format,
+    and deserialized sketches keep working."""
+    for n in (0, 100, 100000):
+        hll = create_hll()
+        insert_range(hll, 0, n)
+        serialized = serialize(hll)
+        copy = deserialize(serialized)
+        assert serialize(copy) == serialized
+        assert C.umash_hll_estimate(copy) == C.umash_hll_estimate(hll)
+
+        insert_range(hll, n, 2 * n + 10)
+        insert_range(copy, n, 2 * n + 10)
+        assert serialize(copy) == serialize(hll)
+
+    # Sketches only deserialize with the parameters and seed they
+    # were built with.
+    params = FFI.new("struct umash_params[1]")
+    C.umash_params_derive(params, 1, FFI.NULL)
+    hll = create_hll(params=params, seed=42)
+    insert_range(hll, 0, 100)
+    serialized = serialize(hll)
+    copy = C.umash_hll_deserialize(serialized, len(serialized), params, 42)
+    assert copy != FFI.NULL
+    C.umash_hll_destroy(copy)
+    for bad_params, seed in [(FFI.NULL, 42), (params, 0)]:
+        copy = C.umash_hll_deserialize(serialized, len(serialized), bad_params, seed)
+        assert copy == FFI.NULL
+        assert FFI.errno == errno.EINVAL
+
+    # A short buffer fails with ENOSPC.
+    size = C.umash_hll_serialized_size(hll)
+    buf = FFI.new("char[]", size)
+    assert not C.umash_hll_serialize(hll, buf, size - 1)
+    assert FFI.errno == errno.ENOSPC
+
+
+def test_public_umash_hll_invalid():
+    """Bad options and corrupt serialized sketches fail with EINVAL."""
+    options = FFI.new("struct umash_hll_options *")
+    assert C.umash_hll_create(options) == FFI.NULL
+    assert FFI.errno == errno.EINVAL
+
+    options.size = FFI.sizeof("struct umash_hll_options")
+    for precision in (3, 19):
+        options.precision = precision
+        assert C.umash_hll_create(options) == FFI.NULL
+        assert FFI.errno == errno.EINVAL
+
+    sparse = create_hll(precision=10)
+    insert_range(sparse, 0, 50)
+    sparse = serialize(sparse)
+    dense = create_hll(precision=10, dense=True)
+    insert_range(dense, 0, 50)
+    dense = serialize(dense)
+
+    entry = sparse[16:20]
+    for corrupt in [
+        b"",
+        sparse[:15],
+        sparse[:-1],
+        sparse + b"\0",
+        b"X" + sparse[1:],
+        sparse[:4] + b"\2" + sparse[5:],
+        sparse[:5] + b"\3" + sparse[6:],
+        sparse[:6] + b"\2" + sparse[7:],
+        sparse[:12] + bytes([sparse[12] ^ 1]) + sparse[13:],
+        # Duplicate (non-increasing) entries.
+        sparse[:16] + entry + entry + sparse[24:],
+        # Entries with a zero value.
+        sparse[:16] + bytes([entry[0] & ~63]) + sparse[17:],
+        dense[:-1],
+        dense[:8] + b"\1" + dense[9:],
+        dense[:16] + b"\x40" + dense[17:],
+    ]:
+        assert C.umash_hll_deserialize(corrupt, len(corrupt), FFI.NULL, 0) == FFI.NULL
+        assert FFI.errno == errno.EINVAL
@@ -0,0 +1,109 @@
+"""
+Test suite for the fused copy and fingerprint functions.
+"""
+from hypothesis import given, settings
+import hypothesis.strategies as st
+from umash import C, FFI
+
+
+U64S = st.integers(min_value=0, max_value=2**64 - 1)
+
+
+def repeats(min_size):
+    """Repeats one byte n times."""
+    return st.builds(
+        lambda count, binary: binary * count,
+        st.integers(min_value=min_size, max_value=64 * 1024),
+        st.binary(min_size=1, max_size=1),
+    )
+
+
+def derived_params(bits):
+    params = FFI.new("struct umash_params[1]")
+    C.umash_params_derive(params, bits, FFI.NULL)
+    return params
+
+
+@given(
+    bits=U64S,
+    seed=U64S,
+    data=st.binary() | repeats(1),
+    offset=st.integers(min_value=0, max_value=15),
+)
+def test_public_umash_memcpy_fprint(bits, seed, data, offset):
+    """umash_memcpy_fprint should copy the data, and return the same
+    fingerprint as umash_fprint."""
+    params = derived_params(bits)
+    n_bytes = len(data)
+    src = FFI.new("char[]", n_bytes)
+    FFI.memmove(src, data, n_bytes)
+    dst = FFI.new("char[]", n_bytes + offset)
+
+    expected = C.umash_fprint(params, seed, src, n_bytes)
+    actual = C.umash_memcpy_fprint(dst + offset, src, n_bytes, params, seed)
+    assert [actual.hash[0], actual.hash[1]] == [expected.hash[0], expected.hash[1]]
+    assert FFI.buffer(dst + offset, n_bytes)[:] == data
+
+
+@settings(deadline=None)
+@given(
+    bits=U64S,
+    seed=U64S,
+    byte=st.binary(min_size=1, max_size=1),
+    extra=st.integers(min_value=0, max_value=1024),
+    offset=st.integers(min_value=0, max_value=15),
+)
+def test_public_umash_memcpy_fprint_nontemporal(bits, seed, byte, extra, offset):
+    """Exercise the non-temporal copy path with multi-MB inputs."""
+    params = derived_params(bits)
+    n_bytes = (2 << 20) + extra
+    data = bytes(((i * 13) ^ byte[0]) & 0xFF for i in range(256)) * (n_bytes // 256)
+    data += byte * (n_bytes - len(data))
+    src = FFI.new("char[]", n_bytes)
+    FFI.memmove(src, data, n_bytes)
+    dst = FFI.new("char[]", n_bytes + offset)
+
+    expected = C.umash_fprint(params, seed, src, n_bytes)
+    actual = C.umash_memcpy_fprint(dst + offset, src, n_bytes, params, seed)
+    assert [actual.hash[0], actual.hash[1]] == [expected.hash[0], expected.hash[1]]
+    assert FFI.buffer(dst + offset, n_bytes)[:] == data
+
+
+@given(
+    bits=U64S,
+    seed=U64S,
+    which=st.integers(min_value=0, max_value=2),
+    chunks=st.lists(st.binary() | repeats(1), max_size=5),
+)
+def test_public_umash_sink_update_memcpy(bits, seed, which, chunks):
+    """Feeding chunks with umash_sink_update_memcpy should copy each
+    chunk and compute the same value as the batch function."""
+    params = derived_params(bits)
+    data = b"".join(chunks)
+
+    if which == 2:
+        state = FFI.new("struct umash_fp_state[1]")
+        C.umash_fp_init(state, params, seed)
+    else:
+        state = FFI.new("struct umash_state[1]")
+        C.umash_init(state, params, seed, which)
+
+    for chunk in chunks:
+        n_bytes = len(chunk)
+        src = FFI.new("char[]", n_bytes)
+        FFI.memmove(src, chunk, n_bytes)
+        dst = FFI.new("char[]", n_bytes)
+        C.umash_sink_update_memcpy(FFI.addressof(state[0].sink), dst, src, n_bytes)
+        assert FFI.buffer(dst, n_bytes)[:] == chunk
+
+    if which == 2:
+        expected = C.umash_fprint(params, seed, data, len(data))
+        actual = C.umash_fp_digest(state)
+        assert [actual.hash[0], actual.hash[1]] == [
+            expected.hash[0],
+            expected.hash[1],
+        ]
+    else:
+        assert C.umash_digest(state) == C.umash_full(
+            params, seed, which, data, len(data)
+        )
@@ -0,0 +1,211 @@
+"""
+Test suite for the MinHash signatures and the LSH index.
+"""
+import errno
+
+from hypothesis import given, settings
+import hypothesis.strategies as st
+from umash import C, FFI, Keys, create
+
+
+ALL_ONES = 2**64 - 1
+SHINGLES = st.lists(st.binary(max_size=12), max_size=200)
+
+
+def create_minhash(**kwargs):
+    return create(
+        "umash_minhash_options",
+        C.umash_minhash_create,
+        C.umash_minhash_destroy,
+        **kwargs,
+    )
+
+
+def create_lsh(**kwargs):
+    return create(
+        "umash_lsh_options", C.umash_lsh_create, C.umash_lsh_destroy, **kwargs
+    )
+
+
+def add_all(minhash, shingles):
+    array = Keys(shingles)
+    C.umash_minhash_add_many(minhash, array.pointers, array.lengths, array.count)
+
+
+def signature(minhash):
+    k = C.umash_minhash_k(minhash)
+    ret = FFI.new("uint64_t[]", k)
+    C.umash_minhash_signature(minhash, ret)
+    return list(ret)
+
+
+def signature_of(shingles, **kwargs):
+    minhash = create_minhash(**kwargs)
+    add_all(minhash, shingles)
+    return signature(minhash)
+
+
+def similarity(x, y):
+    assert len(x) == len(y)
+    return C.umash_minhash_similarity(x, y, len(x))
+
+
+def compress(sig, b):
+    size = C.umash_minhash_compressed_size(len(sig), b)
+    buf = FFI.new("char[]", max(1, size))
+    assert C.umash_minhash_compress(sig, len(sig), b, buf, size)
+    return bytes(FFI.buffer(buf, size))
+
+
+@settings(deadline=None)
+@given(
+    k=st.sampled_from([0, 1, 7, 64, 256]),
+    shingles=SHINGLES,
+    extra=SHINGLES,
+)
+def test_public_umash_minhash_add(k, shingles, extra):
+    """Single and bulk insertions compute the same signature, regardless of
+    order and duplicates, and every value of a nonempty set's signature is
+    the hash of one of its shingles."""
+    bulk = create_minhash(k=k)
+    add_all(bulk, shingles)
+    add_all(bulk, shingles[::-1])
+
+    single = create_minhash(k=k)
+    for shingle in shingles:
+        C.umash_minhash_add(single, shingle, len(shingle))
+    assert signature(bulk) == signature(single)
+
+    params = FFI.new("struct umash_params[1]")
+    C.umash_params_derive(params, 0, FFI.NULL)
+    hashes = {C.umash_full(params, 0, 0, shingle, len(shingle)) for shingle in shingles}
+    sig = signature(bulk)
+    assert len(sig) == (k or 128)
+    if shingles:
+        assert set(sig) <= hashes
+        assert min(sig) == min(hashes)
+    else:
+        assert sig == [ALL_ONES] * len(sig)
+
+    # Resetting the builder starts a new set.
+    C.umash_minhash_reset(bulk)
+    add_all(bulk, extra)
+    assert signature(bulk) == signature_of(extra, k=k)
+
+
+@settings(deadline=None)
+@given(data=st.binary(max_size=100), shingle_size=st.integers(0, 12))
+def test_public_umash_minhash_add_shingles(data, shingle_size):
+    """`umash_minhash_add_shingles` adds all the windows of a document."""
+    minhash = create_minhash(k=32)
+    C.umash_minhash_add_shingles(minhash, data, len(data), shingle_size)
+
+    if shingle_size == 0 or len(data) <= shingle_size:
+        expected = [data]
+    else:
+        expected = [
+            data[i : i + shingle_size] for i in range(len(data) - shingle_size + 1)
+        ]
+    assert signature(minhash) == signature_of(expected, k=32)
+
+
+def test_public_umash_minhash_similarity():
+    """Signature similarity estimates the Jaccard similarity of the sets,
+    including for small sets that leave many bins empty."""
+    k = 512
+    for size, common in [(50, 0), (50, 25), (2000, 1000), (2000, 1800), (5, 4)]:
+        x = [b"x %d" % i for i in range(size)]
+        y = [b"y %d" % i for i in range(size - common)] + x[:common]
+        jaccard = common / (2 * size - common)
+        sig_x = signature_of(x, k=k)
+        sig_y = signature_of(y, k=k)
+        estimate = similarity(sig_x, sig_y)
+        assert abs(estimate - jaccard) < 0.1, (size, common, estimate)
+        assert similarity(sig_x, sig_x) == 1
+
+        for b in (1, 2, 8):
+            bbit = C.umash_minhash_bbit_similarity(
+                compress(sig_x, b), compress(sig_y, b), k, b
+            )
+            assert abs(bbit - jaccard) < 0.15, (size, common, b, bbit)
+
+    # Different parameters give unrelated signatures.
+    x = [b"%d" % i for i in range(100)]
+    assert similarity(signature_of(x), signature_of(x, bits=1)) < 0.1
+    assert similarity(signature_of(x), signature_of(x, secret=b"s" * 32)) < 0.1
+
+
+@settings(deadline=None)
+@given(
+    sig=st.lists(st.integers(min_value=0, max_value=2**64 - 1), max_size=40),
+    b=st.integers(min_value=1, max_value=64),
+)
+def test_public_umash_minhash_compress(sig, b):
+    """Compressed signatures pack the low b bits of each value, in order."""
+    packed = int.from_bytes(compress(sig, b), "little")
+    expected = sum((value % 2**b) << (i * b) for i, value in enumerate(sig))
+    assert packed == expected
+
+    if sig:
+        packed = compress(sig, b)
+        assert C.umash_minhash_bbit_similarity(packed, packed, len(sig), b) == 1
+
+
+def test_public_umash_minhash_invalid():
+    """Invalid options and compression widths fail."""
+    options = FFI.new("struct umash_minhash_options *")
+    assert C.umash_minhash_create(options) == FFI.NULL
+    assert FFI.errno == errno.EINVAL
+
+    options.size = FFI.sizeof("struct umash_minhash_options")
+    options.k = 65536 + 1
+    assert C.umash_minhash_create(options) == FFI.NULL
+    assert FFI.errno == errno.EINVAL
+
+    lsh_options = FFI.new("struct umash_lsh_options *")
+    assert C.umash_lsh_create(lsh_options) == FFI.NULL
+    assert FFI.errno == errno.EINVAL
+    lsh_options.size = FFI.sizeof("struct umash_lsh_options")
+    lsh_options.bands = 1000
+    lsh_options.rows = 1000
+    assert C.umash_lsh_create(lsh_options) == FFI.NULL
+    assert FFI.errno == errno.EINVAL
+
+    sig = [1, 2, 3]
+    buf = FFI.new("char[]", 32)
+    for b in (0, 65):
+        assert not C.umash_minhash_compress(sig, 3, b, buf, 32)
+        assert FFI.errno == errno.EINVAL
+    assert not C.umash_minhash_compress(sig, 3, 8, buf, 2)
+    assert FFI.errno == errno.ENOSPC
+
+
+def test_public_umash_lsh():
+    """The LSH index finds near duplicates, and rarely anything else."""
+    k, bands, rows = 128, 32, 4
+    lsh = create_lsh(bands=bands, rows=rows)
+    empty = FFI.new("uint64_t[]", 16)
+    assert C.umash_lsh_query(lsh, signature_of([b"x"], k=k), empty, 16) == 0
+
+    documents = [
+        [b"doc %d shingle %d" % (d, i) for i in range(100)] for d in range(300)
+    ]
+    for id, document in enumerate(documents):
+        assert C.umash_lsh_insert(lsh, signature_of(document, k=k), id)
+    assert C.umash_lsh_size(lsh) == len(documents)
+
+    ids = FFI.new("uint64_t[]", 64)
+    for id, document in enumerate(documents):
+        # A 90% similar document finds the original.
+        near = document[:95] + [b"other %d" % i for i in range(5)]
+        count = C.umash_lsh_query(lsh, signature_of(near, k=k), ids, 64)
+        assert id in ids[0:count]
+        assert count <= 3
+        assert len(set(ids[0:count])) == count
+
+    # An identical copy with a new id; `max_ids` bounds the results.
+    copy = documents[0]
+    assert C.umash_lsh_insert(lsh, signature_of(copy, k=k), 1000)
+    count = C.umash_lsh_query(lsh, signature_of(copy, k=k), ids, 64)
+    assert sorted(ids[0:count]) == [0, 1000]
+    assert C.umash_lsh_query(lsh, signature_of(copy, k=k), ids, 1) == 1
@@ -0,0 +1,58 @@
+"""
+Test suite for prefix fingerprints with a checkpoint index.
+"""
+import os
+
+from hypothesis import given, settings
+import hypothesis.strategies as st
+from umash import C, FFI
+
+
+U64S = st.integers(min_value=0, max_value=2**64 - 1)
+
+
+@settings(deadline=None)
+@given(
+    bits=U64S,
+    seed=U64S,
+    n_bytes=st.integers(min_value=0, max_value=5000),
+    prefixes=st.lists(st.integers(min_value=0, max_value=5000), max_size=20),
+)
+def test_public_umash_fp_prefix(bits, seed, n_bytes, prefixes):
+    """Prefix fingerprints should match umash_fprint on the prefix."""
+    params = FFI.new("struct umash_params[1]")
+    C.umash_params_derive(params, bits, FFI.NULL)
+    data = os.urandom(n_bytes)
+    block = FFI.new("char[]", n_bytes)
+    FFI.memmove(block, data, n_bytes)
+
+    n_checkpoints = C.umash_fp_prefix_index_size(n_bytes)
+    index = FFI.new("struct umash_fp_checkpoint[]", max(1, n_checkpoints))
+    C.umash_fp_prefix_index(params, seed, block, n_bytes, index)
+
+    for prefix in prefixes + [0, n_bytes]:
+        prefix = min(prefix, n_bytes)
+        expected = C.umash_fprint(params, seed, block, prefix)
+        actual = C.umash_fp_prefix(params, seed, index, block, prefix)
+        assert [actual.hash[0], actual.hash[1]] == [
+            expected.hash[0],
+            expected.hash[1],
+        ]
+
+
+def test_public_umash_fp_prefix_all():
+    """Exhaustively check every prefix of a few blocks."""
+    params = FFI.new("struct umash_params[1]")
+    C.umash_params_derive(params, 0, FFI.NULL)
+    n_bytes = 4 * C.UMASH_BLOCK_SIZE + 40
+    block = FFI.new("char[]", os.urandom(n_bytes))
+    index = FFI.new(
+        "struct umash_fp_checkpoint[]", C.umash_fp_prefix_index_size(n_bytes)
+    )
+    C.umash_fp_prefix_index(params, 42, block, n_bytes, index)
+
+    for prefix in range(n_bytes + 1):
+        expected = C.umash_fprint(params, 42, block, prefix)
+        actual = C.umash_fp_prefix(params, 42, index, block, prefix)
+        assert actual.hash[0] == expected.hash[0]
+        assert actual.hash[1] == expected.hash[1]
@@ -0,0 +1,103 @@
+"""
+Test suite for the optional `UMASH_STATS` counters.
+"""
+import threading
+
+from hypothesis import example, given
+import hypothesis.strategies as st
+from umash import C, FFI
+
+
+def snapshot():
+    """Returns the current stats as a dict, or None if stats are
+    disabled."""
+    stats = FFI.new("struct umash_stats[1]")
+    enabled = C.umash_stats_snapshot(stats)
+    ret = {
+        "short_inputs": stats[0].short_inputs,
+        "medium_inputs": stats[0].medium_inputs,
+        "long_inputs": stats[0].long_inputs,
+        "multiple_blocks": stats[0].multiple_blocks,
+        "size_log2": list(stats[0].size_log2),
+    }
+    if not enabled:
+        assert ret["short_inputs"] == 0
+        assert ret["size_log2"] == [0] * C.UMASH_STATS_SIZE_BUCKETS
+        return None
+    return ret
+
+
+def expected_delta(n_bytes):
+    path = "short_inputs"
+    if n_bytes > 16:
+        path = "long_inputs"
+    elif n_bytes > 8:
+        path = "medium_inputs"
+    return path, n_bytes.bit_length()
+
+
+@given(n_bytes=st.integers(min_value=0, max_value=5000))
+def test_public_umash_stats_full(n_bytes):
+    """Each umash_full call should increment its code path's counter
+    and its size bucket."""
+    params = FFI.new("struct umash_params[1]")
+    C.umash_params_derive(params, 0, FFI.NULL)
+    before = snapshot()
+    C.umash_full(params, 0, 0, b"\x00" * n_bytes, n_bytes)
+    after = snapshot()
+    if before is None:
+        return
+
+    path, bucket = expected_delta(n_bytes)
+    assert after[path] == before[path] + 1
+    assert after["size_log2"][bucket] == before["size_log2"][bucket] + 1
+    assert sum(after["size_log2"]) == sum(before["size_log2"]) + 1
+
+
+def test_public_umash_stats_threads():
+    """Counts from other threads, including exited ones, should show
+    up in the snapshot."""
+    params = FFI.new("struct umash_params[1]")
+    C.umash_params_derive(params, 0, FFI.NULL)
+    before = snapshot()
+
+    def work():
+        for _ in range(100):
+            C.umash_fprint(params, 0, b"\x00" * 12, 12)
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    after = snapshot()
+    if before is None:
+        return
+    assert after["medium_inputs"] == before["medium_inputs"] + 400
+
+
+@example(chunks=[b"\0" * 5, b"\0" * 11])
+@given(chunks=st.lists(st.binary(max_size=600), max_size=5))
+def test_public_umash_stats_incremental(chunks):
+    """Incremental hashes count one digest in their code path, and the
+    size of each update in the histogram."""
+    params = FFI.new("struct umash_params[1]")
+    C.umash_params_derive(params, 0, FFI.NULL)
+    state = FFI.new("struct umash_state[1]")
+    C.umash_init(state, params, 0, 0)
+    before = snapshot()
+    for chunk in chunks:
+        C.umash_sink_update(FFI.addressof(state[0], "sink"), chunk, len(chunk))
+    C.umash_digest(state)
+    after = snapshot()
+    if before is None:
+        return
+
+    # Incremental states switch to the long input path at 16 bytes.
+    n_bytes = sum(len(chunk) for chunk in chunks)
+    path, _ = expected_delta(n_bytes + (n_bytes == 16))
+    assert after[path] == before[path] + 1
+    for chunk in chunks:
+        before["size_log2"][len(chunk).bit_length()] += 1
+    assert after["size_log2"] == before["size_log2"]
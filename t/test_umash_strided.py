@@ -0,0 +1,70 @@
+"""
+Test suite for fixed-stride record fingerprinting.
+"""
+import os
+
+from hypothesis import given, settings
+import hypothesis.strategies as st
+from umash import C, FFI
+
+
+U64S = st.integers(min_value=0, max_value=2**64 - 1)
+
+
+def derived_params(bits):
+    params = FFI.new("struct umash_params[1]")
+    C.umash_params_derive(params, bits, FFI.NULL)
+    return params
+
+
+@settings(deadline=None)
+@given(
+    bits=U64S,
+    seed=U64S,
+    record_len=st.integers(min_value=0, max_value=300),
+    padding=st.integers(min_value=0, max_value=40),
+    n_records=st.integers(min_value=0, max_value=40),
+)
+def test_public_umash_fprint_strided(bits, seed, record_len, padding, n_records):
+    """Strided fingerprinting should match umash_fprint on each record."""
+    params = derived_params(bits)
+    stride = record_len + padding
+    data = os.urandom(stride * n_records)
+    buf = FFI.new("char[]", max(1, len(data)))
+    FFI.memmove(buf, data, len(data))
+    out = FFI.new("struct umash_fp[]", max(1, n_records))
+
+    C.umash_fprint_strided(params, seed, buf, stride, record_len, n_records, out)
+    for i in range(n_records):
+        expected = C.umash_fprint(params, seed, buf + i * stride, record_len)
+        assert [out[i].hash[0], out[i].hash[1]] == [expected.hash[0], expected.hash[1]]
+
+
+@given(
+    tag=U64S,
+    record_len=st.integers(min_value=17, max_value=256),
+    padding=st.integers(min_value=0, max_value=40),
+    n_records=st.integers(min_value=0, max_value=9),
+)
+def test_umash_oh_records(tag, record_len, padding, n_records):
+    """The dispatched record compressor should match the generic one,
+    and `oh_varblock_fprint` on each record."""
+    params = derived_params(tag)
+    stride = record_len + padding
+    data = os.urandom(stride * n_records)
+    buf = FFI.new("char[]", max(1, len(data)))
+    FFI.memmove(buf, data, len(data))
+
+    actual = FFI.new("struct umash_oh[][2]", max(1, n_records))
+    generic = FFI.new("struct umash_oh[][2]", max(1, n_records))
+    C.umash_oh_records(actual, params[0].oh, tag, buf, stride, record_len, n_records)
+    C.umash_oh_records_generic(
+        generic, params[0].oh, tag, buf, stride, record_len, n_records
+    )
+
+    for i in range(n_records):
+        expected = FFI.new("struct umash_oh[2]")
+        C.oh_varblock_fprint(expected, params[0].oh, tag, buf + i * stride, record_len)
+        for j in range(2):
+            values = [list(x[i][j].bits) for x in (actual, generic)]
+            assert values == [list(expected[j].bits)] * 2
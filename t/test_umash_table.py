@@ -0,0 +1,158 @@
+"""
+Test suite for the concurrent hash table.
+"""
+import errno
+import threading
+
+from hypothesis import given, settings
+import hypothesis.strategies as st
+from umash import C, FFI, create
+
+
+U64S = st.integers(min_value=0, max_value=2**64 - 1)
+
+
+def make_table(**kwargs):
+    return create(
+        "umash_table_options", C.umash_table_create, C.umash_table_destroy, **kwargs
+    )
+
+
+def lookup(table, key):
+    value = FFI.new("uint64_t[1]")
+    if C.umash_table_lookup(table, key, len(key), value):
+        return value[0]
+    return None
+
+
+def stats(table):
+    ret = FFI.new("struct umash_table_stats[1]")
+    C.umash_table_stats(table, ret)
+    return ret[0]
+
+
+@settings(deadline=None)
+@given(
+    seed=U64S,
+    initial_capacity=st.integers(min_value=0, max_value=100),
+    n_shards=st.sampled_from([0, 1, 3, 16]),
+    max_probe_groups=st.sampled_from([0, 1, 2]),
+    ops=st.lists(
+        st.tuples(
+            st.sampled_from(["insert", "delete", "lookup"]),
+            st.binary(max_size=20) | st.integers(0, 300).map(lambda i: b"%d" % i),
+            U64S,
+        ),
+        max_size=1000,
+    ),
+)
+def test_public_umash_table_model(
+    seed, initial_capacity, n_shards, max_probe_groups, ops
+):
+    """The table should behave like a dict, across resizes and rotations."""
+    table = make_table(
+        seed=seed,
+        initial_capacity=initial_capacity,
+        n_shards=n_shards,
+        max_probe_groups=max_probe_groups,
+    )
+    model = {}
+    for op, key, value in ops:
+        if op == "insert":
+            assert C.umash_table_insert(table, key, len(key), value)
+            model[key] = value
+        elif op == "delete":
+            old = FFI.new("uint64_t[1]")
+            found = C.umash_table_delete(table, key, len(key), old)
+            assert found == (key in model)
+            if found:
+                assert old[0] == model.pop(key)
+        else:
+            assert lookup(table, key) == model.get(key)
+
+    assert C.umash_table_size(table) == len(model)
+    for key, value in model.items():
+        assert lookup(table, key) == value
+    assert stats(table).entries == len(model)
+
+
+def test_public_umash_table_grow():
+    table = make_table(n_shards=4)
+    keys = [b"key %d" % i for i in range(20000)]
+    for i, key in enumerate(keys):
+        assert C.umash_table_insert(table, key, len(key), i)
+    for i, key in enumerate(keys):
+        assert lookup(table, key) == i
+    for key in keys[::2]:
+        assert C.umash_table_delete(table, key, len(key), FFI.NULL)
+    for i, key in enumerate(keys):
+        assert lookup(table, key) == (None if i % 2 == 0 else i)
+
+    counters = stats(table)
+    assert counters.entries == len(keys) // 2
+    assert counters.capacity >= counters.entries
+    assert counters.resizes > 0
+    assert counters.rotations == 0
+
+
+def test_public_umash_table_rotation():
+    """Keys that collide in the low hash bits trigger a rotation, after
+    which they spread out again."""
+    params = FFI.new("struct umash_params[1]")
+    C.umash_params_derive(params, 42, FFI.NULL)
+    table = make_table(params=params, n_shards=1, max_probe_groups=2)
+
+    colliding = []
+    i = 0
+    while len(colliding) < 100:
+        key = b"attack %d" % i
+        i += 1
+        # Same starting group in any array of up to 1024 groups.
+        if (C.umash_full(params, 0, 0, key, len(key)) >> 7) % 1024 == 0:
+            colliding.append(key)
+
+    for i, key in enumerate(colliding):
+        assert C.umash_table_insert(table, key, len(key), i)
+
+    counters = stats(table)
+    assert 1 <= counters.rotations <= 3
+    for i, key in enumerate(colliding):
+        assert lookup(table, key) == i
+
+
+def test_public_umash_table_threads():
+    """Concurrent updates to disjoint keys don't interfere."""
+    table = make_table(n_shards=4)
+    errors = []
+
+    def work(thread):
+        keys = [b"%d:%d" % (thread, i) for i in range(5000)]
+        for i, key in enumerate(keys):
+            C.umash_table_insert(table, key, len(key), i)
+        for i, key in enumerate(keys):
+            if lookup(table, key) != i:
+                errors.append(key)
+        for key in keys[1::2]:
+            if not C.umash_table_delete(table, key, len(key), FFI.NULL):
+                errors.append(key)
+
+    threads = [threading.Thread(target=work, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert C.umash_table_size(table) == 4 * 2500
+
+
+def test_public_umash_table_options():
+    table = C.umash_table_create(FFI.NULL)
+    assert table != FFI.NULL
+    assert C.umash_table_insert(table, b"", 0, 1)
+    assert lookup(table, b"") == 1
+    C.umash_table_destroy(table)
+
+    options = FFI.new("struct umash_table_options *")
+    assert C.umash_table_create(options) == FFI.NULL
+    assert FFI.errno == errno.EINVAL
@@ -0,0 +1,77 @@
+"""
+Test suite for the runtime `umash_multiple_blocks` threshold.
+"""
+import os
+
+from hypothesis import given, settings
+import hypothesis.strategies as st
+from umash import C, FFI
+
+
+U64S = st.integers(min_value=0, max_value=2**64 - 1)
+
+
+SIZE_MAX = 2 ** (8 * FFI.sizeof("size_t")) - 1
+
+
+def hashes(params, seed, data):
+    """Returns the one-shot and incremental hashes and fingerprints of
+    `data`."""
+    state = FFI.new("struct umash_state[1]")
+    fp_state = FFI.new("struct umash_fp_state[1]")
+    C.umash_init(state, params, seed, 0)
+    C.umash_fp_init(fp_state, params, seed)
+    for sink in (FFI.addressof(state[0].sink), FFI.addressof(fp_state[0].sink)):
+        C.umash_sink_update(sink, data, len(data))
+
+    fp = C.umash_fprint(params, seed, data, len(data))
+    inc_fp = C.umash_fp_digest(fp_state)
+    return [
+        C.umash_full(params, seed, 0, data, len(data)),
+        fp.hash[0],
+        fp.hash[1],
+        C.umash_digest(state),
+        inc_fp.hash[0],
+        inc_fp.hash[1],
+    ]
+
+
+@settings(deadline=None)
+@given(
+    bits=U64S,
+    seed=U64S,
+    n_bytes=st.integers(min_value=0, max_value=5000),
+    threshold=st.integers(min_value=0, max_value=5000) | st.just(SIZE_MAX),
+)
+def test_public_umash_threshold_invariance(bits, seed, n_bytes, threshold):
+    """The threshold should never change hash values."""
+    params = FFI.new("struct umash_params[1]")
+    C.umash_params_derive(params, bits, FFI.NULL)
+    data = os.urandom(n_bytes)
+
+    expected = hashes(params, seed, data)
+    previous = C.umash_multiple_blocks_threshold_set(threshold)
+    try:
+        actual = hashes(params, seed, data)
+    finally:
+        C.umash_multiple_blocks_threshold_set(previous)
+    assert actual == expected
+
+
+def test_public_umash_threshold_get_set():
+    """Setting the threshold should round up to one block, and return
+    the previous value."""
+    previous = C.umash_multiple_blocks_threshold_get()
+    if previous == SIZE_MAX:
+        # Built without umash_long.inc: the threshold is fixed.
+        assert C.umash_multiple_blocks_threshold_set(2048) == SIZE_MAX
+        assert C.umash_multiple_blocks_threshold_get() == SIZE_MAX
+        return
+
+    try:
+        assert C.umash_multiple_blocks_threshold_set(2048) == previous
+        assert C.umash_multiple_blocks_threshold_get() == 2048
+        assert C.umash_multiple_blocks_threshold_set(1) == 2048
+        assert C.umash_multiple_blocks_threshold_get() == C.UMASH_BLOCK_SIZE
+    finally:
+        C.umash_multiple_blocks_threshold_set(previous)
@@ -0,0 +1,181 @@
+"""
+Test suite for the umashsum command line tool.
+"""
+import os
+import subprocess
+
+import pytest
+from umash import C, FFI, TOPLEVEL
+
+UMASHSUM = os.getenv("UMASHSUM", TOPLEVEL + "umashsum")
+
+
+def umashsum(*args, cwd, input=b""):
+    return subprocess.run(
+        [UMASHSUM, *args],
+        cwd=cwd,
+        input=input,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+
+
+def escape(name):
+    """Returns `name` as umashsum prints it, with a leading backslash if
+    it contains a backslash or a newline."""
+    escaped = name.replace("\\", "\\\\").replace("\n", "\\n")
+    return ("\\" if escaped != name else "") + escaped
+
+
+def fingerprint(data):
+    params = FFI.new("struct umash_params[1]")
+    C.umash_params_derive(params, 0, FFI.NULL)
+    fp = C.umash_fprint(params, 0, data, len(data))
+    return "%016x%016x" % (fp.hash[0], fp.hash[1])
+
+
+@pytest.fixture
+def files(tmp_path):
+    """Populates `tmp_path` with a few files, including some with
+    names that must be escaped in manifests."""
+    contents = {
+        "empty": b"",
+        "short": b"hello world\n",
+        "long": bytes(range(256)) * 4097,
+        "back\\slash": b"escaped",
+        "new\nline": b"also escaped",
+    }
+    for name, data in contents.items():
+        (tmp_path / name).write_bytes(data)
+    return contents
+
+
+def test_umashsum_round_trip(tmp_path, files):
+    """Printed fingerprints match `umash_fprint`, in argument order, and
+    the manifest checks back OK, with or without escaped names."""
+    names = list(files)
+    result = umashsum("-j", "3", *names, cwd=tmp_path)
+    assert result.returncode == 0, result.stderr
+    manifest = result.stdout
+    expected = []
+    for name, data in files.items():
+        escaped = escape(name)
+        if escaped != name:
+            line = "\\%s  %s\n" % (fingerprint(data), escaped[1:])
+        else:
+            line = "%s  %s\n" % (fingerprint(data), name)
+        expected.append(line)
+    assert manifest.decode() == "".join(expected)
+
+    (tmp_path / "manifest").write_bytes(manifest)
+    for flags in [[], ["--mmap"], ["--pread"]]:
+        result = umashsum("-c", *flags, "manifest", cwd=tmp_path)
+        assert result.returncode == 0, result.stderr
+        assert result.stdout.decode() == "".join(
+            "%s: OK\n" % escape(name) for name in names
+        )
+
+    # -q only prints failures.
+    result = umashsum("-c", "-q", "manifest", cwd=tmp_path)
+    assert (result.returncode, result.stdout) == (0, b"")
+
+    # -T reads the list of names, one per line.
+    (tmp_path / "list").write_text("short\nlong\n")
+    result = umashsum("-T", "list", cwd=tmp_path)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout == b"".join(manifest.splitlines(True)[1:3])
+
+
+def test_umashsum_stdin(tmp_path):
+    """With no FILE or with "-", umashsum hashes or checks stdin."""
+    data = b"stdin data\n" * 1000
+    expected = "%s  -\n" % fingerprint(data)
+    for args in [[], ["-"]]:
+        result = umashsum(*args, cwd=tmp_path, input=data)
+        assert result.returncode == 0, result.stderr
+        assert result.stdout.decode() == expected
+
+    (tmp_path / "short").write_bytes(b"hello world\n")
+    manifest = "%s  short\n" % fingerprint(b"hello world\n")
+    for args in [["-c"], ["-c", "-"]]:
+        result = umashsum(*args, cwd=tmp_path, input=manifest.encode())
+        assert result.returncode == 0, result.stderr
+        assert result.stdout == b"short: OK\n"
+
+
+def test_umashsum_check_failures(tmp_path, files):
+    """Mismatches and unreadable files are reported and exit with 1."""
+    manifest = umashsum(*files, cwd=tmp_path).stdout
+    (tmp_path / "manifest").write_bytes(manifest)
+
+    (tmp_path / "short").write_bytes(b"changed\n")
+    result = umashsum("-c", "manifest", cwd=tmp_path)
+    assert result.returncode == 1
+    assert b"short: FAILED\n" in result.stdout
+    assert b"long: OK\n" in result.stdout
+    assert b"1 computed checksum did NOT match" in result.stderr
+
+    (tmp_path / "long").unlink()
+    result = umashsum("-c", "manifest", cwd=tmp_path)
+    assert result.returncode == 1
+    assert b"long: FAILED open or read\n" in result.stdout
+    assert b"1 listed file could not be read" in result.stderr
+
+    # --status only reports through the exit code.
+    result = umashsum("-c", "--status", "manifest", cwd=tmp_path)
+    assert (result.returncode, result.stdout, result.stderr) == (1, b"", b"")
+
+    # Missing files fail when hashing too.
+    result = umashsum("short", "long", cwd=tmp_path)
+    assert result.returncode == 1
+    assert result.stdout.decode() == "%s  short\n" % fingerprint(b"changed\n")
+
+
+def test_umashsum_bad_manifest(tmp_path):
+    """Manifests without any valid line fail; invalid lines are skipped
+    with a warning otherwise."""
+    (tmp_path / "short").write_bytes(b"hello world\n")
+    line = "%s  short\n" % fingerprint(b"hello world\n")
+    for contents in ["", "garbage\n", "\\" + line.replace("short", "bad\\escape")]:
+        (tmp_path / "manifest").write_text(contents)
+        result = umashsum("-c", "manifest", cwd=tmp_path)
+        assert result.returncode == 1
+        assert b"no properly formatted checksum lines found" in result.stderr
+
+    (tmp_path / "manifest").write_text("garbage\n" + line)
+    result = umashsum("-c", "manifest", cwd=tmp_path)
+    assert result.returncode == 0
+    assert result.stdout == b"short: OK\n"
+    assert b"WARNING" in result.stderr
+
+    result = umashsum("-c", "missing", cwd=tmp_path)
+    assert result.returncode == 1
+
+    for args in [["--no-such-option"], ["-j", "abc"], ["-j", "-1"], ["--bits=1x"]]:
+        result = umashsum(*args, "short", cwd=tmp_path)
+        assert (result.returncode, result.stdout) == (2, b"")
+        assert b"Usage" in result.stderr
+
+
+def test_umashsum_check_escaped(tmp_path):
+    """Check reports and errors escape names like manifests do, so each
+    name stays on one line."""
+    name = "a\nb\\c"
+    (tmp_path / name).write_bytes(b"data")
+    manifest = umashsum(name, cwd=tmp_path).stdout
+    (tmp_path / "manifest").write_bytes(manifest)
+
+    result = umashsum("-c", "manifest", cwd=tmp_path)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout == b"\\a\\nb\\\\c: OK\n"
+
+    (tmp_path / name).write_bytes(b"changed")
+    result = umashsum("-c", "manifest", cwd=tmp_path)
+    assert result.returncode == 1
+    assert result.stdout == b"\\a\\nb\\\\c: FAILED\n"
+
+    (tmp_path / name).unlink()
+    result = umashsum("-c", "manifest", cwd=tmp_path)
+    assert result.returncode == 1
+    assert result.stdout == b"\\a\\nb\\\\c: FAILED open or read\n"
+    assert result.stderr.startswith(b"umashsum: \\a\\nb\\\\c: ")
@@ -13,6 +13,14 @@ sys.path.append(TOPLEVEL)
 
 HEADERS = [
     "umash.h",
+    "umash_fd.h",
+    "umash_table.h",
+    "umash_bloom.h",
+    "umash_fuse.h",
+    "umash_hll.h",
+    "umash_freq.h",
+    "umash_minhash.h",
+    "umash_default_params.h",
     "t/umash_test_only.h",
 ]
 
@@ -28,3 +36,55 @@ C = FFI.dlopen(os.getenv("UMASH_TEST_LIB", TOPLEVEL + "umash_test_only.so"))
 
 # Pass in a copy of stderr in case anyone plays redirection tricks.
 faulthandler.enable(os.dup(2))
+
+
+class Keys:
+    """Keeps a list of keys alive as a pair of C arrays."""
+
+    def __init__(self, keys):
+        self.buffers = [FFI.from_buffer(key) for key in keys]
+        self.pointers = FFI.new("void *[]", self.buffers or 1)
+        self.lengths = FFI.new("size_t[]", [len(key) for key in keys] or 1)
+        self.count = len(keys)
+
+
+def options(struct, **kwargs):
+    """Returns a new `struct` (e.g., "umash_hll_options") with its
+    `size` field set, and the fields in `kwargs`."""
+    ret = FFI.new("struct %s *" % struct)
+    ret.size = FFI.sizeof("struct %s" % struct)
+    for name, value in kwargs.items():
+        setattr(ret, name, value)
+    return ret
+
+
+def create(struct, ctor, dtor, **kwargs):
+    """Calls `ctor` with a `struct` options (see `options`), and returns
+    the new object, to be destroyed by `dtor` once unreachable.  Bytes
+    values in `kwargs` are passed as pointers to a copy of the bytes."""
+    buffers = {
+        name: FFI.new("char[]", value)
+        for name, value in kwargs.items()
+        if isinstance(value, bytes)
+    }
+    kwargs.update(buffers)
+    ret = ctor(options(struct, **kwargs))
+    assert ret != FFI.NULL
+    return FFI.gc(ret, dtor)
+
+
+def serialized(size_fn, serialize_fn, obj):
+    """Returns the bytes `serialize_fn` writes for `obj`, in a buffer of
+    `size_fn(obj)` bytes."""
+    size = size_fn(obj)
+    buf = FFI.new("char[]", max(1, size))
+    assert serialize_fn(obj, buf, size)
+    return bytes(FFI.buffer(buf, size))
+
+
+def data_bytes(data_fn, obj):
+    """Returns a copy of the `data_fn(obj, &size)` bytes that back
+    `obj`."""
+    size = FFI.new("size_t[1]")
+    ptr = data_fn(obj, size)
+    return bytes(FFI.buffer(ptr, size[0]))
@@ -107,6 +107,20 @@ struct umash_fp umash_fprint_multiple_blocks_generic(struct umash_fp initial,
     const uint64_t multipliers[static 2][2], const uint64_t *oh, uint64_t seed,
     const void *data, size_t n_blocks);
 
+/**
+ * Compresses `n_records` records of `record_len` bytes each (more
+ * than 16, and at most one block), `stride` bytes apart, with both
+ * OH functions (i.e., `oh_varblock_fprint` on each record).
+ */
+void umash_oh_records(struct umash_oh dst[][2], const uint64_t *oh, uint64_t tag,
+    const void *base, size_t stride, size_t record_len, size_t n_records);
+
+/**
+ * Generic (fallback) implementation of `umash_oh_records`.
+ */
+void umash_oh_records_generic(struct umash_oh dst[][2], const uint64_t *oh, uint64_t tag,
+    const void *base, size_t stride, size_t record_len, size_t n_records);
+
 /**
  * Converts a buffer of <= 8 bytes to a 64-bit integers.
  */
@@ -95,9 +95,38 @@
 
 #endif
 
+/**
+ * -DUMASH_MEMCPY_NONTEMPORAL_THRESHOLD=n to make `umash_memcpy_fprint`
+ * and `umash_sink_update_memcpy` write the destination with
+ * non-temporal stores for copies of `n` bytes or more.  Copies that
+ * large would only evict useful data from the cache hierarchy.
+ *
+ * The default is 1 MB; set the threshold to -1 to always go through
+ * the cache.
+ */
+#ifndef UMASH_MEMCPY_NONTEMPORAL_THRESHOLD
+#define UMASH_MEMCPY_NONTEMPORAL_THRESHOLD (1UL << 20)
+#endif
+
+/**
+ * #define UMASH_STATS=1 to count calls per code path, and build a
+ * histogram of input sizes, in per-thread counters.  Read the
+ * counters with `umash_stats_snapshot`.
+ *
+ * This functionality depends on pthreads and on thread-local storage.
+ */
+#ifndef UMASH_STATS
+#define UMASH_STATS 0
+#endif
+
 #include <assert.h>
 #include <string.h>
 
+#if UMASH_STATS
+#include <pthread.h>
+#include <stdlib.h>
+#endif
+
 #ifdef __PCLMUL__
 /* If we have access to x86 PCLMUL (and some basic SSE). */
 #include <immintrin.h>
@@ -240,6 +269,204 @@ v128_clmul_cross(v128 x)
 /* Incremental UMASH consumes 16 bytes at a time. */
 #define INCREMENTAL_GRANULARITY 16
 
+/*
+ * Fused copy and hash routines alternate between hashing and copying
+ * runs of this many bytes: small enough to still be in L2 when we
+ * copy them, and large enough to amortise the switch.
+ */
+#define MEMCPY_CHUNK_SIZE (64 * BLOCK_SIZE)
+
+/*
+ * `umash_full_multi` hashes runs of this many bytes under every key
+ * before moving to the next run, so that the input is read from
+ * memory once, and then from L1 for the remaining keys.
+ */
+#define MULTI_CHUNK_SIZE (16 * BLOCK_SIZE)
+
+/*
+ * `umash_fprint_strided` compresses this many records at a time,
+ * before finalising their fingerprints.
+ */
+#define STRIDED_BATCH_SIZE 16
+
+/*
+ * The cold-data routines hash one 4 KB page at a time, and prefetch
+ * `UMASH_PREFETCH_DISTANCE` bytes past the current page by default.
+ */
+#define COLD_CHUNK_SIZE (16 * BLOCK_SIZE)
+
+#ifndef UMASH_PREFETCH_DISTANCE
+#define UMASH_PREFETCH_DISTANCE (8 * BLOCK_SIZE)
+#endif
+
+#define CACHE_LINE_SIZE 64
+
+#if UMASH_STATS
+/**
+ * Each thread increments its own `stats_block`, so counting never
+ * contends on a shared cache line.  Blocks live on a global list that
+ * only grows, and blocks of exited threads are recycled by new
+ * threads: the counters are cumulative for the whole process.
+ */
+struct stats_block {
+	struct umash_stats stats;
+	struct stats_block *next;
+	/* 1 while a live thread owns this block. */
+	int in_use;
+};
+
+static struct stats_block *stats_blocks;
+static __thread struct stats_block *stats_mine;
+static pthread_key_t stats_key;
+static pthread_once_t stats_once = PTHREAD_ONCE_INIT;
+
+static COLD FN void
+stats_release(void *arg)
+{
+	struct stats_block *block = arg;
+
+	stats_mine = NULL;
+	__atomic_store_n(&block->in_use, 0, __ATOMIC_RELEASE);
+	return;
+}
+
+static COLD FN void
+stats_init(void)
+{
+
+	(void)pthread_key_create(&stats_key, stats_release);
+	return;
+}
+
+static COLD FN struct stats_block *
+stats_register(void)
+{
+	struct stats_block *block;
+
+	(void)pthread_once(&stats_once, stats_init);
+
+	for (block = __atomic_load_n(&stats_blocks, __ATOMIC_ACQUIRE); block != NULL;
+	    block = block->next) {
+		int expected = 0;
+
+		if (__atomic_compare_exchange_n(&block->in_use, &expected, 1, false,
+			__ATOMIC_ACQUIRE, __ATOMIC_RELAXED))
+			goto found;
+	}
+
+	/* Drop the counts on the floor if we're out of memory. */
+	block = calloc(1, sizeof(*block));
+	if (block == NULL)
+		return NULL;
+
+	block->in_use = 1;
+	block->next = __atomic_load_n(&stats_blocks, __ATOMIC_RELAXED);
+	while (!__atomic_compare_exchange_n(
+	    &stats_blocks, &block->next, block, true, __ATOMIC_RELEASE, __ATOMIC_RELAXED))
+		;
+
+found:
+	(void)pthread_setspecific(stats_key, block);
+	stats_mine = block;
+	return block;
+}
+
+static inline struct umash_stats *
+stats_get(void)
+{
+	struct stats_block *block = stats_mine;
+
+	if (UNLIKELY(block == NULL)) {
+		block = stats_register();
+		if (block == NULL)
+			return NULL;
+	}
+
+	return &block->stats;
+}
+
+/*
+ * Only the owning thread writes to its counters, so we don't need
+ * atomic read-modify-writes, only atomic loads and stores, for
+ * `umash_stats_snapshot`.
+ */
+static inline void
+stats_add(uint64_t *counter, uint64_t count)
+{
+
+	__atomic_store_n(counter, __atomic_load_n(counter, __ATOMIC_RELAXED) + count,
+	    __ATOMIC_RELAXED);
+	return;
+}
+
+#define STATS_INC(FIELD)                                 \
+	do {                                             \
+		struct umash_stats *stats = stats_get(); \
+                                                         \
+		if (stats != NULL)                       \
+			stats_add(&stats->FIELD, 1);     \
+	} while (0)
+
+/**
+ * Adds `count` inputs of `n_bytes` bytes each to the size histogram.
+ */
+static inline void
+stats_record_size(size_t n_bytes, size_t count)
+{
+	struct umash_stats *stats = stats_get();
+	size_t bucket = (n_bytes == 0) ? 0 : 64 - __builtin_clzll(n_bytes);
+
+	if (stats != NULL)
+		stats_add(&stats->size_log2[bucket], count);
+	return;
+}
+
+/**
+ * Counts `count` inputs of `n_bytes` bytes each.
+ */
+static inline void
+stats_record(size_t n_bytes, size_t count)
+{
+	struct umash_stats *stats = stats_get();
+
+	if (stats == NULL)
+		return;
+
+	if (n_bytes <= sizeof(uint64_t)) {
+		stats_add(&stats->short_inputs, count);
+	} else if (n_bytes <= 2 * sizeof(uint64_t)) {
+		stats_add(&stats->medium_inputs, count);
+	} else {
+		stats_add(&stats->long_inputs, count);
+	}
+
+	stats_record_size(n_bytes, count);
+	return;
+}
+#else
+#define STATS_INC(FIELD) \
+	do {             \
+	} while (0)
+
+static inline void
+stats_record_size(size_t n_bytes, size_t count)
+{
+
+	(void)n_bytes;
+	(void)count;
+	return;
+}
+
+static inline void
+stats_record(size_t n_bytes, size_t count)
+{
+
+	(void)n_bytes;
+	(void)count;
+	return;
+}
+#endif
+
 /**
  * Modular arithmetic utilities.
  *
@@ -333,6 +560,43 @@ mul_mod_fast(uint64_t m, uint64_t x)
 	return add_mod_fast(lo, 8 * hi);
 }
 
+/**
+ * Computes `x * y mod 2**64 - 8`, for arbitrary 64-bit `x` and `y`.
+ *
+ * This is only used to combine partial polynomials, so we don't
+ * need the speed of `mul_mod_fast`.
+ */
+static inline uint64_t
+mul_mod_slow(uint64_t x, uint64_t y)
+{
+	uint64_t hi, lo;
+
+	mul128(x, y, &hi, &lo);
+	/*
+	 * x * y = hi * 2**64 + lo \equiv 8 * hi + lo, and
+	 * 8 * hi = (hi >> 61) * 2**64 + (hi << 3) \equiv 8 * (hi >> 61) + (hi << 3).
+	 */
+	return add_mod_slow(add_mod_slow(lo, hi << 3), 8 * (hi >> 61));
+}
+
+/**
+ * Computes `x ** e mod 2**64 - 8`.
+ */
+static FN uint64_t
+pow_mod_slow(uint64_t x, uint64_t e)
+{
+	uint64_t ret = 1;
+
+	for (; e != 0; e >>= 1) {
+		if ((e & 1) != 0)
+			ret = mul_mod_slow(ret, x);
+
+		x = mul_mod_slow(x, x);
+	}
+
+	return ret;
+}
+
 TEST_DEF inline uint64_t
 horner_double_update(uint64_t acc, uint64_t m0, uint64_t m1, uint64_t x, uint64_t y)
 {
@@ -652,6 +916,19 @@ oh_varblock_fprint(struct umash_oh dst[static restrict 2],
 	return;
 }
 
+TEST_DEF void
+umash_oh_records_generic(struct umash_oh dst[][2], const uint64_t *oh, uint64_t tag,
+    const void *base, size_t stride, size_t record_len, size_t n_records)
+{
+
+	for (size_t i = 0; i < n_records; i++) {
+		oh_varblock_fprint(
+		    dst[i], oh, tag, (const char *)base + i * stride, record_len);
+	}
+
+	return;
+}
+
 /**
  * Returns `then` if `cond` is true, `otherwise` if false.
  *
@@ -867,6 +1144,7 @@ umash_long(const uint64_t multipliers[static 2], const uint64_t *oh, uint64_t se
 
 		n_bytes %= BLOCK_SIZE;
 		remaining = (const char *)data + (n_block * BLOCK_SIZE);
+		STATS_INC(multiple_blocks);
 		acc = umash_multiple_blocks(acc, multipliers, oh, seed, data, n_block);
 
 		data = remaining;
@@ -925,6 +1203,7 @@ umash_fp_long(const uint64_t multipliers[static 2][2], const uint64_t *oh, uint6
 
 		n_bytes %= BLOCK_SIZE;
 		remaining = (const char *)data + (n_block * BLOCK_SIZE);
+		STATS_INC(multiple_blocks);
 		poly = umash_fprint_multiple_blocks(
 		    poly, multipliers, oh, seed, data, n_block);
 
@@ -979,6 +1258,78 @@ finalize:
 	return ret;
 }
 
+/**
+ * Updates the pair of polynomial accumulators in `acc` for
+ * `n_blocks` full (non-final) 256-byte blocks in `data`.
+ *
+ * This is the loop in `umash_fp_long`, for callers that want to
+ * interleave other work between runs of blocks.
+ */
+static FN struct umash_fp
+fprint_blocks(struct umash_fp acc, const uint64_t multipliers[static 2][2],
+    const uint64_t *oh, uint64_t seed, const void *data, size_t n_blocks)
+{
+
+	if (n_blocks == 0)
+		return acc;
+
+#ifdef UMASH_MULTIPLE_BLOCKS_THRESHOLD
+	if (n_blocks * BLOCK_SIZE >= UMASH_MULTIPLE_BLOCKS_THRESHOLD) {
+		STATS_INC(multiple_blocks);
+		return umash_fprint_multiple_blocks(
+		    acc, multipliers, oh, seed, data, n_blocks);
+	}
+#endif
+
+	for (size_t i = 0; i < n_blocks; i++) {
+		struct umash_oh compressed[2];
+
+		oh_varblock_fprint(compressed, oh, seed, data, BLOCK_SIZE);
+		data = (const char *)data + BLOCK_SIZE;
+
+		for (size_t j = 0; j < 2; j++) {
+			acc.hash[j] = horner_double_update(acc.hash[j], multipliers[j][0],
+			    multipliers[j][1], compressed[j].bits[0],
+			    compressed[j].bits[1]);
+		}
+	}
+
+	return acc;
+}
+
+/**
+ * Updates the polynomial accumulator `acc` for `n_blocks` full
+ * (non-final) 256-byte blocks in `data`.  This is the hashing
+ * counterpart of `fprint_blocks`.
+ */
+static FN uint64_t
+hash_blocks(uint64_t acc, const uint64_t multipliers[static 2], const uint64_t *oh,
+    uint64_t seed, const void *data, size_t n_blocks)
+{
+
+	if (n_blocks == 0)
+		return acc;
+
+#ifdef UMASH_MULTIPLE_BLOCKS_THRESHOLD
+	if (n_blocks * BLOCK_SIZE >= UMASH_MULTIPLE_BLOCKS_THRESHOLD) {
+		STATS_INC(multiple_blocks);
+		return umash_multiple_blocks(acc, multipliers, oh, seed, data, n_blocks);
+	}
+#endif
+
+	for (size_t i = 0; i < n_blocks; i++) {
+		struct umash_oh compressed;
+
+		compressed = oh_varblock(oh, seed, data, BLOCK_SIZE);
+		data = (const char *)data + BLOCK_SIZE;
+
+		acc = horner_double_update(acc, multipliers[0], multipliers[1],
+		    compressed.bits[0], compressed.bits[1]);
+	}
+
+	return acc;
+}
+
 static FN bool
 value_is_repeated(const uint64_t *values, size_t n, uint64_t needle)
 {
@@ -1223,6 +1574,7 @@ block_sink_update(struct umash_sink *sink, const void *data, size_t n_bytes)
 		 */
 		size_t n_blocks = (n_bytes - 1) / BLOCK_SIZE;
 
+		STATS_INC(multiple_blocks);
 		if (sink->hash_wanted != 0) {
 			const uint64_t multipliers[2][2] = {
 				[0][0] = sink->poly_state[0].mul[0],
@@ -1283,6 +1635,7 @@ umash_sink_update(struct umash_sink *sink, const void *data, size_t n_bytes)
 	size_t remaining = INCREMENTAL_GRANULARITY - sink->bufsz;
 
 	DTRACE_PROBE4(libumash, umash_sink_update, sink, remaining, data, n_bytes);
+	stats_record_size(n_bytes, 1);
 
 	if (n_bytes < remaining) {
 		memcpy(&sink->buf[buf_begin + sink->bufsz], data, n_bytes);
@@ -1341,12 +1694,41 @@ umash_sink_update(struct umash_sink *sink, const void *data, size_t n_bytes)
 	return;
 }
 
+FN size_t
+umash_multiple_blocks_threshold_get(void)
+{
+
+#ifdef UMASH_MULTIPLE_BLOCKS_THRESHOLD
+	return UMASH_MULTIPLE_BLOCKS_THRESHOLD;
+#else
+	return SIZE_MAX;
+#endif
+}
+
+FN size_t
+umash_multiple_blocks_threshold_set(size_t threshold)
+{
+
+#ifdef UMASH_MULTIPLE_BLOCKS_THRESHOLD
+	/* `umash_multiple_blocks` must have at least one block to work on. */
+	if (threshold < BLOCK_SIZE)
+		threshold = BLOCK_SIZE;
+
+	return __atomic_exchange_n(
+	    &umash_multiple_blocks_threshold, threshold, __ATOMIC_RELAXED);
+#else
+	(void)threshold;
+	return SIZE_MAX;
+#endif
+}
+
 FN uint64_t
 umash_full(const struct umash_params *params, uint64_t seed, int which, const void *data,
     size_t n_bytes)
 {
 
 	DTRACE_PROBE4(libumash, umash_full, params, which, data, n_bytes);
+	stats_record(n_bytes, 1);
 
 	/*
 	 * We don't (yet) implement code that only evaluates the
@@ -1379,12 +1761,147 @@ umash_full(const struct umash_params *params, uint64_t seed, int which, const vo
 	return umash_long(params->poly[0], params->oh, seed, data, n_bytes);
 }
 
+FN void
+umash_params_compact_init(
+    struct umash_params_compact *compact, const struct umash_params *params)
+{
+
+	memcpy(compact->poly, params->poly[0], sizeof(compact->poly));
+	memcpy(compact->oh, params->oh, sizeof(compact->oh));
+	return;
+}
+
+FN uint64_t
+umash_full_compact(const struct umash_params_compact *params, uint64_t seed,
+    const void *data, size_t n_bytes)
+{
+
+	DTRACE_PROBE3(libumash, umash_full_compact, params, data, n_bytes);
+	stats_record(n_bytes, 1);
+
+	/* This is `umash_full` with `which = 0`. */
+	if (LIKELY(n_bytes <= sizeof(v128))) {
+		if (LIKELY(n_bytes <= sizeof(uint64_t)))
+			return umash_short(params->oh, seed, data, n_bytes);
+
+		return umash_medium(params->poly, params->oh, seed, data, n_bytes);
+	}
+
+	return umash_long(params->poly, params->oh, seed, data, n_bytes);
+}
+
+FN void
+umash_full_multi(const struct umash_params *const *params, size_t k, uint64_t seed,
+    const void *data, size_t n_bytes, uint64_t *out)
+{
+
+	DTRACE_PROBE4(libumash, umash_full_multi, params, k, data, n_bytes);
+
+	/* Short inputs are loaded once, by definition. */
+	if (n_bytes <= sizeof(v128)) {
+		for (size_t i = 0; i < k; i++)
+			out[i] = umash_full(params[i], seed, 0, data, n_bytes);
+
+		return;
+	}
+
+	stats_record(n_bytes, k);
+
+	for (size_t i = 0; i < k; i++)
+		out[i] = 0;
+
+	while (n_bytes > BLOCK_SIZE) {
+		size_t n_blocks = (n_bytes - 1) / BLOCK_SIZE;
+		size_t chunk_size;
+
+		if (n_blocks > MULTI_CHUNK_SIZE / BLOCK_SIZE)
+			n_blocks = MULTI_CHUNK_SIZE / BLOCK_SIZE;
+
+		for (size_t i = 0; i < k; i++) {
+			out[i] = hash_blocks(out[i], params[i]->poly[0], params[i]->oh,
+			    seed, data, n_blocks);
+		}
+
+		chunk_size = n_blocks * BLOCK_SIZE;
+		data = (const char *)data + chunk_size;
+		n_bytes -= chunk_size;
+	}
+
+	/* The final block may read up to 15 bytes before `data`. */
+	seed ^= (uint8_t)n_bytes;
+	for (size_t i = 0; i < k; i++) {
+		const uint64_t *multipliers = params[i]->poly[0];
+		struct umash_oh compressed;
+
+		compressed = oh_varblock(params[i]->oh, seed, data, n_bytes);
+		out[i] = finalize(horner_double_update(out[i], multipliers[0],
+		    multipliers[1], compressed.bits[0], compressed.bits[1]));
+	}
+
+	return;
+}
+
+FN void
+umash_fprint_strided(const struct umash_params *params, uint64_t seed, const void *base,
+    size_t stride, size_t record_len, size_t n_records, struct umash_fp *out)
+{
+	const uint64_t tag = seed ^ (uint8_t)record_len;
+
+	DTRACE_PROBE4(
+	    libumash, umash_fprint_strided, params, base, record_len, n_records);
+
+	/*
+	 * Only single-block records (that aren't short or medium)
+	 * share a code path that's worth batching.
+	 */
+	if (record_len <= sizeof(v128) || record_len > BLOCK_SIZE) {
+		for (size_t i = 0; i < n_records; i++) {
+			out[i] = umash_fprint(
+			    params, seed, (const char *)base + i * stride, record_len);
+		}
+
+		return;
+	}
+
+	stats_record(record_len, n_records);
+	while (n_records > 0) {
+		struct umash_oh compressed[STRIDED_BATCH_SIZE][2];
+		size_t batch_size = n_records;
+
+		if (batch_size > STRIDED_BATCH_SIZE)
+			batch_size = STRIDED_BATCH_SIZE;
+
+#if UMASH_LONG_INPUTS
+		umash_oh_records(
+		    compressed, params->oh, tag, base, stride, record_len, batch_size);
+#else
+		umash_oh_records_generic(
+		    compressed, params->oh, tag, base, stride, record_len, batch_size);
+#endif
+
+		for (size_t i = 0; i < batch_size; i++) {
+			for (size_t j = 0; j < ARRAY_SIZE(out[i].hash); j++) {
+				out[i].hash[j] = finalize(horner_double_update(/*acc=*/0,
+				    params->poly[j][0], params->poly[j][1],
+				    compressed[i][j].bits[0], compressed[i][j].bits[1]));
+			}
+		}
+
+		base = (const char *)base + batch_size * stride;
+		out += batch_size;
+		n_records -= batch_size;
+	}
+
+	return;
+}
+
 FN struct umash_fp
 umash_fprint(
     const struct umash_params *params, uint64_t seed, const void *data, size_t n_bytes)
 {
 
 	DTRACE_PROBE3(libumash, umash_fprint, params, data, n_bytes);
+	stats_record(n_bytes, 1);
 	if (LIKELY(n_bytes <= sizeof(v128))) {
 		if (LIKELY(n_bytes <= sizeof(uint64_t)))
 			return umash_fp_short(params->oh, seed, data, n_bytes);
@@ -1395,6 +1912,129 @@ umash_fprint(
 	return umash_fp_long(params->poly, params->oh, seed, data, n_bytes);
 }
 
+/**
+ * Prefetches the cache lines for `data[begin ... end)`.
+ */
+static inline void
+prefetch_range(const void *data, size_t begin, size_t end)
+{
+
+	for (size_t i = begin; i < end; i += CACHE_LINE_SIZE)
+		__builtin_prefetch((const char *)data + i);
+
+	return;
+}
+
+/**
+ * Prefetches up to `distance` bytes after `consumed` in `data`,
+ * starting at `*prefetched`, and updates `*prefetched`.
+ */
+static inline void
+prefetch_ahead(const void *data, size_t n_bytes, size_t consumed, size_t distance,
+    size_t *prefetched)
+{
+	size_t end = n_bytes;
+
+	if (n_bytes - consumed > distance)
+		end = consumed + distance;
+
+	if (end > *prefetched) {
+		prefetch_range(data, *prefetched, end);
+		*prefetched = end;
+	}
+
+	return;
+}
+
+FN struct umash_fp
+umash_fprint_cold(const struct umash_params *params, uint64_t seed, const void *data,
+    size_t n_bytes, size_t prefetch_distance)
+{
+	struct umash_oh compressed[2];
+	struct umash_fp acc = { .hash = { 0, 0 } };
+	size_t consumed = 0, prefetched = 0;
+
+	DTRACE_PROBE4(
+	    libumash, umash_fprint_cold, params, data, n_bytes, prefetch_distance);
+
+	if (n_bytes <= sizeof(v128))
+		return umash_fprint(params, seed, data, n_bytes);
+
+	stats_record(n_bytes, 1);
+	if (prefetch_distance == 0)
+		prefetch_distance = UMASH_PREFETCH_DISTANCE;
+
+	while (n_bytes - consumed > BLOCK_SIZE) {
+		size_t n_blocks = (n_bytes - consumed - 1) / BLOCK_SIZE;
+
+		if (n_blocks > COLD_CHUNK_SIZE / BLOCK_SIZE)
+			n_blocks = COLD_CHUNK_SIZE / BLOCK_SIZE;
+
+		/* Prefetch up to `prefetch_distance` bytes past this chunk. */
+		prefetch_ahead(data, n_bytes, consumed + n_blocks * BLOCK_SIZE,
+		    prefetch_distance, &prefetched);
+		acc = fprint_blocks(acc, params->poly, params->oh, seed,
+		    (const char *)data + consumed, n_blocks);
+		consumed += n_blocks * BLOCK_SIZE;
+	}
+
+	/* The final block may read up to 15 bytes before its start. */
+	data = (const char *)data + consumed;
+	n_bytes -= consumed;
+	oh_varblock_fprint(
+	    compressed, params->oh, seed ^ (uint8_t)n_bytes, data, n_bytes);
+	for (size_t i = 0; i < ARRAY_SIZE(acc.hash); i++) {
+		acc.hash[i] = finalize(horner_double_update(acc.hash[i],
+		    params->poly[i][0], params->poly[i][1], compressed[i].bits[0],
+		    compressed[i].bits[1]));
+	}
+
+	return acc;
+}
+
+FN uint64_t
+umash_full_cold(const struct umash_params *params, uint64_t seed, int which,
+    const void *data, size_t n_bytes, size_t prefetch_distance)
+{
+	const uint64_t *multipliers = params->poly[0];
+	struct umash_oh compressed;
+	uint64_t acc = 0;
+	size_t consumed = 0, prefetched = 0;
+
+	DTRACE_PROBE4(libumash, umash_full_cold, params, which, data, n_bytes);
+
+	/* The second hash is only available as part of a fingerprint. */
+	if (which != 0)
+		return umash_fprint_cold(params, seed, data, n_bytes, prefetch_distance)
+		    .hash[1];
+
+	if (n_bytes <= sizeof(v128))
+		return umash_full(params, seed, 0, data, n_bytes);
+
+	stats_record(n_bytes, 1);
+	if (prefetch_distance == 0)
+		prefetch_distance = UMASH_PREFETCH_DISTANCE;
+
+	while (n_bytes - consumed > BLOCK_SIZE) {
+		size_t n_blocks = (n_bytes - consumed - 1) / BLOCK_SIZE;
+
+		if (n_blocks > COLD_CHUNK_SIZE / BLOCK_SIZE)
+			n_blocks = COLD_CHUNK_SIZE / BLOCK_SIZE;
+
+		prefetch_ahead(data, n_bytes, consumed + n_blocks * BLOCK_SIZE,
+		    prefetch_distance, &prefetched);
+		acc = hash_blocks(acc, multipliers, params->oh, seed,
+		    (const char *)data + consumed, n_blocks);
+		consumed += n_blocks * BLOCK_SIZE;
+	}
+
+	data = (const char *)data + consumed;
+	n_bytes -= consumed;
+	compressed = oh_varblock(params->oh, seed ^ (uint8_t)n_bytes, data, n_bytes);
+	return finalize(horner_double_update(
+	    acc, multipliers[0], multipliers[1], compressed.bits[0], compressed.bits[1]));
+}
+
 FN void
 umash_init(struct umash_state *state, const struct umash_params *params, uint64_t seed,
     int which)
@@ -1426,6 +2066,32 @@ umash_init(struct umash_state *state, const struct umash_params *params, uint64_
 	return;
 }
 
+FN void
+umash_init_compact(
+    struct umash_state *state, const struct umash_params_compact *params, uint64_t seed)
+{
+
+	DTRACE_PROBE2(libumash, umash_init_compact, state, params);
+
+	/*
+	 * Hashing (`hash_wanted = 0`) never looks at the second
+	 * polynomial or at the twisted OH state.
+	 */
+	state->sink = (struct umash_sink) {
+		.poly_state[0] = {
+			.mul = {
+				params->poly[0],
+				params->poly[1],
+			},
+		},
+		.oh = params->oh,
+		.hash_wanted = 0,
+		.seed = seed,
+	};
+
+	return;
+}
+
 FN void
 umash_fp_init(
     struct umash_fp_state *state, const struct umash_params *params, uint64_t seed)
@@ -1493,6 +2159,26 @@ digest(const struct umash_sink *sink, int index)
 	    &sink->buf[buf_begin], sink->bufsz);
 }
 
+/**
+ * Counts a digest for `sink` in its code path.  The sink doesn't know
+ * the total size of long inputs, so `umash_sink_update` adds the size
+ * of each update to the histogram instead.
+ */
+static inline void
+stats_record_sink(const struct umash_sink *sink)
+{
+
+	if (sink->large_umash) {
+		STATS_INC(long_inputs);
+	} else if (sink->bufsz <= sizeof(uint64_t)) {
+		STATS_INC(short_inputs);
+	} else {
+		STATS_INC(medium_inputs);
+	}
+
+	return;
+}
+
 static FN struct umash_fp
 fp_digest_sink(const struct umash_sink *sink)
 {
@@ -1533,6 +2219,7 @@ umash_digest(const struct umash_state *state)
 	const struct umash_sink *sink = &state->sink;
 
 	DTRACE_PROBE1(libumash, umash_digest, state);
+	stats_record_sink(sink);
 
 	if (sink->hash_wanted == 1) {
 		struct umash_fp fp;
@@ -1555,5 +2242,294 @@ umash_fp_digest(const struct umash_fp_state *state)
 {
 
 	DTRACE_PROBE1(libumash, umash_fp_digest, state);
+	stats_record_sink(&state->sink);
 	return fp_digest_sink(&state->sink);
 }
+
+FN bool
+umash_stats_snapshot(struct umash_stats *dst)
+{
+
+	memset(dst, 0, sizeof(*dst));
+#if UMASH_STATS
+	for (const struct stats_block *block =
+		 __atomic_load_n(&stats_blocks, __ATOMIC_ACQUIRE);
+	    block != NULL; block = block->next) {
+		const uint64_t *src = (const uint64_t *)&block->stats;
+		uint64_t *acc = (uint64_t *)dst;
+
+		for (size_t i = 0; i < sizeof(*dst) / sizeof(uint64_t); i++)
+			acc[i] += __atomic_load_n(&src[i], __ATOMIC_RELAXED);
+	}
+
+	return true;
+#else
+	return false;
+#endif
+}
+
+FN struct umash_fp_blocks
+umash_fprint_blocks(
+    const struct umash_params *params, uint64_t seed, const void *data, size_t n_blocks)
+{
+	struct umash_fp acc = { .hash = { 0, 0 } };
+
+	DTRACE_PROBE3(libumash, umash_fprint_blocks, params, data, n_blocks);
+
+	acc = fprint_blocks(acc, params->poly, params->oh, seed, data, n_blocks);
+	return (struct umash_fp_blocks) {
+		.acc = { acc.hash[0], acc.hash[1] },
+		.n_blocks = n_blocks,
+	};
+}
+
+FN struct umash_fp_blocks
+umash_fp_blocks_concat(const struct umash_params *params, struct umash_fp_blocks prefix,
+    struct umash_fp_blocks suffix)
+{
+	struct umash_fp_blocks ret = { .n_blocks = prefix.n_blocks + suffix.n_blocks };
+
+	/*
+	 * Horner's method multiplies the prefix's accumulator by f^2
+	 * (`poly[i][0]`) for each block in the suffix.  The
+	 * accumulators are exact modulo 2**64 - 8, so we can do the
+	 * same in one step.
+	 */
+	for (size_t i = 0; i < ARRAY_SIZE(ret.acc); i++) {
+		uint64_t scale = pow_mod_slow(params->poly[i][0], suffix.n_blocks);
+
+		ret.acc[i] =
+		    add_mod_slow(mul_mod_slow(prefix.acc[i], scale), suffix.acc[i]);
+	}
+
+	return ret;
+}
+
+FN struct umash_fp
+umash_fp_blocks_digest(const struct umash_params *params, uint64_t seed,
+    struct umash_fp_blocks prefix, const void *data, size_t n_bytes)
+{
+	struct umash_fp acc = { .hash = { prefix.acc[0], prefix.acc[1] } };
+	struct umash_oh compressed[2];
+	size_t n_blocks;
+
+	DTRACE_PROBE4(libumash, umash_fp_blocks_digest, params, &prefix, data, n_bytes);
+
+	if (prefix.n_blocks == 0)
+		return umash_fprint(params, seed, data, n_bytes);
+
+	stats_record(prefix.n_blocks * BLOCK_SIZE + n_bytes, 1);
+
+	/* The final block may read up to 15 bytes before its start. */
+	assert(n_bytes >= sizeof(v128));
+
+	n_blocks = (n_bytes - 1) / BLOCK_SIZE;
+	acc = fprint_blocks(acc, params->poly, params->oh, seed, data, n_blocks);
+	data = (const char *)data + n_blocks * BLOCK_SIZE;
+	n_bytes -= n_blocks * BLOCK_SIZE;
+
+	oh_varblock_fprint(
+	    compressed, params->oh, seed ^ (uint8_t)n_bytes, data, n_bytes);
+	for (size_t i = 0; i < ARRAY_SIZE(acc.hash); i++) {
+		acc.hash[i] = finalize(horner_double_update(acc.hash[i],
+		    params->poly[i][0], params->poly[i][1], compressed[i].bits[0],
+		    compressed[i].bits[1]));
+	}
+
+	return acc;
+}
+
+FN size_t
+umash_fp_prefix_index_size(size_t n_bytes)
+{
+
+	/* Prefixes of up to 16 bytes don't go through blocks. */
+	if (n_bytes <= sizeof(v128))
+		return 0;
+
+	return (n_bytes - sizeof(v128)) / BLOCK_SIZE;
+}
+
+FN void
+umash_fp_prefix_index(const struct umash_params *params, uint64_t seed, const void *data,
+    size_t n_bytes, struct umash_fp_checkpoint *index)
+{
+	struct umash_fp acc = { .hash = { 0, 0 } };
+	size_t n_checkpoints = umash_fp_prefix_index_size(n_bytes);
+
+	DTRACE_PROBE4(libumash, umash_fp_prefix_index, params, data, n_bytes, index);
+
+	for (size_t i = 0; i < n_checkpoints; i++) {
+		acc = fprint_blocks(acc, params->poly, params->oh, seed,
+		    (const char *)data + i * BLOCK_SIZE, 1);
+		index[i] = (struct umash_fp_checkpoint) {
+			.acc = { acc.hash[0], acc.hash[1] },
+		};
+	}
+
+	return;
+}
+
+FN struct umash_fp
+umash_fp_prefix(const struct umash_params *params, uint64_t seed,
+    const struct umash_fp_checkpoint *index, const void *data, size_t n_bytes)
+{
+	struct umash_fp_blocks prefix = {
+		.n_blocks = umash_fp_prefix_index_size(n_bytes),
+	};
+	size_t skipped = prefix.n_blocks * BLOCK_SIZE;
+
+	DTRACE_PROBE4(libumash, umash_fp_prefix, params, index, data, n_bytes);
+
+	if (prefix.n_blocks == 0)
+		return umash_fprint(params, seed, data, n_bytes);
+
+	prefix.acc[0] = index[prefix.n_blocks - 1].acc[0];
+	prefix.acc[1] = index[prefix.n_blocks - 1].acc[1];
+	/* At most one more block, and the final (partial) block. */
+	return umash_fp_blocks_digest(
+	    params, seed, prefix, (const char *)data + skipped, n_bytes - skipped);
+}
+
+/**
+ * Copies `src[0 ... n_bytes)` to `dst`.  When `nontemporal` is true,
+ * we try to write `dst` without polluting the cache; the caller must
+ * then call `copy_bytes_fence` before returning.
+ */
+static FN void
+copy_bytes(void *dst, const void *src, size_t n_bytes, bool nontemporal)
+{
+
+#ifdef __PCLMUL__
+	if (nontemporal && n_bytes >= 4 * sizeof(v128)) {
+		size_t misalignment = (uintptr_t)dst % sizeof(v128);
+
+		/* Align `dst` for the streaming stores. */
+		if (misalignment != 0) {
+			size_t head = sizeof(v128) - misalignment;
+
+			memcpy(dst, src, head);
+			dst = (char *)dst + head;
+			src = (const char *)src + head;
+			n_bytes -= head;
+		}
+
+		for (; n_bytes >= 4 * sizeof(v128); n_bytes -= 4 * sizeof(v128)) {
+			v128 *out = dst;
+			v128 x0, x1, x2, x3;
+
+			memcpy(&x0, (const char *)src + 0 * sizeof(v128), sizeof(x0));
+			memcpy(&x1, (const char *)src + 1 * sizeof(v128), sizeof(x1));
+			memcpy(&x2, (const char *)src + 2 * sizeof(v128), sizeof(x2));
+			memcpy(&x3, (const char *)src + 3 * sizeof(v128), sizeof(x3));
+
+			_mm_stream_si128(&out[0], x0);
+			_mm_stream_si128(&out[1], x1);
+			_mm_stream_si128(&out[2], x2);
+			_mm_stream_si128(&out[3], x3);
+
+			dst = (char *)dst + 4 * sizeof(v128);
+			src = (const char *)src + 4 * sizeof(v128);
+		}
+	}
+#else
+	(void)nontemporal;
+#endif
+
+	memcpy(dst, src, n_bytes);
+	return;
+}
+
+/**
+ * Orders any non-temporal store in `copy_bytes` before subsequent
+ * regular stores.
+ */
+static inline void
+copy_bytes_fence(bool nontemporal)
+{
+
+#ifdef __PCLMUL__
+	if (nontemporal)
+		_mm_sfence();
+#else
+	(void)nontemporal;
+#endif
+	return;
+}
+
+FN struct umash_fp
+umash_memcpy_fprint(void *restrict dst, const void *restrict src, size_t n_bytes,
+    const struct umash_params *params, uint64_t seed)
+{
+	const bool nontemporal = n_bytes >= UMASH_MEMCPY_NONTEMPORAL_THRESHOLD;
+	struct umash_oh compressed[2];
+	struct umash_fp acc = { .hash = { 0, 0 } };
+
+	DTRACE_PROBE4(libumash, umash_memcpy_fprint, dst, params, src, n_bytes);
+
+	if (n_bytes <= sizeof(v128)) {
+		memcpy(dst, src, n_bytes);
+		return umash_fprint(params, seed, src, n_bytes);
+	}
+
+	stats_record(n_bytes, 1);
+
+	/*
+	 * Hash each chunk first, and only then copy it: the hash pulls
+	 * `src` in cache, so the copy doesn't have to go to memory again.
+	 */
+	while (n_bytes > BLOCK_SIZE) {
+		size_t n_blocks = (n_bytes - 1) / BLOCK_SIZE;
+		size_t chunk_size;
+
+		if (n_blocks > MEMCPY_CHUNK_SIZE / BLOCK_SIZE)
+			n_blocks = MEMCPY_CHUNK_SIZE / BLOCK_SIZE;
+
+		chunk_size = n_blocks * BLOCK_SIZE;
+		acc = fprint_blocks(acc, params->poly, params->oh, seed, src, n_blocks);
+		copy_bytes(dst, src, chunk_size, nontemporal);
+
+		dst = (char *)dst + chunk_size;
+		src = (const char *)src + chunk_size;
+		n_bytes -= chunk_size;
+	}
+
+	/* The final block may read up to 15 bytes before `src`. */
+	oh_varblock_fprint(compressed, params->oh, seed ^ (uint8_t)n_bytes, src, n_bytes);
+	copy_bytes(dst, src, n_bytes, nontemporal);
+	copy_bytes_fence(nontemporal);
+
+	for (size_t i = 0; i < ARRAY_SIZE(acc.hash); i++) {
+		acc.hash[i] = finalize(horner_double_update(acc.hash[i],
+		    params->poly[i][0], params->poly[i][1], compressed[i].bits[0],
+		    compressed[i].bits[1]));
+	}
+
+	return acc;
+}
+
+FN void
+umash_sink_update_memcpy(
+    struct umash_sink *sink, void *restrict dst, const void *restrict src, size_t n_bytes)
+{
+	const bool nontemporal = n_bytes >= UMASH_MEMCPY_NONTEMPORAL_THRESHOLD;
+
+	DTRACE_PROBE4(libumash, umash_sink_update_memcpy, sink, dst, src, n_bytes);
+
+	while (n_bytes > 0) {
+		size_t chunk_size = n_bytes;
+
+		if (chunk_size > MEMCPY_CHUNK_SIZE)
+			chunk_size = MEMCPY_CHUNK_SIZE;
+
+		umash_sink_update(sink, src, chunk_size);
+		copy_bytes(dst, src, chunk_size, nontemporal);
+
+		dst = (char *)dst + chunk_size;
+		src = (const char *)src + chunk_size;
+		n_bytes -= chunk_size;
+	}
+
+	copy_bytes_fence(nontemporal);
+	return;
+}
@@ -61,6 +61,31 @@
  *   calling `umash_full` with the same arguments and `which = 0`;
  *   `umash_fp::hash[1]` corresponds to `which = 1`.
  *
+ * - `umash_fprint_strided` computes `umash_fprint` for each
+ *   fixed-size record in an array, with SIMD across records.
+ *
+ * - `umash_full_multi` computes the first UMASH function for each
+ *   of `k` `struct umash_params`, in one pass over the input.  That's
+ *   useful for schemes like MinHash that need many independent hashes
+ *   of the same bytes.
+ *
+ * - `umash_full_cold` and `umash_fprint_cold` compute the same values
+ *   as `umash_full` and `umash_fprint`, for large inputs that are
+ *   probably not in cache (e.g., freshly mapped file pages).  They
+ *   hash one 4 KB page at a time, and issue software prefetches a
+ *   tunable distance ahead, since hardware prefetchers usually stop
+ *   at page boundaries.
+ *
+ * Users that only hash with `which = 0` and keep many parameter
+ * structs in memory (e.g., one per tenant) can convert each `struct
+ * umash_params` to a smaller `struct umash_params_compact`.
+ *
+ * - `umash_params_compact_init` extracts the hash-only subset of a
+ *   `struct umash_params`.
+ *
+ * - `umash_full_compact` computes the same value as `umash_full`
+ *   with `which = 0`.
+ *
  * ## Incremental hashing and fingerprinting
  *
  * We can also compute UMASH values by feeding bytes incrementally.
@@ -74,6 +99,9 @@
  *   were it passed the arguments that were given to `umash_init`,
  *   and the bytes "fed" into the `umash_state`.
  *
+ * - `umash_init_compact` initialises a `struct umash_state` for
+ *   `which = 0` from a `struct umash_params_compact`.
+ *
  * - `umash_fp_init` initialises a `struct umash_fp_state` with the
  *   same parameters one would pass to `umash_fprint`.
  *
@@ -88,6 +116,68 @@
  *   initialised by calling `umash_init` or `umash_fp_init`.  The sink
  *   does not take ownership of anything and the input bytes may be
  *   overwritten or freed as soon as `umash_sink_update` returns.
+ *
+ * ## Copying and fingerprinting
+ *
+ * Programs that copy buffers before fingerprinting them can fuse the
+ * two operations, and only read the source bytes from memory once.
+ *
+ * - `umash_memcpy_fprint` copies a byte range like `memcpy`, and
+ *   returns the same value as `umash_fprint` on the source bytes.
+ *
+ * - `umash_sink_update_memcpy` copies a byte range like `memcpy`, and
+ *   feeds the source bytes to a `umash_sink` like `umash_sink_update`.
+ *
+ * ## Parallel fingerprinting
+ *
+ * UMASH compresses its input in independent blocks of
+ * `UMASH_BLOCK_SIZE` (256) bytes, and combines the compressed blocks
+ * with a polynomial.  We can thus fingerprint runs of whole blocks
+ * concurrently (or out of order), and stitch the partial results
+ * together.
+ *
+ * - `umash_fprint_blocks` returns a `struct umash_fp_blocks` for a
+ *   run of whole blocks.  A zero-initialised `umash_fp_blocks`
+ *   represents the empty run.
+ *
+ * - `umash_fp_blocks_concat` combines the partial results for two
+ *   consecutive runs of blocks, in logarithmic time.
+ *
+ * - `umash_fp_blocks_digest` hashes the remainder of the input after
+ *   a run of blocks, and returns the same value as `umash_fprint`
+ *   on the whole input.
+ *
+ * The same block structure lets us fingerprint many prefixes of a
+ * large input in constant time each, after a linear-time indexing
+ * pass.
+ *
+ * - `umash_fp_prefix_index` saves the partial fingerprint after each
+ *   block of the input (16 bytes per 256-byte block) in an array of
+ *   `umash_fp_prefix_index_size(n_bytes)` checkpoints.
+ *
+ * - `umash_fp_prefix` computes the same value as `umash_fprint` for
+ *   any prefix of the indexed input, by resuming from the last
+ *   checkpoint that fits, and hashing at most one block and the
+ *   final block.
+ *
+ * ## Tuning
+ *
+ * When `umash_long.inc` is available, inputs of at least
+ * `umash_multiple_blocks_threshold_get()` bytes (1024 by default)
+ * go through a bulk loop that is faster for long inputs, but has a
+ * higher fixed cost.  The crossover point depends on the CPU, and
+ * `bench/runner.c` can measure it (see `bench/README.md`).
+ * `umash_multiple_blocks_threshold_set` updates the threshold at
+ * runtime.  The threshold only affects performance, never the hash
+ * values.
+ *
+ * ## Statistics
+ *
+ * When `umash.c` is built with `-DUMASH_STATS=1`, UMASH counts calls
+ * to each code path, and builds a histogram of input sizes, in cheap
+ * per-thread counters.  `umash_stats_snapshot` sums the counters for
+ * all threads, past and present.  Without `UMASH_STATS`, the snapshot
+ * is always zero.
  */
 
 #ifdef __cplusplus
@@ -96,6 +186,11 @@ extern "C" {
 
 enum { UMASH_OH_PARAM_COUNT = 32, UMASH_OH_TWISTING_COUNT = 2 };
 
+/**
+ * The unit of work for parallel fingerprinting, in bytes.
+ */
+enum { UMASH_BLOCK_SIZE = 8 * UMASH_OH_PARAM_COUNT };
+
 /**
  * A single UMASH params struct stores the parameters for a pair of
  * independent `UMASH` functions.
@@ -113,6 +208,19 @@ struct umash_params {
 	uint64_t oh[UMASH_OH_PARAM_COUNT + UMASH_OH_TWISTING_COUNT];
 };
 
+/**
+ * The subset of a `umash_params` struct that `umash_full` reads when
+ * `which = 0`: 272 bytes instead of 304.  The multipliers come first,
+ * so short and medium inputs touch at most two cache lines when the
+ * struct is aligned to 64 bytes.
+ */
+struct umash_params_compact {
+	/* `umash_params::poly[0]`, i.e., {f^2, f}. */
+	uint64_t poly[2];
+	/* The first `UMASH_OH_PARAM_COUNT` words of `umash_params::oh`. */
+	uint64_t oh[UMASH_OH_PARAM_COUNT];
+};
+
 /**
  * A fingerprint consists of two independent `UMASH` hash values.
  */
@@ -120,6 +228,53 @@ struct umash_fp {
 	uint64_t hash[2];
 };
 
+/**
+ * The partial fingerprint for a run of whole `UMASH_BLOCK_SIZE`-byte
+ * blocks.  The accumulators are not finalised, so this struct is
+ * *not* a fingerprint by itself.
+ */
+struct umash_fp_blocks {
+	uint64_t acc[2];
+	uint64_t n_blocks;
+};
+
+/**
+ * The number of buckets in `umash_stats::size_log2`.
+ */
+enum { UMASH_STATS_SIZE_BUCKETS = 65 };
+
+/**
+ * Counters for `UMASH_STATS` builds.
+ */
+struct umash_stats {
+	/* Hashes or fingerprints of at most 8 bytes. */
+	uint64_t short_inputs;
+	/* Hashes or fingerprints of 9 to 16 bytes. */
+	uint64_t medium_inputs;
+	/* Hashes or fingerprints of more than 16 bytes. */
+	uint64_t long_inputs;
+	/*
+	 * Calls to the bulk loop for inputs of at least
+	 * `umash_multiple_blocks_threshold_get()` bytes.
+	 */
+	uint64_t multiple_blocks;
+	/*
+	 * `size_log2[0]` counts empty inputs, and `size_log2[i]`
+	 * inputs of `[2**(i - 1), 2**i)` bytes.  Incremental hashes
+	 * and fingerprints count the size of each `umash_sink_update`
+	 * call instead of their total size.
+	 */
+	uint64_t size_log2[UMASH_STATS_SIZE_BUCKETS];
+};
+
+/**
+ * The partial fingerprint after a whole number of blocks, in a
+ * `umash_fp_prefix_index`.
+ */
+struct umash_fp_checkpoint {
+	uint64_t acc[2];
+};
+
 /**
  * This struct holds the state for incremental UMASH hashing or
  * fingerprinting.
@@ -244,6 +399,49 @@ void umash_sink_update(struct umash_sink *, const void *data, size_t n_bytes);
 uint64_t umash_full(const struct umash_params *params, uint64_t seed, int which,
     const void *data, size_t n_bytes);
 
+/**
+ * Copies the hash-only subset of `params` to `compact`.
+ */
+void umash_params_compact_init(
+    struct umash_params_compact *compact, const struct umash_params *params);
+
+/**
+ * Computes the same value as `umash_full`, with software prefetches
+ * `prefetch_distance` bytes ahead of the data being hashed.
+ *
+ * @param prefetch_distance 0 for the default (2 KB).
+ */
+uint64_t umash_full_cold(const struct umash_params *params, uint64_t seed, int which,
+    const void *data, size_t n_bytes, size_t prefetch_distance);
+
+/**
+ * Computes the same value as `umash_fprint`, with software prefetches
+ * `prefetch_distance` bytes ahead of the data being hashed.
+ *
+ * @param prefetch_distance 0 for the default (2 KB).
+ */
+struct umash_fp umash_fprint_cold(const struct umash_params *params, uint64_t seed,
+    const void *data, size_t n_bytes, size_t prefetch_distance);
+
+/**
+ * Computes the UMASH hash of `data[0 ... n_bytes)`, like `umash_full`
+ * with `which = 0`.
+ */
+uint64_t umash_full_compact(const struct umash_params_compact *params, uint64_t seed,
+    const void *data, size_t n_bytes);
+
+/**
+ * Computes the UMASH hash of `data[0 ... n_bytes)` for each of the
+ * `k` parameter structs in `params`, and stores the results in
+ * `out[0 ... k)`.
+ *
+ * The result is the same as setting each `out[i] =
+ * umash_full(params[i], seed, 0, data, n_bytes)`, but we only read
+ * the input from memory once.
+ */
+void umash_full_multi(const struct umash_params *const *params, size_t k, uint64_t seed,
+    const void *data, size_t n_bytes, uint64_t *out);
+
 /**
  * Computes the UMASH fingerprint of `data[0 ... n_bytes)`.
  *
@@ -254,6 +452,19 @@ uint64_t umash_full(const struct umash_params *params, uint64_t seed, int which,
 struct umash_fp umash_fprint(
     const struct umash_params *params, uint64_t seed, const void *data, size_t n_bytes);
 
+/**
+ * Computes the UMASH fingerprint of `n_records` records of
+ * `record_len` bytes each, and stores them in `out[0 ... n_records)`.
+ * The `i`th record starts at `base + i * stride`.
+ *
+ * The result is the same as setting each `out[i] = umash_fprint(params,
+ * seed, base + i * stride, record_len)`, but records of 17 to 256
+ * bytes are compressed several at a time.
+ */
+void umash_fprint_strided(const struct umash_params *params, uint64_t seed,
+    const void *base, size_t stride, size_t record_len, size_t n_records,
+    struct umash_fp *out);
+
 /**
  * Prepares a `umash_state` for computing the `which`th UMASH function in
  * `params`.
@@ -261,6 +472,15 @@ struct umash_fp umash_fprint(
 void umash_init(
     struct umash_state *, const struct umash_params *params, uint64_t seed, int which);
 
+/**
+ * Prepares a `umash_state` for computing the first UMASH function,
+ * from the hash-only subset of its parameters.
+ *
+ * The `umash_params_compact` struct must outlive the state.
+ */
+void umash_init_compact(
+    struct umash_state *, const struct umash_params_compact *params, uint64_t seed);
+
 /**
  * Returns the UMASH value for the bytes that have been
  * `umash_sink_update`d into the state.
@@ -280,6 +500,109 @@ void umash_fp_init(
  */
 struct umash_fp umash_fp_digest(const struct umash_fp_state *);
 
+/**
+ * Copies `src[0 ... n_bytes)` to `dst[0 ... n_bytes)`, and returns
+ * the UMASH fingerprint of these bytes.
+ *
+ * The result is the same as `umash_fprint(params, seed, src, n_bytes)`,
+ * but each source byte is only read once from memory.  Large copies
+ * bypass the cache with non-temporal stores.
+ *
+ * The two ranges must not overlap.
+ */
+struct umash_fp umash_memcpy_fprint(void *dst, const void *src, size_t n_bytes,
+    const struct umash_params *params, uint64_t seed);
+
+/**
+ * Copies `src[0 ... n_bytes)` to `dst[0 ... n_bytes)`, and updates
+ * the `umash_sink` to take the same bytes into account.
+ *
+ * The two ranges must not overlap.
+ */
+void umash_sink_update_memcpy(
+    struct umash_sink *, void *dst, const void *src, size_t n_bytes);
+
+/**
+ * Computes the partial fingerprint for the `n_blocks` whole blocks in
+ * `data[0 ... n_blocks * UMASH_BLOCK_SIZE)`.
+ *
+ * The `params` and `seed` must match the ones eventually passed to
+ * `umash_fp_blocks_digest`.
+ */
+struct umash_fp_blocks umash_fprint_blocks(
+    const struct umash_params *params, uint64_t seed, const void *data, size_t n_blocks);
+
+/**
+ * Returns the partial fingerprint for the run of blocks in `prefix`,
+ * immediately followed by the run of blocks in `suffix`.
+ */
+struct umash_fp_blocks umash_fp_blocks_concat(const struct umash_params *params,
+    struct umash_fp_blocks prefix, struct umash_fp_blocks suffix);
+
+/**
+ * Computes the UMASH fingerprint of the run of blocks in `prefix`,
+ * followed by `data[0 ... n_bytes)`.
+ *
+ * The result is the same as `umash_fprint` on the concatenated bytes.
+ * The last block of the input is special, so `prefix` must not
+ * include it: when `prefix` is not empty, `n_bytes` must be at least
+ * 16.  Splitting an input of `n` bytes after
+ * `((n - 16) / UMASH_BLOCK_SIZE) * UMASH_BLOCK_SIZE` bytes always
+ * satisfies that constraint.
+ */
+struct umash_fp umash_fp_blocks_digest(const struct umash_params *params, uint64_t seed,
+    struct umash_fp_blocks prefix, const void *data, size_t n_bytes);
+
+/**
+ * Returns the number of `struct umash_fp_checkpoint` entries in the
+ * prefix index for an input of `n_bytes` bytes.
+ */
+size_t umash_fp_prefix_index_size(size_t n_bytes);
+
+/**
+ * Populates `index[0 ... umash_fp_prefix_index_size(n_bytes))` with
+ * checkpoints for fingerprinting prefixes of `data[0 ... n_bytes)`
+ * with `umash_fp_prefix`.
+ *
+ * The index is only valid for the same `params` and `seed`.
+ */
+void umash_fp_prefix_index(const struct umash_params *params, uint64_t seed,
+    const void *data, size_t n_bytes, struct umash_fp_checkpoint *index);
+
+/**
+ * Computes `umash_fprint(params, seed, data, n_bytes)`, in time
+ * independent of `n_bytes`, given a prefix index for `params`, `seed`,
+ * and at least `n_bytes` bytes of `data`.
+ */
+struct umash_fp umash_fp_prefix(const struct umash_params *params, uint64_t seed,
+    const struct umash_fp_checkpoint *index, const void *data, size_t n_bytes);
+
+/**
+ * Returns the minimum input size, in bytes, for the bulk loop, or
+ * SIZE_MAX if UMASH was built without `umash_long.inc`.
+ */
+size_t umash_multiple_blocks_threshold_get(void);
+
+/**
+ * Sets the minimum input size for the bulk loop to `threshold` bytes,
+ * for all threads.  Values less than `UMASH_BLOCK_SIZE` are rounded
+ * up, and SIZE_MAX disables the bulk loop.
+ *
+ * @return the previous threshold, or SIZE_MAX (and no effect) if UMASH
+ *   was built without `umash_long.inc`.
+ */
+size_t umash_multiple_blocks_threshold_set(size_t threshold);
+
+/**
+ * Stores the sum of the `UMASH_STATS` counters for all threads in
+ * `dst`.  Each counter is read atomically, but the snapshot as a
+ * whole is not.
+ *
+ * @return false (and zero counters) if UMASH was built without
+ *   `UMASH_STATS`.
+ */
+bool umash_stats_snapshot(struct umash_stats *dst);
+
 #ifdef __cplusplus
 }
 #endif
@@ -0,0 +1,552 @@
+#define _GNU_SOURCE /* MAP_ANONYMOUS with -std=c99 */
+#include "umash_bloom.h"
+
+/*
+ * UMASH is distributed under the MIT license.
+ *
+ * SPDX-License-Identifier: MIT
+ *
+ * Copyright 2022 Backtrace I/O, Inc.
+ */
+
+#include <errno.h>
+#include <pthread.h>
+#include <stdint.h>
+#include <stdlib.h>
+#include <string.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <unistd.h>
+
+#if defined(__SSE2__)
+#include <emmintrin.h>
+#endif
+
+/*
+ * #define UMASH_SECTION="special_section" to emit all UMASH symbols
+ * in the `special_section` ELF section.
+ */
+#if defined(UMASH_SECTION) && defined(__GNUC__)
+#define FN __attribute__((__section__(UMASH_SECTION)))
+#else
+#define FN
+#endif
+
+#include "umash_map.inc"
+
+#define BLOCK_BITS 512
+#define BLOCK_WORDS (BLOCK_BITS / 64)
+
+#define DEFAULT_BITS_PER_KEY 12
+#define MAX_HASHES 16
+
+/*
+ * The bulk functions prefetch the block for the key this many
+ * positions ahead of the current one.
+ */
+#define PREFETCH_DISTANCE 8
+
+/*
+ * `umash_bloom_{insert,query}_keys` fingerprint this many keys at a
+ * time, before inserting or querying them.
+ */
+#define KEY_BATCH 64
+
+/*
+ * Parallel builds hand out fingerprints to threads in chunks of this
+ * many fingerprints.
+ */
+#define BUILD_CHUNK 16384
+
+static const char header_magic[8] = "UMASHBF1";
+
+/*
+ * The first 64 bytes of a filter's memory.
+ */
+struct header {
+	char magic[8];
+	uint64_t n_blocks;
+	uint32_t n_hashes;
+	uint32_t byte_order;
+	uint64_t reserved[5];
+};
+
+struct block {
+	uint64_t words[BLOCK_WORDS];
+} __attribute__((__aligned__(64)));
+
+struct umash_bloom {
+	struct block *blocks;
+	size_t n_blocks;
+	unsigned int n_hashes;
+	const void *data; /* The header, followed by the blocks. */
+	size_t size;
+	/* Memory we must `munmap` on destruction, if any. */
+	void *map;
+	size_t map_size;
+};
+
+struct build_state {
+	struct umash_bloom *bloom;
+	const struct umash_fp *fps;
+	size_t n;
+	size_t next; /* Index of the next chunk, updated atomically. */
+};
+
+static FN struct block *
+block_for(const struct umash_bloom *bloom, uint64_t hash)
+{
+	/* Map `hash` to [0, n_blocks) with a multiply-shift. */
+	__uint128_t product = hash;
+
+	product *= bloom->n_blocks;
+	return &bloom->blocks[product >> 64];
+}
+
+/*
+ * Sets the bits for a key whose second hash value is `hash` in
+ * `mask`, by double hashing with the two halves of `hash`.  Each bit
+ * index is the top 9 bits of a 32-bit value.
+ */
+static FN void
+key_mask(uint64_t mask[static BLOCK_WORDS], uint64_t hash, unsigned int n_hashes)
+{
+	uint32_t a = (uint32_t)hash;
+	uint32_t b = (uint32_t)(hash >> 32) | 1;
+
+	memset(mask, 0, BLOCK_WORDS * sizeof(mask[0]));
+	for (unsigned int i = 0; i < n_hashes; i++) {
+		uint32_t bit = (a + i * b) >> 23;
+
+		mask[bit / 64] |= 1ULL << (bit % 64);
+	}
+
+	return;
+}
+
+/*
+ * Returns whether all the bits in `mask` are set in `block`.
+ */
+static FN bool
+block_covers(const struct block *block, const uint64_t mask[static BLOCK_WORDS])
+{
+#if defined(__SSE2__)
+	__m128i missing = _mm_setzero_si128();
+
+	for (size_t i = 0; i < BLOCK_WORDS; i += 2) {
+		__m128i bits = _mm_load_si128((const __m128i *)&block->words[i]);
+		__m128i wanted = _mm_loadu_si128((const __m128i *)&mask[i]);
+
+		missing = _mm_or_si128(missing, _mm_andnot_si128(bits, wanted));
+	}
+
+	return _mm_movemask_epi8(_mm_cmpeq_epi8(missing, _mm_setzero_si128())) == 0xFFFF;
+#else
+	uint64_t missing = 0;
+
+	for (size_t i = 0; i < BLOCK_WORDS; i++)
+		missing |= mask[i] & ~block->words[i];
+
+	return missing == 0;
+#endif
+}
+
+static FN void
+insert_one(struct umash_bloom *bloom, const struct umash_fp *fp)
+{
+	struct block *block = block_for(bloom, fp->hash[0]);
+	uint64_t mask[BLOCK_WORDS];
+
+	key_mask(mask, fp->hash[1], bloom->n_hashes);
+	for (size_t i = 0; i < BLOCK_WORDS; i++)
+		block->words[i] |= mask[i];
+
+	return;
+}
+
+static FN void
+insert_one_atomic(struct umash_bloom *bloom, const struct umash_fp *fp)
+{
+	struct block *block = block_for(bloom, fp->hash[0]);
+	uint64_t mask[BLOCK_WORDS];
+
+	key_mask(mask, fp->hash[1], bloom->n_hashes);
+	for (size_t i = 0; i < BLOCK_WORDS; i++) {
+		/* Skip the RMW (and cache line ownership) when we can. */
+		if ((mask[i] & ~__atomic_load_n(&block->words[i], __ATOMIC_RELAXED)) != 0)
+			__atomic_fetch_or(&block->words[i], mask[i], __ATOMIC_RELAXED);
+	}
+
+	return;
+}
+
+static FN bool
+query_one(const struct umash_bloom *bloom, const struct umash_fp *fp)
+{
+	uint64_t mask[BLOCK_WORDS];
+
+	key_mask(mask, fp->hash[1], bloom->n_hashes);
+	return block_covers(block_for(bloom, fp->hash[0]), mask);
+}
+
+static FN void
+prefetch(const struct umash_bloom *bloom, const struct umash_fp *fps, size_t i, size_t n,
+    bool write)
+{
+
+	if (n - i <= PREFETCH_DISTANCE)
+		return;
+
+	if (write)
+		__builtin_prefetch(
+		    block_for(bloom, fps[i + PREFETCH_DISTANCE].hash[0]), 1);
+	else
+		__builtin_prefetch(
+		    block_for(bloom, fps[i + PREFETCH_DISTANCE].hash[0]), 0);
+	return;
+}
+
+/*
+ * Checks that the `size` bytes at `data` look like a filter, and
+ * points `bloom` at them.
+ */
+static FN bool
+attach(struct umash_bloom *bloom, const void *data, size_t size)
+{
+	const struct header *header = data;
+
+	if (((uintptr_t)data % sizeof(struct block)) != 0 ||
+	    size < sizeof(struct header) ||
+	    memcmp(header->magic, header_magic, sizeof(header_magic)) != 0 ||
+	    header->byte_order != HEADER_BYTE_ORDER || header->n_hashes == 0 ||
+	    header->n_hashes > MAX_HASHES || header->n_blocks == 0 ||
+	    (size - sizeof(struct header)) % sizeof(struct block) != 0 ||
+	    (size - sizeof(struct header)) / sizeof(struct block) != header->n_blocks) {
+		errno = EINVAL;
+		return false;
+	}
+
+	bloom->blocks = (struct block *)((uintptr_t)data + sizeof(struct header));
+	bloom->n_blocks = header->n_blocks;
+	bloom->n_hashes = header->n_hashes;
+	bloom->data = data;
+	bloom->size = size;
+	return true;
+}
+
+FN struct umash_bloom *
+umash_bloom_create(const struct umash_bloom_options *options)
+{
+	static const struct umash_bloom_options default_options = {
+		.size = sizeof(struct umash_bloom_options),
+	};
+	struct umash_bloom_options opts = { 0 };
+	struct umash_bloom *ret;
+	struct header *header;
+	uint64_t n_bits, n_blocks;
+	size_t size;
+	void *map;
+
+	if (options == NULL)
+		options = &default_options;
+
+	if (options->size < sizeof(size_t)) {
+		errno = EINVAL;
+		return NULL;
+	}
+
+	memcpy(&opts, options,
+	    (options->size < sizeof(opts)) ? options->size : sizeof(opts));
+	opts.size = sizeof(opts);
+
+	if (opts.expected_keys == 0)
+		opts.expected_keys = 1;
+	if (opts.bits_per_key == 0)
+		opts.bits_per_key = DEFAULT_BITS_PER_KEY;
+	if (opts.n_hashes > MAX_HASHES) {
+		errno = EINVAL;
+		return NULL;
+	}
+
+	if (opts.n_hashes == 0) {
+		uint64_t n_hashes = (6 * (uint64_t)opts.bits_per_key + 5) / 10;
+
+		if (n_hashes < 1)
+			n_hashes = 1;
+		opts.n_hashes = (n_hashes < MAX_HASHES) ? n_hashes : MAX_HASHES;
+	}
+
+	if (__builtin_mul_overflow(opts.expected_keys, opts.bits_per_key, &n_bits) ||
+	    n_bits > SIZE_MAX - BLOCK_BITS) {
+		errno = ENOMEM;
+		return NULL;
+	}
+
+	n_blocks = (n_bits + BLOCK_BITS - 1) / BLOCK_BITS;
+	if (n_blocks >= (SIZE_MAX - sizeof(struct header)) / sizeof(struct block)) {
+		errno = ENOMEM;
+		return NULL;
+	}
+
+	size = sizeof(struct header) + n_blocks * sizeof(struct block);
+	ret = calloc(1, sizeof(*ret));
+	if (ret == NULL)
+		return NULL;
+
+	/* Anonymous mappings are zero-filled and page-aligned. */
+	map =
+	    mmap(NULL, size, PROT_READ | PROT_WRITE, MAP_PRIVATE | MAP_ANONYMOUS, -1, 0);
+	if (map == MAP_FAILED) {
+		free(ret);
+		return NULL;
+	}
+
+#ifdef MADV_HUGEPAGE
+	/*
+	 * Each query touches a random block: huge pages save a TLB miss
+	 * per query in large filters.
+	 */
+	(void)madvise(map, size, MADV_HUGEPAGE);
+#endif
+
+	header = map;
+	memcpy(header->magic, header_magic, sizeof(header_magic));
+	header->n_blocks = n_blocks;
+	header->n_hashes = opts.n_hashes;
+	header->byte_order = HEADER_BYTE_ORDER;
+
+	ret->map = map;
+	ret->map_size = size;
+	if (!attach(ret, map, size)) {
+		umash_bloom_destroy(ret);
+		return NULL;
+	}
+
+	return ret;
+}
+
+FN struct umash_bloom *
+umash_bloom_view(const void *data, size_t size)
+{
+	struct umash_bloom *ret;
+
+	ret = calloc(1, sizeof(*ret));
+	if (ret == NULL)
+		return NULL;
+
+	if (!attach(ret, data, size)) {
+		free(ret);
+		return NULL;
+	}
+
+	return ret;
+}
+
+FN struct umash_bloom *
+umash_bloom_open_fd(int fd)
+{
+	struct umash_bloom *ret;
+
+	ret = calloc(1, sizeof(*ret));
+	if (ret == NULL)
+		return NULL;
+
+	ret->map = map_fd(fd, sizeof(struct header), &ret->map_size);
+	if (ret->map == NULL) {
+		free(ret);
+		return NULL;
+	}
+
+	if (!attach(ret, ret->map, ret->map_size)) {
+		int error = errno;
+
+		umash_bloom_destroy(ret);
+		errno = error;
+		return NULL;
+	}
+
+	return ret;
+}
+
+FN void
+umash_bloom_destroy(struct umash_bloom *bloom)
+{
+
+	if (bloom == NULL)
+		return;
+
+	if (bloom->map != NULL)
+		munmap(bloom->map, bloom->map_size);
+
+	free(bloom);
+	return;
+}
+
+FN const void *
+umash_bloom_data(const struct umash_bloom *bloom, size_t *size)
+{
+
+	*size = bloom->size;
+	return bloom->data;
+}
+
+FN size_t
+umash_bloom_n_blocks(const struct umash_bloom *bloom)
+{
+
+	return bloom->n_blocks;
+}
+
+FN void
+umash_bloom_insert(struct umash_bloom *bloom, const struct umash_fp *fp)
+{
+
+	insert_one(bloom, fp);
+	return;
+}
+
+FN bool
+umash_bloom_query(const struct umash_bloom *bloom, const struct umash_fp *fp)
+{
+
+	return query_one(bloom, fp);
+}
+
+FN void
+umash_bloom_insert_many(struct umash_bloom *bloom, const struct umash_fp *fps, size_t n)
+{
+
+	for (size_t i = 0; i < n; i++) {
+		prefetch(bloom, fps, i, n, /*write=*/true);
+		insert_one(bloom, &fps[i]);
+	}
+
+	return;
+}
+
+FN size_t
+umash_bloom_query_many(
+    const struct umash_bloom *bloom, const struct umash_fp *fps, size_t n, bool *found)
+{
+	size_t ret = 0;
+
+	for (size_t i = 0; i < n; i++) {
+		prefetch(bloom, fps, i, n, /*write=*/false);
+		found[i] = query_one(bloom, &fps[i]);
+		ret += found[i];
+	}
+
+	return ret;
+}
+
+FN void
+umash_bloom_insert_keys(struct umash_bloom *bloom, const struct umash_params *params,
+    uint64_t seed, const void *const *keys, const size_t *n_bytes, size_t n)
+{
+	struct umash_fp fps[KEY_BATCH];
+
+	for (size_t begin = 0; begin < n; begin += KEY_BATCH) {
+		size_t count = (n - begin < KEY_BATCH) ? n - begin : KEY_BATCH;
+
+		for (size_t i = 0; i < count; i++)
+			fps[i] = umash_fprint(
+			    params, seed, keys[begin + i], n_bytes[begin + i]);
+
+		umash_bloom_insert_many(bloom, fps, count);
+	}
+
+	return;
+}
+
+FN size_t
+umash_bloom_query_keys(const struct umash_bloom *bloom, const struct umash_params *params,
+    uint64_t seed, const void *const *keys, const size_t *n_bytes, size_t n, bool *found)
+{
+	struct umash_fp fps[KEY_BATCH];
+	size_t ret = 0;
+
+	for (size_t begin = 0; begin < n; begin += KEY_BATCH) {
+		size_t count = (n - begin < KEY_BATCH) ? n - begin : KEY_BATCH;
+
+		for (size_t i = 0; i < count; i++)
+			fps[i] = umash_fprint(
+			    params, seed, keys[begin + i], n_bytes[begin + i]);
+
+		ret += umash_bloom_query_many(bloom, fps, count, &found[begin]);
+	}
+
+	return ret;
+}
+
+static FN void *
+build_worker(void *arg)
+{
+	struct build_state *state = arg;
+	const struct umash_fp *fps = state->fps;
+	size_t n = state->n;
+
+	for (;;) {
+		size_t begin =
+		    BUILD_CHUNK * __atomic_fetch_add(&state->next, 1, __ATOMIC_RELAXED);
+		size_t end;
+
+		if (begin >= n)
+			break;
+
+		end = (n - begin < BUILD_CHUNK) ? n : begin + BUILD_CHUNK;
+		for (size_t i = begin; i < end; i++) {
+			prefetch(state->bloom, fps, i, end, /*write=*/true);
+			insert_one_atomic(state->bloom, &fps[i]);
+		}
+	}
+
+	return NULL;
+}
+
+FN void
+umash_bloom_build(struct umash_bloom *bloom, const struct umash_fp *fps, size_t n,
+    unsigned int n_threads)
+{
+	struct build_state state = {
+		.bloom = bloom,
+		.fps = fps,
+		.n = n,
+		.next = 0,
+	};
+	size_t n_chunks = n / BUILD_CHUNK + 1;
+	pthread_t *threads;
+	size_t n_spawned = 0;
+
+	if (n_threads == 0) {
+		long n_cpus = sysconf(_SC_NPROCESSORS_ONLN);
+
+		n_threads = (n_cpus > 0) ? (unsigned int)n_cpus : 1;
+	}
+
+	if (n_threads > n_chunks)
+		n_threads = n_chunks;
+
+	if (n_threads <= 1) {
+		umash_bloom_insert_many(bloom, fps, n);
+		return;
+	}
+
+	/*
+	 * The calling thread is also a worker, so we always make
+	 * progress, even if we fail to spawn any thread.
+	 */
+	threads = calloc(n_threads, sizeof(*threads));
+	for (size_t i = 1; threads != NULL && i < n_threads; i++) {
+		if (pthread_create(&threads[n_spawned], NULL, build_worker, &state) != 0)
+			break;
+
+		n_spawned++;
+	}
+
+	build_worker(&state);
+	for (size_t i = 0; i < n_spawned; i++)
+		pthread_join(threads[i], NULL);
+
+	free(threads);
+	return;
+}
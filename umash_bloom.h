@@ -0,0 +1,173 @@
+#ifndef UMASH_BLOOM_H
+#define UMASH_BLOOM_H
+#include "umash.h"
+
+/**
+ * # Blocked Bloom filters on UMASH fingerprints
+ *
+ * SPDX-License-Identifier: MIT
+ * Copyright 2022 Backtrace I/O, Inc.
+ *
+ * This optional companion (`umash_bloom.c`, POSIX threads) is a
+ * Bloom filter keyed on `struct umash_fp`, meant for large negative
+ * lookup caches, where each query should cost about one cache miss.
+ *
+ * - The filter is an array of 64-byte blocks (cache lines), and each
+ *   key only sets or tests bits in one block.  The first fingerprint
+ *   hash picks the block, and the second generates the bit indices in
+ *   that block by Kirsch-Mitzenmacher double hashing: the `i`th bit
+ *   index is derived from `a + i * b`, where `a` and `b` are the two
+ *   32-bit halves of `hash[1]`.  Queries build the 512-bit mask of a
+ *   key's bits and compare it with the block in a few SSE2 operations.
+ *
+ * - The bulk functions insert or test many fingerprints (or hash and
+ *   insert or test many keys) per call, and prefetch blocks a few
+ *   keys ahead, so cache misses for independent keys overlap.
+ *   `umash_bloom_build` splits a bulk insertion between threads.
+ *
+ * - A filter's memory is its serialized format: a 64-byte header
+ *   followed by the blocks, in native byte order.  Writing the
+ *   bytes returned by `umash_bloom_data` to a file, and opening that
+ *   file with `umash_bloom_open_fd` (or any other copy of the bytes
+ *   with `umash_bloom_view`) gives a read-only filter without
+ *   copying or parsing.
+ *
+ * Only the fingerprints matter, so the filter's false positive rate
+ * is that of an ideal blocked Bloom filter as long as the
+ * fingerprints are computed with parameters that are independent of
+ * the keys.
+ */
+
+#ifdef __cplusplus
+extern "C" {
+#endif
+
+/**
+ * Sizing options for `umash_bloom_create`.  Zero-initialised fields
+ * take their default value.
+ */
+struct umash_bloom_options {
+	/* Must be `sizeof(struct umash_bloom_options)`. */
+	size_t size;
+	/* Number of keys to size the filter for (default 1). */
+	uint64_t expected_keys;
+	/*
+	 * Number of filter bits per expected key (default 12), for a
+	 * false positive rate around 0.5%.
+	 */
+	unsigned int bits_per_key;
+	/*
+	 * Number of bits set for each key, at most 16 (defaults to
+	 * `0.6 * bits_per_key`, capped at 16).
+	 */
+	unsigned int n_hashes;
+};
+
+struct umash_bloom;
+
+/**
+ * Returns a new empty filter, or NULL with `errno` set on failure.
+ *
+ * @param options NULL for the default options.
+ */
+struct umash_bloom *umash_bloom_create(const struct umash_bloom_options *options);
+
+/**
+ * Returns a read-only filter backed by the `size` bytes at `data`,
+ * which must be a copy of the bytes returned by `umash_bloom_data`,
+ * aligned to 64 bytes, and outlive the filter.
+ *
+ * @return NULL with `errno` set to EINVAL if the bytes are not a
+ *   valid filter, or ENOMEM.
+ */
+struct umash_bloom *umash_bloom_view(const void *data, size_t size);
+
+/**
+ * Maps the filter in the file open as `fd` (e.g., written from
+ * `umash_bloom_data`) in memory, and returns a read-only filter
+ * backed by that mapping.  The file descriptor may be closed
+ * immediately.
+ *
+ * @return NULL with `errno` set on failure.
+ */
+struct umash_bloom *umash_bloom_open_fd(int fd);
+
+/**
+ * Releases the filter, and any memory it owns or mapped.
+ */
+void umash_bloom_destroy(struct umash_bloom *);
+
+/**
+ * Returns the filter's serialized bytes, and stores their size in
+ * `size`.  The bytes are the filter's memory, and change with
+ * further insertions.
+ */
+const void *umash_bloom_data(const struct umash_bloom *, size_t *size);
+
+/**
+ * Returns the number of 64-byte blocks in the filter.
+ */
+size_t umash_bloom_n_blocks(const struct umash_bloom *);
+
+/**
+ * Inserts one fingerprint in the filter.  Insertions must not be
+ * concurrent with other insertions in the same filter, and the
+ * filter must not be read-only.
+ */
+void umash_bloom_insert(struct umash_bloom *, const struct umash_fp *);
+
+/**
+ * Returns whether the fingerprint may have been inserted in the
+ * filter: false if it definitely wasn't, true otherwise.
+ */
+bool umash_bloom_query(const struct umash_bloom *, const struct umash_fp *);
+
+/**
+ * Inserts `n` fingerprints in the filter, with the same restrictions
+ * as `umash_bloom_insert`.
+ */
+void umash_bloom_insert_many(struct umash_bloom *, const struct umash_fp *fps, size_t n);
+
+/**
+ * Queries `n` fingerprints, and stores each result in `found`.
+ *
+ * @return the number of true results.
+ */
+size_t umash_bloom_query_many(
+    const struct umash_bloom *, const struct umash_fp *fps, size_t n, bool *found);
+
+/**
+ * Fingerprints the `n` keys `keys[i]` (of `n_bytes[i]` bytes each)
+ * with `umash_fprint(params, seed, ...)`, and inserts them in the
+ * filter, with the same restrictions as `umash_bloom_insert`.
+ */
+void umash_bloom_insert_keys(struct umash_bloom *, const struct umash_params *params,
+    uint64_t seed, const void *const *keys, const size_t *n_bytes, size_t n);
+
+/**
+ * Fingerprints the `n` keys `keys[i]` (of `n_bytes[i]` bytes each)
+ * with `umash_fprint(params, seed, ...)`, queries them, and stores
+ * each result in `found`.
+ *
+ * @return the number of true results.
+ */
+size_t umash_bloom_query_keys(const struct umash_bloom *,
+    const struct umash_params *params, uint64_t seed, const void *const *keys,
+    const size_t *n_bytes, size_t n, bool *found);
+
+/**
+ * Inserts `n` fingerprints in the filter with up to `n_threads`
+ * threads (including the caller), which update blocks with atomic
+ * operations.  The result is the same as `umash_bloom_insert_many`.
+ * The filter must not be read-only, and must not be queried or
+ * updated by other threads until the build returns.
+ *
+ * @param n_threads 0 for one thread per online CPU.
+ */
+void umash_bloom_build(
+    struct umash_bloom *, const struct umash_fp *fps, size_t n, unsigned int n_threads);
+
+#ifdef __cplusplus
+}
+#endif
+#endif /* !UMASH_BLOOM_H */
@@ -0,0 +1,92 @@
+/*
+ * Generated by t/gen-default-params.sh from umash_default_params.txt.
+ * DO NOT EDIT.
+ */
+#include "umash_default_params.h"
+
+const struct umash_params umash_default_params[UMASH_DEFAULT_PARAMS_COUNT] = {
+	/* bits = 0, default key. */
+	{
+		.poly = {
+			{ 0x1750289755934e3aULL, 0x0d1b5522f4059e62ULL },
+			{ 0x08d5c6edbb37b832ULL, 0x0daab0fd57364132ULL },
+		},
+		.oh = {
+			0x50cf4d1a31f6a7c2ULL, 0x9125c205cf7bfbfdULL, 0x34b5a29915027bd9ULL,
+			0x4064db0605947d66ULL, 0xdfc3aa6b349cc9f8ULL, 0xca46d07129e74931ULL,
+			0x183f8fd8552a62d0ULL, 0x2916a957b5aca803ULL, 0x77c3adb78088f946ULL,
+			0x4ec3286e27bd1e4aULL, 0x435018964199e279ULL, 0x961acc4e8ef00050ULL,
+			0x8897f0876d175df1ULL, 0x0704e01b94943390ULL, 0xc296e3a20bd6003cULL,
+			0x67eeab1ffaaa34cbULL, 0xd4281a801ed2a70aULL, 0xfffbfe48fff2619aULL,
+			0x55562ac75e839705ULL, 0xc8c709e6f9102e85ULL, 0x25923b558f59c7e0ULL,
+			0x6c5118d78c2a323eULL, 0x4e716eab314e397aULL, 0xbc5b1fb6ae2a2ac1ULL,
+			0x6d28c944d3f5a552ULL, 0xfc7a62968c512b59ULL, 0xa920582be95d7874ULL,
+			0xbae9a930a8ad2706ULL, 0x290477bc432047e3ULL, 0xebb75be5124e9e0eULL,
+			0x99449fe997b86c82ULL, 0x2badc1034f1ed132ULL, 0xafa8fc171fffe6ddULL,
+			0xce31841da9dc1647ULL,
+		},
+	},
+	/* bits = 1, default key. */
+	{
+		.poly = {
+			{ 0x18bbe5e24c8a2b28ULL, 0x1231fd60e09fab84ULL },
+			{ 0x154b6652c7c8a177ULL, 0x1c307aca668ae5f8ULL },
+		},
+		.oh = {
+			0xad62040537de7261ULL, 0xf443eaa3e7dc70c8ULL, 0xc52e101b57cd1567ULL,
+			0xf7906c0ca2ebfc21ULL, 0xb7c81ebfa619f885ULL, 0xfbcb65e7bfbe5137ULL,
+			0x09d64bbb55d18d6fULL, 0xb454478f3f225c4aULL, 0x846c638a1cc882fcULL,
+			0xeb2573979b76e4bcULL, 0xe2da5acec5598a5eULL, 0xae9ba1326707ca73ULL,
+			0xe82d51bd3d4a6fd2ULL, 0x2a8f836fae9bc54bULL, 0xe139aa3bf6db5886ULL,
+			0x21c5929c04f8e041ULL, 0x48387f6df4c62e5aULL, 0x5ecf89d1acdd0407ULL,
+			0x0782800828bd77c3ULL, 0xdcde5fe027550d61ULL, 0x703e5f4b21d600c0ULL,
+			0x6906da2e830d8a1cULL, 0xd26c51442e582607ULL, 0x8ff6e2b29033eab0ULL,
+			0x04e1bcf8ba90a2a4ULL, 0xccdd3b793bc39324ULL, 0x909680bccaa7e57eULL,
+			0x66c3fc24899b293aULL, 0xb9376d031384c7f0ULL, 0xddea96c6d480aaf6ULL,
+			0x071869d5e6b528f9ULL, 0xe5a1db964a340189ULL, 0xc69cf58ce3756f48ULL,
+			0x7da970472a2dda91ULL,
+		},
+	},
+	/* bits = 2, default key. */
+	{
+		.poly = {
+			{ 0x0c490a78b68d01c9ULL, 0x0bcbdf9282ef89b8ULL },
+			{ 0x1a10b2da44c9534cULL, 0x120affc0216b7926ULL },
+		},
+		.oh = {
+			0x322bb106eea7560bULL, 0xd5a2041b5f28eb1fULL, 0x526cc39bc4b3c723ULL,
+			0xc45c7cc280622692ULL, 0x64642da77cbf8be7ULL, 0xde1d013a247b44adULL,
+			0x5b3e335f3fa5b6a2ULL, 0x03f363d85a1d54a5ULL, 0x4e041db1e4a55d92ULL,
+			0xfd8a4702feda27f1ULL, 0xeeb697b93ba387c3ULL, 0xdb98f17c4e1c02edULL,
+			0xf7fe5427d2c61713ULL, 0xc9389cb672e21b0aULL, 0xf354bbde15da95daULL,
+			0x6f5f89e329ee3e53ULL, 0x8294048da7860dedULL, 0x2ce2c440ddae4b28ULL,
+			0x0a240b0ca71dda44ULL, 0xab30a312e13c266bULL, 0x0373668d1bd83864ULL,
+			0x2c869914a9a03663ULL, 0x2135d200e3873aa6ULL, 0x8f69580e3c3de39cULL,
+			0x12c47ac7aae71398ULL, 0xcbbb57f357c55c55ULL, 0x40f1fcc30de5c361ULL,
+			0x36885aee0389f855ULL, 0xe8ddfe2370e34f5bULL, 0xc3bf80a2ad57b88aULL,
+			0x2ae7eaa1857db4a8ULL, 0x1cbb6c5cb63e9f9fULL, 0x5bd615f407d58cffULL,
+			0xc5ef240f8bb7aa09ULL,
+		},
+	},
+	/* bits = 3, default key. */
+	{
+		.poly = {
+			{ 0x05c414b7dc65d239ULL, 0x0b9c4c2985501aa3ULL },
+			{ 0x03f2bb5f49ba18c6ULL, 0x07848b13bad88e0dULL },
+		},
+		.oh = {
+			0x2aabc44a5b50c206ULL, 0x1901c735c9c94173ULL, 0xb6c4374621f56be1ULL,
+			0xb93f4d90487a804aULL, 0x8ff3d8817ec7c01aULL, 0x2c8dbae38d8efe32ULL,
+			0xa5fb5dc9b5290da0ULL, 0x5be3c10f7636c802ULL, 0xbede69fb39f22ad0ULL,
+			0x66165706452cf655ULL, 0x98617cc49b9f5aedULL, 0x86c39a82446ece06ULL,
+			0x014dd8a4a51f863cULL, 0xe414255591e4ae92ULL, 0xce63885fa77d0159ULL,
+			0x99ec666d13a057a7ULL, 0xde11ab5a02cfc444ULL, 0xb10747364f2dea1eULL,
+			0xbc5c139cf2378a3cULL, 0x54c09966204222cbULL, 0x286c073e197ab6caULL,
+			0xeadc42aee5a8b3b0ULL, 0xfadc435b59047d77ULL, 0x8e4056d55e4ac41eULL,
+			0xf7e8529b53402beaULL, 0xda55970bb6024cf0ULL, 0xc87aaaf93a1dd025ULL,
+			0xd7f5237eb4d20080ULL, 0x4a0e23551b8b9e54ULL, 0x5e223f6d4f32577eULL,
+			0xb223be2417e1f70aULL, 0x0281bec969a31f75ULL, 0x03900c5428821bebULL,
+			0xd0c6b5acc8c22469ULL,
+		},
+	},
+};
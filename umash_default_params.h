@@ -0,0 +1,51 @@
+/*
+ * Generated by t/gen-default-params.sh from umash_default_params.txt.
+ * DO NOT EDIT.
+ */
+#ifndef UMASH_DEFAULT_PARAMS_H
+#define UMASH_DEFAULT_PARAMS_H
+#include "umash.h"
+
+/**
+ * # Precomputed UMASH parameters
+ *
+ * SPDX-License-Identifier: MIT
+ * Copyright 2022 Backtrace I/O, Inc.
+ *
+ * `umash_params_derive` expands its inputs with Salsa20 and
+ * validates the result with `umash_params_prepare`.  That's quick,
+ * but short-lived processes that always derive the same parameters
+ * may as well load them from `.rodata`.
+ *
+ * `umash_default_params[i]` is the `struct umash_params` that
+ * `umash_params_derive` constructs for the `i`th `(bits, key)` pair
+ * listed in `umash_default_params.txt`.  For example, if that pair
+ * is `0 -`,
+ *
+ *     umash_params_derive(&params, 0, NULL);
+ *     umash_full(&params, ...);
+ *
+ * is equivalent to
+ *
+ *     umash_full(&umash_default_params[i], ...);
+ *
+ * This version of the table holds:
+ *
+ * - `umash_default_params[0]`: bits = 0, default key.
+ * - `umash_default_params[1]`: bits = 1, default key.
+ * - `umash_default_params[2]`: bits = 2, default key.
+ * - `umash_default_params[3]`: bits = 3, default key.
+ */
+
+#ifdef __cplusplus
+extern "C" {
+#endif
+
+enum { UMASH_DEFAULT_PARAMS_COUNT = 4 };
+
+extern const struct umash_params umash_default_params[UMASH_DEFAULT_PARAMS_COUNT];
+
+#ifdef __cplusplus
+}
+#endif
+#endif /* !UMASH_DEFAULT_PARAMS_H */
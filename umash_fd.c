@@ -0,0 +1,1038 @@
+#define _GNU_SOURCE /* O_DIRECT */
+#include "umash_fd.h"
+
+/*
+ * UMASH is distributed under the MIT license.
+ *
+ * SPDX-License-Identifier: MIT
+ *
+ * Copyright 2022 Backtrace I/O, Inc.
+ */
+
+#include <errno.h>
+#include <fcntl.h>
+#include <pthread.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <sys/uio.h>
+#include <unistd.h>
+
+/*
+ * #define UMASH_FD_IO_URING=0 to always use the thread pool in
+ * `umash_fprint_fd_pipelined`.  We talk to io_uring with raw
+ * syscalls, so we only need the kernel's UAPI header, not liburing.
+ */
+#ifndef UMASH_FD_IO_URING
+#if defined(__linux__) && defined(__has_include)
+#if __has_include(<linux/io_uring.h>)
+#define UMASH_FD_IO_URING 1
+#endif /* __has_include(<linux/io_uring.h>) */
+#endif /* __linux__ && __has_include */
+#endif /* !UMASH_FD_IO_URING */
+
+#ifndef UMASH_FD_IO_URING
+#define UMASH_FD_IO_URING 0
+#endif
+
+#if UMASH_FD_IO_URING
+#include <linux/io_uring.h>
+#include <sys/syscall.h>
+#endif
+
+/*
+ * #define UMASH_SECTION="special_section" to emit all UMASH symbols
+ * in the `special_section` ELF section.
+ */
+#if defined(UMASH_SECTION) && defined(__GNUC__)
+#define FN __attribute__((__section__(UMASH_SECTION)))
+#else
+#define FN
+#endif
+
+/*
+ * We hash (and read) files in chunks of this many bytes.  That's
+ * large enough to amortise syscalls and keep `umash_sink_update` in
+ * its bulk loop, and small enough to stay in L2.
+ */
+#define CHUNK_SIZE ((size_t)1 << 20)
+
+/*
+ * We ask the kernel to read ahead this many chunks past the one
+ * we're hashing.
+ */
+#define READAHEAD_CHUNKS 4
+
+/*
+ * When the caller doesn't pick a strategy, we only map ranges of at
+ * least this many bytes: page faults and unmapping make `mmap`
+ * slower than a plain `pread` for small files.
+ */
+#define MMAP_MIN_SIZE (4 * CHUNK_SIZE)
+
+/*
+ * O_DIRECT reads must be aligned to the logical block size of the
+ * underlying device.  4 KB is always a multiple of that size in
+ * practice.
+ */
+#define DIRECT_ALIGNMENT 4096
+
+/**
+ * Hints the kernel that we will soon need the mapped bytes in
+ * `[begin, end)` of the `map_size`-byte mapping at `map`.
+ */
+static FN void
+map_willneed(char *map, size_t map_size, size_t begin, size_t end, size_t page_size)
+{
+
+	if (end > map_size)
+		end = map_size;
+	if (begin >= end)
+		return;
+
+	begin -= begin % page_size;
+	/* This is only a hint; ignore errors. */
+	(void)madvise(map + begin, end - begin, MADV_WILLNEED);
+	return;
+}
+
+static FN bool
+fprint_mmap(struct umash_sink *sink, int fd, uint64_t offset, size_t n_bytes)
+{
+	const size_t page_size = sysconf(_SC_PAGESIZE);
+	const size_t skip = offset % page_size;
+	const size_t map_size = skip + n_bytes;
+	char *map;
+
+	map = mmap(NULL, map_size, PROT_READ, MAP_SHARED, fd, (off_t)(offset - skip));
+	if (map == MAP_FAILED)
+		return false;
+
+	(void)madvise(map, map_size, MADV_SEQUENTIAL);
+	map_willneed(map, map_size, 0, skip + READAHEAD_CHUNKS * CHUNK_SIZE, page_size);
+
+	for (size_t hashed = 0; hashed < n_bytes;) {
+		size_t chunk_size = n_bytes - hashed;
+		size_t ahead = skip + hashed + READAHEAD_CHUNKS * CHUNK_SIZE;
+
+		if (chunk_size > CHUNK_SIZE)
+			chunk_size = CHUNK_SIZE;
+
+		/* Keep the disk busy with the next chunk while we hash. */
+		map_willneed(map, map_size, ahead, ahead + CHUNK_SIZE, page_size);
+		umash_sink_update(sink, map + skip + hashed, chunk_size);
+		hashed += chunk_size;
+	}
+
+	munmap(map, map_size);
+	return true;
+}
+
+/**
+ * Reads up to `n_bytes` at `offset` into `buf`, retrying on short
+ * reads.  Only returns less than `n_bytes` at EOF, or -1 on error.
+ */
+static FN ssize_t
+read_fully(int fd, char *buf, size_t n_bytes, uint64_t offset)
+{
+	size_t total = 0;
+
+	while (total < n_bytes) {
+		ssize_t r;
+
+		r = pread(fd, buf + total, n_bytes - total, (off_t)(offset + total));
+		if (r < 0) {
+			if (errno == EINTR)
+				continue;
+			return -1;
+		}
+
+		if (r == 0)
+			break;
+
+		total += r;
+	}
+
+	return total;
+}
+
+/**
+ * Opens a new file description for `fd` with O_DIRECT: we don't want
+ * to change the status flags of the caller's file description.
+ */
+static FN int
+reopen_direct(int fd)
+{
+#ifdef O_DIRECT
+	char path[64];
+
+	snprintf(path, sizeof(path), "/proc/self/fd/%d", fd);
+	return open(path, O_RDONLY | O_DIRECT | O_CLOEXEC);
+#else
+	(void)fd;
+	errno = ENOTSUP;
+	return -1;
+#endif
+}
+
+static FN bool
+fprint_pread(
+    struct umash_sink *sink, int fd, uint64_t offset, uint64_t n_bytes, bool direct)
+{
+	const size_t alignment = direct ? DIRECT_ALIGNMENT : 1;
+	uint64_t position = offset - offset % alignment;
+	size_t skip = offset % alignment;
+	int read_fd = fd;
+	char *buf = NULL;
+	bool ret = false;
+	int error;
+
+	if (direct) {
+		read_fd = reopen_direct(fd);
+		if (read_fd < 0)
+			return false;
+	} else {
+		/* These are only hints; ignore errors. */
+		(void)posix_fadvise(
+		    fd, (off_t)offset, (off_t)n_bytes, POSIX_FADV_SEQUENTIAL);
+		(void)posix_fadvise(fd, (off_t)offset, READAHEAD_CHUNKS * CHUNK_SIZE,
+		    POSIX_FADV_WILLNEED);
+	}
+
+	error = posix_memalign((void **)&buf, DIRECT_ALIGNMENT, CHUNK_SIZE);
+	if (error != 0) {
+		errno = error;
+		goto out;
+	}
+
+	while (n_bytes > 0) {
+		size_t wanted = CHUNK_SIZE;
+		size_t available;
+		ssize_t r;
+
+		if (skip + n_bytes < wanted) {
+			wanted = skip + n_bytes;
+			/* Round up to a multiple of the alignment. */
+			wanted = alignment * ((wanted + alignment - 1) / alignment);
+		}
+
+		if (!direct) {
+			(void)posix_fadvise(fd,
+			    (off_t)(position + READAHEAD_CHUNKS * CHUNK_SIZE), CHUNK_SIZE,
+			    POSIX_FADV_WILLNEED);
+		}
+
+		r = read_fully(read_fd, buf, wanted, position);
+		if (r < 0)
+			goto out;
+
+		/* We hit EOF before the end of the range. */
+		if ((size_t)r <= skip) {
+			errno = EINVAL;
+			goto out;
+		}
+
+		available = (size_t)r - skip;
+		if (available > n_bytes)
+			available = n_bytes;
+
+		umash_sink_update(sink, buf + skip, available);
+		n_bytes -= available;
+		position += r;
+		skip = 0;
+
+		if ((size_t)r < wanted && n_bytes > 0) {
+			errno = EINVAL;
+			goto out;
+		}
+	}
+
+	ret = true;
+
+out:
+	error = errno;
+	free(buf);
+	if (read_fd != fd)
+		close(read_fd);
+	errno = error;
+	return ret;
+}
+
+/**
+ * Checks that the `n_bytes` at `offset` are inside the file open as
+ * `fd`, and stores the file's metadata in `st`.
+ */
+static FN bool
+check_range(struct stat *st, int fd, uint64_t offset, uint64_t n_bytes)
+{
+
+	if (offset > INT64_MAX || n_bytes > INT64_MAX - offset) {
+		errno = EINVAL;
+		return false;
+	}
+
+	if (fstat(fd, st) != 0)
+		return false;
+
+	/*
+	 * Check the range now: touching a mapping past EOF would
+	 * SIGBUS.
+	 */
+	if (S_ISREG(st->st_mode) &&
+	    (offset > (uint64_t)st->st_size ||
+		n_bytes > (uint64_t)st->st_size - offset)) {
+		errno = EINVAL;
+		return false;
+	}
+
+	return true;
+}
+
+FN bool
+umash_fprint_fd(struct umash_fp *dst, const struct umash_params *params, uint64_t seed,
+    int fd, uint64_t offset, uint64_t n_bytes, int flags)
+{
+	struct umash_fp_state state;
+	struct stat st;
+	bool use_mmap;
+
+	if (!check_range(&st, fd, offset, n_bytes))
+		return false;
+
+	if ((flags & (UMASH_FD_PREAD | UMASH_FD_DIRECT)) != 0) {
+		use_mmap = false;
+	} else if ((flags & UMASH_FD_MMAP) != 0) {
+		use_mmap = true;
+	} else {
+		use_mmap = S_ISREG(st.st_mode) && n_bytes >= MMAP_MIN_SIZE;
+	}
+
+	if (n_bytes > SIZE_MAX / 2)
+		use_mmap = false;
+
+	umash_fp_init(&state, params, seed);
+	if (n_bytes == 0)
+		goto out;
+
+	if (use_mmap) {
+		if (fprint_mmap(&state.sink, fd, offset, n_bytes))
+			goto out;
+
+		/*
+		 * `fprint_mmap` only fails before hashing anything;
+		 * fall back to reads if we picked `mmap` ourselves.
+		 */
+		if ((flags & UMASH_FD_MMAP) != 0)
+			return false;
+	}
+
+	if (!fprint_pread(
+		&state.sink, fd, offset, n_bytes, (flags & UMASH_FD_DIRECT) != 0))
+		return false;
+
+out:
+	*dst = umash_fp_digest(&state);
+	return true;
+}
+
+/*
+ * Default number of reads in flight for `umash_fprint_fd_pipelined`,
+ * and the largest value we accept.
+ */
+#define PIPELINE_QUEUE_DEPTH 8
+#define PIPELINE_MAX_QUEUE_DEPTH 256
+
+/*
+ * We remember the partial fingerprints of up to this many segments
+ * per read in flight while waiting for an earlier segment: a slow
+ * read only stalls the pipeline once that window is full.
+ */
+#define PIPELINE_WINDOW_FACTOR 4
+
+/**
+ * A pipeline splits a range of whole UMASH blocks in segments, and
+ * merges their partial fingerprints in file order.
+ */
+struct pipeline {
+	const struct umash_params *params;
+	uint64_t seed;
+	int fd;
+	size_t alignment;
+	/* File offset of the first segment. */
+	uint64_t begin;
+	/* Total size of the segments, a multiple of UMASH_BLOCK_SIZE. */
+	uint64_t n_bytes;
+	size_t segment_size;
+	uint64_t n_segments;
+	/*
+	 * Partial fingerprints for segments in
+	 * [n_merged, n_merged + window), indexed modulo `window`.
+	 */
+	struct umash_fp_blocks *partials;
+	bool *ready;
+	size_t window;
+	uint64_t n_merged;
+	/* Partial fingerprint for segments [0, n_merged). */
+	struct umash_fp_blocks acc;
+};
+
+static FN size_t
+segment_length(const struct pipeline *p, uint64_t k)
+{
+	uint64_t remaining = p->n_bytes - k * p->segment_size;
+
+	return (remaining < p->segment_size) ? (size_t)remaining : p->segment_size;
+}
+
+/**
+ * Computes the `alignment`-aligned read that covers `n_bytes` at
+ * `offset`.  The read starts at `*position`, and the bytes we want
+ * start `*skip` bytes into the read.
+ *
+ * @return the size of the aligned read, at most `n_bytes + 2 * alignment`.
+ */
+static FN size_t
+aligned_read(
+    uint64_t *position, size_t *skip, uint64_t offset, size_t n_bytes, size_t alignment)
+{
+
+	*skip = offset % alignment;
+	*position = offset - *skip;
+	return alignment * ((*skip + n_bytes + alignment - 1) / alignment);
+}
+
+/**
+ * Reads the `n_bytes` at `offset` into `buf`, which must have room
+ * for `n_bytes + 2 * alignment` bytes.
+ *
+ * @return a pointer to the bytes in `buf`, or NULL with `errno` set.
+ */
+static FN const char *
+read_range(int fd, char *buf, uint64_t offset, size_t n_bytes, size_t alignment)
+{
+	uint64_t position;
+	size_t skip;
+	size_t wanted;
+	ssize_t r;
+
+	wanted = aligned_read(&position, &skip, offset, n_bytes, alignment);
+	r = read_fully(fd, buf, wanted, position);
+	if (r < 0)
+		return NULL;
+
+	if ((size_t)r < skip + n_bytes) {
+		errno = EINVAL;
+		return NULL;
+	}
+
+	return buf + skip;
+}
+
+static FN struct umash_fp_blocks
+hash_segment(const struct pipeline *p, uint64_t k, const char *data)
+{
+
+	return umash_fprint_blocks(
+	    p->params, p->seed, data, segment_length(p, k) / UMASH_BLOCK_SIZE);
+}
+
+/**
+ * Records the partial fingerprint for segment `k`, and merges all
+ * the segments that are now ready, in order.
+ */
+static FN void
+pipeline_store(struct pipeline *p, uint64_t k, struct umash_fp_blocks partial)
+{
+	size_t slot = k % p->window;
+
+	p->partials[slot] = partial;
+	p->ready[slot] = true;
+
+	while (p->n_merged < p->n_segments) {
+		slot = p->n_merged % p->window;
+		if (!p->ready[slot])
+			break;
+
+		p->acc = umash_fp_blocks_concat(p->params, p->acc, p->partials[slot]);
+		p->ready[slot] = false;
+		p->n_merged++;
+	}
+
+	return;
+}
+
+/**
+ * The thread pool fallback: each worker claims the next segment, reads
+ * it with a synchronous `pread`, hashes it, and merges it under the
+ * pool's lock.
+ */
+struct pool {
+	struct pipeline *pipeline;
+	pthread_mutex_t lock;
+	pthread_cond_t cond;
+	/* The next segment to read. */
+	uint64_t next;
+	/* The first error we encountered, or 0. */
+	int error;
+};
+
+static FN void *
+pool_worker(void *arg)
+{
+	struct pool *pool = arg;
+	struct pipeline *p = pool->pipeline;
+	char *buf = NULL;
+	int error;
+
+	error = posix_memalign(
+	    (void **)&buf, DIRECT_ALIGNMENT, p->segment_size + 2 * DIRECT_ALIGNMENT);
+
+	pthread_mutex_lock(&pool->lock);
+	if (error != 0 && pool->error == 0) {
+		pool->error = error;
+		pthread_cond_broadcast(&pool->cond);
+	}
+
+	while (pool->error == 0 && pool->next < p->n_segments) {
+		struct umash_fp_blocks partial;
+		const char *data;
+		uint64_t k;
+
+		/* Don't run too far ahead of the oldest pending segment. */
+		if (pool->next >= p->n_merged + p->window) {
+			pthread_cond_wait(&pool->cond, &pool->lock);
+			continue;
+		}
+
+		k = pool->next++;
+		pthread_mutex_unlock(&pool->lock);
+
+		data = read_range(p->fd, buf, p->begin + k * p->segment_size,
+		    segment_length(p, k), p->alignment);
+		if (data != NULL)
+			partial = hash_segment(p, k, data);
+		else
+			error = errno;
+
+		pthread_mutex_lock(&pool->lock);
+		if (data == NULL) {
+			if (pool->error == 0)
+				pool->error = error;
+		} else {
+			pipeline_store(p, k, partial);
+		}
+
+		pthread_cond_broadcast(&pool->cond);
+	}
+
+	pthread_mutex_unlock(&pool->lock);
+	free(buf);
+	return NULL;
+}
+
+static FN bool
+pipeline_threads(struct pipeline *p, unsigned int n_threads)
+{
+	struct pool pool = {
+		.pipeline = p,
+		.next = 0,
+		.error = 0,
+	};
+	pthread_t *threads;
+	size_t n_spawned = 0;
+
+	pthread_mutex_init(&pool.lock, NULL);
+	pthread_cond_init(&pool.cond, NULL);
+
+	/*
+	 * The calling thread is also a worker, so we can always make
+	 * progress, even if we fail to spawn any thread.
+	 */
+	threads = calloc(n_threads, sizeof(*threads));
+	for (size_t i = 1; threads != NULL && i < n_threads; i++) {
+		if (pthread_create(&threads[n_spawned], NULL, pool_worker, &pool) != 0)
+			break;
+
+		n_spawned++;
+	}
+
+	pool_worker(&pool);
+	for (size_t i = 0; i < n_spawned; i++)
+		pthread_join(threads[i], NULL);
+
+	free(threads);
+	pthread_cond_destroy(&pool.cond);
+	pthread_mutex_destroy(&pool.lock);
+
+	if (pool.error != 0) {
+		errno = pool.error;
+		return false;
+	}
+
+	return true;
+}
+
+#if UMASH_FD_IO_URING
+/**
+ * Just enough of an io_uring to issue reads and reap their
+ * completions from a single thread.
+ */
+struct uring {
+	int fd;
+	unsigned int *sq_tail;
+	unsigned int *sq_mask;
+	unsigned int *sq_array;
+	unsigned int *cq_head;
+	unsigned int *cq_tail;
+	unsigned int *cq_mask;
+	struct io_uring_sqe *sqes;
+	struct io_uring_cqe *cqes;
+
+	void *sq_ring;
+	size_t sq_ring_size;
+	/* NULL when the kernel maps both rings together. */
+	void *cq_ring;
+	size_t cq_ring_size;
+	size_t sqes_size;
+};
+
+static FN void
+uring_fini(struct uring *ring)
+{
+
+	if (ring->sqes != NULL)
+		munmap(ring->sqes, ring->sqes_size);
+	if (ring->cq_ring != NULL)
+		munmap(ring->cq_ring, ring->cq_ring_size);
+	if (ring->sq_ring != NULL)
+		munmap(ring->sq_ring, ring->sq_ring_size);
+
+	close(ring->fd);
+	return;
+}
+
+static FN void *
+uring_map(int fd, size_t size, off_t offset)
+{
+	void *ret;
+
+	ret = mmap(
+	    NULL, size, PROT_READ | PROT_WRITE, MAP_SHARED | MAP_POPULATE, fd, offset);
+	return (ret == MAP_FAILED) ? NULL : ret;
+}
+
+/**
+ * Sets up an io_uring with at least `entries` submission and
+ * completion slots.
+ *
+ * @return false on failure (e.g., ENOSYS or EPERM), with `errno` set.
+ */
+static FN bool
+uring_init(struct uring *ring, unsigned int entries)
+{
+	struct io_uring_params params;
+	char *sq, *cq;
+	int error;
+	long fd;
+
+	memset(ring, 0, sizeof(*ring));
+	memset(&params, 0, sizeof(params));
+
+	fd = syscall(__NR_io_uring_setup, entries, &params);
+	if (fd < 0)
+		return false;
+
+	ring->fd = (int)fd;
+	ring->sq_ring_size =
+	    params.sq_off.array + params.sq_entries * sizeof(unsigned int);
+	ring->cq_ring_size =
+	    params.cq_off.cqes + params.cq_entries * sizeof(struct io_uring_cqe);
+	ring->sqes_size = params.sq_entries * sizeof(struct io_uring_sqe);
+
+#ifdef IORING_FEAT_SINGLE_MMAP
+	if ((params.features & IORING_FEAT_SINGLE_MMAP) != 0) {
+		if (ring->cq_ring_size > ring->sq_ring_size)
+			ring->sq_ring_size = ring->cq_ring_size;
+		ring->cq_ring_size = 0;
+	}
+#endif
+
+	ring->sq_ring = uring_map(ring->fd, ring->sq_ring_size, IORING_OFF_SQ_RING);
+	if (ring->sq_ring == NULL)
+		goto fail;
+
+	if (ring->cq_ring_size == 0) {
+		ring->cq_ring_size = ring->sq_ring_size;
+		cq = ring->sq_ring;
+	} else {
+		ring->cq_ring =
+		    uring_map(ring->fd, ring->cq_ring_size, IORING_OFF_CQ_RING);
+		if (ring->cq_ring == NULL)
+			goto fail;
+		cq = ring->cq_ring;
+	}
+
+	ring->sqes = uring_map(ring->fd, ring->sqes_size, IORING_OFF_SQES);
+	if (ring->sqes == NULL)
+		goto fail;
+
+	sq = ring->sq_ring;
+	ring->sq_tail = (unsigned int *)(sq + params.sq_off.tail);
+	ring->sq_mask = (unsigned int *)(sq + params.sq_off.ring_mask);
+	ring->sq_array = (unsigned int *)(sq + params.sq_off.array);
+	ring->cq_head = (unsigned int *)(cq + params.cq_off.head);
+	ring->cq_tail = (unsigned int *)(cq + params.cq_off.tail);
+	ring->cq_mask = (unsigned int *)(cq + params.cq_off.ring_mask);
+	ring->cqes = (struct io_uring_cqe *)(cq + params.cq_off.cqes);
+	return true;
+
+fail:
+	error = errno;
+	uring_fini(ring);
+	errno = error;
+	return false;
+}
+
+/**
+ * Queues a read of `iov` at `position` in `fd`.  The caller must
+ * never have more reads in flight than it asked for in `uring_init`.
+ */
+static FN void
+uring_push_readv(struct uring *ring, int fd, const struct iovec *iov, uint64_t position,
+    uint64_t user_data)
+{
+	/* We're the only writer for the tail. */
+	unsigned int tail = *ring->sq_tail;
+	unsigned int index = tail & *ring->sq_mask;
+	struct io_uring_sqe *sqe = &ring->sqes[index];
+
+	memset(sqe, 0, sizeof(*sqe));
+	sqe->opcode = IORING_OP_READV;
+	sqe->fd = fd;
+	sqe->addr = (uintptr_t)iov;
+	sqe->len = 1;
+	sqe->off = position;
+	sqe->user_data = user_data;
+
+	ring->sq_array[index] = index;
+	__atomic_store_n(ring->sq_tail, tail + 1, __ATOMIC_RELEASE);
+	return;
+}
+
+/**
+ * Submits the `*n_submit` queued reads, and waits for at least
+ * `min_complete` completions.  We may return early, without any
+ * completion, if a signal interrupts the wait.
+ *
+ * On return, `*n_submit` counts the reads that are still queued: the
+ * kernel never saw them, and never will if we fail.
+ */
+static FN bool
+uring_enter(struct uring *ring, unsigned int *n_submit, unsigned int min_complete)
+{
+
+	for (;;) {
+		long r;
+
+		r = syscall(__NR_io_uring_enter, ring->fd, *n_submit, min_complete,
+		    (min_complete > 0) ? IORING_ENTER_GETEVENTS : 0, NULL, 0);
+		if (r >= 0) {
+			if ((unsigned long)r >= *n_submit) {
+				*n_submit = 0;
+				return true;
+			}
+
+			*n_submit -= (unsigned int)r;
+			continue;
+		}
+
+		if (errno != EINTR && errno != EAGAIN)
+			return false;
+	}
+}
+
+/**
+ * A read buffer for the io_uring pipeline.
+ */
+struct uring_slot {
+	char *buf;
+	struct iovec iov;
+	uint64_t segment;
+	uint64_t position;
+	size_t skip;
+};
+
+/**
+ * Finishes the read for `slot`, after its completion returned `res`,
+ * and merges the segment's fingerprint in the pipeline.
+ *
+ * @return 0 on success, an errno value on failure.
+ */
+static FN int
+uring_complete(struct pipeline *p, struct uring_slot *slot, int res)
+{
+	const size_t n_bytes = segment_length(p, slot->segment);
+	size_t got;
+
+	if (res < 0)
+		return -res;
+
+	/*
+	 * Short reads are rare; just finish them synchronously.  Resume
+	 * at an aligned offset, in case `p->fd` is open with O_DIRECT.
+	 */
+	got = (size_t)res;
+	if (got < slot->skip + n_bytes) {
+		ssize_t r;
+
+		got -= got % p->alignment;
+		r = read_fully(p->fd, slot->buf + got, slot->iov.iov_len - got,
+		    slot->position + got);
+		if (r < 0)
+			return errno;
+
+		got += (size_t)r;
+		if (got < slot->skip + n_bytes)
+			return EINVAL;
+	}
+
+	pipeline_store(
+	    p, slot->segment, hash_segment(p, slot->segment, slot->buf + slot->skip));
+	return 0;
+}
+
+/**
+ * The io_uring engine: a single thread keeps `depth` reads in flight,
+ * and hashes segments in completion order.
+ */
+static FN bool
+pipeline_uring(struct pipeline *p, struct uring *ring, unsigned int depth)
+{
+	struct uring_slot *slots;
+	size_t *free_slots;
+	size_t n_free = 0;
+	unsigned int in_flight = 0;
+	unsigned int n_submit = 0;
+	uint64_t next = 0;
+	int error = 0;
+
+	slots = calloc(depth, sizeof(*slots));
+	free_slots = calloc(depth, sizeof(*free_slots));
+	if (slots == NULL || free_slots == NULL) {
+		error = errno;
+		goto out;
+	}
+
+	for (size_t i = 0; i < depth; i++) {
+		error = posix_memalign((void **)&slots[i].buf, DIRECT_ALIGNMENT,
+		    p->segment_size + 2 * DIRECT_ALIGNMENT);
+		if (error != 0) {
+			slots[i].buf = NULL;
+			goto out;
+		}
+
+		free_slots[n_free++] = i;
+	}
+
+	while (error == 0 && p->n_merged < p->n_segments) {
+		unsigned int head, tail;
+
+		while (n_free > 0 && next < p->n_segments &&
+		    next < p->n_merged + p->window) {
+			struct uring_slot *slot = &slots[free_slots[--n_free]];
+
+			slot->segment = next++;
+			slot->iov.iov_base = slot->buf;
+			slot->iov.iov_len = aligned_read(&slot->position, &slot->skip,
+			    p->begin + slot->segment * p->segment_size,
+			    segment_length(p, slot->segment), p->alignment);
+			uring_push_readv(
+			    ring, p->fd, &slot->iov, slot->position, slot - slots);
+			n_submit++;
+		}
+
+		/* Only count reads the kernel accepted as in flight. */
+		in_flight += n_submit;
+		if (!uring_enter(ring, &n_submit, 1)) {
+			error = errno;
+			in_flight -= n_submit;
+			break;
+		}
+
+		head = *ring->cq_head;
+		tail = __atomic_load_n(ring->cq_tail, __ATOMIC_ACQUIRE);
+		for (; head != tail; head++) {
+			const struct io_uring_cqe *cqe =
+			    &ring->cqes[head & *ring->cq_mask];
+			size_t index = cqe->user_data;
+
+			in_flight--;
+			if (error == 0)
+				error = uring_complete(p, &slots[index], cqe->res);
+			free_slots[n_free++] = index;
+		}
+
+		__atomic_store_n(ring->cq_head, head, __ATOMIC_RELEASE);
+	}
+
+	/* The kernel may still write to in-flight buffers: drain them. */
+	while (in_flight > 0) {
+		unsigned int head, tail;
+		unsigned int none = 0;
+
+		if (!uring_enter(ring, &none, in_flight)) {
+			/* We can't tell when the buffers are safe to free. */
+			slots = NULL;
+			break;
+		}
+
+		head = *ring->cq_head;
+		tail = __atomic_load_n(ring->cq_tail, __ATOMIC_ACQUIRE);
+		in_flight -= tail - head;
+		__atomic_store_n(ring->cq_head, tail, __ATOMIC_RELEASE);
+	}
+
+out:
+	for (size_t i = 0; slots != NULL && i < depth; i++)
+		free(slots[i].buf);
+	free(slots);
+	free(free_slots);
+
+	if (error != 0) {
+		errno = error;
+		return false;
+	}
+
+	return true;
+}
+#endif /* UMASH_FD_IO_URING */
+
+FN bool
+umash_fprint_fd_pipelined(struct umash_fp *dst, const struct umash_params *params,
+    uint64_t seed, int fd, uint64_t offset, uint64_t n_bytes,
+    const struct umash_fd_options *options)
+{
+	struct pipeline p = {
+		.params = params,
+		.seed = seed,
+		.fd = fd,
+		.alignment = 1,
+		.begin = offset,
+	};
+	unsigned int queue_depth = PIPELINE_QUEUE_DEPTH;
+	size_t segment_size = CHUNK_SIZE;
+	const char *tail;
+	char *tail_buf = NULL;
+	uint64_t tail_size;
+	struct stat st;
+	bool ret = false;
+	int flags = 0;
+	int error;
+
+	if (options != NULL) {
+		if (options->size < sizeof(*options)) {
+			errno = EINVAL;
+			return false;
+		}
+
+		flags = options->flags;
+		if (options->queue_depth != 0)
+			queue_depth = options->queue_depth;
+		if (options->segment_size != 0)
+			segment_size = options->segment_size;
+	}
+
+	if (queue_depth > PIPELINE_MAX_QUEUE_DEPTH)
+		queue_depth = PIPELINE_MAX_QUEUE_DEPTH;
+
+	if (segment_size > SIZE_MAX / 4) {
+		errno = EINVAL;
+		return false;
+	}
+
+	/* Segments must be whole blocks, and aligned for O_DIRECT. */
+	segment_size =
+	    DIRECT_ALIGNMENT * ((segment_size + DIRECT_ALIGNMENT - 1) / DIRECT_ALIGNMENT);
+
+	if (!check_range(&st, fd, offset, n_bytes))
+		return false;
+
+	/*
+	 * The final block must be hashed last (and by
+	 * `umash_fp_blocks_digest`).  Leave at least 16 bytes after
+	 * the segments, as `umash_fp_blocks_digest` expects.
+	 */
+	if (n_bytes > 16)
+		p.n_bytes = ((n_bytes - 16) / UMASH_BLOCK_SIZE) * UMASH_BLOCK_SIZE;
+	tail_size = n_bytes - p.n_bytes;
+
+	/* Nothing to parallelise. */
+	if (p.n_bytes == 0) {
+		return umash_fprint_fd(dst, params, seed, fd, offset, n_bytes,
+		    UMASH_FD_PREAD | (flags & UMASH_FD_DIRECT));
+	}
+
+	p.segment_size = segment_size;
+	p.n_segments = (p.n_bytes + segment_size - 1) / segment_size;
+	p.window = (size_t)queue_depth * PIPELINE_WINDOW_FACTOR;
+
+	if ((flags & UMASH_FD_DIRECT) != 0) {
+		p.alignment = DIRECT_ALIGNMENT;
+		p.fd = reopen_direct(fd);
+		if (p.fd < 0)
+			return false;
+	} else {
+		/* This is only a hint; ignore errors. */
+		(void)posix_fadvise(
+		    fd, (off_t)offset, (off_t)n_bytes, POSIX_FADV_SEQUENTIAL);
+	}
+
+	p.partials = calloc(p.window, sizeof(*p.partials));
+	p.ready = calloc(p.window, sizeof(*p.ready));
+	error = posix_memalign(
+	    (void **)&tail_buf, DIRECT_ALIGNMENT, tail_size + 2 * DIRECT_ALIGNMENT);
+	if (error != 0) {
+		tail_buf = NULL;
+		errno = error;
+		goto out;
+	}
+
+	if (p.partials == NULL || p.ready == NULL)
+		goto out;
+
+	tail = read_range(p.fd, tail_buf, offset + p.n_bytes, tail_size, p.alignment);
+	if (tail == NULL)
+		goto out;
+
+#if UMASH_FD_IO_URING
+	if ((flags & UMASH_FD_THREADS) == 0) {
+		struct uring ring;
+
+		if (uring_init(&ring, queue_depth)) {
+			ret = pipeline_uring(&p, &ring, queue_depth);
+			uring_fini(&ring);
+			goto digest;
+		}
+	}
+#endif
+
+	ret = pipeline_threads(&p, queue_depth);
+
+#if UMASH_FD_IO_URING
+digest:
+#endif
+	if (ret)
+		*dst = umash_fp_blocks_digest(params, seed, p.acc, tail, tail_size);
+
+out:
+	error = errno;
+	free(tail_buf);
+	free(p.ready);
+	free(p.partials);
+	if (p.fd != fd)
+		close(p.fd);
+	errno = error;
+	return ret;
+}
@@ -0,0 +1,123 @@
+#ifndef UMASH_FD_H
+#define UMASH_FD_H
+#include "umash.h"
+
+/**
+ * # UMASH fingerprints for file descriptors
+ *
+ * SPDX-License-Identifier: MIT
+ * Copyright 2022 Backtrace I/O, Inc.
+ *
+ * `umash.c` only hashes bytes that are already in memory.  This
+ * optional companion (`umash_fd.c`, POSIX only) fingerprints byte
+ * ranges in files without making each caller write their own read
+ * loop around `umash_sink_update`.
+ *
+ * - `umash_fprint_fd` computes the same value as `umash_fprint`
+ *   would for the `n_bytes` at `offset` in the file.  The bytes are
+ *   either mapped in memory with `mmap` or read in large chunks with
+ *   `pread`, and we always hint the kernel to read ahead of the
+ *   chunk currently being hashed, so that the disk stays busy while
+ *   the CPU is hashing.
+ *
+ * - `umash_fprint_fd_pipelined` computes the same value, but keeps
+ *   several aligned reads in flight, with io_uring on Linux, or a
+ *   pool of threads otherwise.  Segments are hashed as soon as their
+ *   read completes, possibly out of order, and the partial results
+ *   are combined in file order with `umash_fp_blocks_concat`.  This
+ *   is the faster option for large files on fast storage, where a
+ *   single synchronous read stream can't saturate the device.
+ */
+
+#ifdef __cplusplus
+extern "C" {
+#endif
+
+/**
+ * Flags for `umash_fprint_fd`.  The default (0) lets the
+ * implementation pick a strategy.
+ */
+enum umash_fd_flags {
+	/*
+	 * Map the file in memory, and hash the mapped bytes directly.
+	 * This is usually the fastest option when the data is already
+	 * in the page cache.
+	 */
+	UMASH_FD_MMAP = 1 << 0,
+	/*
+	 * Read the file in large chunks into a private buffer.
+	 */
+	UMASH_FD_PREAD = 1 << 1,
+	/*
+	 * Read the file with `O_DIRECT`, bypassing the page cache.
+	 * Implies `UMASH_FD_PREAD`.  This avoids polluting the page
+	 * cache when scrubbing large volumes of cold data.
+	 */
+	UMASH_FD_DIRECT = 1 << 2,
+	/*
+	 * `umash_fprint_fd_pipelined` only: read with a pool of
+	 * threads, even when io_uring is available.
+	 */
+	UMASH_FD_THREADS = 1 << 3,
+};
+
+/**
+ * Tuning knobs for `umash_fprint_fd_pipelined`.  Zero-initialised
+ * fields take their default value.
+ */
+struct umash_fd_options {
+	/* Must be `sizeof(struct umash_fd_options)`. */
+	size_t size;
+	/*
+	 * 0 or a combination of `UMASH_FD_DIRECT` and
+	 * `UMASH_FD_THREADS`; other flags are ignored.
+	 */
+	int flags;
+	/* Number of reads in flight (default 8). */
+	unsigned int queue_depth;
+	/*
+	 * Number of bytes in each read (default 1 MB), rounded up to a
+	 * multiple of 4 KB.
+	 */
+	size_t segment_size;
+};
+
+/**
+ * Computes the UMASH fingerprint of the `n_bytes` bytes at `offset`
+ * in the file open as `fd`.
+ *
+ * The result is the same as `umash_fprint(params, seed, data,
+ * n_bytes)`, where `data` holds the same bytes as the file.  The file
+ * offset of `fd` is not modified, but `umash_fprint_fd` may issue
+ * read-ahead hints (`posix_fadvise`) on `fd`.
+ *
+ * If the file is truncated while it is mapped in memory, the process
+ * may receive a SIGBUS; pass `UMASH_FD_PREAD` to avoid that risk.
+ *
+ * @param flags 0 or a combination of `enum umash_fd_flags` values.
+ * @return false on failure, with `errno` set.  The range must be
+ *   entirely inside the file (EINVAL otherwise).
+ */
+bool umash_fprint_fd(struct umash_fp *, const struct umash_params *params, uint64_t seed,
+    int fd, uint64_t offset, uint64_t n_bytes, int flags);
+
+/**
+ * Computes the UMASH fingerprint of the `n_bytes` bytes at `offset`
+ * in the file open as `fd`, like `umash_fprint_fd`, with up to
+ * `options->queue_depth` reads in flight.
+ *
+ * The thread pool fallback spawns up to `queue_depth - 1` threads,
+ * and joins them before returning.
+ *
+ * @param options NULL for the default options.
+ * @return false on failure, with `errno` set.  The range must be
+ *   entirely inside the file (EINVAL otherwise).
+ */
+bool umash_fprint_fd_pipelined(struct umash_fp *, const struct umash_params *params,
+    uint64_t seed, int fd, uint64_t offset, uint64_t n_bytes,
+    const struct umash_fd_options *options);
+
+#ifdef __cplusplus
+}
+#endif
+#endif /* !UMASH_FD_H */
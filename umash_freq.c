@@ -0,0 +1,561 @@
+#include "umash_freq.h"
+
+/*
+ * UMASH is distributed under the MIT license.
+ *
+ * SPDX-License-Identifier: MIT
+ *
+ * Copyright 2022 Backtrace I/O, Inc.
+ */
+
+#include <errno.h>
+#include <stdint.h>
+#include <stdlib.h>
+#include <string.h>
+
+/*
+ * #define UMASH_SECTION="special_section" to emit all UMASH symbols
+ * in the `special_section` ELF section.
+ */
+#if defined(UMASH_SECTION) && defined(__GNUC__)
+#define FN __attribute__((__section__(UMASH_SECTION)))
+#else
+#define FN
+#endif
+
+#define DEFAULT_DEPTH 4
+#define DEFAULT_WIDTH_BITS 14
+
+/*
+ * Bulk operations hash this many keys before touching any counter,
+ * and prefetch the counters of the key `PREFETCH_DISTANCE` positions
+ * ahead of the one they update.
+ */
+#define HASH_BATCH 32
+#define PREFETCH_DISTANCE 4
+
+/*
+ * Serialized sketches start with a 32-byte header:
+ *
+ *  0: "UMFQ"
+ *  4: format version (1)
+ *  5: kind
+ *  6: flags (FLAG_CONSERVATIVE | FLAG_DERIVED_ROWS)
+ *  7: depth
+ *  8: width_bits
+ *  9: reserved (0)
+ * 16: bits, as a little-endian u64
+ * 24: reserved (0)
+ *
+ * followed by the counters, row by row, as little-endian i64.
+ */
+static const char header_magic[4] = "UMFQ";
+
+#define FORMAT_VERSION 1
+#define HEADER_SIZE 32
+
+enum {
+	FLAG_CONSERVATIVE = 1,
+	FLAG_DERIVED_ROWS = 2,
+};
+
+struct umash_freq {
+	enum umash_freq_kind kind;
+	unsigned int depth;
+	unsigned int width_bits;
+	bool conservative;
+	bool derived_rows;
+	bool atomic;
+	uint64_t bits;
+	/* One set of parameters, or one per row with `derived_rows`. */
+	struct umash_params *params;
+	/* `depth` rows of `2**width_bits` counters. */
+	int64_t *counters;
+};
+
+/*
+ * Stores the `depth` row hashes of the `n_bytes` key at `key` in
+ * `hashes`: the top `width_bits` of each hash select the key's
+ * counter in that row, and the next bit its sign in count sketches.
+ */
+static FN void
+hash_key(const struct umash_freq *freq, const void *key, size_t n_bytes, uint64_t *hashes)
+{
+	struct umash_fp fp;
+
+	if (freq->derived_rows) {
+		for (unsigned int i = 0; i < freq->depth; i++)
+			hashes[i] = umash_full(&freq->params[i], 0, 0, key, n_bytes);
+		return;
+	}
+
+	/*
+	 * Kirsch and Mitzenmacher's double hashing: the odd step
+	 * guarantees distinct hashes for all rows.
+	 */
+	fp = umash_fprint(freq->params, 0, key, n_bytes);
+	for (unsigned int i = 0; i < freq->depth; i++)
+		hashes[i] = fp.hash[0] + i * (fp.hash[1] | 1);
+	return;
+}
+
+static FN int64_t *
+counter_for(const struct umash_freq *freq, unsigned int row, uint64_t hash)
+{
+	size_t column = hash >> (64 - freq->width_bits);
+
+	return &freq->counters[((size_t)row << freq->width_bits) + column];
+}
+
+static FN int64_t
+sign_for(const struct umash_freq *freq, uint64_t hash)
+{
+
+	return ((hash >> (63 - freq->width_bits)) & 1) ? -1 : 1;
+}
+
+static FN int64_t
+load_counter(const struct umash_freq *freq, const int64_t *counter)
+{
+
+	if (freq->atomic)
+		return __atomic_load_n(counter, __ATOMIC_RELAXED);
+	return *counter;
+}
+
+static FN void
+add_counter(const struct umash_freq *freq, int64_t *counter, int64_t delta)
+{
+
+	if (freq->atomic) {
+		__atomic_fetch_add(counter, delta, __ATOMIC_RELAXED);
+	} else {
+		*counter = (int64_t)((uint64_t)*counter + (uint64_t)delta);
+	}
+
+	return;
+}
+
+/*
+ * Increases `counter` to at least `value`.
+ */
+static FN void
+raise_counter(const struct umash_freq *freq, int64_t *counter, int64_t value)
+{
+	int64_t current;
+
+	if (!freq->atomic) {
+		if (*counter < value)
+			*counter = value;
+		return;
+	}
+
+	current = __atomic_load_n(counter, __ATOMIC_RELAXED);
+	while (current < value &&
+	    !__atomic_compare_exchange_n(
+		counter, &current, value, true, __ATOMIC_RELAXED, __ATOMIC_RELAXED))
+		;
+	return;
+}
+
+static FN void
+prefetch_key(const struct umash_freq *freq, const uint64_t *hashes, bool write)
+{
+
+	for (unsigned int i = 0; i < freq->depth; i++) {
+		if (write)
+			__builtin_prefetch(counter_for(freq, i, hashes[i]), 1);
+		else
+			__builtin_prefetch(counter_for(freq, i, hashes[i]), 0);
+	}
+
+	return;
+}
+
+static FN int64_t
+estimate_hashes(const struct umash_freq *freq, const uint64_t *hashes)
+{
+	int64_t values[UMASH_FREQ_MAX_DEPTH];
+	unsigned int depth = freq->depth;
+
+	if (freq->kind == UMASH_FREQ_COUNT_MIN) {
+		int64_t min = INT64_MAX;
+
+		for (unsigned int i = 0; i < depth; i++) {
+			int64_t value =
+			    load_counter(freq, counter_for(freq, i, hashes[i]));
+
+			min = (value < min) ? value : min;
+		}
+
+		return min;
+	}
+
+	/* Insertion sort the signed counters, and return their median. */
+	for (unsigned int i = 0; i < depth; i++) {
+		int64_t value = sign_for(freq, hashes[i]) *
+		    load_counter(freq, counter_for(freq, i, hashes[i]));
+		unsigned int j;
+
+		for (j = i; j > 0 && values[j - 1] > value; j--)
+			values[j] = values[j - 1];
+		values[j] = value;
+	}
+
+	if (depth % 2 != 0)
+		return values[depth / 2];
+
+	/* Average without overflow, rounding towards negative infinity. */
+	return (values[depth / 2 - 1] >> 1) + (values[depth / 2] >> 1) +
+	    (values[depth / 2 - 1] & values[depth / 2] & 1);
+}
+
+static FN void
+update_hashes(struct umash_freq *freq, const uint64_t *hashes, int64_t weight)
+{
+	unsigned int depth = freq->depth;
+	int64_t target;
+
+	if (freq->kind == UMASH_FREQ_COUNT_SKETCH) {
+		for (unsigned int i = 0; i < depth; i++)
+			add_counter(freq, counter_for(freq, i, hashes[i]),
+			    sign_for(freq, hashes[i]) * weight);
+		return;
+	}
+
+	if (!freq->conservative) {
+		for (unsigned int i = 0; i < depth; i++)
+			add_counter(freq, counter_for(freq, i, hashes[i]), weight);
+		return;
+	}
+
+	/*
+	 * Conservative update: the key's weight is at most its
+	 * current estimate plus `weight`, so no counter needs to
+	 * exceed that.
+	 */
+	if (weight <= 0)
+		return;
+
+	target = estimate_hashes(freq, hashes) + weight;
+	for (unsigned int i = 0; i < depth; i++)
+		raise_counter(freq, counter_for(freq, i, hashes[i]), target);
+	return;
+}
+
+FN struct umash_freq *
+umash_freq_create(const struct umash_freq_options *options)
+{
+	static const struct umash_freq_options default_options = {
+		.size = sizeof(struct umash_freq_options),
+	};
+	struct umash_freq_options opts = { 0 };
+	struct umash_freq *ret;
+	size_t n_params;
+
+	if (options == NULL)
+		options = &default_options;
+
+	if (options->size < sizeof(size_t)) {
+		errno = EINVAL;
+		return NULL;
+	}
+
+	memcpy(&opts, options,
+	    (options->size < sizeof(opts)) ? options->size : sizeof(opts));
+	opts.size = sizeof(opts);
+
+	if (opts.depth == 0)
+		opts.depth = DEFAULT_DEPTH;
+	if (opts.width_bits == 0)
+		opts.width_bits = DEFAULT_WIDTH_BITS;
+
+	if ((opts.kind != UMASH_FREQ_COUNT_MIN && opts.kind != UMASH_FREQ_COUNT_SKETCH) ||
+	    (opts.conservative && opts.kind != UMASH_FREQ_COUNT_MIN) ||
+	    opts.depth > UMASH_FREQ_MAX_DEPTH ||
+	    opts.width_bits > UMASH_FREQ_MAX_WIDTH_BITS) {
+		errno = EINVAL;
+		return NULL;
+	}
+
+	ret = calloc(1, sizeof(*ret));
+	if (ret == NULL)
+		return NULL;
+
+	n_params = opts.derived_rows ? opts.depth : 1;
+	ret->params = calloc(n_params, sizeof(*ret->params));
+	ret->counters = calloc((size_t)opts.depth << opts.width_bits, sizeof(int64_t));
+	if (ret->params == NULL || ret->counters == NULL) {
+		umash_freq_destroy(ret);
+		return NULL;
+	}
+
+	for (size_t i = 0; i < n_params; i++)
+		umash_params_derive(&ret->params[i], opts.bits + i, opts.secret);
+
+	ret->kind = opts.kind;
+	ret->depth = opts.depth;
+	ret->width_bits = opts.width_bits;
+	ret->conservative = opts.conservative;
+	ret->derived_rows = opts.derived_rows;
+	ret->atomic = opts.atomic;
+	ret->bits = opts.bits;
+	return ret;
+}
+
+FN void
+umash_freq_destroy(struct umash_freq *freq)
+{
+
+	if (freq == NULL)
+		return;
+
+	free(freq->counters);
+	free(freq->params);
+	free(freq);
+	return;
+}
+
+FN void
+umash_freq_clear(struct umash_freq *freq)
+{
+
+	memset(freq->counters, 0,
+	    ((size_t)freq->depth << freq->width_bits) * sizeof(freq->counters[0]));
+	return;
+}
+
+FN unsigned int
+umash_freq_depth(const struct umash_freq *freq)
+{
+
+	return freq->depth;
+}
+
+FN size_t
+umash_freq_width(const struct umash_freq *freq)
+{
+
+	return (size_t)1 << freq->width_bits;
+}
+
+FN void
+umash_freq_update(
+    struct umash_freq *freq, const void *key, size_t n_bytes, int64_t weight)
+{
+	uint64_t hashes[UMASH_FREQ_MAX_DEPTH];
+
+	hash_key(freq, key, n_bytes, hashes);
+	update_hashes(freq, hashes, weight);
+	return;
+}
+
+FN void
+umash_freq_update_many(struct umash_freq *freq, const void *const *keys,
+    const size_t *n_bytes, const int64_t *weights, size_t n)
+{
+	uint64_t hashes[HASH_BATCH][UMASH_FREQ_MAX_DEPTH];
+
+	for (size_t begin = 0; begin < n; begin += HASH_BATCH) {
+		size_t count = (n - begin < HASH_BATCH) ? n - begin : HASH_BATCH;
+
+		for (size_t i = 0; i < count; i++) {
+			hash_key(freq, keys[begin + i], n_bytes[begin + i], hashes[i]);
+			if (i < PREFETCH_DISTANCE)
+				prefetch_key(freq, hashes[i], true);
+		}
+
+		for (size_t i = 0; i < count; i++) {
+			if (i + PREFETCH_DISTANCE < count)
+				prefetch_key(freq, hashes[i + PREFETCH_DISTANCE], true);
+
+			update_hashes(
+			    freq, hashes[i], (weights == NULL) ? 1 : weights[begin + i]);
+		}
+	}
+
+	return;
+}
+
+FN int64_t
+umash_freq_estimate(const struct umash_freq *freq, const void *key, size_t n_bytes)
+{
+	uint64_t hashes[UMASH_FREQ_MAX_DEPTH];
+
+	hash_key(freq, key, n_bytes, hashes);
+	return estimate_hashes(freq, hashes);
+}
+
+FN void
+umash_freq_estimate_many(const struct umash_freq *freq, const void *const *keys,
+    const size_t *n_bytes, size_t n, int64_t *estimates)
+{
+	uint64_t hashes[HASH_BATCH][UMASH_FREQ_MAX_DEPTH];
+
+	for (size_t begin = 0; begin < n; begin += HASH_BATCH) {
+		size_t count = (n - begin < HASH_BATCH) ? n - begin : HASH_BATCH;
+
+		for (size_t i = 0; i < count; i++) {
+			hash_key(freq, keys[begin + i], n_bytes[begin + i], hashes[i]);
+			if (i < PREFETCH_DISTANCE)
+				prefetch_key(freq, hashes[i], false);
+		}
+
+		for (size_t i = 0; i < count; i++) {
+			if (i + PREFETCH_DISTANCE < count)
+				prefetch_key(freq, hashes[i + PREFETCH_DISTANCE], false);
+
+			estimates[begin + i] = estimate_hashes(freq, hashes[i]);
+		}
+	}
+
+	return;
+}
+
+/*
+ * Returns whether the two sketches hash keys to the same counters.
+ */
+static FN bool
+compatible(const struct umash_freq *x, const struct umash_freq *y)
+{
+	size_t n_params = x->derived_rows ? x->depth : 1;
+
+	return x->kind == y->kind && x->depth == y->depth &&
+	    x->width_bits == y->width_bits && x->conservative == y->conservative &&
+	    x->derived_rows == y->derived_rows && x->bits == y->bits &&
+	    memcmp(x->params, y->params, n_params * sizeof(x->params[0])) == 0;
+}
+
+FN bool
+umash_freq_merge(struct umash_freq *dst, const struct umash_freq *src)
+{
+	size_t n = (size_t)dst->depth << dst->width_bits;
+
+	if (!compatible(dst, src)) {
+		errno = EINVAL;
+		return false;
+	}
+
+	if (!dst->atomic && !src->atomic) {
+		for (size_t i = 0; i < n; i++)
+			dst->counters[i] = (int64_t)((uint64_t)dst->counters[i] +
+			    (uint64_t)src->counters[i]);
+		return true;
+	}
+
+	for (size_t i = 0; i < n; i++) {
+		int64_t delta = load_counter(src, &src->counters[i]);
+
+		if (delta != 0)
+			add_counter(dst, &dst->counters[i], delta);
+	}
+
+	return true;
+}
+
+FN size_t
+umash_freq_serialized_size(const struct umash_freq *freq)
+{
+
+	return HEADER_SIZE + ((size_t)freq->depth << freq->width_bits) * sizeof(int64_t);
+}
+
+static FN void
+store_le64(uint8_t *dst, uint64_t x)
+{
+
+	for (size_t i = 0; i < 8; i++)
+		dst[i] = x >> (8 * i);
+	return;
+}
+
+static FN uint64_t
+load_le64(const uint8_t *src)
+{
+	uint64_t ret = 0;
+
+	for (size_t i = 0; i < 8; i++)
+		ret |= (uint64_t)src[i] << (8 * i);
+	return ret;
+}
+
+FN bool
+umash_freq_serialize(const struct umash_freq *freq, void *dst, size_t size)
+{
+	uint8_t *bytes = dst;
+	size_t n = (size_t)freq->depth << freq->width_bits;
+
+	if (size < umash_freq_serialized_size(freq)) {
+		errno = ENOSPC;
+		return false;
+	}
+
+	memset(bytes, 0, HEADER_SIZE);
+	memcpy(bytes, header_magic, sizeof(header_magic));
+	bytes[4] = FORMAT_VERSION;
+	bytes[5] = freq->kind;
+	bytes[6] = (freq->conservative ? FLAG_CONSERVATIVE : 0) |
+	    (freq->derived_rows ? FLAG_DERIVED_ROWS : 0);
+	bytes[7] = freq->depth;
+	bytes[8] = freq->width_bits;
+	store_le64(&bytes[16], freq->bits);
+
+	for (size_t i = 0; i < n; i++)
+		store_le64(&bytes[HEADER_SIZE + i * sizeof(int64_t)],
+		    load_counter(freq, &freq->counters[i]));
+
+	return true;
+}
+
+FN struct umash_freq *
+umash_freq_deserialize(const void *src, size_t size, const void *secret)
+{
+	static const uint8_t zeros[HEADER_SIZE];
+	const uint8_t *bytes = src;
+	struct umash_freq_options options = {
+		.size = sizeof(options),
+		.secret = secret,
+	};
+	struct umash_freq *ret;
+	size_t n;
+
+	if (size < HEADER_SIZE ||
+	    memcmp(bytes, header_magic, sizeof(header_magic)) != 0 ||
+	    bytes[4] != FORMAT_VERSION ||
+	    (bytes[6] & ~(FLAG_CONSERVATIVE | FLAG_DERIVED_ROWS)) != 0 || bytes[7] == 0 ||
+	    bytes[8] == 0 || memcmp(&bytes[9], zeros, 7) != 0 ||
+	    memcmp(&bytes[24], zeros, 8) != 0)
+		goto invalid;
+
+	options.kind = bytes[5];
+	options.conservative = (bytes[6] & FLAG_CONSERVATIVE) != 0;
+	options.derived_rows = (bytes[6] & FLAG_DERIVED_ROWS) != 0;
+	options.depth = bytes[7];
+	options.width_bits = bytes[8];
+	options.bits = load_le64(&bytes[16]);
+
+	/*
+	 * Bound the width before computing the number of counters;
+	 * `umash_freq_create` validates the other options.
+	 */
+	if (options.width_bits > UMASH_FREQ_MAX_WIDTH_BITS)
+		goto invalid;
+
+	n = (size_t)options.depth << options.width_bits;
+	if ((size - HEADER_SIZE) / sizeof(int64_t) != n ||
+	    (size - HEADER_SIZE) % sizeof(int64_t) != 0)
+		goto invalid;
+
+	ret = umash_freq_create(&options);
+	if (ret == NULL)
+		return NULL;
+
+	for (size_t i = 0; i < n; i++)
+		ret->counters[i] = load_le64(&bytes[HEADER_SIZE + i * sizeof(int64_t)]);
+
+	return ret;
+
+invalid:
+	errno = EINVAL;
+	return NULL;
+}
@@ -0,0 +1,168 @@
+#ifndef UMASH_FREQ_H
+#define UMASH_FREQ_H
+#include "umash.h"
+
+/**
+ * # Count-min and count sketches on UMASH
+ *
+ * SPDX-License-Identifier: MIT
+ * Copyright 2022 Backtrace I/O, Inc.
+ *
+ * This optional companion (`umash_freq.c`) estimates the total weight
+ * of each key in a stream (e.g., to find heavy hitters) in a fixed
+ * amount of memory, with `depth` rows of `2**width_bits` counters.
+ *
+ * - A count-min sketch adds each key's weight to one counter per
+ *   row, and estimates a key's weight as the minimum of its counters:
+ *   estimates never fall short of the true (non-negative) weight, and
+ *   exceed it by more than `e / 2**width_bits` of the total weight
+ *   with probability at most `exp(-depth)`.  The conservative update
+ *   option only increases counters as much as needed to keep that
+ *   guarantee, which tightens estimates for skewed streams, but only
+ *   accepts non-negative weights and does not commute with merges.
+ *
+ * - A count sketch also multiplies each key's weight by a random
+ *   sign per row, and returns the median of the signed counters: its
+ *   estimates are unbiased, and their error scales with the stream's
+ *   L2 norm rather than its total weight, which is much smaller for
+ *   skewed streams.
+ *
+ * Rows may hash keys with a single `umash_fprint` call (the two
+ * 64-bit hashes generate all rows by double hashing), or with one
+ * `umash_full` call per row, each with its own parameters from
+ * `umash_params_derive(bits + row, secret)`; the latter is slower,
+ * but gives fully independent rows.
+ *
+ * Sketches with atomic counters accept concurrent updates from any
+ * number of threads.  Alternatively, threads can update their own
+ * (sharded) sketches, and combine them with `umash_freq_merge`,
+ * which also combines sketches received from other nodes in the
+ * portable (little-endian) serialized format.
+ */
+
+#ifdef __cplusplus
+extern "C" {
+#endif
+
+#define UMASH_FREQ_MAX_DEPTH 16
+#define UMASH_FREQ_MAX_WIDTH_BITS 28
+
+enum umash_freq_kind {
+	UMASH_FREQ_COUNT_MIN = 0,
+	UMASH_FREQ_COUNT_SKETCH = 1,
+};
+
+/**
+ * Options for `umash_freq_create`.  Zero-initialised fields take their
+ * default value.
+ */
+struct umash_freq_options {
+	/* Must be `sizeof(struct umash_freq_options)`. */
+	size_t size;
+	enum umash_freq_kind kind;
+	/* Number of rows (default 4). */
+	unsigned int depth;
+	/* Log2 of the number of counters per row (default 14). */
+	unsigned int width_bits;
+	/* Conservative updates, for count-min sketches only. */
+	bool conservative;
+	/* Hash each row with its own parameters. */
+	bool derived_rows;
+	/* Update counters with atomic instructions. */
+	bool atomic;
+	/* `bits` argument for `umash_params_derive` (default 0). */
+	uint64_t bits;
+	/* NULL or 32 bytes, passed to `umash_params_derive`. */
+	const void *secret;
+};
+
+struct umash_freq;
+
+/**
+ * Returns a new sketch with all counters at zero, or NULL with
+ * `errno` set on failure (EINVAL for invalid options, or ENOMEM).
+ *
+ * @param options NULL for the default options.
+ */
+struct umash_freq *umash_freq_create(const struct umash_freq_options *options);
+
+void umash_freq_destroy(struct umash_freq *);
+
+/**
+ * Resets all the sketch's counters to zero.  Not atomic.
+ */
+void umash_freq_clear(struct umash_freq *);
+
+/**
+ * Returns the number of rows in the sketch.
+ */
+unsigned int umash_freq_depth(const struct umash_freq *);
+
+/**
+ * Returns the number of counters in each row of the sketch.
+ */
+size_t umash_freq_width(const struct umash_freq *);
+
+/**
+ * Adds `weight` to the weight of the `n_bytes` key at `key`.
+ * Conservative updates ignore negative weights.
+ */
+void umash_freq_update(
+    struct umash_freq *, const void *key, size_t n_bytes, int64_t weight);
+
+/**
+ * Adds `weights[i]` (1 if `weights` is NULL) to each of the `n` keys
+ * `keys[i]`, of `n_bytes[i]` bytes each.
+ */
+void umash_freq_update_many(struct umash_freq *, const void *const *keys,
+    const size_t *n_bytes, const int64_t *weights, size_t n);
+
+/**
+ * Returns the estimated weight of the `n_bytes` key at `key`.
+ */
+int64_t umash_freq_estimate(const struct umash_freq *, const void *key, size_t n_bytes);
+
+/**
+ * Stores the estimated weight of each of the `n` keys `keys[i]`
+ * (of `n_bytes[i]` bytes each) in `estimates[i]`.
+ */
+void umash_freq_estimate_many(const struct umash_freq *, const void *const *keys,
+    const size_t *n_bytes, size_t n, int64_t *estimates);
+
+/**
+ * Adds the counters of `src` to `dst`, which must have the same
+ * options (except for `atomic`), or fails with EINVAL.  The result
+ * estimates the weights in the union of the two streams.
+ *
+ * @return false with `errno` set on failure.
+ */
+bool umash_freq_merge(struct umash_freq *dst, const struct umash_freq *src);
+
+/**
+ * Returns the number of bytes `umash_freq_serialize` writes.
+ */
+size_t umash_freq_serialized_size(const struct umash_freq *);
+
+/**
+ * Writes the sketch to the `size` bytes at `dst`.
+ *
+ * @return false with `errno` set to ENOSPC if the buffer is smaller
+ *   than `umash_freq_serialized_size`.
+ */
+bool umash_freq_serialize(const struct umash_freq *, void *dst, size_t size);
+
+/**
+ * Returns a new (non-atomic) sketch with the contents of the `size`
+ * serialized bytes at `src`.
+ *
+ * @param secret the `secret` option of the serialized sketch.
+ * @return NULL with `errno` set on failure: EINVAL if the bytes are
+ *   not a valid sketch, or ENOMEM.
+ */
+struct umash_freq *umash_freq_deserialize(
+    const void *src, size_t size, const void *secret);
+
+#ifdef __cplusplus
+}
+#endif
+#endif /* !UMASH_FREQ_H */
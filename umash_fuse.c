@@ -0,0 +1,815 @@
+#define _GNU_SOURCE /* MAP_ANONYMOUS with -std=c99 */
+#include "umash_fuse.h"
+
+/*
+ * UMASH is distributed under the MIT license.
+ *
+ * SPDX-License-Identifier: MIT
+ *
+ * Copyright 2022 Backtrace I/O, Inc.
+ */
+
+#include <errno.h>
+#include <pthread.h>
+#include <stdint.h>
+#include <stdlib.h>
+#include <string.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <unistd.h>
+
+/*
+ * #define UMASH_SECTION="special_section" to emit all UMASH symbols
+ * in the `special_section` ELF section.
+ */
+#if defined(UMASH_SECTION) && defined(__GNUC__)
+#define FN __attribute__((__section__(UMASH_SECTION)))
+#else
+#define FN
+#endif
+
+#include "umash_map.inc"
+
+#define DEFAULT_MAX_ATTEMPTS 32
+#define MAX_SEGMENT_LENGTH ((uint64_t)1 << 18)
+
+/*
+ * Threads fingerprint keys in chunks of this many keys.
+ */
+#define HASH_CHUNK 4096
+
+/*
+ * Fingerprints are partitioned in buckets of about this many
+ * fingerprints on average, by the top bits of their first hash,
+ * before sorting each (tiny) bucket independently.  Threads sort
+ * chunks of SORT_CHUNK buckets at a time.
+ */
+#define SORT_BUCKET_SIZE 4
+#define SORT_CHUNK 4096
+
+static const char header_magic[8] = "UMASHFU1";
+
+/*
+ * The first 64 bytes of a filter's memory.
+ */
+struct header {
+	char magic[8];
+	uint64_t bits; /* `umash_params_derive` argument. */
+	uint64_t n_keys;
+	uint32_t segment_length;
+	uint32_t fingerprint_bits;
+	uint64_t segment_count_length;
+	uint64_t array_length;
+	uint32_t byte_order;
+	uint32_t reserved0;
+	uint64_t reserved1;
+};
+
+struct umash_fuse {
+	struct umash_params params;
+	uint64_t n_keys;
+	uint64_t segment_length_mask;
+	uint64_t segment_length;
+	uint64_t segment_count_length;
+	unsigned int fingerprint_bits;
+	const void *fingerprints;
+	const void *data; /* The header, followed by the fingerprints. */
+	size_t size;
+	/* Memory we must `munmap` on destruction, if any. */
+	void *map;
+	size_t map_size;
+};
+
+/*
+ * Shared state for the construction's parallel phases: workers
+ * claim chunks of work by incrementing `next`.
+ */
+struct build_state {
+	const struct umash_params *params;
+	const void *const *keys;
+	const size_t *n_bytes;
+	size_t n;
+	struct umash_fp *fps;
+	struct umash_fp *sorted;
+	size_t *bucket_begin; /* n_buckets + 1 offsets in sorted. */
+	size_t n_buckets;
+	unsigned int bucket_bits; /* n_buckets = 2**bucket_bits */
+	size_t next;
+};
+
+/*
+ * Returns a natural logarithm with a few digits of precision, for
+ * sizing computations that don't warrant linking with libm.
+ */
+static FN double
+approx_log(uint64_t x)
+{
+	int exponent = 63 - __builtin_clzll(x);
+	double m = (double)x / (double)((uint64_t)1 << exponent);
+	double y = (m - 1) / (m + 1); /* ln(m) = 2 atanh(y), y in [0, 1/3). */
+	double y2 = y * y;
+
+	return exponent * 0.6931471805599453 +
+	    2 * y * (1 + y2 * (1.0 / 3 + y2 * (1.0 / 5 + y2 * (1.0 / 7 + y2 / 9))));
+}
+
+/*
+ * Computes the shape of the array for `n` keys, like the reference
+ * implementation of 3-wise binary fuse filters.
+ */
+static FN void
+fuse_shape(struct header *header, uint64_t n)
+{
+	uint64_t segment_length = 4;
+	uint64_t capacity = 0;
+	uint64_t segment_count;
+
+	if (n > 1) {
+		/* 1 << floor(log(n) / log(3.33) + 2.25) */
+		segment_length = (uint64_t)1
+		    << (int)(approx_log(n) / 1.2029723039923526 + 2.25);
+		if (segment_length > MAX_SEGMENT_LENGTH)
+			segment_length = MAX_SEGMENT_LENGTH;
+
+		/* n * max(1.125, 0.875 + 0.25 * log(1e6) / log(n)), rounded. */
+		{
+			double factor = 0.875 + 0.25 * 13.815510557964274 / approx_log(n);
+
+			if (factor < 1.125)
+				factor = 1.125;
+			capacity = (uint64_t)(n * factor + 0.5);
+		}
+	}
+
+	segment_count = (capacity + segment_length - 1) / segment_length;
+	segment_count = (segment_count <= 2) ? 1 : segment_count - 2;
+
+	header->segment_length = segment_length;
+	header->segment_count_length = segment_count * segment_length;
+	header->array_length = (segment_count + 2) * segment_length;
+	return;
+}
+
+static FN uint64_t
+mulhi(uint64_t x, uint64_t y)
+{
+	__uint128_t product = x;
+
+	product *= y;
+	return product >> 64;
+}
+
+/*
+ * Computes the three slots for a key whose first hash is `hash`: one
+ * in each of three consecutive segments.
+ */
+static FN void
+fuse_slots(uint64_t slots[static 3], uint64_t hash, uint64_t segment_length,
+    uint64_t segment_count_length)
+{
+	uint64_t mask = segment_length - 1;
+
+	slots[0] = mulhi(hash, segment_count_length);
+	slots[1] = (slots[0] + segment_length) ^ ((hash >> 18) & mask);
+	slots[2] = (slots[0] + 2 * segment_length) ^ (hash & mask);
+	return;
+}
+
+static FN uint64_t
+load_fingerprint(const void *array, unsigned int bits, uint64_t i)
+{
+
+	if (bits == 8)
+		return ((const uint8_t *)array)[i];
+	return ((const uint16_t *)array)[i];
+}
+
+/*
+ * Runs `worker(state)` on up to `n_threads` threads, including the
+ * calling thread, so we always make progress, even if we fail to
+ * spawn any thread.
+ */
+static FN void
+run_parallel(void *(*worker)(void *), void *state, unsigned int n_threads)
+{
+	pthread_t *threads = NULL;
+	size_t n_spawned = 0;
+
+	if (n_threads > 1)
+		threads = calloc(n_threads, sizeof(*threads));
+
+	for (size_t i = 1; threads != NULL && i < n_threads; i++) {
+		if (pthread_create(&threads[n_spawned], NULL, worker, state) != 0)
+			break;
+
+		n_spawned++;
+	}
+
+	worker(state);
+	for (size_t i = 0; i < n_spawned; i++)
+		pthread_join(threads[i], NULL);
+
+	free(threads);
+	return;
+}
+
+static FN void *
+hash_worker(void *arg)
+{
+	struct build_state *state = arg;
+
+	for (;;) {
+		size_t begin =
+		    HASH_CHUNK * __atomic_fetch_add(&state->next, 1, __ATOMIC_RELAXED);
+		size_t end;
+
+		if (begin >= state->n)
+			break;
+
+		end = (state->n - begin < HASH_CHUNK) ? state->n : begin + HASH_CHUNK;
+		for (size_t i = begin; i < end; i++)
+			state->fps[i] = umash_fprint(
+			    state->params, 0, state->keys[i], state->n_bytes[i]);
+	}
+
+	return NULL;
+}
+
+static FN int
+cmp_fp(const void *x, const void *y)
+{
+	const struct umash_fp *a = x;
+	const struct umash_fp *b = y;
+
+	if (a->hash[0] != b->hash[0])
+		return (a->hash[0] > b->hash[0]) - (a->hash[0] < b->hash[0]);
+	return (a->hash[1] > b->hash[1]) - (a->hash[1] < b->hash[1]);
+}
+
+static FN size_t
+bucket_of(const struct umash_fp *fp, unsigned int bucket_bits)
+{
+
+	return (bucket_bits == 0) ? 0 : fp->hash[0] >> (64 - bucket_bits);
+}
+
+static FN void
+sort_bucket(struct umash_fp *fps, size_t n)
+{
+
+	if (n > 32) {
+		qsort(fps, n, sizeof(fps[0]), cmp_fp);
+		return;
+	}
+
+	for (size_t i = 1; i < n; i++) {
+		struct umash_fp x = fps[i];
+		size_t j;
+
+		for (j = i; j > 0 && cmp_fp(&fps[j - 1], &x) > 0; j--)
+			fps[j] = fps[j - 1];
+		fps[j] = x;
+	}
+
+	return;
+}
+
+static FN void *
+sort_worker(void *arg)
+{
+	struct build_state *state = arg;
+
+	for (;;) {
+		size_t begin =
+		    SORT_CHUNK * __atomic_fetch_add(&state->next, 1, __ATOMIC_RELAXED);
+		size_t end;
+
+		if (begin >= state->n_buckets)
+			break;
+
+		end = (state->n_buckets - begin < SORT_CHUNK) ? state->n_buckets :
+								begin + SORT_CHUNK;
+		for (size_t i = begin; i < end; i++) {
+			size_t first = state->bucket_begin[i];
+
+			sort_bucket(
+			    &state->sorted[first], state->bucket_begin[i + 1] - first);
+		}
+	}
+
+	return NULL;
+}
+
+/*
+ * Fingerprints all the keys with `params` and sorts the fingerprints
+ * in `sorted`, without duplicates.
+ *
+ * @return the number of distinct fingerprints.
+ */
+static FN size_t
+hash_and_sort(
+    struct build_state *state, const struct umash_params *params, unsigned int n_threads)
+{
+	size_t *bucket_begin = state->bucket_begin;
+	size_t n_buckets = state->n_buckets;
+	size_t n_unique = 0;
+
+	state->params = params;
+	state->next = 0;
+	run_parallel(hash_worker, state, n_threads);
+
+	/*
+	 * Partition by the top bits of the first hash (the slots are
+	 * monotonic in that hash), then sort buckets in parallel.
+	 */
+	memset(bucket_begin, 0, (n_buckets + 1) * sizeof(bucket_begin[0]));
+	for (size_t i = 0; i < state->n; i++)
+		bucket_begin[bucket_of(&state->fps[i], state->bucket_bits) + 1]++;
+
+	for (size_t i = 0; i < n_buckets; i++)
+		bucket_begin[i + 1] += bucket_begin[i];
+
+	/* Scattering shifts each bucket's offset to the next bucket's. */
+	for (size_t i = 0; i < state->n; i++) {
+		size_t bucket = bucket_of(&state->fps[i], state->bucket_bits);
+
+		state->sorted[bucket_begin[bucket]++] = state->fps[i];
+	}
+
+	memmove(&bucket_begin[1], &bucket_begin[0], n_buckets * sizeof(bucket_begin[0]));
+	bucket_begin[0] = 0;
+
+	state->next = 0;
+	run_parallel(sort_worker, state, n_threads);
+
+	for (size_t i = 0; i < state->n; i++) {
+		if (n_unique > 0 &&
+		    cmp_fp(&state->sorted[n_unique - 1], &state->sorted[i]) == 0)
+			continue;
+
+		state->sorted[n_unique++] = state->sorted[i];
+	}
+
+	return n_unique;
+}
+
+/*
+ * Peeling state for one slot of the filter's array.  We accumulate
+ * the xor of the fingerprints that map to the slot, so that peeling
+ * a slot with a single key directly yields its fingerprint.
+ */
+struct peel_slot {
+	struct umash_fp xor_fps;
+	/*
+	 * (number of keys in the slot) << 2, xor the index (0, 1, or 2)
+	 * of the slot for each key in the slot.
+	 */
+	uint32_t count;
+};
+
+/*
+ * Peeling state, for `array_length` slots and `n` keys.
+ */
+struct peel {
+	struct peel_slot *slots;
+	uint64_t *queue; /* Slots with one key. */
+	struct umash_fp *order; /* Keys in peeling order. */
+	uint8_t *order_slot; /* Index of the slot that peeled each key. */
+};
+
+static FN void
+peel_deinit(struct peel *peel)
+{
+
+	free(peel->slots);
+	free(peel->queue);
+	free(peel->order);
+	free(peel->order_slot);
+	return;
+}
+
+static FN bool
+peel_init(struct peel *peel, uint64_t array_length, size_t n)
+{
+
+	*peel = (struct peel) {
+		.slots = calloc(array_length, sizeof(*peel->slots)),
+		.queue = calloc(array_length, sizeof(*peel->queue)),
+		.order = calloc(n + 1, sizeof(*peel->order)),
+		.order_slot = calloc(n + 1, sizeof(*peel->order_slot)),
+	};
+
+	if (peel->slots == NULL || peel->queue == NULL || peel->order == NULL ||
+	    peel->order_slot == NULL) {
+		peel_deinit(peel);
+		errno = ENOMEM;
+		return false;
+	}
+
+	return true;
+}
+
+static FN void
+peel_toggle(struct peel_slot *slot, const struct umash_fp *fp, uint32_t index)
+{
+
+	slot->xor_fps.hash[0] ^= fp->hash[0];
+	slot->xor_fps.hash[1] ^= fp->hash[1];
+	slot->count ^= index;
+	return;
+}
+
+/*
+ * Attempts to peel the `n` sorted fingerprints in `fps` and assign
+ * the filter's slots.
+ *
+ * @return false if the keys can't be peeled.
+ */
+static FN bool
+peel_and_assign(struct peel *peel, const struct header *header, void *fingerprints,
+    const struct umash_fp *fps, size_t n)
+{
+	const uint64_t segment_length = header->segment_length;
+	const uint64_t segment_count_length = header->segment_count_length;
+	const uint64_t array_length = header->array_length;
+	struct peel_slot *state = peel->slots;
+	size_t queue_size = 0;
+	size_t n_peeled = 0;
+
+	memset(state, 0, array_length * sizeof(*state));
+
+	/* Sorted fingerprints scan the array almost sequentially. */
+	for (size_t i = 0; i < n; i++) {
+		uint64_t slots[3];
+
+		fuse_slots(slots, fps[i].hash[0], segment_length, segment_count_length);
+		for (uint32_t j = 0; j < 3; j++) {
+			state[slots[j]].count += 4;
+			peel_toggle(&state[slots[j]], &fps[i], j);
+		}
+	}
+
+	for (uint64_t i = 0; i < array_length; i++) {
+		if ((state[i].count >> 2) == 1)
+			peel->queue[queue_size++] = i;
+	}
+
+	while (queue_size > 0) {
+		uint64_t slot = peel->queue[--queue_size];
+		struct umash_fp fp;
+		uint64_t slots[3];
+		uint32_t found;
+
+		if ((state[slot].count >> 2) != 1)
+			continue;
+
+		fp = state[slot].xor_fps;
+		found = state[slot].count & 3;
+		peel->order[n_peeled] = fp;
+		peel->order_slot[n_peeled] = found;
+		n_peeled++;
+
+		fuse_slots(slots, fp.hash[0], segment_length, segment_count_length);
+		for (uint32_t j = 0; j < 3; j++) {
+			struct peel_slot *other = &state[slots[j]];
+
+			other->count -= 4;
+			peel_toggle(other, &fp, j);
+			if (j != found && (other->count >> 2) == 1)
+				peel->queue[queue_size++] = slots[j];
+		}
+	}
+
+	if (n_peeled != n)
+		return false;
+
+	/*
+	 * Assign slots in reverse peeling order: each key's peeled slot
+	 * is the only one of its three slots that later keys don't set.
+	 */
+	memset(fingerprints, 0, array_length * (header->fingerprint_bits / 8));
+	for (size_t i = n; i-- > 0;) {
+		const struct umash_fp *fp = &peel->order[i];
+		uint32_t found = peel->order_slot[i];
+		uint64_t slots[3];
+		uint64_t value = fp->hash[1];
+
+		fuse_slots(slots, fp->hash[0], segment_length, segment_count_length);
+		for (uint32_t j = 0; j < 3; j++) {
+			if (j != found)
+				value ^= load_fingerprint(
+				    fingerprints, header->fingerprint_bits, slots[j]);
+		}
+
+		if (header->fingerprint_bits == 8)
+			((uint8_t *)fingerprints)[slots[found]] = value;
+		else
+			((uint16_t *)fingerprints)[slots[found]] = value;
+	}
+
+	return true;
+}
+
+/*
+ * Checks that the `size` bytes at `data` look like a filter, and
+ * points `fuse` at them.
+ */
+static FN bool
+attach(struct umash_fuse *fuse, const void *data, size_t size, const void *secret)
+{
+	const struct header *header = data;
+	uint64_t array_size;
+
+	if (((uintptr_t)data % sizeof(uint64_t)) != 0 || size < sizeof(struct header) ||
+	    memcmp(header->magic, header_magic, sizeof(header_magic)) != 0 ||
+	    header->byte_order != HEADER_BYTE_ORDER ||
+	    (header->fingerprint_bits != 8 && header->fingerprint_bits != 16) ||
+	    header->segment_length == 0 ||
+	    (header->segment_length & (header->segment_length - 1)) != 0 ||
+	    header->segment_length > MAX_SEGMENT_LENGTH ||
+	    header->segment_count_length % header->segment_length != 0 ||
+	    header->array_length !=
+		header->segment_count_length + 2 * (uint64_t)header->segment_length ||
+	    __builtin_mul_overflow(
+		header->array_length, header->fingerprint_bits / 8, &array_size) ||
+	    size - sizeof(struct header) != array_size) {
+		errno = EINVAL;
+		return false;
+	}
+
+	umash_params_derive(&fuse->params, header->bits, secret);
+	fuse->n_keys = header->n_keys;
+	fuse->segment_length = header->segment_length;
+	fuse->segment_length_mask = header->segment_length - 1;
+	fuse->segment_count_length = header->segment_count_length;
+	fuse->fingerprint_bits = header->fingerprint_bits;
+	fuse->fingerprints = (const void *)((uintptr_t)data + sizeof(struct header));
+	fuse->data = data;
+	fuse->size = size;
+	return true;
+}
+
+FN struct umash_fuse *
+umash_fuse_build(const void *secret, const void *const *keys, const size_t *n_bytes,
+    size_t n, const struct umash_fuse_options *options)
+{
+	static const struct umash_fuse_options default_options = {
+		.size = sizeof(struct umash_fuse_options),
+	};
+	struct umash_fuse_options opts = { 0 };
+	struct build_state state = {
+		.keys = keys,
+		.n_bytes = n_bytes,
+		.n = n,
+	};
+	struct peel peel;
+	struct header *header;
+	struct umash_fuse *ret = NULL;
+	struct umash_params params;
+	uint64_t array_size;
+	size_t size = 0;
+	void *map = MAP_FAILED;
+	int error = ENOMEM;
+
+	if (options == NULL)
+		options = &default_options;
+
+	if (options->size < sizeof(size_t)) {
+		errno = EINVAL;
+		return NULL;
+	}
+
+	memcpy(&opts, options,
+	    (options->size < sizeof(opts)) ? options->size : sizeof(opts));
+	opts.size = sizeof(opts);
+
+	if (opts.max_attempts == 0)
+		opts.max_attempts = DEFAULT_MAX_ATTEMPTS;
+	if (opts.fingerprint_bits == 0)
+		opts.fingerprint_bits = 8;
+	if (opts.n_threads == 0) {
+		long n_cpus = sysconf(_SC_NPROCESSORS_ONLN);
+
+		opts.n_threads = (n_cpus > 0) ? (unsigned int)n_cpus : 1;
+	}
+
+	if (opts.fingerprint_bits != 8 && opts.fingerprint_bits != 16) {
+		errno = EINVAL;
+		return NULL;
+	}
+
+	if (n > SIZE_MAX / sizeof(struct umash_fp)) {
+		errno = ENOMEM;
+		return NULL;
+	}
+
+	while (
+	    state.bucket_bits < 48 && ((size_t)SORT_BUCKET_SIZE << state.bucket_bits) < n)
+		state.bucket_bits++;
+	state.n_buckets = (size_t)1 << state.bucket_bits;
+
+	state.fps = malloc(n * sizeof(*state.fps) + 1);
+	state.sorted = malloc(n * sizeof(*state.sorted) + 1);
+	state.bucket_begin = calloc(state.n_buckets + 1, sizeof(*state.bucket_begin));
+	if (state.fps == NULL || state.sorted == NULL || state.bucket_begin == NULL)
+		goto out;
+
+	for (unsigned int attempt = 0; attempt < opts.max_attempts; attempt++) {
+		struct header shape = { .fingerprint_bits = opts.fingerprint_bits };
+		uint64_t bits = opts.bits + attempt;
+		size_t n_unique;
+
+		umash_params_derive(&params, bits, secret);
+		n_unique = hash_and_sort(&state, &params, opts.n_threads);
+		fuse_shape(&shape, n_unique);
+
+		if (map == MAP_FAILED) {
+			/* The shape only depends on the number of unique keys. */
+			if (__builtin_mul_overflow(shape.array_length,
+				opts.fingerprint_bits / 8, &array_size) ||
+			    array_size > SIZE_MAX - sizeof(struct header))
+				goto out;
+
+			size = sizeof(struct header) + array_size;
+			map = mmap(NULL, size, PROT_READ | PROT_WRITE,
+			    MAP_PRIVATE | MAP_ANONYMOUS, -1, 0);
+			if (map == MAP_FAILED)
+				goto out;
+
+			if (!peel_init(&peel, shape.array_length, n_unique)) {
+				munmap(map, size);
+				map = MAP_FAILED;
+				goto out;
+			}
+		}
+
+		header = map;
+		if (!peel_and_assign(&peel, &shape,
+			(void *)((uintptr_t)map + sizeof(struct header)), state.sorted,
+			n_unique))
+			continue;
+
+		memcpy(shape.magic, header_magic, sizeof(header_magic));
+		shape.bits = bits;
+		shape.n_keys = n_unique;
+		shape.byte_order = HEADER_BYTE_ORDER;
+		*header = shape;
+		error = 0;
+		break;
+	}
+
+	if (map != MAP_FAILED)
+		peel_deinit(&peel);
+
+	if (error == ENOMEM && map != MAP_FAILED)
+		error = EAGAIN;
+
+	if (error != 0)
+		goto out;
+
+	ret = calloc(1, sizeof(*ret));
+	if (ret == NULL) {
+		error = ENOMEM;
+		goto out;
+	}
+
+	ret->map = map;
+	ret->map_size = size;
+	map = MAP_FAILED;
+	if (!attach(ret, ret->map, size, secret)) {
+		error = errno;
+		umash_fuse_destroy(ret);
+		ret = NULL;
+	}
+
+out:
+	if (map != MAP_FAILED)
+		munmap(map, size);
+	free(state.fps);
+	free(state.sorted);
+	free(state.bucket_begin);
+	if (ret == NULL)
+		errno = error;
+	return ret;
+}
+
+FN struct umash_fuse *
+umash_fuse_view(const void *data, size_t size, const void *secret)
+{
+	struct umash_fuse *ret;
+
+	ret = calloc(1, sizeof(*ret));
+	if (ret == NULL)
+		return NULL;
+
+	if (!attach(ret, data, size, secret)) {
+		free(ret);
+		return NULL;
+	}
+
+	return ret;
+}
+
+FN struct umash_fuse *
+umash_fuse_open_fd(int fd, const void *secret)
+{
+	struct umash_fuse *ret;
+
+	ret = calloc(1, sizeof(*ret));
+	if (ret == NULL)
+		return NULL;
+
+	ret->map = map_fd(fd, sizeof(struct header), &ret->map_size);
+	if (ret->map == NULL) {
+		free(ret);
+		return NULL;
+	}
+
+	if (!attach(ret, ret->map, ret->map_size, secret)) {
+		int error = errno;
+
+		umash_fuse_destroy(ret);
+		errno = error;
+		return NULL;
+	}
+
+	return ret;
+}
+
+FN void
+umash_fuse_destroy(struct umash_fuse *fuse)
+{
+
+	if (fuse == NULL)
+		return;
+
+	if (fuse->map != NULL)
+		munmap(fuse->map, fuse->map_size);
+
+	free(fuse);
+	return;
+}
+
+FN const void *
+umash_fuse_data(const struct umash_fuse *fuse, size_t *size)
+{
+
+	*size = fuse->size;
+	return fuse->data;
+}
+
+FN const struct umash_params *
+umash_fuse_params(const struct umash_fuse *fuse)
+{
+
+	return &fuse->params;
+}
+
+FN uint64_t
+umash_fuse_size(const struct umash_fuse *fuse)
+{
+
+	return fuse->n_keys;
+}
+
+FN bool
+umash_fuse_contains_fp(const struct umash_fuse *fuse, const struct umash_fp *fp)
+{
+	uint64_t slots[3];
+	uint64_t value = fp->hash[1];
+
+	fuse_slots(slots, fp->hash[0], fuse->segment_length, fuse->segment_count_length);
+	if (fuse->fingerprint_bits == 8) {
+		const uint8_t *array = fuse->fingerprints;
+
+		return (uint8_t)value ==
+		    (array[slots[0]] ^ array[slots[1]] ^ array[slots[2]]);
+	} else {
+		const uint16_t *array = fuse->fingerprints;
+
+		return (uint16_t)value ==
+		    (array[slots[0]] ^ array[slots[1]] ^ array[slots[2]]);
+	}
+}
+
+FN bool
+umash_fuse_contains(const struct umash_fuse *fuse, const void *key, size_t n_bytes)
+{
+	struct umash_fp fp = umash_fprint(&fuse->params, 0, key, n_bytes);
+
+	return umash_fuse_contains_fp(fuse, &fp);
+}
+
+FN size_t
+umash_fuse_contains_many(const struct umash_fuse *fuse, const void *const *keys,
+    const size_t *n_bytes, size_t n, bool *found)
+{
+	size_t ret = 0;
+
+	for (size_t i = 0; i < n; i++) {
+		found[i] = umash_fuse_contains(fuse, keys[i], n_bytes[i]);
+		ret += found[i];
+	}
+
+	return ret;
+}
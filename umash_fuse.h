@@ -0,0 +1,145 @@
+#ifndef UMASH_FUSE_H
+#define UMASH_FUSE_H
+#include "umash.h"
+
+/**
+ * # Binary fuse filters on UMASH fingerprints
+ *
+ * SPDX-License-Identifier: MIT
+ * Copyright 2022 Backtrace I/O, Inc.
+ *
+ * This optional companion (`umash_fuse.c`, POSIX threads) builds
+ * static approximate membership filters for immutable key sets
+ * (e.g., sealed tables or published block lists), with the
+ * [binary fuse](https://arxiv.org/abs/2201.01174) construction of
+ * Graf and Lemire.  A binary fuse filter with 8-bit fingerprints has
+ * a false positive rate of 1/256 for about 9 bits per key, less than
+ * a Bloom filter at the same rate (and 16-bit fingerprints give
+ * 1/65536 for 18 bits per key).
+ *
+ * - Each key is fingerprinted once with `umash_fprint`.  The first
+ *   hash maps the key to three slots in consecutive segments of the
+ *   filter's array, and the second gives the key's 8 or 16 bit
+ *   fingerprint; a key is (probably) in the set iff its fingerprint
+ *   is the xor of its three slots.
+ *
+ * - Construction fingerprints and sorts the keys with a pool of
+ *   threads, then assigns the slots by "peeling", a sequential pass
+ *   that fails with low probability.  After a failure, we retry with
+ *   the parameters `umash_params_derive` generates from the next
+ *   `bits` value (and the same secret key).  The filter records the
+ *   `bits` value that worked, and derives the same parameters
+ *   whenever it's loaded with the same secret.
+ *
+ * - A filter's memory is its serialized format: a 64-byte header
+ *   followed by the fingerprint array, in native byte order.  Writing
+ *   the bytes returned by `umash_fuse_data` to a file, and opening
+ *   that file with `umash_fuse_open_fd` (or any copy of the bytes with
+ *   `umash_fuse_view`) gives a filter without copying or parsing.
+ */
+
+#ifdef __cplusplus
+extern "C" {
+#endif
+
+/**
+ * Options for `umash_fuse_build`.  Zero-initialised fields take their
+ * default value.
+ */
+struct umash_fuse_options {
+	/* Must be `sizeof(struct umash_fuse_options)`. */
+	size_t size;
+	/* First `bits` argument for `umash_params_derive` (default 0). */
+	uint64_t bits;
+	/* Number of construction attempts before giving up (default 32). */
+	unsigned int max_attempts;
+	/* 8 (default) or 16. */
+	unsigned int fingerprint_bits;
+	/* Number of threads, including the caller (default: one per CPU). */
+	unsigned int n_threads;
+};
+
+struct umash_fuse;
+
+/**
+ * Builds a filter for the `n` keys `keys[i]`, of `n_bytes[i]` bytes
+ * each.  Duplicate keys are fine.
+ *
+ * @param secret NULL or 32 bytes, passed to `umash_params_derive`.
+ * @param options NULL for the default options.
+ * @return NULL with `errno` set on failure: EINVAL for invalid
+ *   options, EAGAIN if all attempts failed, or ENOMEM.
+ */
+struct umash_fuse *umash_fuse_build(const void *secret, const void *const *keys,
+    const size_t *n_bytes, size_t n, const struct umash_fuse_options *options);
+
+/**
+ * Returns a filter backed by the `size` bytes at `data`, which must
+ * be a copy of the bytes returned by `umash_fuse_data`, aligned to 8
+ * bytes, and outlive the filter.
+ *
+ * @param secret the `secret` argument to `umash_fuse_build`.
+ * @return NULL with `errno` set to EINVAL if the bytes are not a
+ *   valid filter, or ENOMEM.
+ */
+struct umash_fuse *umash_fuse_view(const void *data, size_t size, const void *secret);
+
+/**
+ * Maps the filter in the file open as `fd` (e.g., written from
+ * `umash_fuse_data`) in memory, and returns a filter backed by that
+ * mapping.  The file descriptor may be closed immediately.
+ *
+ * @param secret the `secret` argument to `umash_fuse_build`.
+ * @return NULL with `errno` set on failure.
+ */
+struct umash_fuse *umash_fuse_open_fd(int fd, const void *secret);
+
+/**
+ * Releases the filter, and any memory it owns or mapped.
+ */
+void umash_fuse_destroy(struct umash_fuse *);
+
+/**
+ * Returns the filter's serialized bytes, and stores their size in
+ * `size`.
+ */
+const void *umash_fuse_data(const struct umash_fuse *, size_t *size);
+
+/**
+ * Returns the parameters that fingerprint keys for this filter, e.g.,
+ * to call `umash_fuse_contains_fp` on fingerprints computed elsewhere
+ * with `umash_fprint(params, 0, ...)`.
+ */
+const struct umash_params *umash_fuse_params(const struct umash_fuse *);
+
+/**
+ * Returns the number of distinct keys in the filter.
+ */
+uint64_t umash_fuse_size(const struct umash_fuse *);
+
+/**
+ * Returns whether the fingerprint may belong to a key in the filter:
+ * false if it definitely doesn't, true otherwise.
+ */
+bool umash_fuse_contains_fp(const struct umash_fuse *, const struct umash_fp *);
+
+/**
+ * Returns whether the `n_bytes` key at `key` may be in the filter:
+ * false if it definitely isn't, true otherwise.
+ */
+bool umash_fuse_contains(const struct umash_fuse *, const void *key, size_t n_bytes);
+
+/**
+ * Checks whether each of the `n` keys `keys[i]` (of `n_bytes[i]`
+ * bytes each) may be in the filter, and stores the result in
+ * `found[i]`.
+ *
+ * @return the number of true results.
+ */
+size_t umash_fuse_contains_many(const struct umash_fuse *, const void *const *keys,
+    const size_t *n_bytes, size_t n, bool *found);
+
+#ifdef __cplusplus
+}
+#endif
+#endif /* !UMASH_FUSE_H */
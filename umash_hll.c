@@ -0,0 +1,740 @@
+#include "umash_hll.h"
+
+/*
+ * UMASH is distributed under the MIT license.
+ *
+ * SPDX-License-Identifier: MIT
+ *
+ * Copyright 2022 Backtrace I/O, Inc.
+ */
+
+#include <errno.h>
+#include <stdint.h>
+#include <stdlib.h>
+#include <string.h>
+
+#if defined(__SSE2__)
+#include <emmintrin.h>
+#endif
+
+/*
+ * #define UMASH_SECTION="special_section" to emit all UMASH symbols
+ * in the `special_section` ELF section.
+ */
+#if defined(UMASH_SECTION) && defined(__GNUC__)
+#define FN __attribute__((__section__(UMASH_SECTION)))
+#else
+#define FN
+#endif
+
+#define DEFAULT_PRECISION 14
+
+/*
+ * Sparse entries are registers of a precision-25 sketch, encoded as
+ * `index << 6 | value`: sorting entries sorts them by index.
+ */
+#define SPARSE_PRECISION 25
+#define SPARSE_VALUE_BITS 6
+#define SPARSE_VALUE_MASK ((1U << SPARSE_VALUE_BITS) - 1)
+
+/*
+ * Bulk insertions hash this many keys at a time, before updating
+ * the sketch.
+ */
+#define HASH_BATCH 64
+
+/*
+ * Serialized sketches start with a 16-byte header:
+ *
+ *  0: "UMHL"
+ *  4: format version (1)
+ *  5: precision
+ *  6: encoding (0 for sparse, 1 for dense)
+ *  7: reserved (0)
+ *  8: number of sparse entries, as a little-endian u32
+ * 12: `params_check` for the sketch's UMASH parameters and seed,
+ *     as a little-endian u32
+ *
+ * followed by the sparse entries (as little-endian u32), or by one
+ * byte per dense register.
+ */
+static const char header_magic[4] = "UMHL";
+
+#define FORMAT_VERSION 1
+#define HEADER_SIZE 16
+
+enum encoding {
+	ENCODING_SPARSE = 0,
+	ENCODING_DENSE = 1,
+};
+
+struct umash_hll {
+	const struct umash_params *params;
+	uint64_t seed;
+	/* `params_check(params, seed)`. */
+	uint32_t params_check;
+	unsigned int precision;
+	bool start_dense;
+	/* Dense registers, or NULL for sparse sketches. */
+	uint8_t *registers;
+	/* Sorted sparse entries, with distinct register indices. */
+	uint32_t *entries;
+	size_t n_entries;
+	size_t capacity;
+	/* Switch to dense registers rather than grow past this. */
+	size_t max_entries;
+	struct umash_params own_params;
+};
+
+/*
+ * Returns a short identifier for the hash function: sketches built
+ * with different parameters or seeds hash the same key to unrelated
+ * registers, and must not be merged.
+ */
+static FN uint32_t
+params_check(const struct umash_params *params, uint64_t seed)
+{
+	static const char tag[] = "umash_hll params";
+
+	return (uint32_t)umash_full(params, seed, 0, tag, sizeof(tag) - 1);
+}
+
+/*
+ * Returns the value of the register for `hash` in a sketch with
+ * `precision`: the number of leading zeros after the index bits,
+ * plus one.
+ */
+static FN uint8_t
+register_value(uint64_t hash, unsigned int precision)
+{
+	uint64_t w = hash << precision;
+
+	if (w == 0)
+		return 64 - precision + 1;
+
+	return __builtin_clzll(w) + 1;
+}
+
+static FN uint32_t
+sparse_entry(uint64_t hash)
+{
+	uint32_t index = hash >> (64 - SPARSE_PRECISION);
+
+	return (index << SPARSE_VALUE_BITS) | register_value(hash, SPARSE_PRECISION);
+}
+
+/*
+ * Converts a sparse entry to its dense register index and value:
+ * each precision-25 register determines a precision-p register.
+ */
+static FN void
+sparse_to_dense(uint32_t entry, unsigned int precision, size_t *index, uint8_t *value)
+{
+	const unsigned int extra = SPARSE_PRECISION - precision;
+	uint32_t sparse_index = entry >> SPARSE_VALUE_BITS;
+	uint32_t low = sparse_index & ((1U << extra) - 1);
+
+	*index = sparse_index >> extra;
+	if (low != 0)
+		*value = __builtin_clz(low) - (32 - extra) + 1;
+	else
+		*value = extra + (entry & SPARSE_VALUE_MASK);
+	return;
+}
+
+static FN void
+dense_update(uint8_t *registers, size_t index, uint8_t value)
+{
+
+	if (registers[index] < value)
+		registers[index] = value;
+	return;
+}
+
+static FN void
+dense_update_entry(struct umash_hll *hll, uint32_t entry)
+{
+	size_t index;
+	uint8_t value;
+
+	sparse_to_dense(entry, hll->precision, &index, &value);
+	dense_update(hll->registers, index, value);
+	return;
+}
+
+static FN bool
+convert_to_dense(struct umash_hll *hll)
+{
+	uint8_t *registers;
+
+	registers = calloc((size_t)1 << hll->precision, 1);
+	if (registers == NULL)
+		return false;
+
+	hll->registers = registers;
+	for (size_t i = 0; i < hll->n_entries; i++)
+		dense_update_entry(hll, hll->entries[i]);
+
+	free(hll->entries);
+	hll->entries = NULL;
+	hll->n_entries = hll->capacity = 0;
+	return true;
+}
+
+/*
+ * Returns the position of the first entry whose register index is
+ * at least `entry`'s.
+ */
+static FN size_t
+sparse_search(const struct umash_hll *hll, uint32_t entry)
+{
+	size_t lo = 0, hi = hll->n_entries;
+
+	entry &= ~SPARSE_VALUE_MASK;
+	while (lo < hi) {
+		size_t mid = lo + (hi - lo) / 2;
+
+		if (hll->entries[mid] < entry)
+			lo = mid + 1;
+		else
+			hi = mid;
+	}
+
+	return lo;
+}
+
+/*
+ * Adds a sparse entry to the sketch, whether it's sparse or dense.
+ */
+static FN bool
+update(struct umash_hll *hll, uint32_t entry)
+{
+	size_t i;
+
+	if (hll->registers != NULL) {
+		dense_update_entry(hll, entry);
+		return true;
+	}
+
+	i = sparse_search(hll, entry);
+	if (i < hll->n_entries &&
+	    (hll->entries[i] >> SPARSE_VALUE_BITS) == (entry >> SPARSE_VALUE_BITS)) {
+		if (hll->entries[i] < entry)
+			hll->entries[i] = entry;
+		return true;
+	}
+
+	if (hll->n_entries == hll->capacity) {
+		size_t capacity = 2 * hll->capacity;
+		uint32_t *grown;
+
+		/*
+		 * Past `max_entries`, the dense registers take less
+		 * memory than the sparse list.
+		 */
+		if (hll->capacity >= hll->max_entries) {
+			if (!convert_to_dense(hll))
+				return false;
+
+			dense_update_entry(hll, entry);
+			return true;
+		}
+
+		if (capacity < 4)
+			capacity = 4;
+		if (capacity > hll->max_entries)
+			capacity = hll->max_entries;
+
+		grown = realloc(hll->entries, capacity * sizeof(*grown));
+		if (grown == NULL)
+			return false;
+
+		hll->entries = grown;
+		hll->capacity = capacity;
+	}
+
+	memmove(&hll->entries[i + 1], &hll->entries[i],
+	    (hll->n_entries - i) * sizeof(hll->entries[0]));
+	hll->entries[i] = entry;
+	hll->n_entries++;
+	return true;
+}
+
+static FN bool
+insert_hashes(struct umash_hll *hll, const uint64_t *hashes, size_t n)
+{
+
+	if (hll->registers != NULL) {
+		const unsigned int precision = hll->precision;
+
+		for (size_t i = 0; i < n; i++)
+			dense_update(hll->registers, hashes[i] >> (64 - precision),
+			    register_value(hashes[i], precision));
+		return true;
+	}
+
+	for (size_t i = 0; i < n; i++) {
+		if (!update(hll, sparse_entry(hashes[i])))
+			return false;
+	}
+
+	return true;
+}
+
+/*
+ * sigma and tau from Ertl's paper, with their series evaluated until
+ * they converge to double precision.
+ */
+static FN double
+ertl_sigma(double x)
+{
+	double y = 1;
+	double z = x;
+
+	if (x == 1)
+		return __builtin_inf();
+
+	for (;;) {
+		double prev = z;
+
+		x *= x;
+		z += x * y;
+		y += y;
+		if (z == prev)
+			return z;
+	}
+}
+
+/*
+ * Newton's method is enough for the square roots of numbers in
+ * [0, 1] that `ertl_tau` needs, without linking with libm.
+ */
+static FN double
+approx_sqrt(double x)
+{
+	double r = 1;
+
+	if (x <= 0)
+		return 0;
+
+	for (size_t i = 0; i < 100; i++) {
+		double next = 0.5 * (r + x / r);
+
+		if (next == r)
+			break;
+		r = next;
+	}
+
+	return r;
+}
+
+static FN double
+ertl_tau(double x)
+{
+	double y = 1;
+	double z = 1 - x;
+
+	if (x == 0 || x == 1)
+		return 0;
+
+	for (;;) {
+		double prev = z;
+
+		x = approx_sqrt(x);
+		y *= 0.5;
+		z -= (1 - x) * (1 - x) * y;
+		if (z == prev)
+			return z / 3;
+	}
+}
+
+/*
+ * Ertl's improved raw estimator, for `m` registers of `q + 1` bits
+ * hash suffixes, given the histogram `counts[0 ... q + 1]` of their
+ * values.
+ */
+static FN double
+ertl_estimate(const uint64_t *counts, unsigned int q, double m)
+{
+	double z = m * ertl_tau(1 - counts[q + 1] / m);
+
+	for (unsigned int k = q; k >= 1; k--)
+		z = 0.5 * (z + counts[k]);
+
+	z += m * ertl_sigma(counts[0] / m);
+	/* alpha_inf = 1 / (2 ln 2) */
+	return 0.7213475204444817 * m * m / z;
+}
+
+FN struct umash_hll *
+umash_hll_create(const struct umash_hll_options *options)
+{
+	static const struct umash_hll_options default_options = {
+		.size = sizeof(struct umash_hll_options),
+	};
+	struct umash_hll_options opts = { 0 };
+	struct umash_hll *ret;
+
+	if (options == NULL)
+		options = &default_options;
+
+	if (options->size < sizeof(size_t)) {
+		errno = EINVAL;
+		return NULL;
+	}
+
+	memcpy(&opts, options,
+	    (options->size < sizeof(opts)) ? options->size : sizeof(opts));
+	opts.size = sizeof(opts);
+
+	if (opts.precision == 0)
+		opts.precision = DEFAULT_PRECISION;
+
+	if (opts.precision < UMASH_HLL_MIN_PRECISION ||
+	    opts.precision > UMASH_HLL_MAX_PRECISION) {
+		errno = EINVAL;
+		return NULL;
+	}
+
+	ret = calloc(1, sizeof(*ret));
+	if (ret == NULL)
+		return NULL;
+
+	if (opts.params == NULL) {
+		umash_params_derive(&ret->own_params, 0, NULL);
+		opts.params = &ret->own_params;
+	}
+
+	ret->params = opts.params;
+	ret->seed = opts.seed;
+	ret->params_check = params_check(opts.params, opts.seed);
+	ret->precision = opts.precision;
+	ret->start_dense = opts.dense;
+	/* Each entry takes 4 bytes, vs 1 byte per dense register. */
+	ret->max_entries = ((size_t)1 << opts.precision) / sizeof(uint32_t);
+	if (opts.dense && !convert_to_dense(ret)) {
+		free(ret);
+		return NULL;
+	}
+
+	return ret;
+}
+
+FN void
+umash_hll_destroy(struct umash_hll *hll)
+{
+
+	if (hll == NULL)
+		return;
+
+	free(hll->registers);
+	free(hll->entries);
+	free(hll);
+	return;
+}
+
+FN void
+umash_hll_clear(struct umash_hll *hll)
+{
+
+	hll->n_entries = 0;
+	if (hll->registers == NULL)
+		return;
+
+	if (hll->start_dense) {
+		memset(hll->registers, 0, (size_t)1 << hll->precision);
+	} else {
+		free(hll->registers);
+		hll->registers = NULL;
+	}
+
+	return;
+}
+
+FN unsigned int
+umash_hll_precision(const struct umash_hll *hll)
+{
+
+	return hll->precision;
+}
+
+FN bool
+umash_hll_is_dense(const struct umash_hll *hll)
+{
+
+	return hll->registers != NULL;
+}
+
+FN bool
+umash_hll_insert(struct umash_hll *hll, const void *data, size_t n_bytes)
+{
+
+	return umash_hll_insert_hash(
+	    hll, umash_full(hll->params, hll->seed, 0, data, n_bytes));
+}
+
+FN bool
+umash_hll_insert_hash(struct umash_hll *hll, uint64_t hash)
+{
+
+	return insert_hashes(hll, &hash, 1);
+}
+
+FN bool
+umash_hll_insert_many(
+    struct umash_hll *hll, const void *const *keys, const size_t *n_bytes, size_t n)
+{
+	uint64_t hashes[HASH_BATCH];
+
+	for (size_t begin = 0; begin < n; begin += HASH_BATCH) {
+		size_t count = (n - begin < HASH_BATCH) ? n - begin : HASH_BATCH;
+
+		for (size_t i = 0; i < count; i++)
+			hashes[i] = umash_full(hll->params, hll->seed, 0, keys[begin + i],
+			    n_bytes[begin + i]);
+
+		if (!insert_hashes(hll, hashes, count))
+			return false;
+	}
+
+	return true;
+}
+
+FN bool
+umash_hll_insert_rows(struct umash_hll *hll, const void *rows, size_t row_size, size_t n)
+{
+	const char *bytes = rows;
+	uint64_t hashes[HASH_BATCH];
+
+	for (size_t begin = 0; begin < n; begin += HASH_BATCH) {
+		size_t count = (n - begin < HASH_BATCH) ? n - begin : HASH_BATCH;
+
+		for (size_t i = 0; i < count; i++)
+			hashes[i] = umash_full(hll->params, hll->seed, 0,
+			    bytes + (begin + i) * row_size, row_size);
+
+		if (!insert_hashes(hll, hashes, count))
+			return false;
+	}
+
+	return true;
+}
+
+FN double
+umash_hll_estimate(const struct umash_hll *hll)
+{
+	uint64_t counts[64 - UMASH_HLL_MIN_PRECISION + 2] = { 0 };
+
+	if (hll->registers == NULL) {
+		for (size_t i = 0; i < hll->n_entries; i++)
+			counts[hll->entries[i] & SPARSE_VALUE_MASK]++;
+
+		counts[0] = ((uint64_t)1 << SPARSE_PRECISION) - hll->n_entries;
+		return ertl_estimate(counts, 64 - SPARSE_PRECISION,
+		    (double)((uint64_t)1 << SPARSE_PRECISION));
+	}
+
+	for (size_t i = 0, m = (size_t)1 << hll->precision; i < m; i++)
+		counts[hll->registers[i]]++;
+
+	return ertl_estimate(
+	    counts, 64 - hll->precision, (double)((uint64_t)1 << hll->precision));
+}
+
+/*
+ * dst[i] = max(dst[i], src[i]) for the `m` (a multiple of 16)
+ * registers.
+ */
+static FN void
+dense_merge(uint8_t *dst, const uint8_t *src, size_t m)
+{
+#if defined(__SSE2__)
+	for (size_t i = 0; i < m; i += 16) {
+		__m128i x = _mm_loadu_si128((const __m128i *)&dst[i]);
+		__m128i y = _mm_loadu_si128((const __m128i *)&src[i]);
+
+		_mm_storeu_si128((__m128i *)&dst[i], _mm_max_epu8(x, y));
+	}
+#else
+	for (size_t i = 0; i < m; i++)
+		dense_update(dst, i, src[i]);
+#endif
+	return;
+}
+
+FN bool
+umash_hll_merge(struct umash_hll *dst, const struct umash_hll *src)
+{
+
+	if (dst->precision != src->precision || dst->seed != src->seed ||
+	    (dst->params != src->params &&
+		memcmp(dst->params, src->params, sizeof(*dst->params)) != 0)) {
+		errno = EINVAL;
+		return false;
+	}
+
+	if (src->registers == NULL) {
+		for (size_t i = 0; i < src->n_entries; i++) {
+			if (!update(dst, src->entries[i]))
+				return false;
+		}
+
+		return true;
+	}
+
+	if (dst->registers == NULL && !convert_to_dense(dst))
+		return false;
+
+	dense_merge(dst->registers, src->registers, (size_t)1 << dst->precision);
+	return true;
+}
+
+FN size_t
+umash_hll_serialized_size(const struct umash_hll *hll)
+{
+
+	if (hll->registers != NULL)
+		return HEADER_SIZE + ((size_t)1 << hll->precision);
+
+	return HEADER_SIZE + hll->n_entries * sizeof(uint32_t);
+}
+
+static FN void
+store_le32(uint8_t *dst, uint32_t x)
+{
+
+	for (size_t i = 0; i < 4; i++)
+		dst[i] = x >> (8 * i);
+	return;
+}
+
+static FN uint32_t
+load_le32(const uint8_t *src)
+{
+	uint32_t ret = 0;
+
+	for (size_t i = 0; i < 4; i++)
+		ret |= (uint32_t)src[i] << (8 * i);
+	return ret;
+}
+
+FN bool
+umash_hll_serialize(const struct umash_hll *hll, void *dst, size_t size)
+{
+	uint8_t *bytes = dst;
+
+	if (size < umash_hll_serialized_size(hll)) {
+		errno = ENOSPC;
+		return false;
+	}
+
+	memset(bytes, 0, HEADER_SIZE);
+	memcpy(bytes, header_magic, sizeof(header_magic));
+	bytes[4] = FORMAT_VERSION;
+	bytes[5] = hll->precision;
+	bytes[6] = (hll->registers != NULL) ? ENCODING_DENSE : ENCODING_SPARSE;
+	store_le32(&bytes[8], hll->n_entries);
+	store_le32(&bytes[12], hll->params_check);
+
+	if (hll->registers != NULL) {
+		memcpy(&bytes[HEADER_SIZE], hll->registers, (size_t)1 << hll->precision);
+		return true;
+	}
+
+	for (size_t i = 0; i < hll->n_entries; i++)
+		store_le32(&bytes[HEADER_SIZE + i * sizeof(uint32_t)], hll->entries[i]);
+
+	return true;
+}
+
+FN struct umash_hll *
+umash_hll_deserialize(
+    const void *src, size_t size, const struct umash_params *params, uint64_t seed)
+{
+	const uint8_t *bytes = src;
+	struct umash_hll_options options = {
+		.size = sizeof(options),
+		.params = params,
+		.seed = seed,
+	};
+	struct umash_hll *ret;
+	size_t n_entries, m;
+	uint8_t max_value;
+
+	if (size < HEADER_SIZE ||
+	    memcmp(bytes, header_magic, sizeof(header_magic)) != 0 ||
+	    bytes[4] != FORMAT_VERSION || bytes[5] < UMASH_HLL_MIN_PRECISION ||
+	    bytes[5] > UMASH_HLL_MAX_PRECISION ||
+	    (bytes[6] != ENCODING_SPARSE && bytes[6] != ENCODING_DENSE))
+		goto invalid;
+
+	options.precision = bytes[5];
+	options.dense = (bytes[6] == ENCODING_DENSE);
+	m = (size_t)1 << options.precision;
+	n_entries = load_le32(&bytes[8]);
+
+	if (options.dense) {
+		max_value = 64 - options.precision + 1;
+		if (n_entries != 0 || size != HEADER_SIZE + m)
+			goto invalid;
+
+		for (size_t i = 0; i < m; i++) {
+			if (bytes[HEADER_SIZE + i] > max_value)
+				goto invalid;
+		}
+	} else {
+		max_value = 64 - SPARSE_PRECISION + 1;
+		if (n_entries > m / sizeof(uint32_t) ||
+		    size != HEADER_SIZE + n_entries * sizeof(uint32_t))
+			goto invalid;
+
+		for (size_t i = 0; i < n_entries; i++) {
+			uint32_t entry = load_le32(&bytes[HEADER_SIZE + 4 * i]);
+			uint32_t value = entry & SPARSE_VALUE_MASK;
+
+			if (value == 0 || value > max_value ||
+			    (entry >> SPARSE_VALUE_BITS) >= (1U << SPARSE_PRECISION))
+				goto invalid;
+
+			if (i > 0 &&
+			    (entry >> SPARSE_VALUE_BITS) <=
+				(load_le32(&bytes[HEADER_SIZE + 4 * (i - 1)]) >>
+				    SPARSE_VALUE_BITS))
+				goto invalid;
+		}
+	}
+
+	ret = umash_hll_create(&options);
+	if (ret == NULL)
+		return NULL;
+
+	/* The sketch was built with different parameters or seed. */
+	if (load_le32(&bytes[12]) != ret->params_check) {
+		umash_hll_destroy(ret);
+		goto invalid;
+	}
+
+	/* Deserialized sketches start sparse, like new ones. */
+	ret->start_dense = false;
+	if (options.dense) {
+		memcpy(ret->registers, &bytes[HEADER_SIZE], m);
+		return ret;
+	}
+
+	if (n_entries > 0) {
+		ret->entries = calloc(n_entries, sizeof(uint32_t));
+		if (ret->entries == NULL) {
+			umash_hll_destroy(ret);
+			return NULL;
+		}
+	}
+
+	for (size_t i = 0; i < n_entries; i++)
+		ret->entries[i] = load_le32(&bytes[HEADER_SIZE + 4 * i]);
+	ret->n_entries = ret->capacity = n_entries;
+	return ret;
+
+invalid:
+	errno = EINVAL;
+	return NULL;
+}
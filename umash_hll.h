@@ -0,0 +1,166 @@
+#ifndef UMASH_HLL_H
+#define UMASH_HLL_H
+#include "umash.h"
+
+/**
+ * # HyperLogLog cardinality sketches on UMASH
+ *
+ * SPDX-License-Identifier: MIT
+ * Copyright 2022 Backtrace I/O, Inc.
+ *
+ * This optional companion (`umash_hll.c`) estimates the number of
+ * distinct keys in a stream with a HyperLogLog++ sketch that hashes
+ * keys with `umash_full`.  The 64-bit hash is almost universal, so
+ * the estimator's accuracy does not rely on heuristic hash quality:
+ * the relative standard error is about `1.04 / sqrt(2**precision)`
+ * (0.8% at the default precision of 14) for any key set that is
+ * independent of the (secret) parameters.
+ *
+ * - Small sketches use the sparse HLL++ representation: a sorted list
+ *   of (register, value) entries at precision 25, with an exact
+ *   conversion to the dense representation (one byte per register)
+ *   once the list would use more memory than the dense registers.
+ *
+ * - Estimates use Ertl's improved estimator ("New cardinality
+ *   estimation algorithms for HyperLogLog sketches", 2017), which is
+ *   unbiased over the whole range without HLL++'s empirical bias
+ *   correction tables, and needs no math library.
+ *
+ * - The bulk insertion functions hash and insert many keys (or
+ *   fixed-size rows) per call.  Merging dense sketches takes the
+ *   register-wise maximum with SSE2 when available.
+ *
+ * - The serialized format (little-endian, portable across nodes)
+ *   stores the precision and representation, so sketches computed
+ *   on different machines can be combined with
+ *   `umash_hll_deserialize` and `umash_hll_merge`, as long as they
+ *   all used the same UMASH parameters and seed.  The format also
+ *   stores a 32-bit check of the parameters and seed, to reject
+ *   sketches built with other ones.
+ */
+
+#ifdef __cplusplus
+extern "C" {
+#endif
+
+#define UMASH_HLL_MIN_PRECISION 4
+#define UMASH_HLL_MAX_PRECISION 18
+
+/**
+ * Options for `umash_hll_create`.  Zero-initialised fields take their
+ * default value.
+ */
+struct umash_hll_options {
+	/* Must be `sizeof(struct umash_hll_options)`. */
+	size_t size;
+	/*
+	 * Hash parameters, which must outlive the sketch.  Defaults to
+	 * parameters derived from `umash_params_derive(0, NULL)`.
+	 */
+	const struct umash_params *params;
+	uint64_t seed;
+	/* Log2 of the number of dense registers (default 14). */
+	unsigned int precision;
+	/* Start with the dense representation. */
+	bool dense;
+};
+
+struct umash_hll;
+
+/**
+ * Returns a new empty sketch, or NULL with `errno` set on failure.
+ *
+ * @param options NULL for the default options.
+ */
+struct umash_hll *umash_hll_create(const struct umash_hll_options *options);
+
+void umash_hll_destroy(struct umash_hll *);
+
+/**
+ * Resets the sketch to empty, sparse unless it was created dense.
+ */
+void umash_hll_clear(struct umash_hll *);
+
+/**
+ * Returns the sketch's precision.
+ */
+unsigned int umash_hll_precision(const struct umash_hll *);
+
+/**
+ * Returns whether the sketch currently uses the dense representation.
+ */
+bool umash_hll_is_dense(const struct umash_hll *);
+
+/**
+ * Adds the `n_bytes` key at `data` to the sketch.
+ *
+ * @return false with `errno` set (ENOMEM) on failure.
+ */
+bool umash_hll_insert(struct umash_hll *, const void *data, size_t n_bytes);
+
+/**
+ * Adds a key that hashes to `hash` (as `umash_full(params, seed, 0,
+ * ...)` with the sketch's parameters) to the sketch.
+ *
+ * @return false with `errno` set (ENOMEM) on failure.
+ */
+bool umash_hll_insert_hash(struct umash_hll *, uint64_t hash);
+
+/**
+ * Adds the `n` keys `keys[i]` (of `n_bytes[i]` bytes each).
+ *
+ * @return false with `errno` set (ENOMEM) on failure.
+ */
+bool umash_hll_insert_many(
+    struct umash_hll *, const void *const *keys, const size_t *n_bytes, size_t n);
+
+/**
+ * Adds the `n` keys of `row_size` bytes each stored contiguously
+ * at `rows`.
+ *
+ * @return false with `errno` set (ENOMEM) on failure.
+ */
+bool umash_hll_insert_rows(
+    struct umash_hll *, const void *rows, size_t row_size, size_t n);
+
+/**
+ * Returns the estimated number of distinct keys in the sketch.
+ */
+double umash_hll_estimate(const struct umash_hll *);
+
+/**
+ * Adds all the keys in `src` to `dst`; both must have the same
+ * precision, parameters, and seed (EINVAL otherwise).
+ *
+ * @return false with `errno` set on failure.
+ */
+bool umash_hll_merge(struct umash_hll *dst, const struct umash_hll *src);
+
+/**
+ * Returns the number of bytes `umash_hll_serialize` writes.
+ */
+size_t umash_hll_serialized_size(const struct umash_hll *);
+
+/**
+ * Writes the sketch to the `size` bytes at `dst`.
+ *
+ * @return false with `errno` set to ENOSPC if the buffer is smaller
+ *   than `umash_hll_serialized_size`.
+ */
+bool umash_hll_serialize(const struct umash_hll *, void *dst, size_t size);
+
+/**
+ * Returns a new sketch with the contents of the `size` serialized
+ * bytes at `src`, which will hash new keys with `params` (NULL for
+ * the default) and `seed`.
+ *
+ * @return NULL with `errno` set on failure: EINVAL if the bytes are
+ *   not a valid sketch built with `params` and `seed`, or ENOMEM.
+ */
+struct umash_hll *umash_hll_deserialize(
+    const void *src, size_t size, const struct umash_params *params, uint64_t seed);
+
+#ifdef __cplusplus
+}
+#endif
+#endif /* !UMASH_HLL_H */
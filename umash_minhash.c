@@ -0,0 +1,557 @@
+#include "umash_minhash.h"
+
+/*
+ * UMASH is distributed under the MIT license.
+ *
+ * SPDX-License-Identifier: MIT
+ *
+ * Copyright 2022 Backtrace I/O, Inc.
+ */
+
+#include <errno.h>
+#include <stdint.h>
+#include <stdlib.h>
+#include <string.h>
+
+/*
+ * #define UMASH_SECTION="special_section" to emit all UMASH symbols
+ * in the `special_section` ELF section.
+ */
+#if defined(UMASH_SECTION) && defined(__GNUC__)
+#define FN __attribute__((__section__(UMASH_SECTION)))
+#else
+#define FN
+#endif
+
+#define DEFAULT_K 128
+#define DEFAULT_BANDS 16
+#define DEFAULT_ROWS 8
+
+/*
+ * Bulk insertions hash this many shingles at a time, before updating
+ * the bins.
+ */
+#define HASH_BATCH 64
+
+/*
+ * Empty bins hold the maximum value.  A shingle that hashes to
+ * exactly that value is indistinguishable from an empty bin, which
+ * only matters with probability 2**-64.
+ */
+#define EMPTY_BIN UINT64_MAX
+
+#define MIN_LSH_CAPACITY_BITS 6
+
+struct umash_minhash {
+	size_t k;
+	/* Number of nonempty bins. */
+	size_t n_filled;
+	uint64_t *bins;
+	struct umash_params params;
+	struct umash_params densify_params;
+};
+
+struct lsh_entry {
+	/* Hash of one band of a signature, always odd; 0 for empty slots. */
+	uint64_t key;
+	uint64_t id;
+};
+
+struct umash_lsh {
+	unsigned int bands;
+	unsigned int rows;
+	size_t n_signatures;
+	size_t n_entries;
+	/* Open addressing (linear probing) table of `2**capacity_bits` slots. */
+	unsigned int capacity_bits;
+	struct lsh_entry *entries;
+	struct umash_params params;
+};
+
+static FN uint64_t
+mulhi(uint64_t x, uint64_t y)
+{
+	__uint128_t product = x;
+
+	product *= y;
+	return product >> 64;
+}
+
+/*
+ * Adds a shingle's hash to its bin: the hash's high bits pick the
+ * bin, so the minimum hash in each bin is also the minimum of the
+ * hash's remaining bits.
+ */
+static FN void
+add_hash(struct umash_minhash *minhash, uint64_t hash)
+{
+	uint64_t *bin = &minhash->bins[mulhi(hash, minhash->k)];
+
+	if (hash >= *bin)
+		return;
+
+	minhash->n_filled += (*bin == EMPTY_BIN);
+	*bin = hash;
+	return;
+}
+
+FN struct umash_minhash *
+umash_minhash_create(const struct umash_minhash_options *options)
+{
+	static const struct umash_minhash_options default_options = {
+		.size = sizeof(struct umash_minhash_options),
+	};
+	struct umash_minhash_options opts = { 0 };
+	struct umash_minhash *ret;
+
+	if (options == NULL)
+		options = &default_options;
+
+	if (options->size < sizeof(size_t)) {
+		errno = EINVAL;
+		return NULL;
+	}
+
+	memcpy(&opts, options,
+	    (options->size < sizeof(opts)) ? options->size : sizeof(opts));
+	opts.size = sizeof(opts);
+
+	if (opts.k == 0)
+		opts.k = DEFAULT_K;
+
+	if (opts.k > UMASH_MINHASH_MAX_K) {
+		errno = EINVAL;
+		return NULL;
+	}
+
+	ret = calloc(1, sizeof(*ret));
+	if (ret == NULL)
+		return NULL;
+
+	ret->bins = calloc(opts.k, sizeof(ret->bins[0]));
+	if (ret->bins == NULL) {
+		free(ret);
+		return NULL;
+	}
+
+	ret->k = opts.k;
+	umash_params_derive(&ret->params, opts.bits, opts.secret);
+	umash_params_derive(&ret->densify_params, opts.bits + 1, opts.secret);
+	umash_minhash_reset(ret);
+	return ret;
+}
+
+FN void
+umash_minhash_destroy(struct umash_minhash *minhash)
+{
+
+	if (minhash == NULL)
+		return;
+
+	free(minhash->bins);
+	free(minhash);
+	return;
+}
+
+FN void
+umash_minhash_reset(struct umash_minhash *minhash)
+{
+
+	for (size_t i = 0; i < minhash->k; i++)
+		minhash->bins[i] = EMPTY_BIN;
+	minhash->n_filled = 0;
+	return;
+}
+
+FN size_t
+umash_minhash_k(const struct umash_minhash *minhash)
+{
+
+	return minhash->k;
+}
+
+FN void
+umash_minhash_add(struct umash_minhash *minhash, const void *shingle, size_t n_bytes)
+{
+
+	add_hash(minhash, umash_full(&minhash->params, 0, 0, shingle, n_bytes));
+	return;
+}
+
+FN void
+umash_minhash_add_many(struct umash_minhash *minhash, const void *const *shingles,
+    const size_t *n_bytes, size_t n)
+{
+	uint64_t hashes[HASH_BATCH];
+
+	for (size_t begin = 0; begin < n; begin += HASH_BATCH) {
+		size_t count = (n - begin < HASH_BATCH) ? n - begin : HASH_BATCH;
+
+		for (size_t i = 0; i < count; i++)
+			hashes[i] = umash_full(&minhash->params, 0, 0,
+			    shingles[begin + i], n_bytes[begin + i]);
+
+		for (size_t i = 0; i < count; i++)
+			add_hash(minhash, hashes[i]);
+	}
+
+	return;
+}
+
+FN void
+umash_minhash_add_shingles(
+    struct umash_minhash *minhash, const void *data, size_t n_bytes, size_t shingle_size)
+{
+	const char *bytes = data;
+	uint64_t hashes[HASH_BATCH];
+	size_t n;
+
+	if (n_bytes <= shingle_size || shingle_size == 0) {
+		umash_minhash_add(minhash, data, n_bytes);
+		return;
+	}
+
+	n = n_bytes - shingle_size + 1;
+	for (size_t begin = 0; begin < n; begin += HASH_BATCH) {
+		size_t count = (n - begin < HASH_BATCH) ? n - begin : HASH_BATCH;
+
+		for (size_t i = 0; i < count; i++)
+			hashes[i] = umash_full(
+			    &minhash->params, 0, 0, bytes + begin + i, shingle_size);
+
+		for (size_t i = 0; i < count; i++)
+			add_hash(minhash, hashes[i]);
+	}
+
+	return;
+}
+
+FN void
+umash_minhash_signature(const struct umash_minhash *minhash, uint64_t *signature)
+{
+	const size_t k = minhash->k;
+
+	memcpy(signature, minhash->bins, k * sizeof(signature[0]));
+	if (minhash->n_filled == 0 || minhash->n_filled == k)
+		return;
+
+	/*
+	 * Optimal densification: each empty bin copies the first
+	 * nonempty bin in its own sequence of hashed probes.  The
+	 * probes only depend on the bin's index, so identical sets
+	 * still get identical signatures.
+	 */
+	for (size_t i = 0; i < k; i++) {
+		uint64_t index = i;
+
+		if (minhash->bins[i] != EMPTY_BIN)
+			continue;
+
+		for (uint64_t attempt = 0;; attempt++) {
+			uint64_t hash = umash_full(
+			    &minhash->densify_params, attempt, 0, &index, sizeof(index));
+			uint64_t source = minhash->bins[mulhi(hash, k)];
+
+			if (source != EMPTY_BIN) {
+				signature[i] = source;
+				break;
+			}
+		}
+	}
+
+	return;
+}
+
+FN double
+umash_minhash_similarity(const uint64_t *x, const uint64_t *y, size_t k)
+{
+	size_t matches = 0;
+
+	if (k == 0)
+		return 0;
+
+	for (size_t i = 0; i < k; i++)
+		matches += (x[i] == y[i]);
+
+	return (double)matches / k;
+}
+
+FN size_t
+umash_minhash_compressed_size(size_t k, unsigned int b)
+{
+
+	return (k * b + 7) / 8;
+}
+
+/*
+ * Returns the `b`-bit value at index `i` in the packed array `bytes`.
+ */
+static FN uint64_t
+load_packed(const uint8_t *bytes, size_t i, unsigned int b)
+{
+	size_t bit = i * b;
+	uint64_t ret = 0;
+
+	for (unsigned int shift = 0; shift < b;) {
+		unsigned int offset = (bit + shift) % 8;
+		unsigned int n = 8 - offset;
+
+		if (n > b - shift)
+			n = b - shift;
+		ret |= (uint64_t)((bytes[(bit + shift) / 8] >> offset) & ((1U << n) - 1))
+		    << shift;
+		shift += n;
+	}
+
+	return ret;
+}
+
+FN bool
+umash_minhash_compress(
+    const uint64_t *signature, size_t k, unsigned int b, void *dst, size_t size)
+{
+	uint8_t *bytes = dst;
+	size_t n = umash_minhash_compressed_size(k, b);
+	uint64_t acc = 0;
+	unsigned int n_bits = 0;
+
+	if (b == 0 || b > 64) {
+		errno = EINVAL;
+		return false;
+	}
+
+	if (size < n) {
+		errno = ENOSPC;
+		return false;
+	}
+
+	/*
+	 * Shift values into a bit accumulator, and flush it one byte
+	 * at a time; `n_bits` stays below 8 between values.
+	 */
+	for (size_t i = 0; i < k; i++) {
+		uint64_t value =
+		    (b == 64) ? signature[i] : signature[i] & ((1ULL << b) - 1);
+		unsigned int remaining = b;
+
+		while (remaining > 0) {
+			unsigned int take = (remaining < 8) ? remaining : 8;
+
+			acc |= (value & ((1U << take) - 1)) << n_bits;
+			value >>= take;
+			remaining -= take;
+			n_bits += take;
+			while (n_bits >= 8) {
+				*bytes++ = acc;
+				acc >>= 8;
+				n_bits -= 8;
+			}
+		}
+	}
+
+	if (n_bits > 0)
+		*bytes = acc;
+	return true;
+}
+
+FN double
+umash_minhash_bbit_similarity(const void *x, const void *y, size_t k, unsigned int b)
+{
+	double accidental;
+	double matches;
+	size_t count = 0;
+
+	if (k == 0 || b == 0 || b > 64)
+		return 0;
+
+	if (b % 8 == 0) {
+		const size_t n_bytes = b / 8;
+
+		for (size_t i = 0; i < k; i++)
+			count += memcmp((const uint8_t *)x + i * n_bytes,
+				     (const uint8_t *)y + i * n_bytes, n_bytes) == 0;
+	} else {
+		for (size_t i = 0; i < k; i++)
+			count += load_packed(x, i, b) == load_packed(y, i, b);
+	}
+
+	/* Two different values agree on their low b bits w.p. 2**-b. */
+	matches = (double)count / k;
+	accidental = (b >= 64) ? 0 : 1.0 / (double)(1ULL << b);
+	if (matches <= accidental)
+		return 0;
+
+	return (matches - accidental) / (1 - accidental);
+}
+
+FN struct umash_lsh *
+umash_lsh_create(const struct umash_lsh_options *options)
+{
+	static const struct umash_lsh_options default_options = {
+		.size = sizeof(struct umash_lsh_options),
+	};
+	struct umash_lsh_options opts = { 0 };
+	struct umash_lsh *ret;
+
+	if (options == NULL)
+		options = &default_options;
+
+	if (options->size < sizeof(size_t)) {
+		errno = EINVAL;
+		return NULL;
+	}
+
+	memcpy(&opts, options,
+	    (options->size < sizeof(opts)) ? options->size : sizeof(opts));
+	opts.size = sizeof(opts);
+
+	if (opts.bands == 0)
+		opts.bands = DEFAULT_BANDS;
+	if (opts.rows == 0)
+		opts.rows = DEFAULT_ROWS;
+
+	if ((uint64_t)opts.bands * opts.rows > UMASH_MINHASH_MAX_K) {
+		errno = EINVAL;
+		return NULL;
+	}
+
+	ret = calloc(1, sizeof(*ret));
+	if (ret == NULL)
+		return NULL;
+
+	ret->bands = opts.bands;
+	ret->rows = opts.rows;
+	umash_params_derive(&ret->params, opts.bits, opts.secret);
+	return ret;
+}
+
+FN void
+umash_lsh_destroy(struct umash_lsh *lsh)
+{
+
+	if (lsh == NULL)
+		return;
+
+	free(lsh->entries);
+	free(lsh);
+	return;
+}
+
+FN size_t
+umash_lsh_size(const struct umash_lsh *lsh)
+{
+
+	return lsh->n_signatures;
+}
+
+static FN uint64_t
+band_key(const struct umash_lsh *lsh, const uint64_t *signature, unsigned int band)
+{
+	const uint64_t *values = &signature[(size_t)band * lsh->rows];
+
+	/* Odd keys leave 0 free to mark empty slots. */
+	return umash_full(&lsh->params, band, 0, values, lsh->rows * sizeof(values[0])) |
+	    1;
+}
+
+static FN void
+lsh_place(struct lsh_entry *entries, unsigned int capacity_bits, struct lsh_entry entry)
+{
+	size_t mask = ((size_t)1 << capacity_bits) - 1;
+	size_t i = entry.key >> (64 - capacity_bits);
+
+	while (entries[i].key != 0)
+		i = (i + 1) & mask;
+
+	entries[i] = entry;
+	return;
+}
+
+/*
+ * Grows the table until it can hold `n_entries` at a load factor of
+ * at most 1/2.
+ */
+static FN bool
+lsh_reserve(struct umash_lsh *lsh, size_t n_entries)
+{
+	unsigned int capacity_bits = lsh->capacity_bits;
+	struct lsh_entry *entries;
+
+	if (capacity_bits < MIN_LSH_CAPACITY_BITS)
+		capacity_bits = MIN_LSH_CAPACITY_BITS;
+	while (n_entries > ((size_t)1 << capacity_bits) / 2)
+		capacity_bits++;
+
+	if (capacity_bits == lsh->capacity_bits)
+		return true;
+
+	entries = calloc((size_t)1 << capacity_bits, sizeof(*entries));
+	if (entries == NULL)
+		return false;
+
+	if (lsh->entries != NULL) {
+		for (size_t i = 0, n = (size_t)1 << lsh->capacity_bits; i < n; i++) {
+			if (lsh->entries[i].key != 0)
+				lsh_place(entries, capacity_bits, lsh->entries[i]);
+		}
+	}
+
+	free(lsh->entries);
+	lsh->entries = entries;
+	lsh->capacity_bits = capacity_bits;
+	return true;
+}
+
+FN bool
+umash_lsh_insert(struct umash_lsh *lsh, const uint64_t *signature, uint64_t id)
+{
+
+	if (!lsh_reserve(lsh, lsh->n_entries + lsh->bands))
+		return false;
+
+	for (unsigned int band = 0; band < lsh->bands; band++) {
+		struct lsh_entry entry = {
+			.key = band_key(lsh, signature, band),
+			.id = id,
+		};
+
+		lsh_place(lsh->entries, lsh->capacity_bits, entry);
+	}
+
+	lsh->n_entries += lsh->bands;
+	lsh->n_signatures++;
+	return true;
+}
+
+FN size_t
+umash_lsh_query(
+    const struct umash_lsh *lsh, const uint64_t *signature, uint64_t *ids, size_t max_ids)
+{
+	size_t mask = ((size_t)1 << lsh->capacity_bits) - 1;
+	size_t n_ids = 0;
+
+	if (lsh->entries == NULL)
+		return 0;
+
+	for (unsigned int band = 0; band < lsh->bands && n_ids < max_ids; band++) {
+		uint64_t key = band_key(lsh, signature, band);
+
+		for (size_t i = key >> (64 - lsh->capacity_bits);
+		    lsh->entries[i].key != 0 && n_ids < max_ids; i = (i + 1) & mask) {
+			uint64_t id = lsh->entries[i].id;
+			size_t j;
+
+			if (lsh->entries[i].key != key)
+				continue;
+
+			/* Candidate lists are short: dedup by linear search. */
+			for (j = 0; j < n_ids && ids[j] != id; j++)
+				;
+
+			if (j == n_ids)
+				ids[n_ids++] = id;
+		}
+	}
+
+	return n_ids;
+}
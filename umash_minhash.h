@@ -0,0 +1,199 @@
+#ifndef UMASH_MINHASH_H
+#define UMASH_MINHASH_H
+#include "umash.h"
+
+/**
+ * # MinHash signatures and LSH on UMASH
+ *
+ * SPDX-License-Identifier: MIT
+ * Copyright 2022 Backtrace I/O, Inc.
+ *
+ * This optional companion (`umash_minhash.c`) summarises sets of
+ * shingles (e.g., the overlapping byte n-grams of a document) as
+ * MinHash signatures: the fraction of equal values in two signatures
+ * estimates the Jaccard similarity of the two sets.
+ *
+ * - Signatures use one permutation hashing: each shingle is hashed
+ *   once, with `umash_full`, and the hash both picks one of the `k`
+ *   bins and competes for that bin's minimum, instead of computing
+ *   `k` hashes per shingle.  Bins that no shingle hit are filled by
+ *   Shrivastava's optimal densification ("Optimal densification for
+ *   fast and accurate minwise hashing", 2017), which copies the value
+ *   of a nonempty bin picked by hashing the empty bin's index.
+ *
+ * - Shingles hash with parameters from `umash_params_derive(bits,
+ *   secret)`, and densification with those from `bits + 1`, so
+ *   signatures are only comparable when they share `bits`, `secret`,
+ *   and `k`.
+ *
+ * - Compressed signatures keep the low `b` bits of each value
+ *   (b-bit minwise hashing), e.g., 128 bins in 16 bytes for b = 1,
+ *   and `umash_minhash_bbit_similarity` corrects for the resulting
+ *   accidental matches.
+ *
+ * - The LSH index splits signatures in `bands` of `rows` values, and
+ *   finds the indexed signatures that match a query on at least one
+ *   band: pairs with Jaccard similarity `s` are candidates with
+ *   probability `1 - (1 - s**rows)**bands`.
+ */
+
+#ifdef __cplusplus
+extern "C" {
+#endif
+
+#define UMASH_MINHASH_MAX_K 65536
+
+/**
+ * Options for `umash_minhash_create`.  Zero-initialised fields take
+ * their default value.
+ */
+struct umash_minhash_options {
+	/* Must be `sizeof(struct umash_minhash_options)`. */
+	size_t size;
+	/* Number of values in each signature (default 128). */
+	size_t k;
+	/* `bits` argument for `umash_params_derive` (default 0). */
+	uint64_t bits;
+	/* NULL or 32 bytes, passed to `umash_params_derive`. */
+	const void *secret;
+};
+
+/**
+ * A signature builder accumulates the shingles of one set at a time;
+ * use one builder per thread.
+ */
+struct umash_minhash;
+
+/**
+ * Returns a new builder for an empty set, or NULL with `errno` set on
+ * failure (EINVAL for invalid options, or ENOMEM).
+ *
+ * @param options NULL for the default options.
+ */
+struct umash_minhash *umash_minhash_create(const struct umash_minhash_options *options);
+
+void umash_minhash_destroy(struct umash_minhash *);
+
+/**
+ * Empties the builder's set, to start a new signature.
+ */
+void umash_minhash_reset(struct umash_minhash *);
+
+/**
+ * Returns the number of values in the builder's signatures.
+ */
+size_t umash_minhash_k(const struct umash_minhash *);
+
+/**
+ * Adds the `n_bytes` shingle at `shingle` to the set.
+ */
+void umash_minhash_add(struct umash_minhash *, const void *shingle, size_t n_bytes);
+
+/**
+ * Adds the `n` shingles `shingles[i]`, of `n_bytes[i]` bytes each,
+ * to the set.
+ */
+void umash_minhash_add_many(
+    struct umash_minhash *, const void *const *shingles, const size_t *n_bytes, size_t n);
+
+/**
+ * Adds every run of `shingle_size` consecutive bytes in the
+ * `n_bytes` at `data` to the set, or all of `data` if it's shorter
+ * than `shingle_size` (or `shingle_size` is 0).
+ */
+void umash_minhash_add_shingles(
+    struct umash_minhash *, const void *data, size_t n_bytes, size_t shingle_size);
+
+/**
+ * Writes the `k` values of the current set's (densified) signature to
+ * `signature`.  The signature of the empty set is all ones.
+ */
+void umash_minhash_signature(const struct umash_minhash *, uint64_t *signature);
+
+/**
+ * Returns the fraction of the `k` values that are equal in the two
+ * signatures, an estimate of the Jaccard similarity of their sets.
+ */
+double umash_minhash_similarity(const uint64_t *x, const uint64_t *y, size_t k);
+
+/**
+ * Returns the size in bytes of a `k`-value signature compressed to
+ * `b` bits per value.
+ */
+size_t umash_minhash_compressed_size(size_t k, unsigned int b);
+
+/**
+ * Packs the low `b` bits (1 to 64) of each of the `k` values in
+ * `signature` to `dst`, in order, starting with the least significant
+ * bits of the first byte.
+ *
+ * @return false with `errno` set on failure: EINVAL if `b` is out of
+ *   range, ENOSPC if `size` is less than `umash_minhash_compressed_size`.
+ */
+bool umash_minhash_compress(
+    const uint64_t *signature, size_t k, unsigned int b, void *dst, size_t size);
+
+/**
+ * Returns the Jaccard similarity estimated from two `k`-value
+ * signatures compressed to `b` bits per value, after subtracting the
+ * expected fraction (2**-b) of accidental matches.
+ */
+double umash_minhash_bbit_similarity(
+    const void *x, const void *y, size_t k, unsigned int b);
+
+/**
+ * Options for `umash_lsh_create`.  Zero-initialised fields take their
+ * default value.
+ */
+struct umash_lsh_options {
+	/* Must be `sizeof(struct umash_lsh_options)`. */
+	size_t size;
+	/* Number of bands (default 16). */
+	unsigned int bands;
+	/* Number of signature values per band (default 8). */
+	unsigned int rows;
+	/* `bits` argument for `umash_params_derive` (default 0). */
+	uint64_t bits;
+	/* NULL or 32 bytes, passed to `umash_params_derive`. */
+	const void *secret;
+};
+
+struct umash_lsh;
+
+/**
+ * Returns a new empty index for signatures of at least `bands * rows`
+ * values, or NULL with `errno` set on failure (EINVAL for invalid
+ * options, or ENOMEM).
+ *
+ * @param options NULL for the default options.
+ */
+struct umash_lsh *umash_lsh_create(const struct umash_lsh_options *options);
+
+void umash_lsh_destroy(struct umash_lsh *);
+
+/**
+ * Returns the number of signatures in the index.
+ */
+size_t umash_lsh_size(const struct umash_lsh *);
+
+/**
+ * Adds `signature` to the index, as `id`.
+ *
+ * @return false with `errno` set (ENOMEM) on failure.
+ */
+bool umash_lsh_insert(struct umash_lsh *, const uint64_t *signature, uint64_t id);
+
+/**
+ * Finds the ids of the indexed signatures that match `signature` on
+ * at least one band, and stores up to `max_ids` distinct ids in
+ * `ids`, in no particular order.
+ *
+ * @return the number of ids stored.
+ */
+size_t umash_lsh_query(
+    const struct umash_lsh *, const uint64_t *signature, uint64_t *ids, size_t max_ids);
+
+#ifdef __cplusplus
+}
+#endif
+#endif /* !UMASH_MINHASH_H */
@@ -0,0 +1,746 @@
+#define _GNU_SOURCE /* pthread_rwlock_t with -std=c99 */
+#include "umash_table.h"
+
+/*
+ * UMASH is distributed under the MIT license.
+ *
+ * SPDX-License-Identifier: MIT
+ *
+ * Copyright 2022 Backtrace I/O, Inc.
+ */
+
+#include <errno.h>
+#include <pthread.h>
+#include <stdint.h>
+#include <stdlib.h>
+#include <string.h>
+
+#if defined(__SSE2__)
+#include <emmintrin.h>
+#endif
+
+/*
+ * #define UMASH_SECTION="special_section" to emit all UMASH symbols
+ * in the `special_section` ELF section.
+ */
+#if defined(UMASH_SECTION) && defined(__GNUC__)
+#define FN __attribute__((__section__(UMASH_SECTION)))
+#else
+#define FN
+#endif
+
+/*
+ * Control bytes come in groups of 16, which we compare in one SSE2
+ * instruction.  Full slots hold the low 7 bits of their hash (a
+ * non-negative value); empty and deleted slots have the sign bit set.
+ */
+#define GROUP_SIZE 16
+#define CTRL_EMPTY ((int8_t)-128)
+#define CTRL_DELETED ((int8_t)-2)
+
+/*
+ * We let each slot array fill up to 7/8 (14 out of 16 slots per
+ * group), counting deleted slots, before growing or rehashing it.
+ */
+#define GROUP_GROWTH 14
+
+#define DEFAULT_SHARDS 16
+#define MAX_SHARDS (1U << 16)
+#define DEFAULT_MAX_PROBE_GROUPS 8
+
+/*
+ * Each update to a shard that's migrating to a new slot array moves
+ * this many groups from the old array.
+ */
+#define MIGRATE_GROUPS 4
+
+struct entry {
+	uint64_t value;
+	size_t n_bytes;
+	char key[];
+};
+
+struct slot {
+	uint64_t hash;
+	struct entry *entry;
+};
+
+/*
+ * An open addressing array of slots, and the parameters that hash
+ * keys for that array.  Empty arrays have `n_groups = 0`.
+ */
+struct array {
+	const struct umash_params *params;
+	uint64_t seed;
+	bool owns_params;
+	size_t n_groups; /* 0 or a power of 2. */
+	size_t count; /* Number of full slots. */
+	size_t growth_left; /* Number of empty slots we may still fill. */
+	int8_t *ctrl;
+	struct slot *slots;
+};
+
+/*
+ * Each shard owns a current array, and, while it is incrementally
+ * rehashing, the old array it is moving entries out of.  Lookups
+ * check both.
+ */
+struct shard {
+	pthread_rwlock_t lock;
+	struct array cur;
+	struct array old; /* Empty unless migrating. */
+	size_t migrate_cursor; /* Next group to move out of `old`. */
+	uint64_t rng; /* Secret state for rotated params and seeds. */
+	uint64_t resizes;
+	uint64_t rotations;
+} __attribute__((__aligned__(64)));
+
+struct umash_table {
+	const struct umash_params *params;
+	uint64_t seed;
+	unsigned int shard_bits;
+	unsigned int max_probe_groups;
+	struct shard *shards;
+	struct umash_params own_params;
+};
+
+static FN uint64_t
+splitmix64(uint64_t *state)
+{
+	uint64_t z = (*state += 0x9e3779b97f4a7c15ULL);
+
+	z = (z ^ (z >> 30)) * 0xbf58476d1ce4e5b9ULL;
+	z = (z ^ (z >> 27)) * 0x94d049bb133111ebULL;
+	return z ^ (z >> 31);
+}
+
+/**
+ * Returns a bitmask of the slots in the group at `ctrl` whose
+ * control byte equals `byte`.
+ */
+static FN uint32_t
+match_byte(const int8_t *ctrl, int8_t byte)
+{
+#if defined(__SSE2__)
+	__m128i group = _mm_load_si128((const __m128i *)ctrl);
+
+	return _mm_movemask_epi8(_mm_cmpeq_epi8(group, _mm_set1_epi8(byte)));
+#else
+	uint32_t ret = 0;
+
+	for (size_t i = 0; i < GROUP_SIZE; i++)
+		ret |= (uint32_t)(ctrl[i] == byte) << i;
+	return ret;
+#endif
+}
+
+/**
+ * Returns a bitmask of the empty or deleted slots in the group.
+ */
+static FN uint32_t
+match_free(const int8_t *ctrl)
+{
+#if defined(__SSE2__)
+	return _mm_movemask_epi8(_mm_load_si128((const __m128i *)ctrl));
+#else
+	uint32_t ret = 0;
+
+	for (size_t i = 0; i < GROUP_SIZE; i++)
+		ret |= (uint32_t)(ctrl[i] < 0) << i;
+	return ret;
+#endif
+}
+
+/**
+ * Returns the number of groups for an array that can hold at least
+ * `n_entries` entries.
+ */
+static FN size_t
+groups_for(size_t n_entries)
+{
+	size_t ret = 1;
+
+	while (ret * GROUP_GROWTH < n_entries)
+		ret *= 2;
+	return ret;
+}
+
+static FN bool
+array_init(struct array *array, size_t n_groups, const struct umash_params *params,
+    uint64_t seed)
+{
+	void *ctrl = NULL;
+
+	*array = (struct array) {
+		.params = params,
+		.seed = seed,
+	};
+
+	if (n_groups == 0)
+		return true;
+
+	if (posix_memalign(&ctrl, GROUP_SIZE, n_groups * GROUP_SIZE) != 0) {
+		errno = ENOMEM;
+		return false;
+	}
+
+	array->slots = calloc(n_groups * GROUP_SIZE, sizeof(struct slot));
+	if (array->slots == NULL) {
+		free(ctrl);
+		return false;
+	}
+
+	memset(ctrl, CTRL_EMPTY, n_groups * GROUP_SIZE);
+	array->ctrl = ctrl;
+	array->n_groups = n_groups;
+	array->growth_left = n_groups * GROUP_GROWTH;
+	return true;
+}
+
+/**
+ * Releases the array's storage, but not the entries in it.
+ */
+static FN void
+array_deinit(struct array *array)
+{
+
+	free(array->ctrl);
+	free(array->slots);
+	if (array->owns_params)
+		free((void *)array->params);
+
+	*array = (struct array) { .params = NULL };
+	return;
+}
+
+static FN void
+array_free_entries(struct array *array)
+{
+
+	for (size_t i = 0; i < array->n_groups * GROUP_SIZE; i++) {
+		if (array->ctrl[i] >= 0)
+			free(array->slots[i].entry);
+	}
+
+	return;
+}
+
+/**
+ * Returns the hash of `key` for `array`: `hash0` is the hash with the
+ * table's parameters, which most arrays share.
+ */
+static FN uint64_t
+array_hash(const struct umash_table *table, const struct array *array, uint64_t hash0,
+    const void *key, size_t n_bytes)
+{
+
+	if (array->params == table->params && array->seed == table->seed)
+		return hash0;
+
+	return umash_full(array->params, array->seed, 0, key, n_bytes);
+}
+
+/**
+ * Returns the index of the slot for `key` in `array`, or SIZE_MAX if
+ * there is none.
+ */
+static FN size_t
+array_find(const struct array *array, uint64_t hash, const void *key, size_t n_bytes)
+{
+	const size_t mask = array->n_groups - 1;
+	const int8_t h2 = hash & 0x7f;
+	size_t group = (hash >> 7) & mask;
+
+	/* Triangular probing visits every group of a power-of-2 array. */
+	for (size_t i = 0; i < array->n_groups; i++) {
+		const int8_t *ctrl = array->ctrl + group * GROUP_SIZE;
+
+		for (uint32_t bits = match_byte(ctrl, h2); bits != 0; bits &= bits - 1) {
+			size_t index = group * GROUP_SIZE + __builtin_ctz(bits);
+			const struct slot *slot = &array->slots[index];
+
+			if (slot->hash == hash && slot->entry->n_bytes == n_bytes &&
+			    (n_bytes == 0 || memcmp(slot->entry->key, key, n_bytes) == 0))
+				return index;
+		}
+
+		/* The key would have been inserted in an empty slot. */
+		if (match_byte(ctrl, CTRL_EMPTY) != 0)
+			return SIZE_MAX;
+
+		group = (group + i + 1) & mask;
+	}
+
+	return SIZE_MAX;
+}
+
+/**
+ * Stores `entry` in the first free slot on its probe sequence, and
+ * returns the number of groups we looked at.  The array must have
+ * `growth_left > 0`.
+ */
+static FN size_t
+array_place(struct array *array, uint64_t hash, struct entry *entry)
+{
+	const size_t mask = array->n_groups - 1;
+	size_t group = (hash >> 7) & mask;
+	size_t i;
+
+	for (i = 0;; i++) {
+		int8_t *ctrl = array->ctrl + group * GROUP_SIZE;
+		uint32_t bits = match_free(ctrl);
+
+		if (bits != 0) {
+			size_t offset = __builtin_ctz(bits);
+
+			if (ctrl[offset] == CTRL_EMPTY)
+				array->growth_left--;
+
+			ctrl[offset] = hash & 0x7f;
+			array->slots[group * GROUP_SIZE + offset] = (struct slot) {
+				.hash = hash,
+				.entry = entry,
+			};
+			array->count++;
+			return i + 1;
+		}
+
+		group = (group + i + 1) & mask;
+	}
+}
+
+/**
+ * Removes the entry at `index` from the array, and returns it.
+ */
+static FN struct entry *
+array_remove(struct array *array, size_t index)
+{
+	int8_t *ctrl = array->ctrl + (index / GROUP_SIZE) * GROUP_SIZE;
+
+	/*
+	 * If the group has an empty slot, no probe sequence ever went
+	 * past it, so we can mark the slot as empty instead of deleted.
+	 */
+	if (match_byte(ctrl, CTRL_EMPTY) != 0) {
+		array->ctrl[index] = CTRL_EMPTY;
+		array->growth_left++;
+	} else {
+		array->ctrl[index] = CTRL_DELETED;
+	}
+
+	array->count--;
+	return array->slots[index].entry;
+}
+
+/**
+ * Moves up to `max_groups` groups of entries from the shard's old
+ * array to the current one, and frees the old array once it's
+ * empty.
+ */
+static FN void
+migrate_step(struct shard *shard, size_t max_groups)
+{
+	struct array *old = &shard->old;
+	struct array *cur = &shard->cur;
+	bool same_hash;
+
+	if (old->n_groups == 0)
+		return;
+
+	same_hash = old->params == cur->params && old->seed == cur->seed;
+	for (size_t i = 0; i < max_groups && shard->migrate_cursor < old->n_groups;
+	    i++, shard->migrate_cursor++) {
+		const size_t base = shard->migrate_cursor * GROUP_SIZE;
+
+		for (size_t j = base; j < base + GROUP_SIZE; j++) {
+			struct entry *entry;
+			uint64_t hash;
+
+			if (old->ctrl[j] < 0)
+				continue;
+
+			entry = old->slots[j].entry;
+			hash = old->slots[j].hash;
+			if (!same_hash) {
+				hash = umash_full(cur->params, cur->seed, 0, entry->key,
+				    entry->n_bytes);
+			}
+
+			/* Lookups must not find the entry twice. */
+			old->ctrl[j] = CTRL_DELETED;
+			old->count--;
+			array_place(cur, hash, entry);
+		}
+	}
+
+	if (old->count == 0 || shard->migrate_cursor == old->n_groups) {
+		array_deinit(old);
+		shard->migrate_cursor = 0;
+	}
+
+	return;
+}
+
+/**
+ * Switches the shard to a new array with room for twice its current
+ * entries, hashed with `params` and `seed`, and starts migrating
+ * entries to it.  The shard must not be migrating already.
+ *
+ * @param rotated true if the new array should own the new `params`,
+ *   false if it inherits the current array's `params` and `seed`.
+ */
+static FN bool
+start_migration(
+    struct shard *shard, const struct umash_params *params, uint64_t seed, bool rotated)
+{
+	struct array fresh;
+
+	if (!array_init(&fresh, groups_for(2 * (shard->cur.count + 1)), params, seed))
+		return false;
+
+	if (rotated) {
+		fresh.owns_params = true;
+		shard->rotations++;
+	} else {
+		fresh.owns_params = shard->cur.owns_params;
+		shard->cur.owns_params = false;
+		/* Don't count the first allocation as a resize. */
+		shard->resizes += shard->cur.n_groups != 0;
+	}
+
+	shard->old = shard->cur;
+	shard->cur = fresh;
+	shard->migrate_cursor = 0;
+	migrate_step(shard, 0);
+	return true;
+}
+
+/**
+ * Makes sure the shard's current array can accept a new entry on top
+ * of the ones still waiting in the old array.
+ */
+static FN bool
+make_room(struct shard *shard)
+{
+
+	if (shard->cur.growth_left > shard->old.count)
+		return true;
+
+	migrate_step(shard, SIZE_MAX);
+	if (shard->cur.growth_left > 0)
+		return true;
+
+	return start_migration(shard, shard->cur.params, shard->cur.seed, false);
+}
+
+/**
+ * Returns whether long probes in `array` are suspicious.  Probe
+ * sequences naturally get longer as arrays approach their maximum
+ * load, but, at most half full, a random hash function is
+ * astronomically unlikely to send a probe past a few groups.
+ */
+static FN bool
+suspicious_load(const struct array *array)
+{
+
+	return 2 * array->count <= array->n_groups * GROUP_SIZE;
+}
+
+/**
+ * Rehashes the shard with fresh parameters derived from secret state:
+ * whoever found colliding keys will have to start over.
+ */
+static FN void
+rotate(const struct umash_table *table, struct shard *shard)
+{
+	struct umash_params *params;
+
+	params = malloc(sizeof(*params));
+	if (params == NULL)
+		return;
+
+	/* The table's OH key is secret, and at least 32 bytes long. */
+	umash_params_derive(params, splitmix64(&shard->rng), table->params->oh);
+	if (!start_migration(shard, params, splitmix64(&shard->rng), true))
+		free(params);
+
+	return;
+}
+
+static FN struct shard *
+pick_shard(const struct umash_table *table, uint64_t hash0)
+{
+
+	if (table->shard_bits == 0)
+		return &table->shards[0];
+
+	return &table->shards[hash0 >> (64 - table->shard_bits)];
+}
+
+FN struct umash_table *
+umash_table_create(const struct umash_table_options *options)
+{
+	static const struct umash_table_options default_options = {
+		.size = sizeof(default_options),
+	};
+	struct umash_table_options opts = default_options;
+	struct umash_table *table;
+	void *shards = NULL;
+	size_t n_shards = 1;
+	size_t per_shard;
+	int error;
+
+	if (options != NULL) {
+		if (options->size < sizeof(size_t)) {
+			errno = EINVAL;
+			return NULL;
+		}
+
+		memcpy(&opts, options,
+		    options->size < sizeof(opts) ? options->size : sizeof(opts));
+		opts.size = sizeof(opts);
+	}
+
+	if (opts.n_shards == 0)
+		opts.n_shards = DEFAULT_SHARDS;
+	if (opts.n_shards > MAX_SHARDS)
+		opts.n_shards = MAX_SHARDS;
+	if (opts.max_probe_groups == 0)
+		opts.max_probe_groups = DEFAULT_MAX_PROBE_GROUPS;
+
+	table = calloc(1, sizeof(*table));
+	if (table == NULL)
+		return NULL;
+
+	if (opts.params == NULL) {
+		umash_params_derive(&table->own_params, opts.seed, NULL);
+		opts.params = &table->own_params;
+	}
+
+	while (n_shards < opts.n_shards) {
+		n_shards *= 2;
+		table->shard_bits++;
+	}
+
+	table->params = opts.params;
+	table->seed = opts.seed;
+	table->max_probe_groups = opts.max_probe_groups;
+
+	if (posix_memalign(&shards, 64, n_shards * sizeof(struct shard)) != 0) {
+		free(table);
+		errno = ENOMEM;
+		return NULL;
+	}
+
+	memset(shards, 0, n_shards * sizeof(struct shard));
+	table->shards = shards;
+
+	per_shard = (opts.initial_capacity + n_shards - 1) / n_shards;
+	for (size_t i = 0; i < n_shards; i++) {
+		struct shard *shard = &table->shards[i];
+
+		error = pthread_rwlock_init(&shard->lock, NULL);
+		if (error != 0 ||
+		    !array_init(&shard->cur, per_shard > 0 ? groups_for(per_shard) : 0,
+			table->params, table->seed)) {
+			if (error == 0) {
+				error = errno;
+				pthread_rwlock_destroy(&shard->lock);
+			}
+
+			for (size_t j = 0; j < i; j++) {
+				pthread_rwlock_destroy(&table->shards[j].lock);
+				array_deinit(&table->shards[j].cur);
+			}
+
+			free(table->shards);
+			free(table);
+			errno = error;
+			return NULL;
+		}
+
+		shard->rng = umash_full(table->params, i, 1, "umash_table", 11);
+	}
+
+	return table;
+}
+
+FN void
+umash_table_destroy(struct umash_table *table)
+{
+	const size_t n_shards = (size_t)1 << table->shard_bits;
+
+	for (size_t i = 0; i < n_shards; i++) {
+		struct shard *shard = &table->shards[i];
+
+		array_free_entries(&shard->cur);
+		array_free_entries(&shard->old);
+		array_deinit(&shard->cur);
+		array_deinit(&shard->old);
+		pthread_rwlock_destroy(&shard->lock);
+	}
+
+	free(table->shards);
+	free(table);
+	return;
+}
+
+FN bool
+umash_table_insert(
+    struct umash_table *table, const void *key, size_t n_bytes, uint64_t value)
+{
+	const uint64_t hash0 = umash_full(table->params, table->seed, 0, key, n_bytes);
+	struct shard *shard = pick_shard(table, hash0);
+	struct entry *entry;
+	uint64_t hash;
+	size_t index;
+	bool ret = true;
+
+	pthread_rwlock_wrlock(&shard->lock);
+	migrate_step(shard, MIGRATE_GROUPS);
+
+	hash = array_hash(table, &shard->cur, hash0, key, n_bytes);
+	index = SIZE_MAX;
+	if (shard->cur.n_groups != 0)
+		index = array_find(&shard->cur, hash, key, n_bytes);
+	if (index != SIZE_MAX) {
+		shard->cur.slots[index].entry->value = value;
+		goto out;
+	}
+
+	if (shard->old.n_groups != 0) {
+		uint64_t old_hash = array_hash(table, &shard->old, hash0, key, n_bytes);
+
+		index = array_find(&shard->old, old_hash, key, n_bytes);
+		if (index != SIZE_MAX) {
+			shard->old.slots[index].entry->value = value;
+			goto out;
+		}
+	}
+
+	entry = malloc(sizeof(*entry) + n_bytes);
+	if (entry == NULL || !make_room(shard)) {
+		free(entry);
+		errno = ENOMEM;
+		ret = false;
+		goto out;
+	}
+
+	entry->value = value;
+	entry->n_bytes = n_bytes;
+	if (n_bytes > 0)
+		memcpy(entry->key, key, n_bytes);
+
+	/* `make_room` may have switched to a new array. */
+	hash = array_hash(table, &shard->cur, hash0, key, n_bytes);
+	if (array_place(&shard->cur, hash, entry) > table->max_probe_groups &&
+	    suspicious_load(&shard->cur) && shard->old.n_groups == 0)
+		rotate(table, shard);
+
+out:
+	pthread_rwlock_unlock(&shard->lock);
+	return ret;
+}
+
+FN bool
+umash_table_lookup(
+    struct umash_table *table, const void *key, size_t n_bytes, uint64_t *value)
+{
+	const uint64_t hash0 = umash_full(table->params, table->seed, 0, key, n_bytes);
+	struct shard *shard = pick_shard(table, hash0);
+	const struct array *arrays[2];
+	bool ret = false;
+
+	pthread_rwlock_rdlock(&shard->lock);
+	arrays[0] = &shard->cur;
+	arrays[1] = &shard->old;
+	for (size_t i = 0; i < 2; i++) {
+		const struct array *array = arrays[i];
+		size_t index;
+
+		if (array->n_groups == 0)
+			continue;
+
+		index = array_find(
+		    array, array_hash(table, array, hash0, key, n_bytes), key, n_bytes);
+		if (index != SIZE_MAX) {
+			if (value != NULL)
+				*value = array->slots[index].entry->value;
+			ret = true;
+			break;
+		}
+	}
+
+	pthread_rwlock_unlock(&shard->lock);
+	return ret;
+}
+
+FN bool
+umash_table_delete(
+    struct umash_table *table, const void *key, size_t n_bytes, uint64_t *value)
+{
+	const uint64_t hash0 = umash_full(table->params, table->seed, 0, key, n_bytes);
+	struct shard *shard = pick_shard(table, hash0);
+	struct array *arrays[2];
+	bool ret = false;
+
+	pthread_rwlock_wrlock(&shard->lock);
+	migrate_step(shard, MIGRATE_GROUPS);
+
+	arrays[0] = &shard->cur;
+	arrays[1] = &shard->old;
+	for (size_t i = 0; i < 2; i++) {
+		struct array *array = arrays[i];
+		struct entry *entry;
+		size_t index;
+
+		if (array->n_groups == 0)
+			continue;
+
+		index = array_find(
+		    array, array_hash(table, array, hash0, key, n_bytes), key, n_bytes);
+		if (index == SIZE_MAX)
+			continue;
+
+		entry = array_remove(array, index);
+		if (value != NULL)
+			*value = entry->value;
+		free(entry);
+		ret = true;
+		break;
+	}
+
+	pthread_rwlock_unlock(&shard->lock);
+	return ret;
+}
+
+FN size_t
+umash_table_size(struct umash_table *table)
+{
+	struct umash_table_stats stats;
+
+	umash_table_stats(table, &stats);
+	return stats.entries;
+}
+
+FN void
+umash_table_stats(struct umash_table *table, struct umash_table_stats *stats)
+{
+	const size_t n_shards = (size_t)1 << table->shard_bits;
+
+	memset(stats, 0, sizeof(*stats));
+	for (size_t i = 0; i < n_shards; i++) {
+		struct shard *shard = &table->shards[i];
+
+		pthread_rwlock_rdlock(&shard->lock);
+		stats->entries += shard->cur.count + shard->old.count;
+		stats->capacity +=
+		    (shard->cur.n_groups + shard->old.n_groups) * GROUP_SIZE;
+		stats->resizes += shard->resizes;
+		stats->rotations += shard->rotations;
+		stats->migrating += shard->old.n_groups != 0;
+		pthread_rwlock_unlock(&shard->lock);
+	}
+
+	return;
+}
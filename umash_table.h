@@ -0,0 +1,140 @@
+#ifndef UMASH_TABLE_H
+#define UMASH_TABLE_H
+#include "umash.h"
+
+/**
+ * # A concurrent hash table keyed by UMASH
+ *
+ * SPDX-License-Identifier: MIT
+ * Copyright 2022 Backtrace I/O, Inc.
+ *
+ * This optional companion (`umash_table.c`, POSIX threads) is a
+ * reference hash table on top of `umash_full`, for callers who would
+ * otherwise wrap UMASH in their own table.  It maps byte string keys
+ * (copied in the table) to 64-bit values.
+ *
+ * - The table is split in independent shards, each protected by its
+ *   own reader-writer lock, so threads that work on different keys
+ *   rarely contend.  The top bits of the key's hash pick the shard.
+ *
+ * - Each shard is an open addressing "SwissTable": slots are grouped
+ *   by 16, with one control byte per slot that holds 7 bits of the
+ *   slot's hash, or marks it as empty or deleted.  Probes compare a
+ *   whole group of control bytes at once (with SSE2 on x86-64), and
+ *   only look at the keys whose control byte matches.
+ *
+ * - Resizing and rehashing are incremental: a shard that must grow
+ *   switches to a new slot array, and each subsequent update moves a
+ *   few groups of entries from the old array, so no single call pays
+ *   for rehashing the whole shard.
+ *
+ * - When an insertion probes suspiciously many groups (while the
+ *   shard is at most half full), the shard assumes someone found keys
+ *   that collide under its current parameters, and rotates them: it
+ *   derives new `umash_params` and a new seed, and incrementally
+ *   rehashes its entries with them.  The new parameters are derived
+ *   from secret bits in the table's parameters, so the table should
+ *   be created with secret (e.g., random) parameters when keys come
+ *   from untrusted sources.
+ */
+
+#ifdef __cplusplus
+extern "C" {
+#endif
+
+/**
+ * Tuning knobs for `umash_table_create`.  Zero-initialised fields
+ * take their default value.
+ */
+struct umash_table_options {
+	/* Must be `sizeof(struct umash_table_options)`. */
+	size_t size;
+	/*
+	 * Hash parameters, which must outlive the table.  Defaults to
+	 * parameters derived from `umash_params_derive(seed, NULL)`.
+	 */
+	const struct umash_params *params;
+	uint64_t seed;
+	/* Number of entries to size the table for (default 0). */
+	size_t initial_capacity;
+	/* Number of shards, rounded up to a power of 2 (default 16). */
+	unsigned int n_shards;
+	/*
+	 * Rotate a shard's parameters when an insertion probes more
+	 * than this many 16-slot groups in an array that's at most half
+	 * full (default 8).
+	 */
+	unsigned int max_probe_groups;
+};
+
+/**
+ * Counters for a table, summed over all its shards.
+ */
+struct umash_table_stats {
+	/* Number of entries in the table. */
+	uint64_t entries;
+	/* Number of slots (live, deleted, or empty). */
+	uint64_t capacity;
+	/* Number of incremental rehashes for growth or cleanup. */
+	uint64_t resizes;
+	/* Number of parameter rotations after long probes. */
+	uint64_t rotations;
+	/* Number of shards currently migrating entries. */
+	uint64_t migrating;
+};
+
+struct umash_table;
+
+/**
+ * Returns a new empty table, or NULL with `errno` set on failure.
+ *
+ * @param options NULL for the default options.
+ */
+struct umash_table *umash_table_create(const struct umash_table_options *options);
+
+/**
+ * Frees the table and all the keys it holds.
+ */
+void umash_table_destroy(struct umash_table *);
+
+/**
+ * Associates `value` with the `n_bytes` key at `key`, overwriting any
+ * previous value for the same key.  The key is copied.
+ *
+ * @return false with `errno` set (ENOMEM) on failure.
+ */
+bool umash_table_insert(
+    struct umash_table *, const void *key, size_t n_bytes, uint64_t value);
+
+/**
+ * Looks up the `n_bytes` key at `key`.
+ *
+ * @return true and stores the key's value in `value` (if non-NULL)
+ *   if the key is in the table, false otherwise.
+ */
+bool umash_table_lookup(
+    struct umash_table *, const void *key, size_t n_bytes, uint64_t *value);
+
+/**
+ * Removes the `n_bytes` key at `key` from the table.
+ *
+ * @return true and stores the key's old value in `value` (if
+ *   non-NULL) if the key was in the table, false otherwise.
+ */
+bool umash_table_delete(
+    struct umash_table *, const void *key, size_t n_bytes, uint64_t *value);
+
+/**
+ * Returns the number of entries in the table.
+ */
+size_t umash_table_size(struct umash_table *);
+
+/**
+ * Fills `stats` with counters for the table.
+ */
+void umash_table_stats(struct umash_table *, struct umash_table_stats *stats);
+
+#ifdef __cplusplus
+}
+#endif
+#endif /* !UMASH_TABLE_H */
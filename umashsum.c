@@ -0,0 +1,693 @@
+/*
+ * umashsum: print or check UMASH fingerprints, like sha256sum.
+ *
+ * SPDX-License-Identifier: MIT
+ * Copyright 2022 Backtrace I/O, Inc.
+ *
+ *   $ cc -O2 -W -Wall -mpclmul umashsum.c umash.c umash_fd.c -pthread \
+ *         -o umashsum
+ *   $ ./umashsum -j 16 -T files.txt > manifest
+ *   $ ./umashsum --check manifest
+ *
+ * Files are fingerprinted by a pool of threads, largest first, so
+ * that a huge file at the end of the list doesn't leave one thread
+ * working alone while the others idle.  Each line of output has the
+ * fingerprint's two 64-bit halves as 32 hex digits, two spaces, and
+ * the file name; names with a backslash or a newline are escaped
+ * like sha256sum does, with a leading backslash.
+ */
+#define _GNU_SOURCE /* getopt_long, getline */
+#include <errno.h>
+#include <fcntl.h>
+#include <getopt.h>
+#include <inttypes.h>
+#include <pthread.h>
+#include <stdbool.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <sys/stat.h>
+#include <unistd.h>
+
+#include "umash.h"
+#include "umash_fd.h"
+
+/* Size of the buffer for streams we can't `umash_fprint_fd`. */
+#define STREAM_BUFFER_SIZE ((size_t)1 << 20)
+
+struct job {
+	char *path;
+	/* Sort key; 0 for anything that isn't a regular file. */
+	uint64_t size;
+	/* Set in `--check` mode. */
+	struct umash_fp expected;
+	struct umash_fp actual;
+	/* 0 on success, an errno value otherwise. */
+	int error;
+};
+
+static struct umash_params params;
+static int io_flags;
+
+/* Sorted by decreasing size; `next_job` indexes into this array. */
+static struct job **schedule;
+static size_t n_jobs;
+static size_t next_job;
+
+static void *
+xrealloc(void *ptr, size_t size)
+{
+	void *ret;
+
+	ret = realloc(ptr, size);
+	if (ret == NULL) {
+		perror("realloc");
+		exit(2);
+	}
+
+	return ret;
+}
+
+static char *
+xstrdup(const char *str)
+{
+	char *ret;
+
+	ret = strdup(str);
+	if (ret == NULL) {
+		perror("strdup");
+		exit(2);
+	}
+
+	return ret;
+}
+
+/**
+ * Parses all of `str` as an unsigned integer in `base`.
+ *
+ * @return false if `str` is not a (non-negative) number, or overflows.
+ */
+static bool
+parse_u64(const char *str, int base, uint64_t *out)
+{
+	char *end;
+
+	if (str[0] == '-')
+		return false;
+
+	errno = 0;
+	*out = strtoull(str, &end, base);
+	return errno == 0 && end != str && *end == '\0';
+}
+
+/**
+ * Fingerprints a pipe or other stream we can't map or `pread`.
+ */
+static bool
+fprint_stream(struct umash_fp *fp, int fd)
+{
+	struct umash_fp_state state;
+	char *buf;
+	bool ret = false;
+
+	buf = malloc(STREAM_BUFFER_SIZE);
+	if (buf == NULL)
+		return false;
+
+	umash_fp_init(&state, &params, 0);
+	for (;;) {
+		ssize_t r;
+
+		r = read(fd, buf, STREAM_BUFFER_SIZE);
+		if (r < 0) {
+			if (errno == EINTR)
+				continue;
+
+			goto out;
+		}
+
+		if (r == 0)
+			break;
+
+		umash_sink_update(&state.sink, buf, r);
+	}
+
+	*fp = umash_fp_digest(&state);
+	ret = true;
+
+out:
+	free(buf);
+	return ret;
+}
+
+static void
+run_job(struct job *job)
+{
+	struct stat st;
+	int fd;
+
+	if (strcmp(job->path, "-") == 0) {
+		if (!fprint_stream(&job->actual, STDIN_FILENO))
+			job->error = errno;
+		return;
+	}
+
+	fd = open(job->path, O_RDONLY | O_CLOEXEC);
+	if (fd < 0 || fstat(fd, &st) != 0) {
+		job->error = errno;
+		goto out;
+	}
+
+	if (S_ISDIR(st.st_mode)) {
+		job->error = EISDIR;
+	} else if (!S_ISREG(st.st_mode)) {
+		if (!fprint_stream(&job->actual, fd))
+			job->error = errno;
+	} else if (!umash_fprint_fd(
+		       &job->actual, &params, 0, fd, 0, st.st_size, io_flags)) {
+		job->error = errno;
+	}
+
+out:
+	if (fd >= 0)
+		close(fd);
+	return;
+}
+
+static void *
+worker(void *arg)
+{
+
+	(void)arg;
+	for (;;) {
+		size_t i = __atomic_fetch_add(&next_job, 1, __ATOMIC_RELAXED);
+
+		if (i >= n_jobs)
+			break;
+
+		run_job(schedule[i]);
+	}
+
+	return NULL;
+}
+
+static int
+cmp_job_size(const void *x, const void *y)
+{
+	const struct job *a = *(struct job *const *)x;
+	const struct job *b = *(struct job *const *)y;
+
+	/* Largest first. */
+	return (a->size < b->size) - (a->size > b->size);
+}
+
+/**
+ * Runs all the jobs on `n_threads` threads (including the caller).
+ */
+static void
+run_jobs(struct job *jobs, size_t count, size_t n_threads)
+{
+	pthread_t *threads;
+	size_t n_spawned = 0;
+
+	schedule = xrealloc(NULL, (count + 1) * sizeof(*schedule));
+	for (size_t i = 0; i < count; i++) {
+		struct stat st;
+
+		jobs[i].size = 0;
+		if (stat(jobs[i].path, &st) == 0 && S_ISREG(st.st_mode))
+			jobs[i].size = st.st_size;
+
+		schedule[i] = &jobs[i];
+	}
+
+	qsort(schedule, count, sizeof(*schedule), cmp_job_size);
+	n_jobs = count;
+	next_job = 0;
+
+	if (n_threads > count)
+		n_threads = count;
+
+	threads = xrealloc(NULL, (n_threads + 1) * sizeof(*threads));
+	for (size_t i = 1; i < n_threads; i++) {
+		if (pthread_create(&threads[n_spawned], NULL, worker, NULL) != 0)
+			break;
+
+		n_spawned++;
+	}
+
+	(void)worker(NULL);
+	for (size_t i = 0; i < n_spawned; i++)
+		pthread_join(threads[i], NULL);
+
+	free(threads);
+	free(schedule);
+	schedule = NULL;
+	return;
+}
+
+static bool
+needs_escape(const char *path)
+{
+
+	return strpbrk(path, "\\\n") != NULL;
+}
+
+static void
+print_path(FILE *stream, const char *path)
+{
+
+	for (const char *p = path; *p != '\0'; p++) {
+		if (*p == '\\') {
+			fputs("\\\\", stream);
+		} else if (*p == '\n') {
+			fputs("\\n", stream);
+		} else {
+			putc(*p, stream);
+		}
+	}
+
+	return;
+}
+
+/**
+ * Prints `path` to `stream` for `--check` reports and errors: names
+ * that need escaping get a leading backslash, like in manifests.
+ */
+static void
+print_name(FILE *stream, const char *path)
+{
+
+	if (needs_escape(path))
+		putc('\\', stream);
+	print_path(stream, path);
+	return;
+}
+
+/**
+ * Prints "umashsum: `path`: `message`" to stderr.
+ */
+static void
+report_error(const char *path, const char *message)
+{
+
+	fputs("umashsum: ", stderr);
+	print_name(stderr, path);
+	fprintf(stderr, ": %s\n", message);
+	return;
+}
+
+/**
+ * Undoes `print_path`'s escaping in place.
+ *
+ * @return false for invalid escape sequences.
+ */
+static bool
+unescape_path(char *path)
+{
+	char *dst = path;
+
+	for (const char *src = path; *src != '\0'; src++) {
+		if (*src != '\\') {
+			*dst++ = *src;
+			continue;
+		}
+
+		src++;
+		if (*src == '\\') {
+			*dst++ = '\\';
+		} else if (*src == 'n') {
+			*dst++ = '\n';
+		} else {
+			return false;
+		}
+	}
+
+	*dst = '\0';
+	return true;
+}
+
+static bool
+parse_hex64(const char *str, uint64_t *out)
+{
+	uint64_t acc = 0;
+
+	for (size_t i = 0; i < 16; i++) {
+		char c = str[i];
+		unsigned int digit;
+
+		if (c >= '0' && c <= '9') {
+			digit = c - '0';
+		} else if (c >= 'a' && c <= 'f') {
+			digit = 10 + c - 'a';
+		} else if (c >= 'A' && c <= 'F') {
+			digit = 10 + c - 'A';
+		} else {
+			return false;
+		}
+
+		acc = (acc << 4) | digit;
+	}
+
+	*out = acc;
+	return true;
+}
+
+/**
+ * Parses one manifest line (without its newline) into `job`.
+ */
+static bool
+parse_line(char *line, struct job *job)
+{
+	bool escaped = false;
+
+	if (line[0] == '\\') {
+		escaped = true;
+		line++;
+	}
+
+	if (strlen(line) < 35 || !parse_hex64(line, &job->expected.hash[0]) ||
+	    !parse_hex64(line + 16, &job->expected.hash[1]))
+		return false;
+
+	/* "  " for text mode, " *" for binary mode: both mean the same. */
+	if (line[32] != ' ' || (line[33] != ' ' && line[33] != '*'))
+		return false;
+
+	line += 34;
+	if (escaped && !unescape_path(line))
+		return false;
+
+	job->path = xstrdup(line);
+
+	return true;
+}
+
+/**
+ * Appends the jobs listed in manifest `path` (or stdin for "-") to
+ * `*jobs`.  Fails if the manifest can't be read or doesn't list any
+ * job: a truncated or corrupt manifest must not pass a check.
+ */
+static bool
+read_manifest(const char *path, struct job **jobs, size_t *count, size_t *capacity)
+{
+	FILE *file = stdin;
+	char *line = NULL;
+	size_t line_capacity = 0;
+	size_t n_invalid = 0;
+	const size_t initial_count = *count;
+	bool ret = true;
+	ssize_t len;
+
+	if (strcmp(path, "-") != 0) {
+		file = fopen(path, "r");
+		if (file == NULL) {
+			report_error(path, strerror(errno));
+			return false;
+		}
+	}
+
+	while ((len = getline(&line, &line_capacity, file)) >= 0) {
+		if (len > 0 && line[len - 1] == '\n')
+			line[--len] = '\0';
+
+		if (*count == *capacity) {
+			*capacity = 2 * *capacity + 16;
+			*jobs = xrealloc(*jobs, *capacity * sizeof(**jobs));
+		}
+
+		memset(&(*jobs)[*count], 0, sizeof(**jobs));
+		if (!parse_line(line, &(*jobs)[*count])) {
+			n_invalid++;
+			continue;
+		}
+
+		(*count)++;
+	}
+
+	if (ferror(file)) {
+		report_error(path, "read error");
+		ret = false;
+	} else if (*count == initial_count) {
+		report_error(path, "no properly formatted checksum lines found");
+		ret = false;
+	} else if (n_invalid > 0) {
+		fprintf(stderr, "umashsum: WARNING: %zu line%s in ", n_invalid,
+		    (n_invalid == 1) ? "" : "s");
+		print_name(stderr, path);
+		fprintf(stderr, " %s improperly formatted\n",
+		    (n_invalid == 1) ? "is" : "are");
+	}
+
+	free(line);
+	if (file != stdin)
+		fclose(file);
+
+	return ret;
+}
+
+/**
+ * Appends one job per line of `path` (or stdin for "-") to `*jobs`.
+ */
+static bool
+read_file_list(const char *path, struct job **jobs, size_t *count, size_t *capacity)
+{
+	FILE *file = stdin;
+	char *line = NULL;
+	size_t line_capacity = 0;
+	ssize_t len;
+
+	if (strcmp(path, "-") != 0) {
+		file = fopen(path, "r");
+		if (file == NULL) {
+			report_error(path, strerror(errno));
+			return false;
+		}
+	}
+
+	while ((len = getline(&line, &line_capacity, file)) >= 0) {
+		if (len > 0 && line[len - 1] == '\n')
+			line[--len] = '\0';
+
+		if (len == 0)
+			continue;
+
+		if (*count == *capacity) {
+			*capacity = 2 * *capacity + 16;
+			*jobs = xrealloc(*jobs, *capacity * sizeof(**jobs));
+		}
+
+		memset(&(*jobs)[*count], 0, sizeof(**jobs));
+		(*jobs)[(*count)++].path = line;
+		line = NULL;
+		line_capacity = 0;
+	}
+
+	free(line);
+	if (file != stdin)
+		fclose(file);
+
+	return true;
+}
+
+static void
+usage(FILE *stream)
+{
+
+	fprintf(stream,
+	    "Usage: umashsum [OPTION]... [FILE]...\n"
+	    "Print or check UMASH fingerprints.\n\n"
+	    "  -c, --check          read fingerprints from the FILEs and check them\n"
+	    "  -T, --files-from=F   also fingerprint the files listed (one per line) in F\n"
+	    "  -j, --jobs=N         fingerprint up to N files at a time\n"
+	    "                       (default: number of online CPUs)\n"
+	    "      --mmap           always map files in memory\n"
+	    "      --pread          always read files with pread\n"
+	    "      --direct         read files with O_DIRECT\n"
+	    "      --bits=N         derive parameters from N (default 0)\n"
+	    "  -q, --quiet          don't print OK for each verified file\n"
+	    "      --status         don't output anything, the exit code shows success\n"
+	    "  -h, --help           display this help and exit\n\n"
+	    "With no FILE, or when FILE is -, read standard input.\n");
+	return;
+}
+
+enum {
+	OPT_MMAP = 256,
+	OPT_PREAD,
+	OPT_DIRECT,
+	OPT_BITS,
+	OPT_STATUS,
+};
+
+static const struct option long_options[] = {
+	{ "check", no_argument, NULL, 'c' },
+	{ "files-from", required_argument, NULL, 'T' },
+	{ "jobs", required_argument, NULL, 'j' },
+	{ "mmap", no_argument, NULL, OPT_MMAP },
+	{ "pread", no_argument, NULL, OPT_PREAD },
+	{ "direct", no_argument, NULL, OPT_DIRECT },
+	{ "bits", required_argument, NULL, OPT_BITS },
+	{ "quiet", no_argument, NULL, 'q' },
+	{ "status", no_argument, NULL, OPT_STATUS },
+	{ "help", no_argument, NULL, 'h' },
+	{ NULL, 0, NULL, 0 },
+};
+
+int
+main(int argc, char **argv)
+{
+	struct job *jobs = NULL;
+	size_t count = 0, capacity = 0;
+	size_t n_threads = 0;
+	uint64_t bits = 0;
+	bool check = false, quiet = false, status = false;
+	bool listed = false, read_error = false;
+	size_t n_failed = 0, n_unreadable = 0;
+	int opt;
+
+	while ((opt = getopt_long(argc, argv, "cT:j:qh", long_options, NULL)) != -1) {
+		switch (opt) {
+		case 'c':
+			check = true;
+			break;
+		case 'T':
+			listed = true;
+			if (!read_file_list(optarg, &jobs, &count, &capacity))
+				read_error = true;
+			break;
+		case 'j': {
+			uint64_t value;
+
+			if (!parse_u64(optarg, 10, &value) || value > SIZE_MAX) {
+				fprintf(stderr, "umashsum: invalid number of jobs: %s\n",
+				    optarg);
+				usage(stderr);
+				return 2;
+			}
+
+			n_threads = value;
+			break;
+		}
+		case OPT_MMAP:
+			io_flags |= UMASH_FD_MMAP;
+			break;
+		case OPT_PREAD:
+			io_flags |= UMASH_FD_PREAD;
+			break;
+		case OPT_DIRECT:
+			io_flags |= UMASH_FD_DIRECT;
+			break;
+		case OPT_BITS:
+			if (!parse_u64(optarg, 0, &bits)) {
+				fprintf(stderr, "umashsum: invalid bits: %s\n", optarg);
+				usage(stderr);
+				return 2;
+			}
+
+			break;
+		case 'q':
+			quiet = true;
+			break;
+		case OPT_STATUS:
+			status = true;
+			break;
+		case 'h':
+			usage(stdout);
+			return 0;
+		default:
+			usage(stderr);
+			return 2;
+		}
+	}
+
+	umash_params_derive(&params, bits, NULL);
+
+	if (n_threads == 0) {
+		long n_cpus = sysconf(_SC_NPROCESSORS_ONLN);
+
+		n_threads = (n_cpus > 0) ? (size_t)n_cpus : 1;
+	}
+
+	if (optind == argc && !listed) {
+		static char *stdin_only[] = { "-", NULL };
+
+		argv = stdin_only;
+		argc = 1;
+		optind = 0;
+	}
+
+	for (int i = optind; i < argc; i++) {
+		if (check) {
+			if (!read_manifest(argv[i], &jobs, &count, &capacity))
+				read_error = true;
+			continue;
+		}
+
+		if (count == capacity) {
+			capacity = 2 * capacity + 16;
+			jobs = xrealloc(jobs, capacity * sizeof(*jobs));
+		}
+
+		memset(&jobs[count], 0, sizeof(*jobs));
+		jobs[count].path = xstrdup(argv[i]);
+		count++;
+	}
+
+	run_jobs(jobs, count, n_threads);
+
+	/* Report in input order. */
+	for (size_t i = 0; i < count; i++) {
+		const struct job *job = &jobs[i];
+
+		if (job->error != 0) {
+			n_unreadable++;
+			if (!status)
+				report_error(job->path, strerror(job->error));
+			if (check && !status) {
+				print_name(stdout, job->path);
+				printf(": FAILED open or read\n");
+			}
+			continue;
+		}
+
+		if (check) {
+			bool ok = job->actual.hash[0] == job->expected.hash[0] &&
+			    job->actual.hash[1] == job->expected.hash[1];
+
+			n_failed += !ok;
+			if (!status && (!ok || !quiet)) {
+				print_name(stdout, job->path);
+				printf(": %s\n", ok ? "OK" : "FAILED");
+			}
+			continue;
+		}
+
+		if (needs_escape(job->path))
+			putchar('\\');
+		printf("%016" PRIx64 "%016" PRIx64 "  ", job->actual.hash[0],
+		    job->actual.hash[1]);
+		print_path(stdout, job->path);
+		putchar('\n');
+	}
+
+	if (check && !status) {
+		if (n_unreadable > 0)
+			fprintf(stderr,
+			    "umashsum: WARNING: %zu listed file%s could not be read\n",
+			    n_unreadable, (n_unreadable == 1) ? "" : "s");
+		if (n_failed > 0)
+			fprintf(stderr,
+			    "umashsum: WARNING: %zu computed checksum%s did NOT match\n",
+			    n_failed, (n_failed == 1) ? "" : "s");
+	}
+
+	for (size_t i = 0; i < count; i++)
+		free(jobs[i].path);
+	free(jobs);
+
+	if (fflush(stdout) != 0)
+		return 2;
+
+	return (read_error || n_failed > 0 || n_unreadable > 0) ? 1 : 0;
+}